@@ -0,0 +1,139 @@
+"""
+Priority-based admission control
+
+Every request is classed 'low' (polling and other reads a client simply
+retries), 'high' (booking, ride state changes, payments) or 'normal'. The
+controller watches two load signals:
+
+- requests in flight in this process, against ADMISSION_MAX_IN_FLIGHT
+- mean latency of the requests finished in the last
+  ADMISSION_WINDOW_SECONDS, against ADMISSION_TARGET_MS. Each request
+  counts for at most twice the critical latency, so one slow export
+  cannot push the mean over the limit on its own
+
+When either is over its limit, new low-priority requests are turned away
+with 503 and Retry-After so the threads stay free for high-priority work.
+At ADMISSION_CRITICAL_FACTOR times the latency target, normal requests are
+shed too. High-priority requests are always admitted. The latency window
+only holds recent requests, so shedding stops on its own once load drops.
+Event streams and exports are shed like any other request but, being
+long-lived, are neither counted nor timed.
+"""
+
+import threading
+import time
+from collections import deque
+
+from flask import current_app, g, request
+
+MIN_SAMPLES = 20  # too few requests in the window to judge latency
+OUTLIER_FACTOR = 2  # samples are clamped to this multiple of the critical latency
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed"""
+
+    def __init__(self, retry_after, priority):
+        super().__init__(f'Shedding {priority} priority requests, retry after {retry_after}s')
+        self.retry_after = retry_after
+        self.priority = priority
+
+
+class AdmissionController:
+    """Sheds low-priority requests first when in-flight count or latency rises"""
+
+    def __init__(self, max_in_flight=24, target_seconds=0.25, critical_factor=4, window_seconds=5,
+                 retry_after=2, priorities=None, exempt=(), untracked=(), on_shed=None, clock=time.monotonic):
+        self.max_in_flight = max_in_flight
+        self.target_seconds = target_seconds
+        self.critical_factor = critical_factor
+        self.window_seconds = window_seconds
+        self.retry_after = retry_after
+        self.priorities = dict(priorities or {})  # endpoint -> priority, default 'normal'
+        self.exempt = frozenset(exempt)  # endpoints neither counted nor shed
+        self.untracked = frozenset(untracked)  # shed, but too long-lived (streams) to count or time
+        self.on_shed = on_shed  # called with (endpoint, priority) for each shed request
+        self.clock = clock
+        self.in_flight = 0
+        self.shed = 0
+        self._samples = deque()  # (finished_at, seconds)
+        self._total = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+        app.extensions['admission'] = self
+
+    def _evict(self, now):
+        cutoff = now - self.window_seconds
+        while self._samples and self._samples[0][0] < cutoff:
+            self._total -= self._samples.popleft()[1]
+
+    def latency(self):
+        """Mean clamped latency over the window, or None with too few samples"""
+        with self._lock:
+            self._evict(self.clock())
+            if len(self._samples) < MIN_SAMPLES:
+                return None
+            return self._total / len(self._samples)
+
+    def shed_level(self):
+        """0: admit everything, 1: shed low, 2: shed low and normal"""
+        latency = self.latency()
+        if latency is not None and latency > self.target_seconds * self.critical_factor:
+            return 2
+        if self.in_flight >= self.max_in_flight or (latency is not None and latency > self.target_seconds):
+            return 1
+        return 0
+
+    def admit(self, priority, track=True):
+        """Count a request in, or raise Overloaded; pair with release()"""
+        if priority != 'high':
+            level = self.shed_level()
+            if level >= 2 or (level == 1 and priority == 'low'):
+                with self._lock:
+                    self.shed += 1
+                raise Overloaded(self.retry_after, priority)
+        if not track:
+            return None
+        with self._lock:
+            self.in_flight += 1
+        return self.clock()
+
+    def release(self, started):
+        now = self.clock()
+        seconds = min(now - started, self.target_seconds * self.critical_factor * OUTLIER_FACTOR)
+        with self._lock:
+            self.in_flight -= 1
+            self._samples.append((now, seconds))
+            self._total += seconds
+            self._evict(now)
+
+    def stats(self):
+        latency = self.latency()
+        return {
+            'in_flight': self.in_flight,
+            'latency_ms': round(latency * 1000, 1) if latency is not None else None,
+            'shed_level': self.shed_level(),
+            'shed': self.shed,
+        }
+
+    # Flask hooks
+
+    def _before_request(self):
+        endpoint = request.endpoint
+        if not current_app.config['ADMISSION_CONTROL'] or endpoint is None or endpoint in self.exempt:
+            return
+        priority = self.priorities.get(endpoint, 'normal')
+        try:
+            g._admitted_at = self.admit(priority, track=endpoint not in self.untracked)
+        except Overloaded:
+            if self.on_shed is not None:
+                self.on_shed(endpoint, priority)
+            raise
+
+    def _teardown_request(self, exc):
+        started = g.pop('_admitted_at', None)
+        if started is not None:
+            self.release(started)
@@ -1,34 +1,200 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
+from flask import Flask, Blueprint, Response, current_app, render_template, request, jsonify, session, redirect, url_for, flash, stream_with_context
+from flask.cli import with_appcontext
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, and_, or_, case, delete, exists, func, insert, inspect, literal, select, text, union_all, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased, joinedload, selectinload
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta, timezone
+import click
+import math
 import uuid
-import qrcode
-import io
 import base64
 import json
 import os
+import hashlib
+import threading
+from collections import defaultdict
 from functools import wraps
+from types import SimpleNamespace
+from urllib.parse import urlencode
+from events import ChannelFeed, load_event_bus, format_sse
+from location import LocationStore
+from geo import GridIndex, valid_coordinates
+from qr import QRCache, FORMATS as QR_FORMATS, qr_digest, render_qr
+from workers import PeriodicWorker, PoolSaturated, create_pool
+from ratelimit import RateLimited, RateLimiter, load_bucket_store
+from admission import AdmissionController, Overloaded
+from metrics import Instrumentation, setup_logging
+from identity import IdentityCache
+from assets import init_assets
+from exports import FORMATS as EXPORT_FORMATS, encode_chunks, gzip_chunks
+from upi import SIGNATURE_HEADER, STATUSES as UPI_STATUSES, intent_uri, verify_signature
+from search import drop_search_index, install_search_index, place_match_clause, ride_match_clause
+from driver_stats import drop_driver_stats, install_driver_stats
+from ride_version import drop_ride_version, install_ride_version
+from schedules import format_weekdays, occurrences, parse_departure_time, parse_weekdays
+from config import config, engine_options
+import migrations
 
-app = Flask(__name__)
+logger = setup_logging()
 
-# Load configuration
-config_name = os.environ.get('FLASK_ENV', 'development')
-if config_name == 'production':
-    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY')
-    if not app.config['SECRET_KEY']:
+db = SQLAlchemy()
+login_manager = LoginManager()
+login_manager.login_view = 'main.login'
+
+bp = Blueprint('main', __name__)
+
+# Process-wide runtime services, (re)bound by create_app
+event_bus = None
+location_store = None
+ride_index = None
+cpu_pool = None
+qr_cache = None
+fare_engine = None  # built on first use; see get_fare_engine()
+identity_cache = None
+sync_feed = None
+stream_slots = None
+instrumentation = None
+
+def _set_sqlite_pragmas(busy_timeout_ms):
+    def set_pragmas(dbapi_connection, connection_record):
+        # WAL lets readers run alongside a writer; busy_timeout makes concurrent
+        # writers wait for the lock instead of failing with "database is locked"
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)}')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+    return set_pragmas
+
+def create_app(config_name=None):
+    """Build the Flask app for a config.config entry (default: $FLASK_ENV)"""
+    global event_bus, location_store, ride_index, cpu_pool, qr_cache, identity_cache, sync_feed, stream_slots, \
+        fare_engine, instrumentation
+
+    config_name = config_name or os.environ.get('FLASK_ENV', 'development')
+    settings = config.get(config_name, config['default'])
+    app = Flask(__name__)
+    app.config.from_object(settings)
+    if config_name == 'production' and not app.config['SECRET_KEY']:
         raise ValueError("SECRET_KEY environment variable must be set in production")
-else:
-    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key-for-development-only')
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI'], settings))
+    if app.config['PROXY_FIX_X_FOR']:
+        # Rate limits key on the client address, not the proxy's
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
 
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///edu_ride.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    login_manager.init_app(app)
+    app.register_blueprint(bp)
+    init_assets(app)
+    app.cli.add_command(migrations.upgrade_command)
+    app.cli.add_command(extend_schedules_command)
+    app.cli.add_command(archive_rides_command)
+    app.cli.add_command(settle_payments_command)
 
-db = SQLAlchemy(app)
-login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login'
+    event_bus = load_event_bus(app.config['EVENT_BUS'])
+    app.extensions['event_bus'] = event_bus
+    # Each open stream holds a server thread; see SSE_MAX_STREAMS
+    stream_slots = threading.BoundedSemaphore(app.config['SSE_MAX_STREAMS'])
+
+    location_store = LocationStore(
+        capacity=app.config['LOCATION_BUFFER_SIZE'],
+        persist_interval=app.config['LOCATION_PERSIST_INTERVAL'],
+        status_recheck=app.config['LOCATION_STATUS_RECHECK']
+    )
+    app.extensions['location_store'] = location_store
+
+    ride_index = GridIndex(cell_degrees=app.config['NEARBY_CELL_DEGREES'])
+    app.extensions['ride_index'] = ride_index
+
+    # Password hashing and QR rendering are CPU-bound; keep them off request threads
+    cpu_pool = create_pool(
+        max_workers=app.config['WORKER_POOL_SIZE'],
+        max_queue=app.config['WORKER_POOL_QUEUE'],
+        kind=app.config['WORKER_POOL_KIND'],
+        timeout=app.config['WORKER_POOL_TIMEOUT']
+    )
+    app.extensions['cpu_pool'] = cpu_pool
+
+    qr_cache = QRCache(
+        max_entries=app.config['QR_CACHE_SIZE'],
+        cache_dir=app.config['QR_CACHE_DIR'],
+        renderer=lambda payload, fmt: cpu_pool.run(render_qr, payload, fmt)
+    )
+    app.extensions['qr_cache'] = qr_cache
+
+    identity_cache = IdentityCache(max_entries=app.config['IDENTITY_CACHE_SIZE'], ttl=app.config['IDENTITY_CACHE_TTL'])
+    app.extensions['identity_cache'] = identity_cache
+
+    # The nearby index and identity cache follow SYNC_CHANNEL, so with a
+    # shared EVENT_BUS every worker sees changes committed by the others
+    sync_feed = ChannelFeed(event_bus, SYNC_CHANNEL, apply_sync_event, reset_synced_state)
+    app.extensions['sync_feed'] = sync_feed
+    
+    fare_engine = None
+
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            event.listen(db.engine, 'connect', _set_sqlite_pragmas(app.config['SQLITE_BUSY_TIMEOUT_MS']))
+        instrumentation = Instrumentation(app, db.engine)
+    
+    # Cheap rejections first: per-client rate limits, then load shedding by priority
+    rate_limited = instrumentation.counter('edu_ride_rate_limited_total', 'Requests rejected by a rate limit',
+                                           ('endpoint', 'scope'))
+    RateLimiter(load_bucket_store(app.config['RATE_LIMIT_STORAGE']), app.config['RATE_LIMITS'],
+                on_limited=rate_limited.inc).init_app(app)
+    shed = instrumentation.counter('edu_ride_requests_shed_total', 'Requests shed by admission control',
+                                   ('endpoint', 'priority'))
+    priorities = dict.fromkeys(app.config['ADMISSION_LOW_PRIORITY'], 'low')
+    priorities.update(dict.fromkeys(app.config['ADMISSION_HIGH_PRIORITY'], 'high'))
+    admission = AdmissionController(
+        max_in_flight=app.config['ADMISSION_MAX_IN_FLIGHT'],
+        target_seconds=app.config['ADMISSION_TARGET_MS'] / 1000,
+        critical_factor=app.config['ADMISSION_CRITICAL_FACTOR'],
+        window_seconds=app.config['ADMISSION_WINDOW_SECONDS'],
+        retry_after=app.config['ADMISSION_RETRY_AFTER'],
+        priorities=priorities,
+        exempt=app.config['ADMISSION_EXEMPT'],
+        untracked=app.config['ADMISSION_UNTRACKED'],
+        on_shed=shed.inc
+    )
+    admission.init_app(app)
+    instrumentation.gauge('edu_ride_admission_in_flight', 'Requests in flight as seen by admission control',
+                          lambda: admission.in_flight)
+    instrumentation.gauge('edu_ride_admission_shed_level', 'Requests being shed: 0 none, 1 low, 2 low and normal',
+                          admission.shed_level)
+    instrumentation.gauge('edu_ride_worker_pool_in_flight', 'Jobs running or queued in the CPU pool',
+                          lambda: cpu_pool.in_flight)
+    instrumentation.gauge('edu_ride_worker_pool_queue_depth', 'Jobs waiting for a CPU pool worker',
+                          lambda: cpu_pool.queue_depth)
+    instrumentation.callback_counter('edu_ride_worker_pool_rejected_total', 'Jobs rejected because the pool was full',
+                                     lambda: cpu_pool.rejected)
+    instrumentation.callback_counter('edu_ride_worker_pool_timed_out_total', 'Jobs the caller stopped waiting for',
+                                     lambda: cpu_pool.timed_out)
+    instrumentation.gauge('edu_ride_worker_pool_queue_seconds_avg', 'Mean time jobs waited for a worker',
+                          lambda: cpu_pool.stats()['queue_seconds_avg'])
+    instrumentation.callback_counter('edu_ride_qr_cache_hits_total', 'QR images served from memory',
+                                     lambda: qr_cache.hits)
+    instrumentation.callback_counter('edu_ride_qr_cache_misses_total', 'QR images rendered', lambda: qr_cache.misses)
+    instrumentation.gauge('edu_ride_identity_cache_hit_ratio', 'Share of user lookups served from memory',
+                          lambda: identity_cache.hit_ratio)
+    instrumentation.gauge('edu_ride_identity_cache_entries', 'Users in the identity cache', lambda: len(identity_cache))
+    instrumentation.gauge('edu_ride_identity_cache_bytes', 'Approximate identity cache size',
+                          lambda: identity_cache.bytes)
+    instrumentation.gauge('edu_ride_route_cache_entries', 'Corridors in the in-memory route cache',
+                          lambda: len(fare_engine) if fare_engine is not None else 0)
+    instrumentation.callback_counter('edu_ride_route_cache_misses_total', 'Corridors sent to the routing backend',
+                                     lambda: fare_engine.misses if fare_engine is not None else 0)
+    instrumentation.gauge('edu_ride_tracked_rides', 'Rides with live location buffers', lambda: len(location_store))
+    instrumentation.gauge('edu_ride_nearby_index_size', 'Rides in the nearby-search index', lambda: len(ride_index))
+    instrumentation.callback_counter('edu_ride_sync_resets_total',
+                                     'Rebuilds of the nearby index and identity cache after missed events',
+                                     lambda: sync_feed.resets)
+    return app
 
 # Database Models
 class User(UserMixin, db.Model):
@@ -49,10 +215,15 @@ class User(UserMixin, db.Model):
     university = db.Column(db.String(100), nullable=True)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = cpu_pool.run(generate_password_hash, password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return cpu_pool.run(check_password_hash, self.password_hash, password)
+
+# Partial indexes are only used when a query repeats their condition verbatim,
+# constants included, so this is spelled out rather than bound as parameters
+UNFINISHED_RIDE = "status NOT IN ('completed', 'cancelled')"
+PENDING_PAYMENT = "status = 'pending'"
 
 class Ride(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -61,6 +232,10 @@ class Ride(db.Model):
     student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     pickup_location = db.Column(db.String(200), nullable=False)
     dropoff_location = db.Column(db.String(200), nullable=False)
+    pickup_lat = db.Column(db.Float, nullable=True)
+    pickup_lng = db.Column(db.Float, nullable=True)
+    dropoff_lat = db.Column(db.Float, nullable=True)
+    dropoff_lng = db.Column(db.Float, nullable=True)
     pickup_time = db.Column(db.DateTime, nullable=False)
     status = db.Column(db.String(20), default='available')  # available, booked, in_progress, completed, cancelled
     fare = db.Column(db.Float, nullable=False)
@@ -68,10 +243,55 @@ class Ride(db.Model):
     max_passengers = db.Column(db.Integer, default=1)
     current_passengers = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    schedule_id = db.Column(db.Integer, db.ForeignKey('ride_schedule.id'), nullable=True)
+    amount_paid = db.Column(db.Float, nullable=True)  # sum of settled payments
     
     # Relationships
     driver = db.relationship('User', foreign_keys=[driver_id], backref='driver_rides')
     student = db.relationship('User', foreign_keys=[student_id], backref='student_rides')
+    
+    __table_args__ = (
+        # Available-ride listing: WHERE status = ? ORDER BY pickup_time
+        db.Index('ix_ride_status_pickup_time', 'status', 'pickup_time'),
+        # Driver dashboard: WHERE driver_id = ? ORDER BY created_at
+        db.Index('ix_ride_driver_created_at', 'driver_id', 'created_at'),
+        # Driver dashboard pages of unfinished rides: WHERE driver_id = ? AND
+        # status NOT IN (...) ORDER BY pickup_time, id. Partial, so paging never
+        # walks past a driver's finished rides
+        db.Index('ix_ride_driver_active', 'driver_id', 'pickup_time',
+                 sqlite_where=text(UNFINISHED_RIDE), postgresql_where=text(UNFINISHED_RIDE)),
+        # A schedule never materialises the same departure twice
+        db.Index('uq_ride_schedule_pickup', 'schedule_id', 'pickup_time', unique=True),
+    )
+
+class RideSchedule(db.Model):
+    """A driver's recurring route; rides are materialised a rolling window ahead"""
+    id = db.Column(db.Integer, primary_key=True)
+    driver_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    pickup_location = db.Column(db.String(200), nullable=False)
+    dropoff_location = db.Column(db.String(200), nullable=False)
+    pickup_lat = db.Column(db.Float, nullable=True)
+    pickup_lng = db.Column(db.Float, nullable=True)
+    dropoff_lat = db.Column(db.Float, nullable=True)
+    dropoff_lng = db.Column(db.Float, nullable=True)
+    weekdays = db.Column(db.Integer, nullable=False)  # bit mask, Monday = 1
+    departure_time = db.Column(db.Time, nullable=False)
+    fare = db.Column(db.Float, nullable=False)
+    is_group_ride = db.Column(db.Boolean, default=False)
+    max_passengers = db.Column(db.Integer, default=1)
+    starts_on = db.Column(db.Date, nullable=False)
+    ends_on = db.Column(db.Date, nullable=True)
+    active = db.Column(db.Boolean, default=True)
+    materialized_until = db.Column(db.Date, nullable=True)  # last day with rides created
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    driver = db.relationship('User', backref='ride_schedules')
+    
+    __table_args__ = (
+        # Rolling window top-up: WHERE active AND materialized_until < ?
+        db.Index('ix_ride_schedule_active_until', 'active', 'materialized_until'),
+    )
 
 class GroupRide(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -83,6 +303,34 @@ class GroupRide(db.Model):
     # Relationships
     ride = db.relationship('Ride', backref='group_members')
     student = db.relationship('User', backref='group_rides')
+    
+    __table_args__ = (
+        db.UniqueConstraint('ride_id', 'student_id', name='uq_group_ride_member'),
+    )
+
+class RideRequest(db.Model):
+    """A student's request to be placed on a group ride by the matcher"""
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    pickup_location = db.Column(db.String(200), nullable=True)
+    pickup_lat = db.Column(db.Float, nullable=False)
+    pickup_lng = db.Column(db.Float, nullable=False)
+    dropoff_lat = db.Column(db.Float, nullable=True)
+    dropoff_lng = db.Column(db.Float, nullable=True)
+    earliest_pickup = db.Column(db.DateTime, nullable=False)
+    latest_pickup = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(20), default='pending')  # pending, matched, expired
+    ride_id = db.Column(db.Integer, db.ForeignKey('ride.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    matched_at = db.Column(db.DateTime, nullable=True)
+    
+    # Relationships
+    student = db.relationship('User', backref='ride_requests')
+    ride = db.relationship('Ride', backref='ride_requests')
+    
+    __table_args__ = (
+        db.Index('ix_ride_request_status_created', 'status', 'created_at'),
+    )
 
 class Payment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -91,57 +339,435 @@ class Payment(db.Model):
     student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     amount = db.Column(db.Float, nullable=False)
     payment_method = db.Column(db.String(20), nullable=False)  # 'upi', 'cash'
-    status = db.Column(db.String(20), default='pending')  # pending, completed, failed
+    status = db.Column(db.String(20), default='pending')  # pending, completed, failed, expired
     qr_code = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    idempotency_key = db.Column(db.String(64), nullable=True)  # client-chosen, unique per student
+    provider_ref = db.Column(db.String(64), nullable=True)  # UPI transaction reference (UTR)
+    settled_at = db.Column(db.DateTime, nullable=True)
     
     # Relationships
     ride = db.relationship('Ride', backref='payments')
     student = db.relationship('User', backref='payments')
+    
+    __table_args__ = (
+        db.Index('ix_payment_ride_id', 'ride_id'),
+        # A retried submission finds the payment its first attempt created
+        db.Index('uq_payment_idempotency', 'student_id', 'idempotency_key', unique=True),
+        # Expiry sweep: WHERE status = 'pending' AND created_at < ?
+        db.Index('ix_payment_status_created', 'status', 'created_at'),
+        # At most one pending payment per passenger and ride, whatever its key
+        db.Index('uq_payment_pending', 'ride_id', 'student_id', unique=True,
+                 sqlite_where=text(PENDING_PAYMENT), postgresql_where=text(PENDING_PAYMENT)),
+    )
+
+class PaymentEvent(db.Model):
+    """Inbox of provider callbacks and cash confirmations, applied by settle_payments()"""
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.String(64), unique=True, nullable=False)  # redeliveries are dropped
+    provider = db.Column(db.String(20), nullable=False)  # 'upi' or 'cash'
+    payment_id = db.Column(db.String(36), nullable=False)  # Payment.payment_id
+    status = db.Column(db.String(20), nullable=False)  # SUCCESS, FAILURE
+    amount = db.Column(db.Float, nullable=True)
+    provider_ref = db.Column(db.String(64), nullable=True)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime, nullable=True)
+    result = db.Column(db.String(20), nullable=True)  # completed, failed, unmatched, already_paid, ...
+    
+    __table_args__ = (
+        # Settlement scan: WHERE processed_at IS NULL ORDER BY id
+        db.Index('ix_payment_event_processed', 'processed_at', 'id'),
+    )
+
+class RideLocation(db.Model):
+    """Downsampled driver location trail, persisted from the in-memory buffer"""
+    id = db.Column(db.Integer, primary_key=True)
+    ride_id = db.Column(db.Integer, db.ForeignKey('ride.id'), nullable=False)
+    lat = db.Column(db.Float, nullable=False)
+    lng = db.Column(db.Float, nullable=False)
+    recorded_at = db.Column(db.DateTime, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_ride_location_ride_recorded', 'ride_id', 'recorded_at'),
+    )
+
+class Notification(db.Model):
+    """Append-only per-user event log, written with the ride change it describes"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    ride_id = db.Column(db.Integer, db.ForeignKey('ride.id'), nullable=True)
+    event = db.Column(db.String(30), nullable=False)  # ride.created, ride.booked, ...
+    level = db.Column(db.String(20), default='info')  # Bootstrap alert style
+    message = db.Column(db.String(300), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    ride = db.relationship('Ride')
+    
+    __table_args__ = (
+        # Incremental feed: WHERE user_id = ? AND id > ? ORDER BY id
+        db.Index('ix_notification_user_id', 'user_id', 'id'),
+    )
+
+class CachedRoute(db.Model):
+    """Persistent route estimate between two geohash cells"""
+    id = db.Column(db.Integer, primary_key=True)
+    pickup_cell = db.Column(db.String(12), nullable=False)
+    dropoff_cell = db.Column(db.String(12), nullable=False)
+    backend = db.Column(db.String(20), nullable=False)
+    distance_m = db.Column(db.Float, nullable=False)
+    duration_s = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('pickup_cell', 'dropoff_cell', 'backend', name='uq_cached_route_cells'),
+    )
+
+class Place(db.Model):
+    """A pickup or drop-off name and how many rides have used it.
+
+    Rows and counts are maintained by database triggers; see search.py.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(200), unique=True, nullable=False)
+    ride_count = db.Column(db.Integer, nullable=False, default=0)
+
+class DriverStats(db.Model):
+    """Lifetime totals of a driver's rides in one status.
+
+    Maintained by database triggers on ride; see driver_stats.py.
+    """
+    driver_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    rides = db.Column(db.Integer, nullable=False, default=0)
+    earnings = db.Column(db.Float, nullable=False, default=0)  # fare x passengers
+    collected = db.Column(db.Float, nullable=False, default=0)  # settled payments
+    group_rides = db.Column(db.Integer, nullable=False, default=0)
+    seats_offered = db.Column(db.Integer, nullable=False, default=0)  # group rides only
+    seats_filled = db.Column(db.Integer, nullable=False, default=0)
+
+class DriverDailyStats(db.Model):
+    """A driver's completed rides per pickup day; maintained like DriverStats"""
+    driver_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    rides = db.Column(db.Integer, nullable=False, default=0)
+    earnings = db.Column(db.Float, nullable=False, default=0)
+    collected = db.Column(db.Float, nullable=False, default=0)
+
+class RideVersion(db.Model):
+    """Single row counting ride changes, bumped by triggers; see ride_version.py"""
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+# Archive tables
+#
+# Completed and cancelled rides, with their group memberships, payments and
+# location trail, are moved here by archive_finished_rides() once they are
+# ARCHIVE_AFTER_DAYS old. Each mirrors its hot table's columns without
+# constraints, plus archived_at.
+def _archive_table(model, *indexes):
+    columns = [db.Column(c.name, c.type, primary_key=c.primary_key, autoincrement=False)
+               for c in model.__table__.columns]
+    return db.Table(f'{model.__table__.name}_archive', *columns,
+                    db.Column('archived_at', db.DateTime, nullable=False), *indexes)
+
+ride_archive = _archive_table(
+    Ride,
+    db.Index('ix_ride_archive_driver_pickup', 'driver_id', 'pickup_time'),
+    db.Index('ix_ride_archive_student_pickup', 'student_id', 'pickup_time'))
+group_ride_archive = _archive_table(
+    GroupRide,
+    db.Index('ix_group_ride_archive_student', 'student_id'))
+payment_archive = _archive_table(
+    Payment,
+    db.Index('ix_payment_archive_ride', 'ride_id'),
+    db.Index('ix_payment_archive_student', 'student_id'))
+ride_location_archive = _archive_table(
+    RideLocation,
+    db.Index('ix_ride_location_archive_ride', 'ride_id', 'recorded_at'))
+
+# Full-text search tables and the statistics and version triggers are not
+# models; install them with the schema (create_all or upgrade-db) and drop
+# them with it
+event.listen(db.metadata, 'after_create', lambda target, connection, **kw: install_search_index(connection))
+event.listen(db.metadata, 'after_create', lambda target, connection, **kw: install_driver_stats(connection))
+event.listen(db.metadata, 'after_create', lambda target, connection, **kw: install_ride_version(connection))
+event.listen(db.metadata, 'before_drop', lambda target, connection, **kw: drop_search_index(connection))
+event.listen(db.metadata, 'before_drop', lambda target, connection, **kw: drop_driver_stats(connection))
+event.listen(db.metadata, 'before_drop', lambda target, connection, **kw: drop_ride_version(connection))
+db.metadata.info['upgrade_hooks'] = [install_search_index, install_driver_stats, install_ride_version]
+
+def expire_duplicate_pending_payments(conn):
+    """Before uq_payment_pending exists, older duplicates of a pending payment expire"""
+    if not inspect(conn).has_table('payment'):
+        return []
+    expired = conn.execute(text(
+        "UPDATE payment SET status = 'expired' WHERE status = 'pending' AND EXISTS ("
+        "SELECT 1 FROM payment AS newer WHERE newer.ride_id = payment.ride_id "
+        "AND newer.student_id = payment.student_id AND newer.status = 'pending' AND newer.id > payment.id)"
+    )).rowcount
+    return [f'expire {expired} duplicate pending payments'] if expired else []
+
+db.metadata.info['upgrade_prepare_hooks'] = [expire_duplicate_pending_payments]
+
+# Ride table versioning
+#
+# Triggers bump RideVersion with every committed ride change, in any
+# process. /api/rides seeds its ETag from it, so an unchanged poll costs one
+# primary-key read and a 304.
+def rides_version_query():
+    return select(RideVersion.version).where(RideVersion.id == 1)
+
+def rides_version():
+    return db.session.scalar(rides_version_query()) or 0
+
+@event.listens_for(Session, 'after_flush')
+def _track_user_changes(session, flush_context):
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            # Cached identities of changed users are dropped on commit
+            session.info.setdefault('users_changed', set()).add(obj.id)
+
+@event.listens_for(Session, 'do_orm_execute')
+def _track_user_bulk_changes(orm_execute_state):
+    # Bulk UPDATE/DELETE statements bypass the flush, so catch them here
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ is User:
+            orm_execute_state.session.info['users_changed_all'] = True
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    if identity_cache is not None:
+        changed_all = session.info.pop('users_changed_all', False)
+        changed = session.info.pop('users_changed', ())
+        if changed_all:
+            identity_cache.clear()
+        for user_id in changed:
+            identity_cache.invalidate(user_id)
+        if changed_all or changed:
+            # Other workers drop their copies when they next sync
+            event_bus.publish(SYNC_CHANNEL, 'identity', {'users': None if changed_all else sorted(changed)})
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_on_rollback(session):
+    session.info.pop('users_changed', None)
+    session.info.pop('users_changed_all', None)
+
+# Ride listing loaders
+#
+# Listings touch ride.driver / ride.student / ride.group_members per row; load
+# them up front so a page of N rides costs a constant number of queries.
+def with_ride_relations(query, driver=False, student=False, group_members=False):
+    if driver:
+        query = query.options(joinedload(Ride.driver))
+    if student:
+        query = query.options(joinedload(Ride.student))
+    if group_members:
+        query = query.options(selectinload(Ride.group_members).joinedload(GroupRide.student))
+    return query
+
+def serialize_ride(ride, driver_name=None):
+    return {
+        'id': ride.id,
+        'pickup_location': ride.pickup_location,
+        'dropoff_location': ride.dropoff_location,
+        'pickup_time': ride.pickup_time.isoformat(),
+        'fare': ride.fare,
+        'is_group_ride': ride.is_group_ride,
+        'max_passengers': ride.max_passengers,
+        'current_passengers': ride.current_passengers,
+        'pickup_lat': ride.pickup_lat,
+        'pickup_lng': ride.pickup_lng,
+        'driver_name': driver_name or ride.driver.username
+    }
+
+# Process-local state shared through the event bus
+#
+# The nearby index and the identity cache live in each process. Changes to
+# them are published on SYNC_CHANNEL after commit, and readers drain
+# sync_feed before using either, so a shared EVENT_BUS keeps every worker's
+# copy in step. A process that missed events (slow to drain, or cut off
+# from the bus) drops both and reloads. Streams never subscribe to it.
+SYNC_CHANNEL = 'sync'
+
+def apply_sync_event(event):
+    if event.type == 'index':
+        apply_index_entries(event.data['rides'])
+    elif event.type == 'identity':
+        if event.data['users'] is None:
+            identity_cache.clear()
+        for user_id in event.data['users'] or ():
+            identity_cache.invalidate(user_id)
+
+def reset_synced_state():
+    identity_cache.clear()
+    with _ride_index_lock:
+        ride_index.clear()  # reloaded on next use
+
+# Nearby-ride index
+#
+# Available rides with pickup coordinates live in an in-memory grid index,
+# loaded from the database on first use and then kept current by the index
+# entries publish_ride_event sends on every ride state change.
+_ride_index_lock = threading.Lock()
+
+def ride_index_entry(ride):
+    """[id, lat, lng, pickup timestamp] for a ride nearby search should find, else [id]"""
+    if ride.status == 'available' and valid_coordinates(ride.pickup_lat, ride.pickup_lng):
+        return [ride.id, ride.pickup_lat, ride.pickup_lng, ride.pickup_time.timestamp()]
+    return [ride.id]
+
+def index_rides(entries):
+    event_bus.publish(SYNC_CHANNEL, 'index', {'rides': entries})
+
+def apply_index_entries(entries):
+    with _ride_index_lock:
+        if not ride_index.loaded:
+            return
+        for entry in entries:
+            if len(entry) == 4:
+                ride_index.upsert(*entry)
+            else:
+                ride_index.remove(entry[0])
+
+def ensure_ride_index_loaded():
+    # Holding the lock while loading makes concurrent apply_index_entries calls wait,
+    # so a ride booked mid-load is removed after the load inserts it
+    with _ride_index_lock:
+        if ride_index.loaded:
+            return
+        rows = db.session.query(Ride.id, Ride.pickup_lat, Ride.pickup_lng, Ride.pickup_time) \
+            .filter(Ride.status == 'available', Ride.pickup_lat.isnot(None), Ride.pickup_lng.isnot(None))
+        for ride_id, lat, lng, pickup_time in rows:
+            if valid_coordinates(lat, lng):
+                ride_index.upsert(ride_id, lat, lng, pickup_time.timestamp())
+        ride_index.loaded = True
+
+def publish_ride_event(event_type, ride, data=None, user_ids=()):
+    """Publish a ride state change to the ride list, the ride's own channel
+    and the users involved. Call only after the change is committed."""
+    payload = data or {
+        'id': ride.id,
+        'status': ride.status,
+        'current_passengers': ride.current_passengers,
+        'max_passengers': ride.max_passengers
+    }
+    index_rides([ride_index_entry(ride)])
+    if ride.status in FINISHED_STATUSES:
+        location_store.finish(ride.id)
+    event_bus.publish('rides', event_type, payload)
+    event_bus.publish(f'ride:{ride.id}', event_type, payload)
+    for user_id in {ride.driver_id, ride.student_id, *user_ids} - {None}:
+        event_bus.publish(f'user:{user_id}', 'notification', dict(payload, event=event_type))
+
+def notify(user_ids, ride, event_type, message, level='info'):
+    """Add notification rows to the current transaction so they commit
+    (or roll back) together with the ride change they describe"""
+    db.session.add_all([
+        Notification(user_id=user_id, ride=ride, event=event_type, level=level, message=message)
+        for user_id in dict.fromkeys(user_ids) if user_id is not None
+    ])
+
+def ride_passenger_ids(ride):
+    if ride.is_group_ride:
+        return [student_id for (student_id,) in
+                db.session.query(GroupRide.student_id).filter_by(ride_id=ride.id)]
+    return [ride.student_id]
+
+class BookingError(Exception):
+    pass
+
+def book_seat(ride, student_id):
+    """Atomically take a seat on a ride for a student and commit.
+
+    The availability check and the seat update are a single conditional
+    UPDATE, so concurrent bookings can never overbook. Solo rides are
+    assigned to the student; group rides get a GroupRide membership row and
+    switch to 'booked' once the last seat is taken. Raises BookingError.
+    """
+    seat_free = and_(
+        Ride.id == ride.id,
+        Ride.status == 'available',
+        Ride.current_passengers < Ride.max_passengers
+    )
+    if ride.is_group_ride:
+        values = {
+            'current_passengers': Ride.current_passengers + 1,
+            'status': case((Ride.current_passengers + 1 >= Ride.max_passengers, 'booked'),
+                           else_='available')
+        }
+    else:
+        seat_free = and_(Ride.id == ride.id, Ride.status == 'available')
+        values = {
+            'student_id': student_id,
+            'status': 'booked',
+            'current_passengers': Ride.current_passengers + 1
+        }
+    
+    try:
+        result = db.session.execute(
+            update(Ride).where(seat_free).values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            db.session.rollback()
+            if ride.is_group_ride and ride.status == 'available':
+                raise BookingError('Group ride is full')
+            raise BookingError('Ride not available')
+        if ride.is_group_ride:
+            db.session.add(GroupRide(ride_id=ride.id, student_id=student_id))
+        route = f'{ride.pickup_location} to {ride.dropoff_location}'
+        notify([student_id], ride, 'ride.booked', f'Your ride from {route} is confirmed!')
+        notify([ride.driver_id], ride, 'ride.booked', f'New booking: {route}')
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise BookingError('You have already joined this ride')
+    
+    # The UPDATE bypassed the identity map; reload the committed values
+    db.session.refresh(ride)
+    publish_ride_event('ride.booked', ride, user_ids=[student_id])
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Served from the identity cache; current_user is a read-only snapshot
+    sync_feed.drain()
+    return identity_cache.get(int(user_id), lambda uid: db.session.get(User, uid))
 
 # Routes
-@app.route('/')
+@bp.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
         
-        # Debug: Print what we're looking for
-        print(f"[DEBUG] Looking for user: {username}")
-        
         user = User.query.filter_by(username=username).first()
         
         if user:
-            print(f"[SUCCESS] User found: {user.username}, Type: {user.user_type}")
-            print(f"[DEBUG] Checking password...")
-            
             if user.check_password(password):
-                print(f"[SUCCESS] Password correct! Logging in...")
+                logger.info('Login succeeded for user %s', user.id)
                 login_user(user)
                 flash(f'Welcome back, {user.username}!')
                 
                 if user.user_type == 'driver':
-                    return redirect(url_for('driver_dashboard'))
+                    return redirect(url_for('main.driver_dashboard'))
                 else:
-                    return redirect(url_for('student_dashboard'))
+                    return redirect(url_for('main.student_dashboard'))
             else:
-                print(f"[ERROR] Password incorrect")
+                logger.info('Login failed for user %s: wrong password', user.id)
                 flash('Invalid password')
         else:
-            print(f"[ERROR] User not found: {username}")
+            logger.info('Login failed: unknown username')
             flash('User not found')
     
     return render_template('login.html')
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form['username']
@@ -150,18 +776,16 @@ def register():
         phone = request.form['phone']
         user_type = request.form['user_type']
         
-        print(f"[DEBUG] Registration attempt for: {username} ({user_type})")
-        
         # Check if user already exists
         existing_user = User.query.filter_by(username=username).first()
         if existing_user:
-            print(f"[ERROR] Username already exists: {username}")
+            logger.info('Registration rejected: username taken')
             flash('Username already exists')
             return render_template('register.html')
         
         existing_email = User.query.filter_by(email=email).first()
         if existing_email:
-            print(f"[ERROR] Email already exists: {email}")
+            logger.info('Registration rejected: email taken')
             flash('Email already exists')
             return render_template('register.html')
         
@@ -178,94 +802,214 @@ def register():
             if user_type == 'driver':
                 user.license_number = request.form.get('license_number')
                 user.vehicle_number = request.form.get('vehicle_number')
-                print(f"[SUCCESS] Driver registered: {username}")
             else:
                 user.university = request.form.get('university')
-                print(f"[SUCCESS] Student registered: {username}")
             
             db.session.add(user)
             db.session.commit()
             
-            print(f"[SUCCESS] User {username} registered successfully!")
+            logger.info('Registered %s user %s', user_type, user.id)
             flash('Registration successful! Please login.')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
             
-        except Exception as e:
-            print(f"[ERROR] Registration error: {e}")
+        except PoolSaturated:
+            db.session.rollback()
+            raise
+        except Exception:
+            logger.exception('Registration error')
             db.session.rollback()
             flash('Registration failed. Please try again.')
             return render_template('register.html')
     
     return render_template('register.html')
 
-@app.route('/debug/users')
-def debug_users():
-    """Debug route to see all users in database"""
-    users = User.query.all()
-    result = []
-    for user in users:
-        result.append({
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'user_type': user.user_type,
-            'created_at': user.created_at.isoformat() if user.created_at else None
-        })
-    return jsonify({'users': result, 'count': len(result)})
-
-@app.route('/logout')
+def is_admin(user):
+    return user.is_authenticated and user.username in current_app.config['ADMIN_USERNAMES']
+
+def admin_required(view):
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if not current_user.is_authenticated:
+            return login_manager.unauthorized()
+        if not is_admin(current_user):
+            return jsonify({'error': 'Unauthorized'}), 403
+        return view(*args, **kwargs)
+    return wrapped
+
+ADMIN_USERS_PAGE_SIZE = 50
+
+@bp.route('/admin/users')
+@admin_required
+def admin_users():
+    """Users in id order, ``limit`` per page, optionally filtered by
+    ``user_type``. The next page cursor is returned in ``X-Next-Cursor``."""
+    try:
+        limit = min(int(request.args.get('limit', ADMIN_USERS_PAGE_SIZE)), RIDES_MAX_PAGE_SIZE)
+        after_id = int(request.args.get('cursor', 0))
+        if limit < 1:
+            raise ValueError('limit must be positive')
+    except ValueError:
+        return jsonify({'error': 'Invalid query parameters'}), 400
+    
+    query = select(User.id, User.username, User.email, User.user_type, User.is_verified, User.created_at) \
+        .where(User.id > after_id).order_by(User.id).limit(limit + 1)
+    if request.args.get('user_type'):
+        query = query.where(User.user_type == request.args['user_type'])
+    users = db.session.execute(query).all()
+    
+    response = jsonify([{
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'user_type': user.user_type,
+        'is_verified': user.is_verified,
+        'created_at': user.created_at.isoformat() if user.created_at else None
+    } for user in users[:limit]])
+    if len(users) > limit:
+        response.headers['X-Next-Cursor'] = str(users[limit - 1].id)
+    return response
+
+@bp.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(instrumentation.render(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/debug/workers')
+@admin_required
+def debug_workers():
+    """Debug route showing worker pool queue depth and wait times"""
+    return jsonify(dict(cpu_pool.stats(), admission=current_app.extensions['admission'].stats()))
+
+def retry_later(message, status, retry_after):
+    headers = {'Retry-After': str(retry_after)}
+    if request.path.startswith('/api/') or request.accept_mimetypes.best == 'application/json':
+        return jsonify({'error': message}), status, headers
+    return message, status, headers
+
+@bp.app_errorhandler(PoolSaturated)
+def handle_pool_saturated(e):
+    return retry_later('Server busy, please retry shortly', 503, e.retry_after)
+
+@bp.app_errorhandler(Overloaded)
+def handle_overloaded(e):
+    return retry_later('Server busy, please retry shortly', 503, e.retry_after)
+
+@bp.app_errorhandler(RateLimited)
+def handle_rate_limited(e):
+    return retry_later('Too many requests, please slow down', 429, e.retry_after)
+
+@bp.route('/logout')
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
-@app.route('/student/dashboard')
+@bp.route('/student/dashboard')
 @login_required
 def student_dashboard():
     if current_user.user_type != 'student':
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
+    
+    ensure_schedule_worker()
+    ensure_archive_worker()
+    available_rides = db.session.scalars(
+        with_ride_relations(available_rides_query({}), driver=True).limit(RIDES_PAGE_SIZE)).all()
+    ride_count, group_ride_count = count_student_rides(current_user.id)
+    return render_template('student_dashboard.html', rides=available_rides,
+                           ride_count=ride_count, group_ride_count=group_ride_count)
+
+DRIVER_RIDES_PAGE_SIZE = 20
+RIDE_STATUSES = ('available', 'booked', 'in_progress', 'completed', 'cancelled')
+
+def driver_summary(driver_id, today=None):
+    """A driver's ride counts, earnings and group fill rate.
+
+    Reads the trigger-maintained DriverStats rows (one per status) and at
+    most ~40 DriverDailyStats rows, however long the driver's history.
+    """
+    today = today or datetime.utcnow().date()
+    week_start = today - timedelta(days=today.weekday())
+    month_start = today.replace(day=1)
+    stats = {row.status: row for row in DriverStats.query.filter_by(driver_id=driver_id)}
+    days = db.session.execute(
+        select(DriverDailyStats.day, DriverDailyStats.earnings)
+        .where(DriverDailyStats.driver_id == driver_id, DriverDailyStats.day >= min(week_start, month_start))
+    ).all()
     
-    available_rides = Ride.query.filter_by(status='available').all()
-    return render_template('student_dashboard.html', rides=available_rides)
+    completed = stats.get('completed')
+    return {
+        'rides': {status: stats[status].rides if status in stats else 0 for status in RIDE_STATUSES},
+        'active_rides': sum(row.rides for status, row in stats.items() if status not in FINISHED_STATUSES),
+        'earnings': {
+            'today': sum(earnings for day, earnings in days if day == today),
+            'week': sum(earnings for day, earnings in days if day >= week_start),
+            'month': sum(earnings for day, earnings in days if day >= month_start),
+            'total': completed.earnings if completed else 0,
+        },
+        'collected': sum(row.collected for row in stats.values()),
+        'group_fill_rate': (round(completed.seats_filled / completed.seats_offered, 3)
+                            if completed and completed.seats_offered else None),
+    }
 
-@app.route('/driver/dashboard')
+@bp.route('/driver/dashboard')
 @login_required
 def driver_dashboard():
     if current_user.user_type != 'driver':
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
-    my_rides = Ride.query.filter_by(driver_id=current_user.id).all()
-    return render_template('driver_dashboard.html', rides=my_rides)
+    ensure_schedule_worker()
+    ensure_archive_worker()
+    # One page of upcoming rides, soonest first; finished rides are paged in
+    # from /api/history on demand and totals come from the summary tables
+    query = Ride.query.filter(Ride.driver_id == current_user.id, text(f'ride.{UNFINISHED_RIDE}'))
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            query = after_ride_cursor(query, cursor)
+        except (ValueError, TypeError):
+            return redirect(url_for('main.driver_dashboard'))
+    my_rides = with_ride_relations(query, student=True, group_members=True) \
+        .order_by(Ride.pickup_time, Ride.id).limit(DRIVER_RIDES_PAGE_SIZE + 1).all()
+    next_cursor = encode_ride_cursor(my_rides[DRIVER_RIDES_PAGE_SIZE - 1]) \
+        if len(my_rides) > DRIVER_RIDES_PAGE_SIZE else None
+    return render_template('driver_dashboard.html', rides=my_rides[:DRIVER_RIDES_PAGE_SIZE],
+                           next_cursor=next_cursor, paged=bool(cursor),
+                           summary=driver_summary(current_user.id))
 
-@app.route('/book_ride/<int:ride_id>')
+@bp.route('/api/driver/stats')
+@login_required
+def api_driver_stats():
+    if current_user.user_type != 'driver':
+        return jsonify({'error': 'Unauthorized'}), 403
+    return jsonify(driver_summary(current_user.id))
+
+@bp.route('/book_ride/<int:ride_id>')
 @login_required
 def book_ride(ride_id):
     if current_user.user_type != 'student':
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
     ride = Ride.query.get_or_404(ride_id)
-    if ride.status != 'available':
+    try:
+        book_seat(ride, current_user.id)
+    except BookingError:
         flash('This ride is no longer available')
-        return redirect(url_for('student_dashboard'))
-    
-    ride.student_id = current_user.id
-    ride.status = 'booked'
-    db.session.commit()
+        return redirect(url_for('main.student_dashboard'))
     
     flash('Ride booked successfully!')
-    return redirect(url_for('student_dashboard'))
+    return redirect(url_for('main.student_dashboard'))
 
-@app.route('/create_ride', methods=['GET', 'POST'])
+@bp.route('/create_ride', methods=['GET', 'POST'])
 @login_required
 def create_ride():
     if current_user.user_type != 'driver':
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
     if request.method == 'POST':
         pickup_location = request.form['pickup_location']
         dropoff_location = request.form['dropoff_location']
         pickup_time = datetime.strptime(request.form['pickup_time'], '%Y-%m-%dT%H:%M')
-        fare = float(request.form['fare'])
+        fare = request.form.get('fare', type=float)
         is_group_ride = 'is_group_ride' in request.form
         max_passengers = int(request.form.get('max_passengers', 1))
         
@@ -279,30 +1023,423 @@ def create_ride():
             max_passengers=max_passengers
         )
         
+        # Coordinates are optional; only keep complete, in-range pairs
+        pickup_lat = request.form.get('pickup_lat', type=float)
+        pickup_lng = request.form.get('pickup_lng', type=float)
+        if valid_coordinates(pickup_lat, pickup_lng):
+            ride.pickup_lat, ride.pickup_lng = pickup_lat, pickup_lng
+        dropoff_lat = request.form.get('dropoff_lat', type=float)
+        dropoff_lng = request.form.get('dropoff_lng', type=float)
+        if valid_coordinates(dropoff_lat, dropoff_lng):
+            ride.dropoff_lat, ride.dropoff_lng = dropoff_lat, dropoff_lng
+        
+        if fare is None:
+            # No fare entered: suggest one from the route when both ends are pinned
+            if ride.pickup_lat is None or ride.dropoff_lat is None:
+                flash('Please enter a fare')
+                return render_template('create_ride.html')
+            ride.fare = get_fare_engine().estimate(ride.pickup_lat, ride.pickup_lng,
+                                                   ride.dropoff_lat, ride.dropoff_lng)['fare']
+        
         db.session.add(ride)
+        notify([current_user.id], ride, 'ride.created',
+               f'Your ride from {pickup_location} to {dropoff_location} is listed')
         db.session.commit()
+        publish_ride_event('ride.created', ride, serialize_ride(ride, current_user.username))
         
         flash('Ride created successfully!')
-        return redirect(url_for('driver_dashboard'))
+        return redirect(url_for('main.driver_dashboard'))
     
     return render_template('create_ride.html')
 
-@app.route('/api/rides')
+# Bulk rides and recurring schedules
+#
+# Both paths insert many rides with one executemany INSERT in a single
+# transaction. Schedules only materialise SCHEDULE_WINDOW_DAYS ahead; the
+# schedule worker (or `flask extend-schedules` from cron) rolls the window
+# forward.
+
+def parse_ride_fields(data):
+    """Route, fare and seat fields shared by bulk rides and schedules.
+    Raises KeyError, TypeError or ValueError on bad input."""
+    fields = {
+        'pickup_location': data['pickup_location'].strip(),
+        'dropoff_location': data['dropoff_location'].strip(),
+        'fare': float(data['fare']),
+        'is_group_ride': bool(data.get('is_group_ride', False)),
+        'max_passengers': int(data.get('max_passengers', 1)),
+    }
+    for name in ('pickup_location', 'dropoff_location'):
+        if not 0 < len(fields[name]) <= 200:
+            raise ValueError(f'{name} must be 1-200 characters')
+    if fields['fare'] < 0 or fields['max_passengers'] < 1:
+        raise ValueError('fare and max_passengers must be positive')
+    for prefix in ('pickup', 'dropoff'):
+        lat, lng = data.get(f'{prefix}_lat'), data.get(f'{prefix}_lng')
+        if lat is not None and lng is not None and valid_coordinates(float(lat), float(lng)):
+            fields[f'{prefix}_lat'], fields[f'{prefix}_lng'] = float(lat), float(lng)
+    return fields
+
+def insert_rides(rows):
+    """Insert ride rows in the current transaction with one executemany.
+
+    Returns plain (id, status, pickup_lat, pickup_lng, pickup_time) rows, not
+    ORM objects, so nothing needs reloading after the commit.
+    """
+    if not rows:
+        return []
+    return db.session.execute(
+        insert(Ride).returning(Ride.id, Ride.status, Ride.pickup_lat, Ride.pickup_lng, Ride.pickup_time),
+        rows
+    ).all()
+
+def announce_rides(rides):
+    """Index and announce bulk-created rides with one event instead of one per ride"""
+    if not rides:
+        return
+    index_rides([ride_index_entry(ride) for ride in rides])
+    event_bus.publish('rides', 'rides.bulk_created', {'ids': [ride.id for ride in rides]})
+
+def extend_schedules(now=None, schedules=None):
+    """Materialise rides for active schedules up to the rolling window and
+    commit. Returns the number of rides created."""
+    now = now or datetime.utcnow()
+    horizon = now.date() + timedelta(days=current_app.config['SCHEDULE_WINDOW_DAYS'])
+    if schedules is None:
+        schedules = RideSchedule.query.filter(
+            RideSchedule.active.is_(True),
+            or_(RideSchedule.materialized_until.is_(None), RideSchedule.materialized_until < horizon),
+            # A schedule materialised through its last day has nothing left to add
+            or_(RideSchedule.ends_on.is_(None), RideSchedule.materialized_until.is_(None),
+                RideSchedule.materialized_until < RideSchedule.ends_on)
+        ).all()
+    
+    rows = []
+    for schedule in schedules:
+        first_day = max(now.date(), schedule.starts_on)
+        if schedule.materialized_until is not None:
+            first_day = max(first_day, schedule.materialized_until + timedelta(days=1))
+        last_day = min(horizon, schedule.ends_on or horizon)
+        for pickup_time in occurrences(schedule.weekdays, schedule.departure_time, first_day, last_day):
+            if pickup_time > now:
+                rows.append({
+                    'driver_id': schedule.driver_id,
+                    'schedule_id': schedule.id,
+                    'pickup_location': schedule.pickup_location,
+                    'dropoff_location': schedule.dropoff_location,
+                    'pickup_lat': schedule.pickup_lat,
+                    'pickup_lng': schedule.pickup_lng,
+                    'dropoff_lat': schedule.dropoff_lat,
+                    'dropoff_lng': schedule.dropoff_lng,
+                    'pickup_time': pickup_time,
+                    'fare': schedule.fare,
+                    'is_group_ride': schedule.is_group_ride,
+                    'max_passengers': schedule.max_passengers,
+                })
+        schedule.materialized_until = max(last_day, schedule.materialized_until or last_day)
+    
+    try:
+        rides = insert_rides(rows)
+        db.session.commit()
+    except IntegrityError:
+        # Another process extended the same schedules first
+        db.session.rollback()
+        return 0
+    announce_rides(rides)
+    return len(rides)
+
+def serialize_schedule(schedule):
+    return {
+        'id': schedule.id,
+        'pickup_location': schedule.pickup_location,
+        'dropoff_location': schedule.dropoff_location,
+        'weekdays': format_weekdays(schedule.weekdays),
+        'departure_time': schedule.departure_time.strftime('%H:%M'),
+        'fare': schedule.fare,
+        'is_group_ride': schedule.is_group_ride,
+        'max_passengers': schedule.max_passengers,
+        'starts_on': schedule.starts_on.isoformat(),
+        'ends_on': schedule.ends_on.isoformat() if schedule.ends_on else None,
+        'active': schedule.active,
+        'materialized_until': schedule.materialized_until.isoformat() if schedule.materialized_until else None
+    }
+
+@bp.route('/api/rides/bulk', methods=['POST'])
+@login_required
+def api_bulk_rides():
+    """Create up to BULK_RIDES_MAX rides in one transaction.
+
+    Body: ``{"rides": [{pickup_location, dropoff_location, pickup_time, fare,
+    ...}, ...]}``. Nothing is created unless every ride is valid.
+    """
+    if current_user.user_type != 'driver':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    items = (request.get_json(silent=True) or {}).get('rides')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'rides must be a non-empty list'}), 400
+    if len(items) > current_app.config['BULK_RIDES_MAX']:
+        return jsonify({'error': f"At most {current_app.config['BULK_RIDES_MAX']} rides per request"}), 413
+    
+    rows = []
+    for i, item in enumerate(items):
+        try:
+            row = parse_ride_fields(item)
+            row['pickup_time'] = datetime.fromisoformat(item['pickup_time'])
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            return jsonify({'error': f'Invalid ride at index {i}: {e}'}), 400
+        rows.append(dict(row, driver_id=current_user.id))
+    
+    rides = insert_rides(rows)
+    notify([current_user.id], None, 'ride.created', f'{len(rides)} rides listed')
+    db.session.commit()
+    announce_rides(rides)
+    return jsonify({'created': len(rides), 'ids': [ride.id for ride in rides]}), 201
+
+@bp.route('/api/schedules', methods=['GET', 'POST'])
+@login_required
+def api_schedules():
+    """List or create the current driver's recurring schedules.
+
+    POST body: route and fare fields as for bulk rides plus ``weekdays``
+    ('weekdays', 'mon,wed,fri' or a list), ``departure_time`` ('08:00') and
+    optional ``starts_on``/``ends_on`` dates. Rides for the rolling window
+    are created immediately.
+    """
+    if current_user.user_type != 'driver':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    if request.method == 'GET':
+        schedules = RideSchedule.query.filter_by(driver_id=current_user.id).order_by(RideSchedule.id).all()
+        return jsonify([serialize_schedule(schedule) for schedule in schedules])
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        fields = parse_ride_fields(data)
+        weekdays = parse_weekdays(data['weekdays'])
+        departure_time = parse_departure_time(data['departure_time'])
+        starts_on = date.fromisoformat(data['starts_on']) if data.get('starts_on') else datetime.utcnow().date()
+        ends_on = date.fromisoformat(data['ends_on']) if data.get('ends_on') else None
+        if ends_on is not None and ends_on < starts_on:
+            raise ValueError('ends_on is before starts_on')
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        return jsonify({'error': f'Invalid schedule: {e}'}), 400
+    
+    schedule = RideSchedule(driver_id=current_user.id, weekdays=weekdays, departure_time=departure_time,
+                            starts_on=starts_on, ends_on=ends_on, **fields)
+    db.session.add(schedule)
+    db.session.flush()
+    created = extend_schedules(schedules=[schedule])
+    ensure_schedule_worker()
+    return jsonify(dict(serialize_schedule(schedule), rides_created=created)), 201
+
+@bp.route('/api/schedules/<int:schedule_id>', methods=['DELETE'])
+@login_required
+def api_delete_schedule(schedule_id):
+    """Stop a schedule and withdraw its upcoming rides nobody has booked"""
+    schedule = RideSchedule.query.get_or_404(schedule_id)
+    if schedule.driver_id != current_user.id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    schedule.active = False
+    withdrawn = db.session.execute(
+        update(Ride).where(
+            Ride.schedule_id == schedule.id,
+            Ride.status == 'available',
+            Ride.current_passengers == 0,
+            Ride.pickup_time > datetime.utcnow()
+        ).values(status='cancelled').returning(Ride.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    db.session.commit()
+    for ride_id in withdrawn:
+        location_store.finish(ride_id)
+    if withdrawn:
+        index_rides([[ride_id] for ride_id in withdrawn])
+        event_bus.publish('rides', 'rides.bulk_cancelled', {'ids': withdrawn})
+    return jsonify({'success': True, 'cancelled': len(withdrawn)})
+
+RIDES_PAGE_SIZE = 50
+RIDES_MAX_PAGE_SIZE = 200
+PLACES_PAGE_SIZE = 8
+PLACES_MAX_PAGE_SIZE = 20
+
+def encode_ride_cursor(ride):
+    raw = f"{ride.pickup_time.isoformat()}|{ride.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_ride_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    pickup_time, ride_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+    return datetime.fromisoformat(pickup_time), int(ride_id)
+
+def parse_bool(value):
+    return value.lower() in ['true', 'on', '1', 'yes']
+
+def page_limit(args, default, maximum):
+    """The ``limit`` arg capped at maximum; raises ValueError unless positive"""
+    limit = min(int(args.get('limit', default)), maximum)
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return limit
+
+def available_rides_query(args):
+    """Build the filtered available-rides select from request args.
+
+    Plain select() rather than Model.query, so the async API (async_api.py) runs
+    the same statement. Raises ValueError for malformed filter values.
+    """
+    query = select(Ride).filter(Ride.status == 'available')
+    
+    if args.get('pickup'):
+        query = query.filter(Ride.pickup_location.ilike(f"%{args['pickup']}%"))
+    if args.get('dropoff'):
+        query = query.filter(Ride.dropoff_location.ilike(f"%{args['dropoff']}%"))
+    if args.get('from'):
+        query = query.filter(Ride.pickup_time >= datetime.fromisoformat(args['from']))
+    if args.get('to'):
+        query = query.filter(Ride.pickup_time <= datetime.fromisoformat(args['to']))
+    if args.get('min_fare'):
+        query = query.filter(Ride.fare >= float(args['min_fare']))
+    if args.get('max_fare'):
+        query = query.filter(Ride.fare <= float(args['max_fare']))
+    if args.get('group'):
+        query = query.filter(Ride.is_group_ride == parse_bool(args['group']))
+    
+    if args.get('cursor'):
+        query = after_ride_cursor(query, args['cursor'])
+    
+    return query.order_by(Ride.pickup_time, Ride.id)
+
+def after_ride_cursor(query, cursor):
+    pickup_time, ride_id = decode_ride_cursor(cursor)
+    return query.filter(or_(
+        Ride.pickup_time > pickup_time,
+        and_(Ride.pickup_time == pickup_time, Ride.id > ride_id)
+    ))
+
+def rides_etag(version, args):
+    """ETag of an /api/rides response: the ride version plus the query args"""
+    args_key = hashlib.md5(urlencode(sorted(args.items())).encode()).hexdigest()[:12]
+    return f"rides-{version}-{args_key}"
+
+def rides_page_query(args):
+    """(statement, limit) for one /api/rides page; raises ValueError or TypeError"""
+    limit = page_limit(args, RIDES_PAGE_SIZE, RIDES_MAX_PAGE_SIZE)
+    # Fetch one extra row to know whether another page exists
+    return with_ride_relations(available_rides_query(args), driver=True).limit(limit + 1), limit
+
+def split_rides_page(rides, limit):
+    """(rides, next cursor or None) from a page fetched with limit + 1 rows"""
+    if len(rides) > limit:
+        return rides[:limit], encode_ride_cursor(rides[limit - 1])
+    return rides, None
+
+@bp.route('/api/rides')
 def api_rides():
-    rides = Ride.query.filter_by(status='available').all()
-    return jsonify([{
-        'id': ride.id,
-        'pickup_location': ride.pickup_location,
-        'dropoff_location': ride.dropoff_location,
-        'pickup_time': ride.pickup_time.isoformat(),
-        'fare': ride.fare,
-        'is_group_ride': ride.is_group_ride,
-        'max_passengers': ride.max_passengers,
-        'current_passengers': ride.current_passengers,
-        'driver_name': ride.driver.username
-    } for ride in rides])
+    """List available rides, soonest pickup first.
+
+    Supports keyset pagination (``limit``, ``cursor``), filters (``pickup``,
+    ``dropoff``, ``from``, ``to``, ``min_fare``, ``max_fare``, ``group``) and
+    conditional GET. Without ``limit`` a page holds RIDES_PAGE_SIZE rides;
+    the next page cursor is returned in ``X-Next-Cursor`` (and ``Link``).
+    """
+    args = request.args.to_dict()
+    etag = rides_etag(rides_version(), args)
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+    
+    try:
+        query, limit = rides_page_query(args)
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Invalid query parameters'}), 400
+    
+    rides, next_cursor = split_rides_page(db.session.scalars(query).all(), limit)
+    response = jsonify([serialize_ride(ride) for ride in rides])
+    
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+        next_args = dict(args, cursor=next_cursor)
+        response.headers['Link'] = f'<{url_for("main.api_rides", **next_args)}>; rel="next"'
+    
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@bp.route('/api/rides/search')
+def api_ride_search():
+    """Available rides by place name from the full-text index, soonest first.
+
+    ``q`` matches the pickup or drop-off name, ``pickup``/``dropoff`` only
+    that one; the last word of each is matched as a prefix. Paged like
+    /api/rides with ``limit`` and ``cursor``.
+    """
+    args = request.args
+    try:
+        limit = page_limit(args, RIDES_PAGE_SIZE, RIDES_MAX_PAGE_SIZE)
+        clause = ride_match_clause(db.engine.dialect.name, args.get('q'), args.get('pickup'), args.get('dropoff'))
+        query = Ride.query.filter(Ride.status == 'available', clause)
+        if args.get('cursor'):
+            query = after_ride_cursor(query, args['cursor'])
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Invalid query parameters'}), 400
+    
+    rides = with_ride_relations(query, driver=True).order_by(Ride.pickup_time, Ride.id).limit(limit + 1).all()
+    response = jsonify([serialize_ride(ride) for ride in rides[:limit]])
+    if len(rides) > limit:
+        response.headers['X-Next-Cursor'] = encode_ride_cursor(rides[limit - 1])
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
-@app.route('/api/book_ride', methods=['POST'])
+@bp.route('/api/places')
+def api_places():
+    """Place-name typeahead: names matching ``q`` as a prefix, most used first"""
+    try:
+        limit = max(1, min(int(request.args.get('limit', PLACES_PAGE_SIZE)), PLACES_MAX_PAGE_SIZE))
+        clause = place_match_clause(db.engine.dialect.name, request.args.get('q'))
+    except ValueError:
+        return jsonify([])
+    places = db.session.execute(
+        select(Place.name, Place.ride_count).where(clause)
+        .order_by(Place.ride_count.desc(), Place.name).limit(limit)
+    ).all()
+    response = jsonify([{'name': name, 'rides': count} for name, count in places])
+    # Suggestions change slowly; let the browser reuse them while typing
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    return response
+
+@bp.route('/api/rides/nearby')
+def api_rides_nearby():
+    """Available rides whose pickup is within ``radius`` meters of
+    ``lat``/``lng``, nearest first (or soonest first with ``sort=time``)."""
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    radius = request.args.get('radius', current_app.config['NEARBY_DEFAULT_RADIUS_M'], type=float)
+    limit = min(request.args.get('limit', RIDES_PAGE_SIZE, type=int), RIDES_MAX_PAGE_SIZE)
+    order = request.args.get('sort', 'distance')
+    
+    if not valid_coordinates(lat, lng) or not 0 < radius <= current_app.config['NEARBY_MAX_RADIUS_M'] \
+            or limit < 1 or order not in ('distance', 'time'):
+        return jsonify({'error': 'Invalid query parameters'}), 400
+    
+    sync_feed.drain()
+    ensure_ride_index_loaded()
+    matches = ride_index.nearby(lat, lng, radius, limit=limit, order=order)
+    if not matches:
+        return jsonify([])
+    
+    rides = with_ride_relations(Ride.query.filter(Ride.id.in_([key for key, _ in matches])), driver=True)
+    rides_by_id = {ride.id: ride for ride in rides}
+    result = []
+    for ride_id, distance in matches:
+        ride = rides_by_id.get(ride_id)
+        if ride is not None and ride.status == 'available':
+            result.append(dict(serialize_ride(ride), distance_m=round(distance)))
+    return jsonify(result)
+
+@bp.route('/api/book_ride', methods=['POST'])
 @login_required
 def api_book_ride():
     if current_user.user_type != 'student':
@@ -312,20 +1449,14 @@ def api_book_ride():
     ride_id = data.get('ride_id')
     ride = Ride.query.get_or_404(ride_id)
     
-    if ride.status != 'available':
-        return jsonify({'error': 'Ride not available'}), 400
-    
-    if ride.is_group_ride and ride.current_passengers >= ride.max_passengers:
-        return jsonify({'error': 'Group ride is full'}), 400
-    
-    ride.student_id = current_user.id
-    ride.status = 'booked'
-    ride.current_passengers += 1
-    db.session.commit()
+    try:
+        book_seat(ride, current_user.id)
+    except BookingError as e:
+        return jsonify({'error': str(e)}), 400
     
     return jsonify({'success': True, 'message': 'Ride booked successfully'})
 
-@app.route('/api/start_ride', methods=['POST'])
+@bp.route('/api/start_ride', methods=['POST'])
 @login_required
 def api_start_ride():
     if current_user.user_type != 'driver':
@@ -338,15 +1469,21 @@ def api_start_ride():
     if ride.driver_id != current_user.id:
         return jsonify({'error': 'Unauthorized'}), 403
     
-    if ride.status != 'booked':
+    # A partly filled group ride can leave once it has at least one passenger
+    startable = ride.status == 'booked' or (
+        ride.is_group_ride and ride.status == 'available' and ride.current_passengers > 0)
+    if not startable:
         return jsonify({'error': 'Ride is not booked'}), 400
     
     ride.status = 'in_progress'
+    notify(ride_passenger_ids(ride), ride, 'ride.started',
+           f'Your ride is on the way! Driver: {current_user.username}', level='success')
     db.session.commit()
+    publish_ride_event('ride.started', ride)
     
     return jsonify({'success': True, 'message': 'Ride started successfully'})
 
-@app.route('/api/complete_ride', methods=['POST'])
+@bp.route('/api/complete_ride', methods=['POST'])
 @login_required
 def api_complete_ride():
     if current_user.user_type != 'driver':
@@ -363,96 +1500,1320 @@ def api_complete_ride():
         return jsonify({'error': 'Ride is not in progress'}), 400
     
     ride.status = 'completed'
+    notify(ride_passenger_ids(ride), ride, 'ride.completed',
+           f'Your ride from {ride.pickup_location} to {ride.dropoff_location} is complete', level='secondary')
     db.session.commit()
+    publish_ride_event('ride.completed', ride)
+    location_store.finish(ride.id)
     
     return jsonify({'success': True, 'message': 'Ride completed successfully'})
 
-@app.route('/track_ride/<int:ride_id>')
+@bp.route('/track_ride/<int:ride_id>')
 @login_required
 def track_ride(ride_id):
     ride = Ride.query.get_or_404(ride_id)
     return render_template('map_tracking.html', ride=ride)
 
-@app.route('/api/notifications')
+SSE_RETRY = 'retry: 3000\n\n'
+SSE_KEEPALIVE = ': keepalive\n\n'
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+SSE_BUSY_RETRY_AFTER = 30  # seconds; the dashboards' polling interval
+
+@bp.route('/api/stream')
+def api_stream():
+    """Server-Sent Events feed of ride changes.
+
+    Streams the public ride list by default, or a single ride with
+    ``?ride=<id>`` (its driver and passengers only). Logged-in users also
+    receive events for their own rides.
+    Clients resume after a disconnect via the standard Last-Event-ID header.
+    Past SSE_MAX_STREAMS open streams in this process it answers 503 and
+    the page polls instead.
+    """
+    ride_id = request.args.get('ride', type=int)
+    if ride_id is not None:
+        if not current_user.is_authenticated:
+            return jsonify({'error': 'Login required'}), 401
+        participants = ride_participants(ride_id)
+        if not participants:
+            return jsonify({'error': 'Ride not found'}), 404
+        if current_user.id not in participants:
+            return jsonify({'error': 'Unauthorized'}), 403
+    channels = stream_channels(ride_id, current_user.id if current_user.is_authenticated else None)
+    
+    if not stream_slots.acquire(blocking=False):
+        return retry_later('Too many live streams, poll instead', 503, SSE_BUSY_RETRY_AFTER)
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    subscription = event_bus.subscribe(channels, last_event_id=last_event_id)
+    heartbeat = current_app.config['SSE_HEARTBEAT_SECONDS']
+    max_duration = current_app.config['SSE_MAX_STREAM_SECONDS']
+    
+    # The generator runs outside the request context (so the DB session is
+    # released as soon as this view returns) and must not touch the database
+    def generate():
+        deadline = datetime.utcnow() + timedelta(seconds=max_duration)
+        yield SSE_RETRY
+        while datetime.utcnow() < deadline and not (subscription.overflowed or subscription.closed):
+            event = subscription.get(timeout=heartbeat)
+            if event is None:
+                yield SSE_KEEPALIVE
+            else:
+                yield format_sse(event)
+    
+    def close():
+        subscription.close()
+        stream_slots.release()
+    
+    response = Response(generate(), mimetype='text/event-stream', headers=SSE_HEADERS)
+    response.call_on_close(close)
+    return response
+
+def stream_channels(ride_id, user_id):
+    """Event bus channels for /api/stream: one ride or the ride list, plus the user's own"""
+    channels = [f'ride:{ride_id}' if ride_id is not None else 'rides']
+    if user_id is not None:
+        channels.append(f'user:{user_id}')
+    return channels
+
+def flush_locations():
+    """Persist the downsampled location trail of every active ride"""
+    rows = location_store.drain()
+    if not rows:
+        return 0
+    db.session.execute(RideLocation.__table__.insert(), [{
+        'ride_id': ride_id,
+        'lat': lat,
+        'lng': lng,
+        'recorded_at': datetime.utcfromtimestamp(timestamp)
+    } for ride_id, timestamp, lat, lng in rows])
+    db.session.commit()
+    return len(rows)
+
+_location_flusher = None
+_location_flusher_lock = threading.Lock()
+
+def ensure_location_flusher():
+    global _location_flusher
+    if _location_flusher is None and not current_app.config.get('TESTING'):
+        with _location_flusher_lock:
+            if _location_flusher is None:
+                app = current_app._get_current_object()
+                def flush():
+                    with app.app_context():
+                        flush_locations()
+                _location_flusher = PeriodicWorker(flush, current_app.config['LOCATION_FLUSH_SECONDS'],
+                                                   name='location-flusher')
+                _location_flusher.start()
+
+def parse_location_points(points):
+    """Normalize [[lat, lng, ts?], ...] or [{'lat', 'lng', 'ts'?}, ...] into
+    (timestamp, lat, lng) tuples. Raises ValueError on bad input."""
+    if not isinstance(points, list) or not points:
+        raise ValueError('points must be a non-empty list')
+    if len(points) > current_app.config['LOCATION_MAX_BATCH']:
+        raise ValueError('too many points in one batch')
+    
+    now = datetime.utcnow().timestamp()
+    parsed = []
+    for point in points:
+        if isinstance(point, dict):
+            lat, lng, ts = point['lat'], point['lng'], point.get('ts', now)
+        else:
+            lat, lng, ts = (list(point) + [now])[:3]
+        lat, lng, ts = float(lat), float(lng), float(ts)
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValueError('coordinates out of range')
+        parsed.append((ts, lat, lng))
+    return parsed
+
+def serialize_fix(fix):
+    timestamp, lat, lng = fix
+    return {'lat': lat, 'lng': lng, 'ts': timestamp}
+
+@bp.route('/api/location', methods=['POST'])
+@login_required
+def api_location():
+    """Ingest a batch of GPS fixes from the driver of an active ride.
+
+    Body: ``{"ride_id": 1, "points": [[lat, lng, unix_ts], ...]}``. Fixes go
+    to the in-memory ride buffer and the newest one is pushed to riders on
+    the ride's event channel; the database only sees a downsampled trail.
+    """
+    if current_user.user_type != 'driver':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        ride_id = int(data.get('ride_id'))
+        points = parse_location_points(data.get('points'))
+    except (KeyError, ValueError, TypeError):
+        return jsonify({'error': 'Invalid location batch'}), 400
+    
+    track = location_store.get(ride_id)
+    if track is None or location_store.needs_check(track):
+        # First fix for this ride, and every LOCATION_STATUS_RECHECK seconds
+        # after: confirm the ride is still active, otherwise serve from memory
+        ride = db.session.get(Ride, ride_id)
+        if ride is None:
+            return jsonify({'error': 'Ride not found'}), 404
+        if ride.driver_id != current_user.id:
+            return jsonify({'error': 'Unauthorized'}), 403
+        if ride.status not in ('booked', 'in_progress'):
+            location_store.finish(ride.id)
+            return jsonify({'error': 'Ride is not active'}), 400
+        track = location_store.open(ride.id, ride.driver_id)
+        ensure_location_flusher()
+    elif track.driver_id != current_user.id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    latest = location_store.append(track, points)
+    event_bus.publish(f'ride:{ride_id}', 'location', dict(serialize_fix(latest), ride_id=ride_id))
+    
+    return jsonify({'success': True, 'accepted': len(points)})
+
+LOCATION_TRAIL_SIZE = 20
+
+@bp.route('/api/rides/<int:ride_id>/location')
+@login_required
+def api_ride_location(ride_id):
+    """Latest known location trail for a ride, newest fix last; for the
+    ride's driver and passengers only"""
+    participants = ride_participants(ride_id)
+    if not participants:
+        return jsonify({'error': 'Ride not found'}), 404
+    if current_user.id not in participants:
+        return jsonify({'error': 'Unauthorized'}), 403
+    limit = request.args.get('limit', LOCATION_TRAIL_SIZE, type=int)
+    fixes = location_store.recent(ride_id, limit)
+    if not fixes:
+        # Not tracked in memory (finished ride or another worker): use the persisted trail
+        fixes = persisted_trail(db.session.scalars(persisted_trail_query(ride_id, limit)).all())
+    return jsonify(serialize_trail(ride_id, fixes))
+
+def ride_participants_query(ride_id):
+    """Ids of the ride's driver and passengers; no rows if the ride does not exist"""
+    return union_all(
+        select(Ride.driver_id).where(Ride.id == ride_id),
+        select(Ride.student_id).where(Ride.id == ride_id, Ride.is_group_ride.isnot(True),
+                                      Ride.student_id.isnot(None)),
+        select(GroupRide.student_id).where(GroupRide.ride_id == ride_id)
+    )
+
+def ride_participants(ride_id):
+    return set(db.session.scalars(ride_participants_query(ride_id)))
+
+def persisted_trail_query(ride_id, limit):
+    return select(RideLocation).where(RideLocation.ride_id == ride_id) \
+        .order_by(RideLocation.recorded_at.desc()).limit(limit)
+
+def persisted_trail(locations):
+    """Fixes from RideLocation rows fetched newest first, oldest first"""
+    return [(loc.recorded_at.replace(tzinfo=timezone.utc).timestamp(), loc.lat, loc.lng)
+            for loc in reversed(locations)]
+
+def serialize_trail(ride_id, fixes):
+    return {'ride_id': ride_id, 'points': [serialize_fix(fix) for fix in fixes]}
+
+def serialize_ride_request(ride_request):
+    return {
+        'id': ride_request.id,
+        'status': ride_request.status,
+        'ride_id': ride_request.ride_id,
+        'pickup_location': ride_request.pickup_location,
+        'earliest_pickup': ride_request.earliest_pickup.isoformat(),
+        'latest_pickup': ride_request.latest_pickup.isoformat()
+    }
+
+def run_matching_batch(now=None):
+    """Match pending ride requests to available group rides.
+
+    Loads one batch of requests and rides as plain columns, runs the NumPy
+    matcher and writes the result back in one transaction: a conditional
+    seat UPDATE per ride, GroupRide rows and claimed requests. Returns the
+    matcher's quality stats.
+    """
+    from matching import MatchParams, RequestBatch, RideBatch, match
+    
+    now = now or datetime.utcnow()
+    RideRequest.query.filter(RideRequest.status == 'pending', RideRequest.latest_pickup < now) \
+        .update({'status': 'expired'}, synchronize_session=False)
+    db.session.commit()
+    
+    requests_rows = db.session.query(
+        RideRequest.id, RideRequest.student_id, RideRequest.pickup_lat, RideRequest.pickup_lng,
+        RideRequest.dropoff_lat, RideRequest.dropoff_lng,
+        RideRequest.earliest_pickup, RideRequest.latest_pickup
+    ).filter(RideRequest.status == 'pending') \
+        .order_by(RideRequest.created_at).limit(current_app.config['MATCHING_BATCH_SIZE']).all()
+    ride_rows = db.session.query(
+        Ride.id, Ride.pickup_lat, Ride.pickup_lng, Ride.dropoff_lat, Ride.dropoff_lng,
+        Ride.pickup_time, Ride.max_passengers - Ride.current_passengers
+    ).filter(
+        Ride.status == 'available', Ride.is_group_ride.is_(True), Ride.pickup_time >= now,
+        Ride.pickup_lat.isnot(None), Ride.pickup_lng.isnot(None),
+        Ride.current_passengers < Ride.max_passengers
+    ).all()
+    if not requests_rows or not ride_rows:
+        return {'requests': len(requests_rows), 'matched': 0}
+    
+    def nullable(value):
+        return float('nan') if value is None else value
+    
+    requests = RequestBatch(
+        pickup_lat=[r.pickup_lat for r in requests_rows],
+        pickup_lng=[r.pickup_lng for r in requests_rows],
+        earliest=[r.earliest_pickup.timestamp() for r in requests_rows],
+        latest=[r.latest_pickup.timestamp() for r in requests_rows],
+        dropoff_lat=[nullable(r.dropoff_lat) for r in requests_rows],
+        dropoff_lng=[nullable(r.dropoff_lng) for r in requests_rows],
+        owners=[r.student_id for r in requests_rows]
+    )
+    rides = RideBatch(
+        pickup_lat=[r.pickup_lat for r in ride_rows],
+        pickup_lng=[r.pickup_lng for r in ride_rows],
+        pickup_time=[r.pickup_time.timestamp() for r in ride_rows],
+        seats=[r[-1] for r in ride_rows],
+        dropoff_lat=[nullable(r.dropoff_lat) for r in ride_rows],
+        dropoff_lng=[nullable(r.dropoff_lng) for r in ride_rows]
+    )
+    
+    # Students already on a candidate ride must not be matched onto it again
+    ride_position = {row.id: i for i, row in enumerate(ride_rows)}
+    members = db.session.query(GroupRide.student_id, GroupRide.ride_id) \
+        .filter(GroupRide.ride_id.in_(list(ride_position)))
+    blocked = {(student_id, ride_position[ride_id]) for student_id, ride_id in members}
+    
+    params = MatchParams(max_detour_m=current_app.config['MATCHING_MAX_DETOUR_M'],
+                         max_wait_s=current_app.config['MATCHING_MAX_WAIT_S'])
+    result = match(requests, rides, params, blocked=blocked)
+    stats = result.stats(len(requests))
+    
+    assignments = {}
+    for req_idx, ride_idx in zip(result.request_idx.tolist(), result.ride_idx.tolist()):
+        assignments.setdefault(ride_rows[ride_idx].id, []).append(requests_rows[req_idx])
+    
+    matched_rides = {}
+    ride_objects = {ride.id: ride for ride in db.session.scalars(select(Ride).where(Ride.id.in_(assignments)))}
+    for ride_id, assigned in assignments.items():
+        taken = len(assigned)
+        seats = db.session.execute(
+            update(Ride).where(
+                Ride.id == ride_id,
+                Ride.status == 'available',
+                Ride.current_passengers + taken <= Ride.max_passengers
+            ).values(
+                current_passengers=Ride.current_passengers + taken,
+                status=case((Ride.current_passengers + taken >= Ride.max_passengers, 'booked'),
+                            else_='available')
+            ).execution_options(synchronize_session=False)
+        )
+        if seats.rowcount != 1:
+            # Seats went to direct bookings since the snapshot; retry next batch
+            continue
+        claimed = db.session.execute(
+            update(RideRequest).where(
+                RideRequest.id.in_([r.id for r in assigned]),
+                RideRequest.status == 'pending'
+            ).values(status='matched', ride_id=ride_id, matched_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        if claimed.rowcount != taken:
+            # Another matcher claimed some of these requests; drop the whole batch
+            db.session.rollback()
+            return dict(stats, matched=0, conflict=True)
+        db.session.add_all([GroupRide(ride_id=ride_id, student_id=r.student_id) for r in assigned])
+        ride = ride_objects[ride_id]
+        route = f'{ride.pickup_location} to {ride.dropoff_location}'
+        notify([r.student_id for r in assigned], ride, 'ride.booked',
+               f'You have been matched to a group ride from {route}!')
+        notify([ride.driver_id], ride, 'ride.booked', f'New booking: {route}')
+        matched_rides[ride_id] = [r.student_id for r in assigned]
+    db.session.commit()
+    
+    for ride_id, student_ids in matched_rides.items():
+        publish_ride_event('ride.booked', ride_objects[ride_id], user_ids=student_ids)
+    
+    stats['matched'] = sum(len(students) for students in matched_rides.values())
+    return stats
+
+_matching_worker = None
+_matching_worker_lock = threading.Lock()
+
+def ensure_matching_worker():
+    global _matching_worker
+    if _matching_worker is None and not current_app.config.get('TESTING'):
+        with _matching_worker_lock:
+            if _matching_worker is None:
+                app = current_app._get_current_object()
+                def run_batch():
+                    with app.app_context():
+                        run_matching_batch()
+                _matching_worker = PeriodicWorker(run_batch, current_app.config['MATCHING_INTERVAL_SECONDS'],
+                                                  name='ride-matcher')
+                _matching_worker.start()
+
+# Ride archive and history
+FINISHED_STATUSES = ('completed', 'cancelled')
+HISTORY_PAGE_SIZE = 20
+
+def _move_rows(model, archive, condition, archived_at):
+    """DELETE ... RETURNING from a hot table, then insert the rows into its archive"""
+    rows = db.session.execute(
+        delete(model).where(condition).returning(*model.__table__.c)
+        .execution_options(synchronize_session=False)
+    ).mappings().all()
+    if rows:
+        db.session.execute(archive.insert(), [dict(row, archived_at=archived_at) for row in rows])
+    return len(rows)
+
+def archive_finished_rides(now=None, max_batches=None):
+    """Move finished rides older than ARCHIVE_AFTER_DAYS to the archive tables.
+
+    Works through ARCHIVE_BATCH_SIZE rides per transaction so the write lock
+    is only held briefly, and picks up where it left off on the next run.
+    Ride requests and notifications keep their rows but drop the ride link.
+    Returns the number of rides archived.
+    """
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=current_app.config['ARCHIVE_AFTER_DAYS'])
+    batch_size = current_app.config['ARCHIVE_BATCH_SIZE']
+    archived = batches = 0
+    while max_batches is None or batches < max_batches:
+        ride_ids = db.session.scalars(
+            select(Ride.id).where(Ride.status.in_(FINISHED_STATUSES), Ride.pickup_time < cutoff)
+            .order_by(Ride.pickup_time).limit(batch_size)
+        ).all()
+        if not ride_ids:
+            break
+        for model, archive in ((RideLocation, ride_location_archive), (GroupRide, group_ride_archive),
+                               (Payment, payment_archive)):
+            _move_rows(model, archive, model.ride_id.in_(ride_ids), now)
+        for model in (RideRequest, Notification):
+            db.session.execute(
+                update(model).where(model.ride_id.in_(ride_ids)).values(ride_id=None)
+                .execution_options(synchronize_session=False)
+            )
+        archived += _move_rows(Ride, ride_archive, Ride.id.in_(ride_ids), now)
+        db.session.commit()
+        batches += 1
+        if len(ride_ids) < batch_size:
+            break
+    if archived:
+        logger.info('Archived %d finished rides', archived)
+    return archived
+
+def ride_history_page(user_id, user_type, cursor=None, limit=HISTORY_PAGE_SIZE):
+    """One page of a user's finished rides, newest pickup first, from the hot
+    table and the archive. Returns (rows, has_more)."""
+    rows = []
+    for rides, members, archived in ((Ride.__table__, GroupRide.__table__, False),
+                                     (ride_archive, group_ride_archive, True)):
+        if user_type == 'driver':
+            mine = rides.c.driver_id == user_id
+        else:
+            joined = select(members.c.ride_id).where(members.c.student_id == user_id)
+            mine = or_(rides.c.student_id == user_id, rides.c.id.in_(joined))
+        query = select(rides.c.id, rides.c.pickup_location, rides.c.dropoff_location, rides.c.pickup_time,
+                       rides.c.fare, rides.c.status, rides.c.is_group_ride).where(mine)
+        if not archived:
+            query = query.where(rides.c.status.in_(FINISHED_STATUSES))
+        if cursor is not None:
+            pickup_time, ride_id = cursor
+            query = query.where(or_(rides.c.pickup_time < pickup_time,
+                                    and_(rides.c.pickup_time == pickup_time, rides.c.id < ride_id)))
+        query = query.order_by(rides.c.pickup_time.desc(), rides.c.id.desc()).limit(limit + 1)
+        rows += [dict(row._mapping, archived=archived) for row in db.session.execute(query)]
+    rows.sort(key=lambda row: (row['pickup_time'], row['id']), reverse=True)
+    return rows[:limit], len(rows) > limit
+
+@bp.route('/api/history')
+@login_required
+def api_history():
+    """The current user's completed and cancelled rides, newest first.
+
+    Pages with ``limit`` and ``cursor`` like /api/rides; the next cursor is
+    in ``X-Next-Cursor``. Archived rides are included transparently.
+    """
+    try:
+        limit = min(int(request.args.get('limit', HISTORY_PAGE_SIZE)), RIDES_MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError('limit must be positive')
+        cursor = decode_ride_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Invalid query parameters'}), 400
+    
+    rows, has_more = ride_history_page(current_user.id, current_user.user_type, cursor, limit)
+    response = jsonify([dict(row, pickup_time=row['pickup_time'].isoformat()) for row in rows])
+    if has_more:
+        last = rows[-1]
+        response.headers['X-Next-Cursor'] = encode_ride_cursor(SimpleNamespace(**last))
+    return response
+
+def count_student_rides(student_id):
+    """(solo rides, group rides) for a student across the hot and archive tables"""
+    solo = db.session.scalar(
+        select(func.count()).select_from(Ride).where(Ride.student_id == student_id)
+    ) + db.session.scalar(
+        select(func.count()).select_from(ride_archive).where(ride_archive.c.student_id == student_id)
+    )
+    group = db.session.scalar(
+        select(func.count()).select_from(GroupRide).where(GroupRide.student_id == student_id)
+    ) + db.session.scalar(
+        select(func.count()).select_from(group_ride_archive).where(group_ride_archive.c.student_id == student_id)
+    )
+    return solo, group
+
+_archive_worker = None
+_archive_worker_lock = threading.Lock()
+
+def ensure_archive_worker():
+    global _archive_worker
+    if _archive_worker is None and not current_app.config.get('TESTING'):
+        with _archive_worker_lock:
+            if _archive_worker is None:
+                app = current_app._get_current_object()
+                def archive():
+                    with app.app_context():
+                        archive_finished_rides()
+                _archive_worker = PeriodicWorker(archive, current_app.config['ARCHIVE_INTERVAL_SECONDS'],
+                                                 name='ride-archiver')
+                _archive_worker.start()
+
+@click.command('archive-rides')
+@with_appcontext
+def archive_rides_command():
+    """Move old completed and cancelled rides to the archive tables."""
+    archived = archive_finished_rides()
+    click.echo(f'[SUCCESS] Archived {archived} rides')
+
+_schedule_worker = None
+_schedule_worker_lock = threading.Lock()
+
+def ensure_schedule_worker():
+    global _schedule_worker
+    if _schedule_worker is None and not current_app.config.get('TESTING'):
+        with _schedule_worker_lock:
+            if _schedule_worker is None:
+                app = current_app._get_current_object()
+                def extend():
+                    with app.app_context():
+                        extend_schedules()
+                _schedule_worker = PeriodicWorker(extend, current_app.config['SCHEDULE_EXTEND_SECONDS'],
+                                                  name='schedule-extender')
+                _schedule_worker.start()
+
+@click.command('extend-schedules')
+@with_appcontext
+def extend_schedules_command():
+    """Materialise recurring rides up to the rolling window."""
+    created = extend_schedules()
+    click.echo(f'[SUCCESS] Created {created} scheduled rides')
+
+def shutdown_app():
+    """Release runtime resources before the process exits.
+
+    Ends open SSE streams (clients reconnect with Last-Event-ID), stops the
+    background workers after a final location flush and shuts down the CPU
+    pool. Safe to call more than once.
+    """
+    if hasattr(event_bus, 'close_all'):
+        event_bus.close_all()
+    for worker in (_location_flusher, _matching_worker, _schedule_worker, _archive_worker, _payment_worker):
+        if worker is not None:
+            try:
+                worker.stop()
+            except Exception:
+                logger.exception('Error stopping %s', worker.name)
+    cpu_pool.shutdown()
+
+@bp.route('/api/ride_requests', methods=['GET', 'POST'])
+@login_required
+def api_ride_requests():
+    """Ask to be matched onto a group ride, or list your own requests.
+
+    POST body: ``{"pickup_lat", "pickup_lng", "earliest", "latest",
+    "dropoff_lat"?, "dropoff_lng"?, "pickup_location"?}`` with ISO times.
+    Requests are matched in batches every MATCHING_INTERVAL_SECONDS.
+    """
+    if current_user.user_type != 'student':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    if request.method == 'GET':
+        ride_requests = RideRequest.query.filter_by(student_id=current_user.id) \
+            .order_by(RideRequest.created_at.desc()).limit(20).all()
+        return jsonify([serialize_ride_request(r) for r in ride_requests])
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        pickup_lat, pickup_lng = float(data['pickup_lat']), float(data['pickup_lng'])
+        earliest = datetime.fromisoformat(data['earliest'])
+        latest = datetime.fromisoformat(data['latest'])
+        dropoff_lat = float(data['dropoff_lat']) if data.get('dropoff_lat') is not None else None
+        dropoff_lng = float(data['dropoff_lng']) if data.get('dropoff_lng') is not None else None
+    except (KeyError, ValueError, TypeError):
+        return jsonify({'error': 'Invalid ride request'}), 400
+    if not valid_coordinates(pickup_lat, pickup_lng) or latest < earliest:
+        return jsonify({'error': 'Invalid ride request'}), 400
+    if (dropoff_lat is None) != (dropoff_lng is None) or \
+            (dropoff_lat is not None and not valid_coordinates(dropoff_lat, dropoff_lng)):
+        return jsonify({'error': 'Invalid ride request'}), 400
+    
+    ride_request = RideRequest(
+        student_id=current_user.id,
+        pickup_location=data.get('pickup_location'),
+        pickup_lat=pickup_lat,
+        pickup_lng=pickup_lng,
+        dropoff_lat=dropoff_lat,
+        dropoff_lng=dropoff_lng,
+        earliest_pickup=earliest,
+        latest_pickup=latest
+    )
+    db.session.add(ride_request)
+    db.session.commit()
+    ensure_matching_worker()
+    
+    return jsonify(serialize_ride_request(ride_request)), 201
+
+NOTIFICATIONS_PAGE_SIZE = 20
+NOTIFICATIONS_MAX_PAGE_SIZE = 100
+
+def serialize_notification(notification):
+    return {
+        'id': notification.id,
+        'event': notification.event,
+        'type': notification.level,
+        'message': notification.message,
+        'ride_id': notification.ride_id,
+        'timestamp': notification.created_at.isoformat()
+    }
+
+@bp.route('/api/notifications')
 @login_required
 def api_notifications():
-    # Simple notification system - in production, use WebSockets or Server-Sent Events
-    notifications = []
-    
-    if current_user.user_type == 'student':
-        # Get notifications for students
-        recent_rides = Ride.query.filter_by(student_id=current_user.id).order_by(Ride.created_at.desc()).limit(5).all()
-        for ride in recent_rides:
-            if ride.status == 'booked':
-                notifications.append({
-                    'type': 'info',
-                    'message': f'Your ride from {ride.pickup_location} to {ride.dropoff_location} is confirmed!',
-                    'timestamp': ride.created_at.isoformat()
-                })
-            elif ride.status == 'in_progress':
-                notifications.append({
-                    'type': 'success',
-                    'message': f'Your ride is on the way! Driver: {ride.driver.username}',
-                    'timestamp': ride.created_at.isoformat()
-                })
+    """Notifications for the current user, newest first.
+
+    Pass the ``X-Next-Cursor`` of the previous response as ``since`` to get
+    only what was added after it; a poll with nothing new is a single index
+    range scan returning an empty list. Without ``since`` the newest
+    ``limit`` notifications are returned.
+    """
+    try:
+        query = notifications_query(current_user.id, request.args)
+    except ValueError:
+        return jsonify({'error': 'Invalid query parameters'}), 400
     
-    elif current_user.user_type == 'driver':
-        # Get notifications for drivers
-        recent_rides = Ride.query.filter_by(driver_id=current_user.id).order_by(Ride.created_at.desc()).limit(5).all()
-        for ride in recent_rides:
-            if ride.status == 'booked':
-                notifications.append({
-                    'type': 'info',
-                    'message': f'New booking: {ride.pickup_location} to {ride.dropoff_location}',
-                    'timestamp': ride.created_at.isoformat()
-                })
+    body, next_cursor = notifications_page(db.session.scalars(query).all(), request.args)
+    response = jsonify(body)
+    response.headers['X-Next-Cursor'] = next_cursor
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+def notifications_query(user_id, args):
+    """Statement for one /api/notifications page; raises ValueError"""
+    limit = page_limit(args, NOTIFICATIONS_PAGE_SIZE, NOTIFICATIONS_MAX_PAGE_SIZE)
+    since = int(args.get('since', 0))
+    if since < 0:
+        raise ValueError('since must be positive')
+    query = select(Notification).where(Notification.user_id == user_id)
+    if 'since' in args:
+        # Oldest unseen first so a backlog larger than one page is drained in order
+        return query.where(Notification.id > since).order_by(Notification.id).limit(limit)
+    return query.order_by(Notification.id.desc()).limit(limit)
+
+def notifications_page(notifications, args):
+    """(JSON body, next ``since`` cursor) for the rows notifications_query fetched"""
+    if 'since' in args:
+        notifications = notifications[::-1]
+    since = notifications[0].id if notifications else int(args.get('since', 0))
+    return [serialize_notification(n) for n in notifications], str(since)
+
+# Fare and ETA estimates
+#
+# Routes are cached per pair of geohash cells, in memory and in the
+# cached_route table shared by all workers. NumPy (via fares) is imported
+# on first use.
+_fare_engine_lock = threading.Lock()
+
+def _route_lookup(backend):
+    def lookup(keys):
+        wanted = set(keys)
+        rows = db.session.execute(
+            select(CachedRoute.pickup_cell, CachedRoute.dropoff_cell, CachedRoute.distance_m, CachedRoute.duration_s)
+            .where(CachedRoute.backend == backend,
+                   CachedRoute.pickup_cell.in_({pickup for pickup, _ in keys}),
+                   CachedRoute.dropoff_cell.in_({dropoff for _, dropoff in keys}))
+        )
+        return {(row.pickup_cell, row.dropoff_cell): (row.distance_m, row.duration_s) for row in rows
+                if (row.pickup_cell, row.dropoff_cell) in wanted}
+    return lookup
+
+def _route_store(backend):
+    def store(routes):
+        table = CachedRoute.__table__
+        if db.engine.dialect.name == 'postgresql':
+            statement = postgresql.insert(table).on_conflict_do_nothing()
+        elif db.engine.dialect.name == 'sqlite':
+            statement = sqlite.insert(table).on_conflict_do_nothing()
+        else:
+            statement = table.insert().prefix_with('IGNORE')
+        # Own connection and transaction, so caching never commits the caller's work
+        with db.engine.begin() as conn:
+            conn.execute(statement, [{
+                'pickup_cell': pickup, 'dropoff_cell': dropoff, 'backend': backend,
+                'distance_m': distance, 'duration_s': duration, 'created_at': datetime.utcnow()
+            } for (pickup, dropoff), (distance, duration) in routes.items()])
+    return store
+
+def get_fare_engine():
+    global fare_engine
+    if fare_engine is None:
+        with _fare_engine_lock:
+            if fare_engine is None:
+                from fares import FareEngine, FareParams, HaversineRouter, load_router
+                settings = current_app.config
+                offline = HaversineRouter(road_factor=settings['ROUTE_ROAD_FACTOR'],
+                                          speed_kmh=settings['ROUTE_SPEED_KMH'])
+                router = load_router(settings['ROUTING_BACKEND'], settings['OSRM_URL'],
+                                     settings['ROUTE_ROAD_FACTOR'], settings['ROUTE_SPEED_KMH'])
+                params = FareParams(base_fare=settings['FARE_BASE'], base_km=settings['FARE_BASE_KM'],
+                                    per_km=settings['FARE_PER_KM'], per_minute=settings['FARE_PER_MINUTE'],
+                                    minimum=settings['FARE_BASE'])
+                fare_engine = FareEngine(router, params, precision=settings['ROUTE_CACHE_PRECISION'],
+                                         max_entries=settings['ROUTE_CACHE_SIZE'],
+                                         fallback=offline if router.name != offline.name else None,
+                                         lookup=_route_lookup(router.name), store=_route_store(router.name))
+                current_app.extensions['fare_engine'] = fare_engine
+    return fare_engine
+
+def per_seat_fare(fare, seats):
+    """One passenger's share of a fare split over seats, rounded up to a whole rupee"""
+    return float(math.ceil(fare / max(seats or 1, 1)))
+
+def ride_seat_fare(ride):
+    """What each passenger pays: a group ride's fare is split over its seats"""
+    return per_seat_fare(ride.fare, ride.max_passengers) if ride.is_group_ride else ride.fare
+
+def serialize_estimate(distance_m, duration_s, fare, passengers=1):
+    from fares import format_duration
+    return {
+        'distance_m': round(float(distance_m)),
+        'duration_s': round(float(duration_s)),
+        'distance_text': f'{distance_m / 1000:.1f} km',
+        'eta_text': format_duration(duration_s),
+        'fare': float(fare),
+        'per_seat_fare': per_seat_fare(fare, passengers)
+    }
+
+def parse_trip(values):
+    trip = [float(value) for value in values]
+    if len(trip) != 4 or not (valid_coordinates(*trip[:2]) and valid_coordinates(*trip[2:])):
+        raise ValueError('a trip is pickup_lat, pickup_lng, dropoff_lat, dropoff_lng')
+    return trip
+
+@bp.route('/api/fare/estimate')
+@login_required
+def api_fare_estimate():
+    """Distance, duration and suggested fare between two points"""
+    try:
+        trip = parse_trip(request.args[name] for name in ('pickup_lat', 'pickup_lng', 'dropoff_lat', 'dropoff_lng'))
+        passengers = int(request.args.get('passengers', 1))
+    except (KeyError, ValueError):
+        return jsonify({'error': 'Invalid query parameters'}), 400
     
-    return jsonify(notifications)
+    estimate = get_fare_engine().estimate(*trip)
+    return jsonify(dict(serialize_estimate(estimate['distance_m'], estimate['duration_s'], estimate['fare'],
+                                           passengers), cached=estimate['cached']))
 
-@app.route('/generate_qr/<int:ride_id>')
+@bp.route('/api/fare/batch', methods=['POST'])
 @login_required
-def generate_qr(ride_id):
+def api_fare_batch():
+    """Estimates for many trips in one call.
+
+    Body: ``{"ride_ids": [...]}`` to price listed rides (rides without both
+    coordinate pairs get null) or ``{"trips": [[pickup_lat, pickup_lng,
+    dropoff_lat, dropoff_lng], ...]}``.
+    """
+    data = request.get_json(silent=True) or {}
+    limit = current_app.config['FARE_BATCH_MAX']
+    try:
+        if 'ride_ids' in data:
+            ride_ids = [int(ride_id) for ride_id in data['ride_ids']][:limit]
+            rows = db.session.execute(
+                select(Ride.id, Ride.pickup_lat, Ride.pickup_lng, Ride.dropoff_lat, Ride.dropoff_lng,
+                       Ride.max_passengers, Ride.is_group_ride).where(Ride.id.in_(ride_ids))
+            ).all()
+            priced = [row for row in rows if valid_coordinates(row.pickup_lat, row.pickup_lng)
+                      and valid_coordinates(row.dropoff_lat, row.dropoff_lng)]
+            trips = [row[1:5] for row in priced]
+            passengers = [row.max_passengers if row.is_group_ride else 1 for row in priced]
+            keys = [row.id for row in priced]
+            result = {ride_id: None for ride_id in ride_ids}
+        else:
+            trips = [parse_trip(trip) for trip in data['trips'][:limit]]
+            passengers = [1] * len(trips)
+            keys = list(range(len(trips)))
+            result = {}
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Send ride_ids or trips'}), 400
+    
+    if trips:
+        columns = list(zip(*trips))
+        estimates = get_fare_engine().estimate_many(*columns)
+        for i, key in enumerate(keys):
+            result[key] = serialize_estimate(estimates['distance_m'][i], estimates['duration_s'][i],
+                                             estimates['fare'][i], passengers[i])
+    if 'ride_ids' in data:
+        return jsonify({str(ride_id): estimate for ride_id, estimate in result.items()})
+    return jsonify([result[i] for i in keys])
+
+@bp.route('/api/rides/<int:ride_id>/eta')
+@login_required
+def api_ride_eta(ride_id):
+    """Distance and time to the drop-off: from the driver's last fix once the
+    ride is under way, otherwise for the whole trip. Driver and passengers only."""
     ride = Ride.query.get_or_404(ride_id)
+    if current_user.id not in ride_participants(ride.id):
+        return jsonify({'error': 'Unauthorized'}), 403
+    if not valid_coordinates(ride.dropoff_lat, ride.dropoff_lng):
+        return jsonify({'error': 'Ride has no drop-off coordinates'}), 404
+    origin, source = (ride.pickup_lat, ride.pickup_lng), 'pickup'
+    latest = location_store.latest(ride.id) if ride.status == 'in_progress' else None
+    if latest is not None:
+        origin, source = latest[1:], 'driver'
+    if not valid_coordinates(*origin):
+        return jsonify({'error': 'Ride has no pickup coordinates'}), 404
+    
+    estimate = get_fare_engine().estimate(*origin, ride.dropoff_lat, ride.dropoff_lng)
+    return jsonify(dict(serialize_estimate(estimate['distance_m'], estimate['duration_s'], estimate['fare']),
+                        ride_id=ride.id, source=source))
+
+# Streaming exports
+#
+# Rows are read with yield_per (a server-side cursor where the driver has
+# one) and encoded chunk by chunk inside the response generator, so memory
+# use does not depend on the number of rows. Archived rows are included.
+RIDE_EXPORT_COLUMNS = ('id', 'ride_id', 'driver_id', 'student_id', 'pickup_location', 'dropoff_location',
+                       'pickup_time', 'status', 'fare', 'is_group_ride', 'max_passengers',
+                       'current_passengers', 'amount_paid', 'created_at')
+PAYMENT_EXPORT_COLUMNS = ('payment_id', 'ride_id', 'student_id', 'amount', 'payment_method', 'status',
+                          'provider_ref', 'created_at', 'settled_at')
+
+def parse_export_filters(args):
+    """``driver_id``, ``from`` (inclusive), ``to`` (exclusive) and ``status`` (comma separated)"""
+    filters = {}
+    if args.get('driver_id'):
+        filters['driver_id'] = int(args['driver_id'])
+    for name in ('from', 'to'):
+        if args.get(name):
+            filters[name] = datetime.fromisoformat(args[name])
+    if args.get('status'):
+        filters['status'] = args['status'].split(',')
+    return filters
+
+def _apply_export_filters(query, filters, driver_column, time_column, status_column):
+    if 'driver_id' in filters:
+        query = query.where(driver_column == filters['driver_id'])
+    if 'from' in filters:
+        query = query.where(time_column >= filters['from'])
+    if 'to' in filters:
+        query = query.where(time_column < filters['to'])
+    if 'status' in filters:
+        query = query.where(status_column.in_(filters['status']))
+    return query
+
+def _stream_rows(query):
+    result = db.session.execute(query, execution_options={'yield_per': current_app.config['EXPORT_BATCH_SIZE']})
+    try:
+        yield from result
+    finally:
+        result.close()
+
+def export_ride_rows(filters):
+    for rides, archived in ((Ride.__table__, False), (ride_archive, True)):
+        query = select(*[rides.c[name] for name in RIDE_EXPORT_COLUMNS], literal(archived))
+        query = _apply_export_filters(query, filters, rides.c.driver_id, rides.c.pickup_time, rides.c.status)
+        yield from _stream_rows(query.order_by(rides.c.pickup_time, rides.c.id))
+
+def export_payment_rows(filters):
+    for payments, rides, archived in ((Payment.__table__, Ride.__table__, False),
+                                      (payment_archive, ride_archive, True)):
+        query = select(*[payments.c[name] for name in PAYMENT_EXPORT_COLUMNS], rides.c.driver_id,
+                       literal(archived)).join(rides, rides.c.id == payments.c.ride_id)
+        query = _apply_export_filters(query, filters, rides.c.driver_id, payments.c.created_at,
+                                      payments.c.status)
+        yield from _stream_rows(query.order_by(payments.c.created_at, payments.c.id))
+
+def export_response(fmt, filename, columns, rows):
+    chunks = encode_chunks(fmt, columns, rows)
+    headers = {
+        'Content-Disposition': f'attachment; filename={filename}.{fmt}',
+        'Cache-Control': 'no-store',
+        'Vary': 'Accept-Encoding'
+    }
+    if 'gzip' in request.accept_encodings:
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(stream_with_context(chunks), mimetype=EXPORT_FORMATS[fmt], headers=headers)
+
+def _export(kind, fmt):
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': 'Unknown export format'}), 404
+    if current_user.user_type != 'driver' and not is_admin(current_user):
+        return jsonify({'error': 'Unauthorized'}), 403
+    try:
+        filters = parse_export_filters(request.args)
+    except ValueError:
+        return jsonify({'error': 'Invalid query parameters'}), 400
+    if not is_admin(current_user):
+        # Drivers only ever export their own rides and payments
+        if filters.setdefault('driver_id', current_user.id) != current_user.id:
+            return jsonify({'error': 'Unauthorized'}), 403
+    
+    stamp = datetime.utcnow().strftime('%Y%m%d')
+    if kind == 'rides':
+        return export_response(fmt, f'rides-{stamp}', RIDE_EXPORT_COLUMNS + ('archived',),
+                               export_ride_rows(filters))
+    return export_response(fmt, f'payments-{stamp}', PAYMENT_EXPORT_COLUMNS + ('driver_id', 'archived'),
+                           export_payment_rows(filters))
+
+@bp.route('/api/export/rides.<fmt>')
+@login_required
+def export_rides(fmt):
+    """Stream rides as CSV or NDJSON, gzipped if the client accepts it"""
+    return _export('rides', fmt)
+
+@bp.route('/api/export/payments.<fmt>')
+@login_required
+def export_payments(fmt):
+    """Stream payments as CSV or NDJSON, gzipped if the client accepts it"""
+    return _export('payments', fmt)
+
+# Payments
+#
+# Students start a payment with an Idempotency-Key header. The key is unique
+# per student, so a retried submission gets the payment its first attempt
+# created instead of a second row; a submission with a fresh key reuses the
+# pending payment for that ride, if any. Provider callbacks and drivers' cash
+# confirmations are only verified and queued in the payment_event inbox;
+# settle_payments() applies them in batches, updating Payment and
+# Ride.amount_paid in one transaction.
+PAYMENT_METHODS = ('upi', 'cash')
+
+def payment_intent_uri(payment):
+    settings = current_app.config
+    return intent_uri(settings['UPI_PAYEE_VPA'], settings['UPI_PAYEE_NAME'], payment.amount,
+                      payment.payment_id, note=f'Edu-Ride ride {payment.ride_id}')
+
+def open_payment(ride_id, student_id):
+    """The student's completed payment for a ride, else their pending one, else None"""
+    return Payment.query.filter(
+        Payment.ride_id == ride_id, Payment.student_id == student_id,
+        Payment.status.in_(('pending', 'completed'))
+    ).order_by(case((Payment.status == 'completed', 0), else_=1)).first()
+
+def serialize_payment(payment):
+    data = {
+        'payment_id': payment.payment_id,
+        'ride_id': payment.ride_id,
+        'amount': payment.amount,
+        'payment_method': payment.payment_method,
+        'status': payment.status,
+        'created_at': payment.created_at.isoformat(),
+        'settled_at': payment.settled_at.isoformat() if payment.settled_at else None
+    }
+    if payment.payment_method == 'upi' and payment.status == 'pending':
+        data['upi_uri'] = payment_intent_uri(payment)
+        data['qr_url'] = url_for('main.payment_qr_image', payment_id=payment.payment_id, fmt='png')
+    return data
+
+@bp.route('/api/payments', methods=['POST'])
+@login_required
+def api_create_payment():
+    """Start paying for a ride. Retries must resend the same Idempotency-Key;
+    a new key while a payment for the ride is pending gets that payment."""
+    if current_user.user_type != 'student':
+        return jsonify({'error': 'Only students can pay for rides'}), 403
+    
+    key = request.headers.get('Idempotency-Key', '').strip()
+    if not key or len(key) > 64:
+        return jsonify({'error': 'An Idempotency-Key header of up to 64 characters is required'}), 400
+    data = request.get_json(silent=True) or {}
+    method = data.get('payment_method', 'upi')
+    if method not in PAYMENT_METHODS:
+        return jsonify({'error': 'payment_method must be upi or cash'}), 400
+    try:
+        ride_id = int(data.get('ride_id'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'ride_id is required'}), 400
+    
+    payment = Payment.query.filter_by(student_id=current_user.id, idempotency_key=key).first()
+    if payment is None:
+        ride = db.session.get(Ride, ride_id)
+        if ride is None:
+            return jsonify({'error': 'Ride not found'}), 404
+        if ride.status == 'cancelled' or current_user.id not in ride_passenger_ids(ride):
+            return jsonify({'error': 'You are not on this ride'}), 403
+        payment = open_payment(ride.id, current_user.id)
+        if payment is None:
+            payment = Payment(ride_id=ride.id, student_id=current_user.id, amount=ride_seat_fare(ride),
+                              payment_method=method, idempotency_key=key)
+            db.session.add(payment)
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # A concurrent request with the same key, or for the same ride, got there first
+                db.session.rollback()
+                payment = (Payment.query.filter_by(student_id=current_user.id, idempotency_key=key).first()
+                           or open_payment(ride.id, current_user.id))
+            else:
+                ensure_payment_worker()
+                return jsonify(serialize_payment(payment)), 201
+        if payment.idempotency_key != key:
+            if payment.status == 'completed':
+                return jsonify({'error': 'This ride is already paid'}), 409
+            if payment.payment_method != method:
+                return jsonify({'error': 'Another payment for this ride is pending',
+                                'payment': serialize_payment(payment)}), 409
+            return jsonify(serialize_payment(payment)), 200
     
-    # Create QR code data
-    qr_data = {
+    if payment.ride_id != ride_id or payment.payment_method != method:
+        return jsonify({'error': 'Idempotency-Key was already used for a different payment'}), 422
+    return jsonify(serialize_payment(payment)), 200
+
+@bp.route('/api/payments/<payment_id>')
+@login_required
+def api_payment(payment_id):
+    payment = Payment.query.filter_by(payment_id=payment_id).first_or_404()
+    if current_user.id not in (payment.student_id, payment.ride.driver_id):
+        return jsonify({'error': 'Unauthorized'}), 403
+    response = jsonify(serialize_payment(payment))
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@bp.route('/api/payments/webhook/upi', methods=['POST'])
+def upi_webhook():
+    """UPI provider callback. Verified and queued only, so bursts cost one
+    INSERT each; settle_payments() applies them. Redeliveries are no-ops."""
+    secret = current_app.config['UPI_WEBHOOK_SECRET']
+    if not secret:
+        return jsonify({'error': 'UPI webhook is not configured'}), 503
+    body = request.get_data()
+    if not verify_signature(secret, body, request.headers.get(SIGNATURE_HEADER)):
+        return jsonify({'error': 'Invalid signature'}), 401
+    
+    try:
+        data = json.loads(body)
+        if data['status'] not in UPI_STATUSES:
+            raise ValueError(data['status'])
+        payment_event = PaymentEvent(
+            event_id=str(data['event_id'])[:64],
+            provider='upi',
+            payment_id=str(data['payment_id'])[:36],
+            status=data['status'],
+            amount=float(data['amount']) if data.get('amount') is not None else None,
+            provider_ref=str(data.get('provider_ref') or '')[:64] or None
+        )
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Malformed callback'}), 400
+    
+    db.session.add(payment_event)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'received': True, 'duplicate': True}), 200
+    ensure_payment_worker()
+    return jsonify({'received': True}), 202
+
+@bp.route('/api/rides/<int:ride_id>/cash_received', methods=['POST'])
+@login_required
+def api_cash_received(ride_id):
+    """Driver confirms cash collected from every passenger who hasn't paid.
+    Their pending UPI payments expire, so cash is the one that settles."""
+    ride = Ride.query.get_or_404(ride_id)
+    if ride.driver_id != current_user.id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    passengers = [student_id for student_id in ride_passenger_ids(ride) if student_id is not None]
+    if not passengers:
+        return jsonify({'error': 'Ride has no passengers'}), 400
+    
+    payments = {}
+    for payment in Payment.query.filter(Payment.ride_id == ride.id, Payment.status.in_(('pending', 'completed'))):
+        if payment.status == 'completed' or payment.payment_method == 'cash':
+            payments[payment.student_id] = payment
+        elif payment.student_id in passengers:
+            payment.status = 'expired'
+    db.session.flush()
+    for student_id in passengers:
+        if student_id not in payments:
+            # Deterministic key: confirming twice never adds a second cash payment
+            payments[student_id] = Payment(ride_id=ride.id, student_id=student_id, amount=ride_seat_fare(ride),
+                                           payment_method='cash', idempotency_key=f'cash-{ride.ride_id}')
+            db.session.add(payments[student_id])
+    db.session.flush()
+    
+    pending = {p.payment_id: p for p in payments.values() if p.status == 'pending'}
+    queued = set(db.session.scalars(select(PaymentEvent.payment_id).where(PaymentEvent.payment_id.in_(pending))))
+    db.session.add_all([
+        PaymentEvent(event_id=f'cash-{payment_id}', provider='cash', payment_id=payment_id,
+                     status='SUCCESS', amount=payment.amount)
+        for payment_id, payment in pending.items() if payment_id not in queued
+    ])
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Confirmed twice at once; the other request queued the same events
+        db.session.rollback()
+    ensure_payment_worker()
+    return jsonify({'success': True, 'pending': len(pending)}), 202
+
+def _publish_payment(payment, ride, status):
+    payload = {'payment_id': payment['payment_id'], 'ride_id': ride.id, 'status': status,
+               'amount': payment['amount']}
+    event_bus.publish(f'ride:{ride.id}', f'payment.{status}', payload)
+    for user_id in (payment['student_id'], ride.driver_id):
+        event_bus.publish(f'user:{user_id}', 'notification', dict(payload, event=f'payment.{status}'))
+
+def settle_payments(now=None, max_batches=None):
+    """Apply queued payment events and expire abandoned UPI payments.
+
+    Each batch of PAYMENT_SETTLE_BATCH events is one transaction with a
+    fixed number of statements: the events are claimed with a conditional
+    UPDATE (so concurrent workers never apply one twice), payments move out
+    of pending with UPDATE ... RETURNING, and the settled amounts are added
+    to Ride.amount_paid. A late SUCCESS still completes an expired payment,
+    unless the passenger has meanwhile paid for the ride another way.
+    Returns the number of payments settled.
+    """
+    now = now or datetime.utcnow()
+    batch_size = current_app.config['PAYMENT_SETTLE_BATCH']
+    settled = batches = 0
+    while max_batches is None or batches < max_batches:
+        event_ids = db.session.scalars(
+            select(PaymentEvent.id).where(PaymentEvent.processed_at.is_(None))
+            .order_by(PaymentEvent.id).limit(batch_size)
+        ).all()
+        if not event_ids:
+            break
+        claimed = db.session.execute(
+            update(PaymentEvent).where(PaymentEvent.id.in_(event_ids), PaymentEvent.processed_at.is_(None))
+            .values(processed_at=now)
+            .returning(PaymentEvent.id, PaymentEvent.payment_id, PaymentEvent.status, PaymentEvent.amount,
+                       PaymentEvent.provider_ref)
+            .execution_options(synchronize_session=False)
+        ).all()
+        
+        # The first applicable event per payment wins; the rest are unmatched
+        open_payments = {payment.payment_id: payment for payment in db.session.execute(
+            select(Payment.payment_id, Payment.ride_id, Payment.student_id, Payment.amount, Payment.status)
+            .where(Payment.payment_id.in_({row.payment_id for row in claimed}),
+                   Payment.status.in_(('pending', 'expired')))
+        )}
+        # Passengers whose ride is paid already; a second payment never completes
+        paid = {(row.ride_id, row.student_id) for row in db.session.execute(
+            select(Payment.ride_id, Payment.student_id)
+            .where(Payment.ride_id.in_({payment.ride_id for payment in open_payments.values()}),
+                   Payment.status == 'completed')
+        )}
+        outcomes = {'completed': {}, 'failed': {}}
+        results = {}
+        for row in sorted(claimed, key=lambda row: row.id):
+            payment = open_payments.get(row.payment_id)
+            if payment is None or row.payment_id in outcomes['completed'] or row.payment_id in outcomes['failed']:
+                results[row.id] = 'unmatched'
+            elif row.status != 'SUCCESS':
+                if payment.status == 'pending':
+                    outcomes['failed'][row.payment_id] = (row.id, row.provider_ref)
+                    results[row.id] = 'failed'
+                else:
+                    results[row.id] = 'unmatched'
+            elif row.amount is not None and abs(row.amount - payment.amount) >= 0.005:
+                results[row.id] = 'amount_mismatch'
+            elif (payment.ride_id, payment.student_id) in paid:
+                results[row.id] = 'already_paid'
+            else:
+                paid.add((payment.ride_id, payment.student_id))
+                outcomes['completed'][row.payment_id] = (row.id, row.provider_ref)
+                results[row.id] = 'completed'
+        
+        changed = {}
+        for status, payments in outcomes.items():
+            if not payments:
+                continue
+            refs = {payment_id: ref for payment_id, (_, ref) in payments.items() if ref}
+            values = {'status': status, 'settled_at': now}
+            if refs:
+                values['provider_ref'] = case(refs, value=Payment.payment_id, else_=Payment.provider_ref)
+            conditions = [Payment.payment_id.in_(payments),
+                          Payment.status.in_(('pending', 'expired') if status == 'completed' else ('pending',))]
+            if status == 'completed':
+                # Another worker may have completed a payment for the same passenger meanwhile
+                other = aliased(Payment)
+                conditions.append(~exists().where(other.ride_id == Payment.ride_id,
+                                                  other.student_id == Payment.student_id,
+                                                  other.status == 'completed'))
+            rows = db.session.execute(
+                update(Payment).where(*conditions)
+                .values(**values)
+                .returning(Payment.payment_id, Payment.ride_id, Payment.student_id, Payment.amount)
+                .execution_options(synchronize_session=False)
+            ).mappings().all()
+            changed[status] = rows
+            for payment_id in set(payments) - {row['payment_id'] for row in rows}:
+                results[payments[payment_id][0]] = 'unmatched'  # settled elsewhere meanwhile
+        
+        totals = defaultdict(float)
+        for row in changed.get('completed', ()):
+            totals[row['ride_id']] += row['amount']
+        if totals:
+            db.session.execute(
+                update(Ride).where(Ride.id.in_(totals))
+                .values(amount_paid=func.coalesce(Ride.amount_paid, 0) + case(totals, value=Ride.id, else_=0))
+                .execution_options(synchronize_session=False)
+            )
+        db.session.execute(
+            update(PaymentEvent).where(PaymentEvent.id.in_(results))
+            .values(result=case(results, value=PaymentEvent.id))
+            .execution_options(synchronize_session=False)
+        )
+        
+        ride_ids = {row['ride_id'] for rows in changed.values() for row in rows}
+        rides = {ride.id: ride for ride in db.session.scalars(select(Ride).where(Ride.id.in_(ride_ids)))}
+        for status, rows in changed.items():
+            for row in rows:
+                ride = rides[row['ride_id']]
+                route = f'{ride.pickup_location} to {ride.dropoff_location}'
+                if status == 'completed':
+                    notify([row['student_id']], ride, 'payment.completed',
+                           f"Payment of ₹{row['amount']:g} received for {route}", level='success')
+                    notify([ride.driver_id], ride, 'payment.completed',
+                           f"₹{row['amount']:g} received for {route}", level='success')
+                else:
+                    notify([row['student_id']], ride, 'payment.failed',
+                           f'Your payment for {route} failed', level='danger')
+        db.session.commit()
+        
+        for status, rows in changed.items():
+            for row in rows:
+                _publish_payment(row, rides[row['ride_id']], status)
+        settled += sum(len(rows) for rows in changed.values())
+        batches += 1
+        if len(event_ids) < batch_size:
+            break
+    
+    cutoff = now - timedelta(minutes=current_app.config['PAYMENT_EXPIRE_MINUTES'])
+    expired = db.session.execute(
+        update(Payment).where(Payment.status == 'pending', Payment.created_at < cutoff,
+                              Payment.payment_method == 'upi')
+        .values(status='expired')
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    if settled or expired:
+        logger.info('Settled %d payments, expired %d', settled, expired)
+    return settled
+
+_payment_worker = None
+_payment_worker_lock = threading.Lock()
+
+def ensure_payment_worker():
+    global _payment_worker
+    if _payment_worker is None and not current_app.config.get('TESTING'):
+        with _payment_worker_lock:
+            if _payment_worker is None:
+                app = current_app._get_current_object()
+                def settle():
+                    with app.app_context():
+                        settle_payments()
+                _payment_worker = PeriodicWorker(settle, current_app.config['PAYMENT_SETTLE_SECONDS'],
+                                                 name='payment-settler')
+                _payment_worker.start()
+
+@click.command('settle-payments')
+@with_appcontext
+def settle_payments_command():
+    """Apply queued payment callbacks and expire unpaid UPI payments."""
+    settled = settle_payments()
+    click.echo(f'[SUCCESS] Settled {settled} payments')
+
+def payment_qr_payload(ride):
+    """Stable payment payload for a ride; identical input gives an identical QR"""
+    return json.dumps({
         'ride_id': ride.id,
         'driver_id': ride.driver_id,
-        'amount': ride.fare,
-        'timestamp': datetime.utcnow().isoformat()
-    }
+        'amount': ride_seat_fare(ride)
+    }, sort_keys=True)
+
+@bp.route('/generate_qr/<int:ride_id>')
+@login_required
+def generate_qr(ride_id):
+    ride = Ride.query.get_or_404(ride_id)
+    
+    # The image is served separately so browsers cache it; the digest in the
+    # URL changes whenever the payload does
+    payload = payment_qr_payload(ride)
+    qr_url = url_for('main.qr_image', ride_id=ride.id, fmt='png', v=qr_digest(payload, 'png')[:16])
+    svg_url = url_for('main.qr_image', ride_id=ride.id, fmt='svg', v=qr_digest(payload, 'svg')[:16])
+    
+    return render_template('qr_payment.html', qr_url=qr_url, svg_url=svg_url, ride=ride,
+                           amount=ride_seat_fare(ride))
+
+def qr_response(payload, fmt):
+    """QR image (PNG or SVG) with a strong content-hash ETag"""
+    digest = qr_digest(payload, fmt)
     
-    # Generate QR code
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(json.dumps(qr_data))
-    qr.make(fit=True)
+    if request.if_none_match.contains(digest):
+        response = current_app.response_class(status=304)
+    else:
+        digest, image = qr_cache.get(payload, fmt)
+        response = current_app.response_class(image, mimetype=QR_FORMATS[fmt])
     
-    img = qr.make_image(fill_color="black", back_color="white")
+    response.set_etag(digest)
+    if request.args.get('v') == digest[:16]:
+        response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@bp.route('/qr/<int:ride_id>.<fmt>')
+@login_required
+def qr_image(ride_id, fmt):
+    """Payment QR image for a ride"""
+    if fmt not in QR_FORMATS:
+        return jsonify({'error': 'Unsupported format'}), 404
     
-    # Convert to base64
-    buffer = io.BytesIO()
-    img.save(buffer, format='PNG')
-    buffer.seek(0)
-    img_str = base64.b64encode(buffer.getvalue()).decode()
+    ride = Ride.query.get_or_404(ride_id)
+    return qr_response(payment_qr_payload(ride), fmt)
+
+@bp.route('/qr/payment/<payment_id>.<fmt>')
+@login_required
+def payment_qr_image(payment_id, fmt):
+    """UPI intent QR for one pending payment"""
+    if fmt not in QR_FORMATS:
+        return jsonify({'error': 'Unsupported format'}), 404
     
-    return render_template('qr_payment.html', qr_code=img_str, ride=ride)
+    payment = Payment.query.filter_by(payment_id=payment_id).first_or_404()
+    if current_user.id not in (payment.student_id, payment.ride.driver_id):
+        return jsonify({'error': 'Unauthorized'}), 403
+    return qr_response(payment_intent_uri(payment), fmt)
+
+def __getattr__(name):
+    # `from app import app` builds the default app on first use, so importing
+    # the models or helpers alone stays cheap
+    if name == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
         try:
-            # Drop all tables first to avoid conflicts
-            db.drop_all()
-            # Create all tables
-            db.create_all()
-            print("[SUCCESS] Database initialized successfully!")
+            migrations.upgrade(db.engine, db.metadata)
+            print("[SUCCESS] Database schema is up to date!")
         except Exception as e:
-            print(f"[ERROR] Database initialization error: {e}")
-            # Try to create tables anyway
-            try:
-                db.create_all()
-                print("[SUCCESS] Database tables created!")
-            except Exception as e2:
-                print(f"[ERROR] Failed to create tables: {e2}")
+            print(f"[ERROR] Database migration error: {e}")
     
     print("[INFO] Starting Edu-Ride application...")
     print("[INFO] Open your browser and go to: http://localhost:5000")
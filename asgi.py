@@ -0,0 +1,19 @@
+"""
+ASGI entry point: async polling and streaming endpoints, Flask for the rest
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --timeout-graceful-shutdown 30
+
+See async_api.py. With a shared EVENT_BUS (redis://...) run one worker per
+core (--workers N); on the 'local' bus, as with gunicorn.conf.py, keep a
+single process so every stream sees every event.
+"""
+
+import os
+
+from app import create_app
+from async_api import AsyncAPI
+
+flask_app = create_app(os.environ.get('FLASK_ENV', 'production'))
+app = AsyncAPI(flask_app, wsgi_threads=int(os.environ.get('ASGI_WSGI_THREADS', 32)))
+
+__all__ = ['app', 'flask_app']
@@ -0,0 +1,250 @@
+"""
+Static asset build: minify, fingerprint and precompress
+
+`build_assets` copies every file under static/ into static/dist/ as
+name.<hash>.ext, minifying CSS and JS on the way and rewriting relative
+url() references in stylesheets to the fingerprinted names. Text assets get
+.gz siblings, and .br ones when the brotli package is installed.
+dist/manifest.json maps source paths to built ones. With
+USE_ASSET_MANIFEST on, url_for('static', ...) resolves through it and
+dist/ is served with immutable caching and the precompressed variants.
+
+    flask --app app build-assets [--vendor]
+
+`--vendor` first downloads the CDN assets in CDN_ASSETS into static/vendor/
+so VENDOR_ASSETS can serve them locally.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import posixpath
+import re
+import urllib.request
+
+import click
+from flask import current_app, request, send_from_directory, url_for
+from flask.cli import with_appcontext
+
+try:
+    import brotli
+except ImportError:  # optional; only .gz variants are built without it
+    brotli = None
+
+logger = logging.getLogger('edu_ride.assets')
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+COMPRESSIBLE_TYPES = ('.css', '.js', '.svg', '.json', '.txt', '.ttf', '.eot', '.map')
+MIN_COMPRESS_BYTES = 256
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Local path under static/ -> CDN URL it is fetched from by --vendor
+_FONTAWESOME = 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0'
+CDN_ASSETS = {
+    'vendor/bootstrap-5.1.3/css/bootstrap.min.css':
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css',
+    'vendor/bootstrap-5.1.3/js/bootstrap.bundle.min.js':
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/js/bootstrap.bundle.min.js',
+    'vendor/fontawesome-6.0.0/css/all.min.css': f'{_FONTAWESOME}/css/all.min.css',
+}
+for _font in ('fa-brands-400', 'fa-regular-400', 'fa-solid-900', 'fa-v4compatibility'):
+    for _ext in ('woff2', 'ttf'):
+        CDN_ASSETS[f'vendor/fontawesome-6.0.0/webfonts/{_font}.{_ext}'] = f'{_FONTAWESOME}/webfonts/{_font}.{_ext}'
+
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+_CSS_SPACE = re.compile(r'\s*([{};,])\s*')
+_CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+_URL_SUFFIX = re.compile(r'([^?#]*)(.*)')
+_BACKTICK = re.compile(r'(?<!\\)`')
+
+
+def minify_css(text):
+    text = _CSS_COMMENT.sub('', text)
+    text = _CSS_SPACE.sub(r'\1', ' '.join(text.split()))
+    return text.replace(';}', '}').strip()
+
+
+def minify_js(text):
+    """Drop indentation, blank lines and whole-line // comments.
+
+    Deliberately conservative: lines are never joined, so automatic
+    semicolon insertion is unaffected, and lines inside multi-line template
+    literals are kept verbatim.
+    """
+    lines, in_template = [], False
+    for line in text.splitlines():
+        if not in_template:
+            line = line.strip()
+            if not line or line.startswith('//'):
+                continue
+        lines.append(line)
+        if len(_BACKTICK.findall(line)) % 2:
+            in_template = not in_template
+    return '\n'.join(lines) + '\n'
+
+
+def fingerprint(path, data):
+    stem, ext = posixpath.splitext(path)
+    return f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+
+def rewrite_css_urls(css, css_path, manifest):
+    """Point relative url() references at their fingerprinted files"""
+    base = posixpath.dirname(css_path)
+
+    def replace(match):
+        ref = match.group(2).strip()
+        if ref.startswith(('/', '#', 'data:')) or ':' in ref:
+            return match.group(0)
+        path, suffix = _URL_SUFFIX.match(ref).groups()
+        built = manifest.get(posixpath.normpath(posixpath.join(base, path)))
+        if built is None:
+            return match.group(0)
+        return f'url({posixpath.relpath(built, base or ".")}{suffix})'
+
+    return _CSS_URL.sub(replace, css)
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _precompress(path, data):
+    if not path.endswith(COMPRESSIBLE_TYPES) or len(data) < MIN_COMPRESS_BYTES:
+        return
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(compressed) < len(data):
+        _write(path + '.gz', compressed)
+    if brotli is not None:
+        compressed = brotli.compress(data)
+        if len(compressed) < len(data):
+            _write(path + '.br', compressed)
+
+
+def build_assets(static_dir):
+    """Build static/dist/ and its manifest; returns the manifest.
+
+    Earlier builds are left in place so pages rendered before a deploy can
+    still load the assets they reference.
+    """
+    out_dir = os.path.join(static_dir, DIST_DIR)
+    sources = []
+    for root, dirs, files in os.walk(static_dir):
+        if os.path.abspath(root) == os.path.abspath(static_dir) and DIST_DIR in dirs:
+            dirs.remove(DIST_DIR)
+        for name in files:
+            if not name.startswith('.'):
+                sources.append(os.path.relpath(os.path.join(root, name), static_dir).replace(os.sep, '/'))
+    # Stylesheets go last so the files they reference are already fingerprinted
+    sources.sort(key=lambda path: (path.endswith('.css'), path))
+
+    manifest = {}
+    for path in sources:
+        with open(os.path.join(static_dir, path), 'rb') as f:
+            data = f.read()
+        minified = '.min.' in posixpath.basename(path)
+        if path.endswith('.css'):
+            text = data.decode('utf-8')
+            text = rewrite_css_urls(text if minified else minify_css(text), path, manifest)
+            data = text.encode('utf-8')
+        elif path.endswith('.js') and not minified:
+            data = minify_js(data.decode('utf-8')).encode('utf-8')
+        built = fingerprint(path, data)
+        target = os.path.join(out_dir, built)
+        _write(target, data)
+        _precompress(target, data)
+        manifest[path] = built
+
+    _write(os.path.join(out_dir, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+def vendor_assets(static_dir, fetch=None):
+    """Download CDN_ASSETS into static/; returns the paths fetched"""
+    fetch = fetch or (lambda url: urllib.request.urlopen(url, timeout=30).read())
+    fetched = []
+    for path, url in CDN_ASSETS.items():
+        target = os.path.join(static_dir, path)
+        if not os.path.exists(target):
+            _write(target, fetch(url))
+            fetched.append(path)
+    return fetched
+
+
+def load_manifest(static_dir):
+    path = os.path.join(static_dir, DIST_DIR, MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        logger.warning('No asset manifest at %s; run `flask build-assets`. Serving unbuilt assets.', path)
+        return {}
+
+
+def send_built_asset(filename):
+    """Serve a file from static/dist/, precompressed if the client accepts it"""
+    static_dir = current_app.static_folder
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encoding in request.accept_encodings and os.path.isfile(os.path.join(static_dir, filename + suffix)):
+            response = send_from_directory(static_dir, filename + suffix, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(static_dir, filename, mimetype=mimetype)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.max_age = IMMUTABLE_MAX_AGE
+    response.cache_control.immutable = True
+    return response
+
+
+def init_assets(app):
+    """Route url_for('static', ...) through the manifest and serve dist/ with
+    long-lived caching; adds vendor_url() to templates"""
+    manifest = load_manifest(app.static_folder) if app.config['USE_ASSET_MANIFEST'] else {}
+    app.extensions['asset_manifest'] = manifest
+    default_static = app.view_functions['static']
+
+    def static_view(filename):
+        if filename.startswith(DIST_DIR + '/'):
+            return send_built_asset(filename)
+        return default_static(filename=filename)
+    app.view_functions['static'] = static_view
+
+    @app.url_defaults
+    def fingerprinted_static(endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            built = app.extensions['asset_manifest'].get(values['filename'])
+            if built is not None:
+                values['filename'] = f'{DIST_DIR}/{built}'
+
+    @app.template_global()
+    def vendor_url(path):
+        """Local copy of a CDN asset when VENDOR_ASSETS is on, else the CDN URL"""
+        if current_app.config['VENDOR_ASSETS']:
+            return url_for('static', filename=path)
+        return CDN_ASSETS[path]
+
+    app.cli.add_command(build_assets_command)
+
+
+@click.command('build-assets')
+@click.option('--vendor', is_flag=True, help='Download the CDN assets into static/vendor first.')
+@with_appcontext
+def build_assets_command(vendor):
+    """Minify, fingerprint and precompress static files into static/dist."""
+    static_dir = current_app.static_folder
+    if vendor:
+        for path in vendor_assets(static_dir):
+            click.echo(f'[SUCCESS] Downloaded {path}')
+    manifest = build_assets(static_dir)
+    click.echo(f'[SUCCESS] Built {len(manifest)} assets into {os.path.join(static_dir, DIST_DIR)}')
+    if brotli is None:
+        click.echo('[INFO] brotli is not installed; only gzip variants were written')
@@ -0,0 +1,282 @@
+"""
+Async polling and streaming endpoints in front of the Flask app
+
+AsyncAPI is an ASGI app. It serves GET /api/rides, /api/notifications,
+/api/rides/<id>/location and /api/stream on the event loop with
+SQLAlchemy's async engine (aiosqlite or asyncpg), so an idle poll or an
+open event stream costs a coroutine and a socket rather than a worker
+thread. Every other request goes to the Flask app on a small thread pool
+through a2wsgi.
+
+The async views run the same statements, serializers, ETags and rate
+limits as their Flask counterparts and read the Flask session cookie. A
+request they cannot authenticate from the cookie alone (e.g. only a
+remember-me cookie) is handed to Flask, which logs it in or turns it away.
+Both halves share one process, so the in-memory event bus, location
+buffers and ride version stay consistent. Admission control and request
+metrics cover the Flask half only.
+
+Needs the optional uvicorn, a2wsgi, greenlet and aiosqlite (or asyncpg)
+packages; see asgi.py for the entry point.
+"""
+
+import asyncio
+import json
+import re
+from urllib.parse import parse_qsl, urlencode
+
+from a2wsgi import WSGIMiddleware
+from itsdangerous import BadSignature
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from werkzeug.http import parse_cookie, parse_etags, quote_etag
+
+import app as web
+from events import format_sse
+from ratelimit import LocalBucketStore, RateLimited
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'postgres': 'postgresql+asyncpg',
+}
+
+
+def async_database_url(uri):
+    """The async-driver form of a SQLALCHEMY_DATABASE_URI"""
+    scheme, separator, rest = uri.partition('://')
+    dialect = scheme.split('+')[0]
+    if not separator or dialect not in ASYNC_DRIVERS:
+        raise ValueError(f'No async driver for database URI scheme {scheme!r}')
+    return f'{ASYNC_DRIVERS[dialect]}://{rest}'
+
+
+def arg_int(values, name, default=None):
+    """values[name] as an int, or default when missing or malformed"""
+    try:
+        return int(values[name])
+    except (KeyError, TypeError, ValueError):
+        return default
+
+
+class PassToFlask(Exception):
+    """Raised by an async view, before it responds, to hand the request to Flask"""
+
+
+class Request:
+    """The parts of an ASGI HTTP scope the async views read"""
+
+    def __init__(self, scope):
+        # First value wins, like request.args.to_dict()
+        self.args = {}
+        for name, value in parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True):
+            self.args.setdefault(name, value)
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1')
+                        for name, value in scope.get('headers', ())}
+        self.cookies = parse_cookie(self.headers.get('cookie', ''))
+        client = scope.get('client')
+        self.remote_addr = client[0] if client else None
+
+
+async def respond(send, status, body=b'', headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def respond_json(send, data, status=200, headers=()):
+    body = json.dumps(data, separators=(',', ':')).encode()
+    await respond(send, status, body, [('Content-Type', 'application/json'),
+                                       ('Content-Length', str(len(body))), *headers])
+
+
+async def send_chunk(send, text):
+    await send({'type': 'http.response.body', 'body': text.encode(), 'more_body': True})
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+class AsyncAPI:
+    """ASGI app: async read endpoints, everything else delegated to Flask"""
+
+    def __init__(self, flask_app, wsgi_threads=32):
+        self.flask_app = flask_app
+        self.wsgi = WSGIMiddleware(flask_app, workers=wsgi_threads)
+        config = flask_app.config
+        self.engine = create_async_engine(async_database_url(config['SQLALCHEMY_DATABASE_URI']),
+                                          **config['SQLALCHEMY_ENGINE_OPTIONS'])
+        if self.engine.dialect.name == 'sqlite':
+            event.listen(self.engine.sync_engine, 'connect', web._set_sqlite_pragmas(config['SQLITE_BUSY_TIMEOUT_MS']))
+        self.session = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+        self.routes = [
+            (re.compile(r'/api/rides$'), self.rides),
+            (re.compile(r'/api/notifications$'), self.notifications),
+            (re.compile(r'/api/rides/(\d+)/location$'), self.ride_location),
+            (re.compile(r'/api/stream$'), self.stream),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            for pattern, view in self.routes:
+                match = pattern.match(scope['path'])
+                if match is None:
+                    continue
+                try:
+                    return await view(Request(scope), receive, send, *match.groups())
+                except PassToFlask:
+                    break
+                except RateLimited as e:
+                    return await respond_json(send, {'error': 'Too many requests, please slow down'}, 429,
+                                              [('Retry-After', str(e.retry_after))])
+        await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                await asyncio.to_thread(web.shutdown_app)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def user_id(self, request):
+        """The logged-in user's id from the Flask session cookie, or None"""
+        cookie = request.cookies.get(self.flask_app.config['SESSION_COOKIE_NAME'])
+        if not cookie or self.serializer is None:
+            return None
+        try:
+            session = self.serializer.loads(cookie, max_age=int(self.flask_app.permanent_session_lifetime.total_seconds()))
+        except BadSignature:
+            return None
+        return arg_int(session, '_user_id')
+
+    async def check_rate_limit(self, endpoint, request, user_id):
+        if not self.flask_app.config['RATE_LIMIT_ENABLED']:
+            return
+        limiter = self.flask_app.extensions['rate_limiter']
+
+        def key_value(scope):
+            if scope == 'username':
+                return None
+            if scope == 'user' and user_id is not None:
+                return f'u{user_id}'
+            return request.remote_addr or 'unknown'
+
+        if isinstance(limiter.store, LocalBucketStore):
+            limiter.check_endpoint(endpoint, 'GET', key_value)
+        else:
+            # Shared stores do network I/O; keep it off the event loop
+            await asyncio.to_thread(limiter.check_endpoint, endpoint, 'GET', key_value)
+
+    # Views, mirroring main.api_rides, main.api_notifications,
+    # main.api_ride_location and main.api_stream
+
+    async def rides(self, request, receive, send):
+        args = request.args
+        await self.check_rate_limit('main.api_rides', request, self.user_id(request))
+        async with self.session() as session:
+            version = await session.scalar(web.rides_version_query()) or 0
+        etag = web.rides_etag(version, args)
+        if parse_etags(request.headers.get('if-none-match')).contains(etag):
+            return await respond(send, 304, headers=[('ETag', quote_etag(etag))])
+        try:
+            query, limit = web.rides_page_query(args)
+        except (ValueError, TypeError):
+            return await respond_json(send, {'error': 'Invalid query parameters'}, 400)
+
+        async with self.session() as session:
+            rides, next_cursor = web.split_rides_page((await session.scalars(query)).all(), limit)
+            body = [web.serialize_ride(ride) for ride in rides]
+        headers = [('ETag', quote_etag(etag)), ('Cache-Control', 'no-cache')]
+        if next_cursor:
+            headers.append(('X-Next-Cursor', next_cursor))
+            headers.append(('Link', f'</api/rides?{urlencode(dict(args, cursor=next_cursor))}>; rel="next"'))
+        await respond_json(send, body, headers=headers)
+
+    async def notifications(self, request, receive, send):
+        user_id = self.user_id(request)
+        if user_id is None:
+            raise PassToFlask()
+        await self.check_rate_limit('main.api_notifications', request, user_id)
+        try:
+            query = web.notifications_query(user_id, request.args)
+        except ValueError:
+            return await respond_json(send, {'error': 'Invalid query parameters'}, 400)
+
+        async with self.session() as session:
+            body, next_cursor = web.notifications_page((await session.scalars(query)).all(), request.args)
+        await respond_json(send, body, headers=[('X-Next-Cursor', next_cursor), ('Cache-Control', 'no-store')])
+
+    async def ride_participant_error(self, ride_id, user_id):
+        """Same refusals as the Flask views for a user outside the ride, else None"""
+        async with self.session() as session:
+            participants = set((await session.scalars(web.ride_participants_query(ride_id))).all())
+        if not participants:
+            return {'error': 'Ride not found'}, 404
+        if user_id not in participants:
+            return {'error': 'Unauthorized'}, 403
+        return None
+
+    async def ride_location(self, request, receive, send, ride_id):
+        user_id = self.user_id(request)
+        if user_id is None:
+            raise PassToFlask()
+        ride_id = int(ride_id)
+        error = await self.ride_participant_error(ride_id, user_id)
+        if error is not None:
+            return await respond_json(send, *error)
+        limit = arg_int(request.args, 'limit', web.LOCATION_TRAIL_SIZE)
+        fixes = web.location_store.recent(ride_id, limit)
+        if not fixes:
+            async with self.session() as session:
+                fixes = web.persisted_trail((await session.scalars(web.persisted_trail_query(ride_id, limit))).all())
+        await respond_json(send, web.serialize_trail(ride_id, fixes))
+
+    async def stream(self, request, receive, send):
+        user_id = self.user_id(request)
+        ride_id = arg_int(request.args, 'ride')
+        if ride_id is not None:
+            if user_id is None:
+                raise PassToFlask()
+            error = await self.ride_participant_error(ride_id, user_id)
+            if error is not None:
+                return await respond_json(send, *error)
+        subscription = web.event_bus.subscribe(web.stream_channels(ride_id, user_id),
+                                               last_event_id=arg_int(request.headers, 'last-event-id'))
+        config = self.flask_app.config
+        heartbeat = config['SSE_HEARTBEAT_SECONDS']
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + config['SSE_MAX_STREAM_SECONDS']
+        # A client hanging up ends the stream at once rather than at the next heartbeat
+        watcher = asyncio.ensure_future(wait_for_disconnect(receive))
+        watcher.add_done_callback(lambda _: subscription.wake())
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [(b'content-type', b'text/event-stream; charset=utf-8')]
+                           + [(name.lower().encode(), value.encode()) for name, value in web.SSE_HEADERS.items()],
+            })
+            await send_chunk(send, web.SSE_RETRY)
+            while loop.time() < deadline and not (subscription.overflowed or subscription.closed):
+                if hasattr(subscription, 'get_async'):
+                    event = await subscription.get_async(timeout=heartbeat)
+                else:
+                    # A custom bus without get_async costs a thread per waiting stream
+                    event = await asyncio.to_thread(subscription.get, heartbeat)
+                await send_chunk(send, web.SSE_KEEPALIVE if event is None else format_sse(event))
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            watcher.cancel()
+            subscription.close()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmark booking latency under a polling flood, with and without admission control
+
+Runs in-process with Flask's test client against a throwaway SQLite
+database. Poller threads hammer the low-priority listing endpoints
+(/api/rides, /api/notifications, /api/rides/search) while booker threads
+book seats one after another. Each run is repeated with
+ADMISSION_CONTROL off and on, and reports booking p50/p99, the poll
+throughput actually served and how many polls were shed.
+
+Usage: python benchmarks/bench_admission.py [--pollers 24] [--bookers 2] [--seconds 10] [--max-in-flight 8]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+POLL_URLS = ['/api/rides?limit=50', '/api/notifications', '/api/rides/search?q=si']
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+def seed(app_module, rides, students):
+    db = app_module.db
+    users = [app_module.User(username=f'student{i}', email=f's{i}@example.com', phone='1', user_type='student',
+                             password_hash='x') for i in range(students)]
+    driver = app_module.User(username='driver', email='driver@example.com', phone='1', user_type='driver',
+                             password_hash='x')
+    db.session.add_all(users + [driver])
+    db.session.commit()
+    start = datetime.utcnow() + timedelta(days=1)
+    app_module.insert_rides([{
+        'driver_id': driver.id, 'pickup_location': 'Sion Station', 'dropoff_location': 'Somaiya College',
+        'pickup_time': start + timedelta(minutes=i), 'fare': 40.0, 'is_group_ride': True,
+        'max_passengers': students,
+    } for i in range(rides)])
+    db.session.commit()
+    return [user.id for user in users], [ride_id for (ride_id,) in db.session.execute(db.select(app_module.Ride.id))]
+
+
+def client_for(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+    return client
+
+
+def run(app, students, ride_ids, pollers, bookers, seconds):
+    stop = threading.Event()
+    results = {'book': [], 'polls': 0, 'shed': 0}
+    lock = threading.Lock()
+
+    def poll(user_id, offset):
+        client, served, shed, i = client_for(app, user_id), 0, 0, offset
+        while not stop.is_set():
+            status = client.get(POLL_URLS[i % len(POLL_URLS)]).status_code
+            served, shed = served + (status == 200), shed + (status == 503)
+            i += 1
+        with lock:
+            results['polls'] += served
+            results['shed'] += shed
+
+    def book(user_id, rides):
+        client, samples = client_for(app, user_id), []
+        for ride_id in rides:
+            if stop.is_set():
+                break
+            started = time.perf_counter()
+            client.post('/api/book_ride', json={'ride_id': ride_id})
+            samples.append((time.perf_counter() - started) * 1000)
+        with lock:
+            results['book'] += samples
+
+    threads = [threading.Thread(target=poll, args=(students[i % len(students)], i)) for i in range(pollers)]
+    threads += [threading.Thread(target=book, args=(students[i], ride_ids)) for i in range(bookers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--pollers', type=int, default=24)
+    parser.add_argument('--bookers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--max-in-flight', type=int, default=8)
+    parser.add_argument('--rides', type=int, default=2000)
+    args = parser.parse_args()
+
+    db_dir = tempfile.mkdtemp(prefix='edu_ride_bench_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(db_dir, 'bench.db')}"
+    import app as app_module
+
+    app = app_module.create_app('testing')
+    app.config['TESTING'] = False  # exercise the real request path, minus background workers below
+    logging.getLogger('edu_ride').setLevel(logging.ERROR)
+    admission = app.extensions['admission']
+    admission.max_in_flight = args.max_in_flight
+
+    print("Admission control benchmark")
+    print("=" * 40)
+    print(f"{args.pollers} pollers, {args.bookers} bookers, {args.seconds:g} s per run, "
+          f"max {args.max_in_flight} in flight")
+    with app.app_context():
+        app_module.db.create_all()
+        students, ride_ids = seed(app_module, args.rides, max(args.pollers, args.bookers))
+        # Background workers would compete for the same threads and database
+        for name in ('ensure_schedule_worker', 'ensure_archive_worker', 'ensure_payment_worker'):
+            setattr(app_module, name, lambda: None)
+        for enabled in (False, True):
+            app.config['ADMISSION_CONTROL'] = enabled
+            shed_before = admission.shed
+            half = len(ride_ids) // 2
+            results = run(app, students, ride_ids[half:] if enabled else ride_ids[:half],
+                          args.pollers, args.bookers, args.seconds)
+            booked = results['book']
+            print(f"admission {'on ' if enabled else 'off'}: bookings {len(booked):5d} "
+                  f"p50 {percentile(booked, 50):7.1f} ms  p99 {percentile(booked, 99):7.1f} ms | "
+                  f"polls served {results['polls'] / args.seconds:7.0f}/s, shed {results['shed']:6d} "
+                  f"(controller: {admission.shed - shed_before})")
+
+
+if __name__ == '__main__':
+    main()
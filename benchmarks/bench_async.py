@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Compare how many idle live-update clients the WSGI and ASGI servers hold
+
+Serves the app with gunicorn (wsgi:app, gthread) and then with uvicorn
+(asgi:app) against a throwaway SQLite database, and opens idle
+/api/stream connections in steps, the way open dashboards do. After each
+step it counts the streams that actually started, times an /api/rides poll
+and reads the server's resident memory. A mode stops at the first step
+where streams go unanswered, the poll fails or memory passes --memory-mb;
+the last good step is what it sustains.
+
+Usage: python benchmarks/bench_async.py [--steps 25,50,100,500,1000,2000,4000] [--threads 32] [--memory-mb 256]
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODES = {
+    'wsgi': lambda port: [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}',
+                          '--log-level', 'warning', 'wsgi:app'],
+    'asgi': lambda port: [sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', str(port), '--log-level', 'warning',
+                          '--timeout-graceful-shutdown', '1'],
+}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+def seed(database_url, rides):
+    os.environ['DATABASE_URL'] = database_url
+    import app as app_module
+
+    app = app_module.create_app('testing')
+    with app.app_context():
+        app_module.db.create_all()
+        driver = app_module.User(username='driver', email='driver@example.com', phone='1', user_type='driver',
+                                 password_hash='x')
+        app_module.db.session.add(driver)
+        app_module.db.session.commit()
+        start = datetime.utcnow() + timedelta(days=1)
+        app_module.insert_rides([{
+            'driver_id': driver.id, 'pickup_location': 'Sion Station', 'dropoff_location': 'Somaiya College',
+            'pickup_time': start + timedelta(minutes=i), 'fare': 40.0,
+        } for i in range(rides)])
+        app_module.db.session.commit()
+        app_module.db.engine.dispose()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def rss_mb(pid):
+    """Resident memory of a process and its children (gunicorn's master and worker)"""
+    total, pids = 0, [pid]
+    while pids:
+        current = pids.pop()
+        try:
+            with open(f'/proc/{current}/status') as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+            with open(f'/proc/{current}/task/{current}/children') as f:
+                pids += [int(child) for child in f.read().split()]
+        except (OSError, StopIteration):
+            pass
+    return total / 1024
+
+
+async def get(port, path, timeout):
+    """Status and seconds taken for a GET, or (None, timeout) if it did not finish"""
+    started = time.perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n'.encode())
+        response = await asyncio.wait_for(reader.read(), timeout)
+        writer.close()
+        return int(response.split(b' ', 2)[1]), time.perf_counter() - started
+    except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+        return None, timeout
+
+
+async def open_stream(port, timeout):
+    """An idle /api/stream connection, and whether the server started the stream"""
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None, False
+    writer.write(b'GET /api/stream HTTP/1.1\r\nHost: bench\r\nAccept: text/event-stream\r\n\r\n')
+    try:
+        await asyncio.wait_for(reader.readuntil(b'retry: 3000'), timeout)
+        return writer, True
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+        return writer, False
+
+
+async def measure(pid, port, steps, memory_mb, timeout, polls):
+    writers, rows = [], []
+    try:
+        for target in steps:
+            opened = await asyncio.gather(*[open_stream(port, timeout) for _ in range(target - len(writers))])
+            writers += [writer for writer, _ in opened if writer is not None]
+            served = (rows[-1]['served'] if rows else 0) + sum(started for _, started in opened)
+            samples = [await get(port, '/api/rides?limit=5', timeout) for _ in range(polls)]
+            row = {
+                'clients': target,
+                'served': served,
+                'poll_ok': all(status == 200 for status, _ in samples),
+                'poll_ms': percentile([seconds * 1000 for _, seconds in samples], 50),
+                'rss_mb': rss_mb(pid),
+            }
+            rows.append(row)
+            print(f"  {target:6d} clients: {served:6d} streaming, poll "
+                  f"{'ok ' if row['poll_ok'] else 'FAIL'} p50 {row['poll_ms']:7.1f} ms, rss {row['rss_mb']:6.1f} MB")
+            if served < target or not row['poll_ok'] or row['rss_mb'] > memory_mb:
+                break
+    finally:
+        for writer in writers:
+            writer.close()
+    good = [row for row in rows if row['served'] == row['clients'] and row['poll_ok'] and row['rss_mb'] <= memory_mb]
+    return good[-1] if good else None
+
+
+def run_mode(mode, env, args):
+    port = free_port()
+    server = subprocess.Popen(MODES[mode](port), cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 30
+        while asyncio.run(get(port, '/api/rides?limit=1', 1))[0] != 200:
+            if time.monotonic() > deadline or server.poll() is not None:
+                raise RuntimeError(f'{mode} server did not start')
+            time.sleep(0.2)
+        print(f"{mode}: idle rss {rss_mb(server.pid):.1f} MB")
+        return asyncio.run(measure(server.pid, port, args.steps, args.memory_mb, args.timeout, args.polls))
+    finally:
+        server.send_signal(signal.SIGINT)
+        try:
+            server.wait(15)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--steps', type=lambda value: [int(n) for n in value.split(',')],
+                        default=[25, 50, 100, 500, 1000, 2000, 4000])
+    parser.add_argument('--threads', type=int, default=32, help='gunicorn threads, and the ASGI side\'s Flask threads')
+    parser.add_argument('--memory-mb', type=float, default=256)
+    parser.add_argument('--timeout', type=float, default=5, help='seconds for a stream to start or a poll to finish')
+    parser.add_argument('--polls', type=int, default=5)
+    parser.add_argument('--rides', type=int, default=200)
+    args = parser.parse_args()
+
+    # Every client is a socket here and in the server
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='edu_ride_bench_'), 'bench.db')}"
+    seed(database_url, args.rides)
+    env = dict(os.environ, DATABASE_URL=database_url, FLASK_ENV='production', SECRET_KEY='bench',
+               RATE_LIMIT_ENABLED='false', ADMISSION_CONTROL='false', USE_ASSET_MANIFEST='false',
+               GUNICORN_THREADS=str(args.threads), ASGI_WSGI_THREADS=str(args.threads), WEB_CONCURRENCY='1')
+
+    print("Idle client capacity: WSGI (gunicorn gthread) vs ASGI (uvicorn)")
+    print("=" * 40)
+    print(f"{args.threads} threads, memory budget {args.memory_mb:g} MB, steps {args.steps}")
+    results = {mode: run_mode(mode, env, args) for mode in MODES}
+    print()
+    for mode, best in results.items():
+        if best is None:
+            print(f"{mode}: sustained no step")
+        else:
+            print(f"{mode}: sustained {best['clients']} idle streams at {best['rss_mb']:.1f} MB, "
+                  f"poll p50 {best['poll_ms']:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark the driver dashboard against a growing ride history
+
+Seeds one driver with a growing number of completed rides (plus a fixed
+set of upcoming ones) in a throwaway SQLite database, through the
+statistics triggers. At each history size it times /driver/dashboard and
+/api/driver/stats with Flask's test client, and the per-view scan the
+summary tables replace (aggregating the driver's rides by status and day).
+Dashboard latency should stay flat while the scan grows with the history.
+
+Usage: python benchmarks/bench_dashboard.py [--history 1000 10000 100000] [--upcoming 200] [--requests 200]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BATCH = 20000
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def add_rides(app_module, driver_id, count, status, start):
+    db, Ride = app_module.db, app_module.Ride
+    started = time.perf_counter()
+    for offset in range(0, count, BATCH):
+        db.session.execute(db.insert(Ride), [{
+            'driver_id': driver_id,
+            'pickup_location': 'Sion Station',
+            'dropoff_location': 'Somaiya College',
+            'pickup_time': start + timedelta(hours=offset + i),
+            'status': status,
+            'fare': 40.0,
+            'current_passengers': 1,
+        } for i in range(min(BATCH, count - offset))])
+        db.session.commit()
+    return time.perf_counter() - started
+
+
+def timed(fn, requests):
+    samples = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--history', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='completed rides in the driver history at each step')
+    parser.add_argument('--upcoming', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    db_dir = tempfile.mkdtemp(prefix='edu_ride_bench_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(db_dir, 'bench.db')}"
+    import app as app_module
+    from sqlalchemy import text
+
+    app = app_module.create_app('testing')
+    logging.getLogger('edu_ride').setLevel(logging.ERROR)  # seeding batches trip the slow-query log
+    db = app_module.db
+    scan = text("SELECT status, count(*), sum(fare * current_passengers) FROM ride WHERE driver_id = :d "
+                "GROUP BY status UNION ALL SELECT date(pickup_time), count(*), sum(fare) FROM ride "
+                "WHERE driver_id = :d AND status = 'completed' GROUP BY date(pickup_time)")
+
+    print("Driver dashboard benchmark")
+    print("=" * 40)
+    with app.app_context():
+        db.create_all()
+        driver = app_module.User(username='driver', email='driver@example.com', phone='1', user_type='driver',
+                                 password_hash='x')
+        db.session.add(driver)
+        db.session.commit()
+        add_rides(app_module, driver.id, args.upcoming, 'available', datetime(2031, 1, 1))
+
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(driver.id)
+        seeded = 0
+        for history in args.history:
+            seconds = add_rides(app_module, driver.id, history - seeded, 'completed',
+                                datetime(2010, 1, 1) + timedelta(hours=seeded))
+            rate = (history - seeded) / seconds if seconds else 0
+            seeded = history
+            db.session.execute(text('ANALYZE'))
+            db.session.commit()
+
+            dashboard = timed(lambda: client.get('/driver/dashboard'), args.requests)
+            stats = timed(lambda: client.get('/api/driver/stats'), args.requests)
+            scans = timed(lambda: db.session.execute(scan, {'d': driver.id}).all(), min(args.requests, 20))
+            print(f"{history:>9,} past rides ({rate:,.0f} rides/s seeded with triggers)")
+            print(f"  /driver/dashboard  p50 {percentile(dashboard, 50):7.2f} ms, p99 {percentile(dashboard, 99):7.2f} ms")
+            print(f"  /api/driver/stats  p50 {percentile(stats, 50):7.2f} ms, p99 {percentile(stats, 99):7.2f} ms")
+            print(f"  history scan       p50 {percentile(scans, 50):7.2f} ms (what per-view totals would cost)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Load-test the booking lifecycle in-process with Flask's test client
+
+Seeds a throwaway SQLite database with students, drivers, rides, group
+rides and payments, then drives weighted mixes of register/login, ride
+polling, booking, start/complete, notifications and payment QR requests.
+Reports p50/p95/p99 latency, requests/sec and SQL statements per request
+(taken from the Server-Timing header) for every operation, and can save
+the results as JSON for comparison across commits.
+
+Usage: python benchmarks/bench_lifecycle.py [--mixes mixed booking] [--requests 2000] [--threads 1] [--json out.json]
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PASSWORD = 'bench-password'
+LOCATIONS = ['Sion Station', 'Somaiya Campus', 'Kurla West', 'Ghatkopar', 'Chembur', 'Dadar TT', 'Matunga']
+
+# Operation weights per workload mix
+MIXES = {
+    'polling': {'poll_rides': 70, 'browse_rides': 10, 'notifications': 15, 'qr': 5},
+    'booking': {'poll_rides': 35, 'book': 30, 'lifecycle': 10, 'create_ride': 10, 'notifications': 15},
+    'mixed': {'poll_rides': 35, 'browse_rides': 5, 'book': 15, 'lifecycle': 10, 'create_ride': 5,
+              'notifications': 15, 'qr': 10, 'login': 3, 'register': 2},
+    'auth': {'login': 60, 'register': 40},
+}
+
+STATEMENTS_RE = re.compile(r'desc="(\d+) statements"')
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Recorder:
+    """Thread-safe latency/statement samples per operation"""
+
+    def __init__(self):
+        self.latency_ms = defaultdict(list)
+        self.statements = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+
+    def record(self, op, elapsed, response):
+        match = STATEMENTS_RE.search(response.headers.get('Server-Timing', ''))
+        with self._lock:
+            self.latency_ms[op].append(elapsed * 1000)
+            if match:
+                self.statements[op].append(int(match.group(1)))
+            self.statuses[op][response.status_code] += 1
+
+    def summary(self, wall_seconds):
+        operations = {}
+        for op, samples in sorted(self.latency_ms.items()):
+            statements = self.statements[op]
+            operations[op] = {
+                'requests': len(samples),
+                'p50_ms': percentile(samples, 50),
+                'p95_ms': percentile(samples, 95),
+                'p99_ms': percentile(samples, 99),
+                'mean_ms': sum(samples) / len(samples),
+                'sql_per_request': sum(statements) / len(statements) if statements else None,
+                'statuses': dict(self.statuses[op]),
+            }
+        total = sum(len(s) for s in self.latency_ms.values())
+        every = [ms for samples in self.latency_ms.values() for ms in samples]
+        statements = [n for samples in self.statements.values() for n in samples]
+        return {
+            'requests': total,
+            'seconds': wall_seconds,
+            'requests_per_sec': total / wall_seconds if wall_seconds else 0.0,
+            'p50_ms': percentile(every, 50) if every else None,
+            'p95_ms': percentile(every, 95) if every else None,
+            'p99_ms': percentile(every, 99) if every else None,
+            'sql_per_request': sum(statements) / len(statements) if statements else None,
+            'operations': operations,
+        }
+
+
+class Fixture:
+    """Seeded ids shared by all workers"""
+
+    def __init__(self, students, drivers, rides, group_rides):
+        self.students = students
+        self.drivers = drivers
+        self.rides = rides
+        self.group_rides = group_rides
+        self.lock = threading.Lock()
+        self.counter = 0
+
+    def next_id(self):
+        with self.lock:
+            self.counter += 1
+            return self.counter
+
+
+def seed(app, app_module, n_students, n_drivers, n_rides, rng):
+    from sqlalchemy import insert
+
+    db = app_module.db
+    User, Ride, GroupRide, Payment = app_module.User, app_module.Ride, app_module.GroupRide, app_module.Payment
+    password_hash = app_module.generate_password_hash(PASSWORD)
+    now = datetime.utcnow()
+
+    with app.app_context():
+        db.create_all()
+        users = [{'username': f'student{i}', 'email': f'student{i}@bench.test', 'password_hash': password_hash,
+                  'phone': '9876543210', 'user_type': 'student', 'university': 'KJ Somaiya'}
+                 for i in range(n_students)]
+        users += [{'username': f'driver{i}', 'email': f'driver{i}@bench.test', 'password_hash': password_hash,
+                   'phone': '9876543210', 'user_type': 'driver', 'license_number': f'MH01{i:06d}',
+                   'vehicle_number': f'MH01AB{i:04d}', 'is_verified': True}
+                  for i in range(n_drivers)]
+        db.session.execute(insert(User), users)
+        students = [u.id for u in User.query.filter_by(user_type='student').all()]
+        drivers = [u.id for u in User.query.filter_by(user_type='driver').all()]
+
+        rides = []
+        for i in range(n_rides):
+            is_group = rng.random() < 0.3
+            # A slice of history so notifications and dashboards have old rows to skip
+            status = rng.choices(['available', 'booked', 'completed', 'cancelled'], [60, 10, 25, 5])[0]
+            rides.append({
+                'ride_id': f'bench-{i}',
+                'driver_id': rng.choice(drivers),
+                'student_id': rng.choice(students) if status != 'available' and not is_group else None,
+                'pickup_location': rng.choice(LOCATIONS),
+                'dropoff_location': rng.choice(LOCATIONS),
+                'pickup_lat': 19.04 + rng.random() * 0.04,
+                'pickup_lng': 72.86 + rng.random() * 0.04,
+                'pickup_time': now + timedelta(minutes=rng.randint(-7 * 24 * 60, 7 * 24 * 60)),
+                'status': status,
+                'fare': round(rng.uniform(30, 250), 2),
+                'is_group_ride': is_group,
+                'max_passengers': 4 if is_group else 1,
+                'current_passengers': 0 if status == 'available' else (rng.randint(1, 4) if is_group else 1),
+                'created_at': now - timedelta(minutes=rng.randint(0, 30 * 24 * 60)),
+            })
+        db.session.execute(insert(Ride), rides)
+
+        members, payments = [], []
+        for ride in Ride.query.filter(Ride.status != 'available').all():
+            if ride.is_group_ride:
+                for student_id in rng.sample(students, ride.current_passengers):
+                    members.append({'group_id': f'bench-{ride.id}-{student_id}', 'ride_id': ride.id,
+                                    'student_id': student_id})
+            if ride.status == 'completed' and ride.student_id:
+                payments.append({'payment_id': f'bench-{ride.id}', 'ride_id': ride.id,
+                                 'student_id': ride.student_id, 'amount': ride.fare,
+                                 'payment_method': rng.choice(['upi', 'cash']), 'status': 'completed'})
+        if members:
+            db.session.execute(insert(GroupRide), members)
+        if payments:
+            db.session.execute(insert(Payment), payments)
+        db.session.commit()
+
+        available = Ride.query.filter_by(status='available')
+        fixture = Fixture(
+            students, drivers,
+            rides=[r.id for r in available.filter_by(is_group_ride=False).all()],
+            group_rides=[r.id for r in available.filter_by(is_group_ride=True).all()],
+        )
+        fixture.counts = {'students': len(students), 'drivers': len(drivers), 'rides': n_rides,
+                          'group_members': len(members), 'payments': len(payments)}
+    return fixture
+
+
+class Worker:
+    """One simulated client with a student and a driver session"""
+
+    def __init__(self, app, fixture, recorder, rng):
+        self.app = app
+        self.fixture = fixture
+        self.recorder = recorder
+        self.rng = rng
+        self.student = app.test_client()
+        self.driver = app.test_client()
+        self.anonymous = app.test_client()
+        self.student_id = rng.choice(fixture.students)
+        self.driver_id = rng.choice(fixture.drivers)
+        for client, user_id in ((self.student, self.student_id), (self.driver, self.driver_id)):
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(user_id)
+                sess['_fresh'] = True
+        self.etag = None
+        self.cursor = None
+
+    def request(self, op, client, method, url, **kwargs):
+        started = time.perf_counter()
+        response = client.open(url, method=method, **kwargs)
+        self.recorder.record(op, time.perf_counter() - started, response)
+        return response
+
+    def poll_rides(self):
+        headers = {'If-None-Match': self.etag} if self.etag else {}
+        response = self.request('poll_rides', self.student, 'GET', '/api/rides', headers=headers)
+        self.etag = response.headers.get('ETag', self.etag)
+
+    def browse_rides(self):
+        url = f'/api/rides?cursor={self.cursor}' if self.cursor else '/api/rides'
+        response = self.request('browse_rides', self.student, 'GET', url)
+        self.cursor = response.headers.get('X-Next-Cursor')
+
+    def _pick_ride(self):
+        pool = self.fixture.group_rides if self.rng.random() < 0.4 else self.fixture.rides
+        with self.fixture.lock:
+            return self.rng.choice(pool) if pool else None
+
+    def book(self):
+        ride_id = self._pick_ride()
+        if ride_id is not None:
+            self.request('book', self.student, 'POST', '/api/book_ride', json={'ride_id': ride_id})
+
+    def create_ride(self):
+        pickup_time = datetime.now() + timedelta(hours=self.rng.randint(1, 72))
+        self.request('create_ride', self.driver, 'POST', '/create_ride', data={
+            'pickup_location': self.rng.choice(LOCATIONS),
+            'dropoff_location': self.rng.choice(LOCATIONS),
+            'pickup_time': pickup_time.strftime('%Y-%m-%dT%H:%M'),
+            'fare': '80',
+        })
+
+    def lifecycle(self):
+        """Create, book, start and complete one ride end to end"""
+        from app import Ride
+        self.create_ride()
+        with self.app.app_context():
+            ride = Ride.query.filter_by(driver_id=self.driver_id).order_by(Ride.id.desc()).first()
+            ride_id = ride.id
+        self.request('book', self.student, 'POST', '/api/book_ride', json={'ride_id': ride_id})
+        self.request('start_ride', self.driver, 'POST', '/api/start_ride', json={'ride_id': ride_id})
+        self.request('complete_ride', self.driver, 'POST', '/api/complete_ride', json={'ride_id': ride_id})
+
+    def notifications(self):
+        client = self.student if self.rng.random() < 0.7 else self.driver
+        self.request('notifications', client, 'GET', '/api/notifications')
+
+    def qr(self):
+        ride_id = self._pick_ride()
+        if ride_id is None:
+            return
+        self.request('qr_page', self.student, 'GET', f'/generate_qr/{ride_id}')
+        self.request('qr_image', self.student, 'GET', f'/qr/{ride_id}.png')
+
+    def login(self):
+        n = self.rng.randrange(len(self.fixture.students))
+        self.request('login', self.anonymous, 'POST', '/login',
+                     data={'username': f'student{n}', 'password': PASSWORD})
+
+    def register(self):
+        n = self.fixture.next_id()
+        self.request('register', self.anonymous, 'POST', '/register', data={
+            'username': f'bench-new-{n}', 'email': f'bench-new-{n}@bench.test', 'password': PASSWORD,
+            'phone': '9876543210', 'user_type': 'student', 'university': 'KJ Somaiya',
+        })
+
+
+def run_mix(app, fixture, weights, n_requests, n_threads, seed_value):
+    recorder = Recorder()
+    ops, op_weights = zip(*weights.items())
+    per_thread = n_requests // n_threads
+
+    def work(index):
+        rng = random.Random(seed_value * 1000 + index)
+        worker = Worker(app, fixture, recorder, rng)
+        for op in rng.choices(ops, op_weights, k=per_thread):
+            getattr(worker, op)()
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(n_threads)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return recorder.summary(time.perf_counter() - started)
+
+
+def print_summary(name, summary):
+    print(f"\n{name}: {summary['requests']:,} requests in {summary['seconds']:.2f}s "
+          f"({summary['requests_per_sec']:,.0f} req/s), p50 {summary['p50_ms']:.2f} ms, "
+          f"p95 {summary['p95_ms']:.2f} ms, p99 {summary['p99_ms']:.2f} ms")
+    print(f"  {'operation':<14}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'sql/req':>9}  statuses")
+    for op, stats in summary['operations'].items():
+        sql = f"{stats['sql_per_request']:.1f}" if stats['sql_per_request'] is not None else '-'
+        statuses = ' '.join(f'{code}:{n}' for code, n in sorted(stats['statuses'].items()))
+        print(f"  {op:<14}{stats['requests']:>7}{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}"
+              f"{stats['p99_ms']:>9.2f}{sql:>9}  {statuses}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--mixes', nargs='+', default=['polling', 'booking', 'mixed'], choices=sorted(MIXES))
+    parser.add_argument('--requests', type=int, default=2000, help='requests per mix')
+    parser.add_argument('--threads', type=int, default=1, help='concurrent simulated clients')
+    parser.add_argument('--students', type=int, default=500)
+    parser.add_argument('--drivers', type=int, default=50)
+    parser.add_argument('--rides', type=int, default=5000)
+    parser.add_argument('--pool', default='thread', choices=['process', 'thread', 'inline'],
+                        help='WORKER_POOL_KIND for hashing and QR rendering')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    # config.py reads these at import time
+    db_dir = tempfile.mkdtemp(prefix='edu_ride_bench_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(db_dir, 'bench.db')}"
+    os.environ['WORKER_POOL_KIND'] = args.pool
+    import app as app_module
+    # The testing config keeps the matching worker and location flusher from
+    # running mid-measurement
+    app = app_module.create_app('testing')
+    logging.getLogger('edu_ride').setLevel(logging.WARNING)
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    fixture = seed(app, app_module, args.students, args.drivers, args.rides, rng)
+    print("Booking lifecycle benchmark")
+    print("=" * 60)
+    print(f"Seeded {fixture.counts} in {time.perf_counter() - started:.2f}s "
+          f"({args.threads} thread(s), {args.pool} pool)")
+
+    results = {}
+    for name in args.mixes:
+        results[name] = run_mix(app, fixture, MIXES[name], args.requests, args.threads, args.seed)
+        print_summary(name, results[name])
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'commit': git_commit(), 'python': sys.version.split()[0], 'args': vars(args),
+                       'seeded': fixture.counts, 'mixes': {n: MIXES[n] for n in args.mixes},
+                       'results': results}, f, indent=2)
+        print(f"\n[INFO] Results written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
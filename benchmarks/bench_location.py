@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark live location ingestion
+
+Measures how many driver fixes per second the in-memory location store and
+the POST /api/location endpoint absorb on one process, and how many rows a
+flush writes to the database.
+
+Usage: python benchmarks/bench_location.py [--rides 1000] [--batches 20] [--batch-size 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from location import LocationStore
+
+
+def bench_store(rides, batches, batch_size):
+    store = LocationStore()
+    tracks = [store.open(ride_id, driver_id=ride_id) for ride_id in range(rides)]
+    started = time.perf_counter()
+    for b in range(batches):
+        for track in tracks:
+            base = b * batch_size
+            store.append(track, [(float(base + i), 19.0, 72.8) for i in range(batch_size)])
+    elapsed = time.perf_counter() - started
+    return rides * batches * batch_size / elapsed
+
+
+def bench_endpoint(rides, batches, batch_size):
+    from app import create_app, db, User, Ride, flush_locations
+
+    app = create_app()
+
+    with app.app_context():
+        db.create_all()
+        driver = User(username='bench_driver', email='bench@example.com', phone='0',
+                      user_type='driver', password_hash='x')
+        db.session.add(driver)
+        db.session.flush()
+        ride_ids = []
+        for _ in range(rides):
+            ride = Ride(driver_id=driver.id, pickup_location='A', dropoff_location='B',
+                        pickup_time=datetime(2030, 1, 1), fare=40.0, status='in_progress')
+            db.session.add(ride)
+            db.session.flush()
+            ride_ids.append(ride.id)
+        db.session.commit()
+        driver_id = driver.id
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(driver_id)
+
+    started = time.perf_counter()
+    for b in range(batches):
+        now = time.time() + b * batch_size
+        for ride_id in ride_ids:
+            points = [[19.0, 72.8, now + i] for i in range(batch_size)]
+            client.post('/api/location', json={'ride_id': ride_id, 'points': points})
+    elapsed = time.perf_counter() - started
+
+    flush_started = time.perf_counter()
+    with app.app_context():
+        persisted = flush_locations()
+    flush_elapsed = time.perf_counter() - flush_started
+
+    return {
+        'requests_per_sec': rides * batches / elapsed,
+        'fixes_per_sec': rides * batches * batch_size / elapsed,
+        'rows_persisted': persisted,
+        'flush_ms': flush_elapsed * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rides', type=int, default=1000)
+    parser.add_argument('--batches', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=5)
+    args = parser.parse_args()
+
+    print("Location ingestion benchmark")
+    print("=" * 40)
+    print(f"Store: {bench_store(args.rides, args.batches, args.batch_size):,.0f} fixes/sec")
+    result = bench_endpoint(args.rides, args.batches, args.batch_size)
+    print(f"HTTP:  {result['requests_per_sec']:,.0f} requests/sec "
+          f"({result['fixes_per_sec']:,.0f} fixes/sec)")
+    print(f"Flush: {result['rows_persisted']} rows in {result['flush_ms']:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark the group ride matching engine on synthetic workloads
+
+Generates requests and group rides scattered around the Sion-Somaiya
+corridor with random time windows, runs matching.match and reports
+throughput and solution quality (match rate, mean detour, mean time
+mismatch, and total cost relative to each request's cheapest ride).
+
+Usage: python benchmarks/bench_matching.py [--workloads 5000x500 50000x5000] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from matching import MatchParams, RequestBatch, RideBatch, match
+
+CENTER = (19.0560, 72.8800)
+SPREAD_DEG = 0.05     # roughly +/- 5 km
+T0 = 1_900_000_000.0
+HORIZON_S = 4 * 3600
+
+
+def synthetic_workload(n_requests, n_rides, rng):
+    earliest = T0 + rng.uniform(0, HORIZON_S, n_requests)
+    requests = RequestBatch(
+        pickup_lat=CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG, n_requests),
+        pickup_lng=CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG, n_requests),
+        earliest=earliest,
+        latest=earliest + rng.uniform(300, 1800, n_requests),
+        dropoff_lat=CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG, n_requests),
+        dropoff_lng=CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG, n_requests),
+    )
+    rides = RideBatch(
+        pickup_lat=CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG, n_rides),
+        pickup_lng=CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG, n_rides),
+        pickup_time=T0 + rng.uniform(0, HORIZON_S, n_rides),
+        seats=rng.integers(2, 5, n_rides),
+        dropoff_lat=CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG, n_rides),
+        dropoff_lng=CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG, n_rides),
+    )
+    return requests, rides
+
+
+def run(n_requests, n_rides, params, seed):
+    rng = np.random.default_rng(seed)
+    requests, rides = synthetic_workload(n_requests, n_rides, rng)
+    started = time.perf_counter()
+    result = match(requests, rides, params)
+    elapsed = time.perf_counter() - started
+    stats = result.stats(n_requests)
+    stats.update({
+        'rides': n_rides,
+        'seats': int(rides.seats.sum()),
+        'seconds': elapsed,
+        'requests_per_sec': n_requests / elapsed,
+    })
+    return stats
+
+
+def parse_workload(text):
+    requests, _, rides = text.lower().partition('x')
+    return int(requests), int(rides)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workloads', nargs='+', default=['5000x500', '20000x2000', '50000x5000'],
+                        help='REQUESTSxRIDES pairs')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--max-detour', type=float, default=2000)
+    parser.add_argument('--max-wait', type=float, default=1800)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    params = MatchParams(max_detour_m=args.max_detour, max_wait_s=args.max_wait)
+    results = []
+    print("Group ride matching benchmark")
+    print("=" * 60)
+    for workload in args.workloads:
+        n_requests, n_rides = parse_workload(workload)
+        stats = run(n_requests, n_rides, params, args.seed)
+        results.append(stats)
+        print(f"{n_requests:>7,} x {n_rides:<6,} {stats['seconds']:6.2f}s "
+              f"{stats['requests_per_sec']:>9,.0f} req/s  "
+              f"matched {stats['matched']:,}/{min(n_requests, stats['seats']):,} "
+              f"({stats['match_rate']:.1%})  detour {stats['mean_detour_m']:.0f} m  "
+              f"mismatch {stats['mean_mismatch_s']:.0f} s  "
+              f"cost ratio {stats['cost_vs_unconstrained']:.3f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'params': vars(params), 'results': results}, f, indent=2)
+        print(f"[INFO] Results written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark nearby-ride queries against the grid index
+
+Fills the index with N available rides scattered over greater Mumbai and
+reports p50/p99 radius-query latency. Two shapes are measured: a fixed
+radius (result count grows with N) and a radius scaled so each query returns
+about the same number of rides, which isolates index overhead from result size.
+
+Usage: python benchmarks/bench_nearby.py [--sizes 10000 100000 300000] [--queries 2000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geo import GridIndex
+
+# Rough bounding box of greater Mumbai
+LAT_RANGE = (18.90, 19.30)
+LNG_RANGE = (72.78, 73.05)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def bench(size, queries, radius, rng):
+    index = GridIndex()
+    for key in range(size):
+        index.upsert(key, rng.uniform(*LAT_RANGE), rng.uniform(*LNG_RANGE), float(key))
+
+    timings = []
+    found = 0
+    for _ in range(queries):
+        lat, lng = rng.uniform(*LAT_RANGE), rng.uniform(*LNG_RANGE)
+        started = time.perf_counter()
+        found += len(index.nearby(lat, lng, radius, limit=50))
+        timings.append((time.perf_counter() - started) * 1000)
+
+    return percentile(timings, 50), percentile(timings, 99), found / queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 300000])
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--radius', type=float, default=1000, help='search radius in meters')
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    print("Nearby-ride query benchmark")
+    print("=" * 40)
+    for size in args.sizes:
+        for label, radius in (('fixed radius ', args.radius),
+                              ('scaled radius', args.radius * (10000 / size) ** 0.5)):
+            p50, p99, avg = bench(size, args.queries, radius, rng)
+            print(f"{size:>8,} rides, {label}: p50 {p50:.3f} ms, p99 {p99:.3f} ms, "
+                  f"{avg:.1f} results/query")
+
+
+if __name__ == '__main__':
+    main()
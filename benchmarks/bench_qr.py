@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark payment QR rendering: cold render vs warm cache
+
+Reports per-request cost of rendering a QR from scratch, of a memory cache
+hit, of an on-disk cache hit, and the size saved by serving the image as a
+separate file instead of base64 inside the HTML.
+
+Usage: python benchmarks/bench_qr.py [--iterations 200]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qr import QRCache, render_qr
+
+
+def payload(i):
+    return json.dumps({'ride_id': i, 'driver_id': 1, 'amount': 45.0}, sort_keys=True)
+
+
+def timed(fn, iterations):
+    started = time.perf_counter()
+    for i in range(iterations):
+        fn(i)
+    return (time.perf_counter() - started) / iterations * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+    n = args.iterations
+
+    print("QR rendering benchmark")
+    print("=" * 40)
+    for fmt in ('png', 'svg'):
+        cold = timed(lambda i: render_qr(payload(i), fmt), n)
+
+        memory = QRCache(max_entries=n)
+        for i in range(n):
+            memory.get(payload(i), fmt)
+        warm = timed(lambda i: memory.get(payload(i), fmt), n)
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            QRCache(cache_dir=cache_dir).get(payload(0), fmt)
+            disk = timed(lambda i: QRCache(cache_dir=cache_dir).get(payload(0), fmt), n)
+
+        size = len(render_qr(payload(0), fmt))
+        print(f"{fmt.upper()}: cold {cold:.3f} ms, memory hit {warm:.4f} ms, disk hit {disk:.3f} ms "
+              f"({cold / warm:,.0f}x faster warm)")
+        print(f"     {size:,} bytes as a file vs {(size + 2) // 3 * 4:,} bytes inlined as base64")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmark place typeahead and ride search on the full-text index
+
+Seeds a throwaway SQLite database with N rides (mostly finished, the rest
+available) over a few thousand place names, going through the same
+triggers as production writes. Then replays typed prefixes ("s", "si",
+"sio", ...) against /api/places and /api/rides/search with Flask's test
+client and reports p50/p99 latency per endpoint. A handful of typeahead
+queries done the old way, LIKE '%...%' over ride history, are timed for
+comparison.
+
+Usage: python benchmarks/bench_search.py [--rides 1000000] [--available 0.01] [--queries 2000]
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+AREAS = ['Sion', 'Somaiya', 'Kurla', 'Ghatkopar', 'Chembur', 'Dadar', 'Matunga', 'Vidyavihar', 'Wadala',
+         'Bandra', 'Andheri', 'Powai', 'Mulund', 'Thane', 'Vikhroli', 'Parel', 'Byculla', 'Colaba']
+LANDMARKS = ['Station', 'Station East', 'Station West', 'Hospital', 'Circle', 'Market', 'Depot', 'College',
+             'Campus Gate', 'Bus Stop', 'Post Office', 'Police Station', 'Library', 'Garden', 'Mall', 'Naka']
+BATCH = 20000
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def place_names(count, rng):
+    names = [f'{area} {landmark}' for area in AREAS for landmark in LANDMARKS]
+    while len(names) < count:
+        names.append(f'{rng.choice(AREAS)} {rng.choice(LANDMARKS)} {rng.randint(1, 999)}')
+    return list(dict.fromkeys(names))[:count]
+
+
+def seed(app_module, driver_id, rides, available, places, rng):
+    db, Ride = app_module.db, app_module.Ride
+    weights = [1 / (rank + 1) for rank in range(len(places))]  # a few busy places, a long tail
+    start = datetime(2024, 1, 1)
+    inserted = 0
+    while inserted < rides:
+        size = min(BATCH, rides - inserted)
+        pickups = rng.choices(places, weights, k=size)
+        dropoffs = rng.choices(places, weights, k=size)
+        rows = [{
+            'ride_id': f'bench-{inserted + i}',
+            'driver_id': driver_id,
+            'pickup_location': pickups[i],
+            'dropoff_location': dropoffs[i],
+            'pickup_time': start + timedelta(minutes=inserted + i),
+            'status': 'available' if rng.random() < available else 'completed',
+            'fare': 40.0,
+        } for i in range(size)]
+        db.session.execute(db.insert(Ride), rows)
+        db.session.commit()
+        inserted += size
+
+
+def timed(client, url, samples):
+    started = time.perf_counter()
+    response = client.get(url)
+    samples.append((time.perf_counter() - started) * 1000)
+    return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rides', type=int, default=1000000)
+    parser.add_argument('--available', type=float, default=0.01, help='share of rides still available')
+    parser.add_argument('--places', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args()
+
+    db_dir = tempfile.mkdtemp(prefix='edu_ride_bench_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(db_dir, 'bench.db')}"
+    import app as app_module
+    from sqlalchemy import text
+
+    app = app_module.create_app('testing')
+    logging.getLogger('edu_ride').setLevel(logging.ERROR)  # seeding batches trip the slow-query log
+    rng = random.Random(1)
+    places = place_names(args.places, rng)
+
+    with app.app_context():
+        db = app_module.db
+        db.create_all()
+        driver = app_module.User(username='driver', email='driver@example.com', phone='1', user_type='driver',
+                                 password_hash='x')
+        db.session.add(driver)
+        db.session.commit()
+
+        started = time.perf_counter()
+        seed(app_module, driver.id, args.rides, args.available, places, rng)
+        seed_seconds = time.perf_counter() - started
+        db.session.execute(text('ANALYZE'))
+        db.session.commit()
+
+        client = app.test_client()
+        typeahead, search = [], []
+        suggested = found = 0
+        for _ in range(args.queries):
+            name = rng.choice(places).lower()
+            prefix = name[:rng.randint(1, min(len(name), 8))].strip()
+            suggested += len(timed(client, f'/api/places?q={prefix}', typeahead).get_json())
+            found += len(timed(client, f'/api/rides/search?q={prefix}&limit=20', search).get_json())
+
+        # Typeahead without the index: group ride history by name
+        like = []
+        for _ in range(5):
+            prefix = rng.choice(places)[:3]
+            started = time.perf_counter()
+            db.session.execute(text("SELECT pickup_location, count(*) FROM ride WHERE pickup_location LIKE :t "
+                                    "GROUP BY pickup_location ORDER BY count(*) DESC LIMIT 8"),
+                               {'t': f'%{prefix}%'}).all()
+            like.append((time.perf_counter() - started) * 1000)
+
+    print("Place search benchmark")
+    print("=" * 40)
+    print(f"{args.rides:,} rides ({args.available:.0%} available), {len(places):,} places, "
+          f"seeded in {seed_seconds:.1f} s ({args.rides / seed_seconds:,.0f} rides/s with index triggers)")
+    print(f"/api/places        p50 {percentile(typeahead, 50):.2f} ms, p99 {percentile(typeahead, 99):.2f} ms, "
+          f"{suggested / args.queries:.1f} suggestions/query")
+    print(f"/api/rides/search  p50 {percentile(search, 50):.2f} ms, p99 {percentile(search, 99):.2f} ms, "
+          f"{found / args.queries:.1f} rides/query")
+    print(f"LIKE typeahead     p50 {percentile(like, 50):.2f} ms (scanning ride history, for comparison)")
+
+
+if __name__ == '__main__':
+    main()
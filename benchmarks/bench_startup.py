@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Measure cold start time and worker memory
+
+Each sample runs in a fresh interpreter: time to `import app`, to
+create_app(), and to serve the first request, plus resident memory and
+which heavy libraries (qrcode, Pillow, NumPy) got loaded. On Linux it also
+forks a pre-loaded app the way gunicorn's preload_app does and reports how
+much of the worker's memory stays shared with the master after serving
+requests, with and without gc.freeze().
+
+Usage: python benchmarks/bench_startup.py [--runs 5] [--config production] [--json startup.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ['qrcode', 'PIL', 'numpy']
+
+# Runs in the child interpreter; prints one JSON line
+COLD_START = r'''
+import json, os, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, ROOT)
+if EAGER:
+    import qrcode, PIL.Image, numpy
+import app as app_module
+t1 = time.perf_counter()
+app = app_module.create_app(CONFIG)
+t2 = time.perf_counter()
+with app.app_context():
+    app_module.db.create_all()
+app.test_client().get('/')
+t3 = time.perf_counter()
+
+def rss_kb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+print(json.dumps({
+    'import_ms': (t1 - t0) * 1000,
+    'create_app_ms': (t2 - t1) * 1000,
+    'first_request_ms': (t3 - t2) * 1000,
+    'total_ms': (t3 - t0) * 1000,
+    'rss_mb': rss_kb() / 1024,
+    'loaded': [m for m in HEAVY if m in sys.modules],
+}))
+'''
+
+# Pre-load in a "master", fork a "worker", serve requests, report smaps
+PRELOAD_FORK = r'''
+import gc, json, os, sys
+sys.path.insert(0, ROOT)
+import app as app_module
+app = app_module.create_app(CONFIG)
+with app.app_context():
+    app_module.db.create_all()
+if FREEZE:
+    gc.freeze()
+pid = os.fork()
+if pid == 0:
+    client = app.test_client()
+    for _ in range(REQUESTS):
+        client.get('/')
+        client.get('/api/rides')
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    shared = fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0)
+    private = fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+    print(json.dumps({'rss_mb': fields.get('Rss', 0) / 1024, 'pss_mb': fields.get('Pss', 0) / 1024,
+                      'shared_mb': shared / 1024, 'private_mb': private / 1024,
+                      'shared_ratio': shared / (shared + private) if shared + private else 0.0}))
+    sys.stdout.flush()
+    os._exit(0)
+os.waitpid(pid, 0)
+'''
+
+
+def run_child(source, env, **constants):
+    prelude = ''.join(f'{name} = {value!r}\n' for name, value in constants.items())
+    result = subprocess.run([sys.executable, '-c', prelude + source], env=env, capture_output=True,
+                            text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(samples):
+    keys = [k for k in samples[0] if isinstance(samples[0][k], (int, float))]
+    summary = {k: statistics.median(s[k] for s in samples) for k in keys}
+    summary['loaded'] = samples[0].get('loaded', [])
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--config', default='production')
+    parser.add_argument('--requests', type=int, default=200, help='requests served by the forked worker')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    db_dir = tempfile.mkdtemp(prefix='edu_ride_startup_')
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(db_dir, 'startup.db')}",
+               SECRET_KEY=os.environ.get('SECRET_KEY', 'bench-secret'), WORKER_POOL_KIND='thread')
+
+    print("Cold start and memory benchmark")
+    print("=" * 60)
+    results = {}
+    for label, eager in (('lazy imports', False), ('eager qrcode/Pillow/numpy', True)):
+        samples = [run_child(COLD_START, env, ROOT=ROOT, CONFIG=args.config, EAGER=eager, HEAVY=HEAVY_MODULES)
+                   for _ in range(args.runs)]
+        stats = results[label] = summarize(samples)
+        print(f"{label:<28} import {stats['import_ms']:6.1f} ms  create_app {stats['create_app_ms']:5.1f} ms  "
+              f"first request {stats['first_request_ms']:6.1f} ms  total {stats['total_ms']:6.1f} ms  "
+              f"RSS {stats['rss_mb']:5.1f} MB  loaded: {', '.join(stats['loaded']) or '-'}")
+
+    if os.path.exists('/proc/self/smaps_rollup') and hasattr(os, 'fork'):
+        print("-" * 60)
+        for label, freeze in (('preload, fork', False), ('preload, gc.freeze, fork', True)):
+            stats = results[label] = run_child(PRELOAD_FORK, env, ROOT=ROOT, CONFIG=args.config,
+                                               FREEZE=freeze, REQUESTS=args.requests)
+            print(f"{label:<28} worker RSS {stats['rss_mb']:5.1f} MB  PSS {stats['pss_mb']:5.1f} MB  "
+                  f"shared {stats['shared_mb']:5.1f} MB  private {stats['private_mb']:5.1f} MB  "
+                  f"({stats['shared_ratio']:.0%} shared)")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+        print(f"[INFO] Results written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
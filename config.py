@@ -4,32 +4,193 @@ Configuration settings for Edu-Ride application
 
 import os
 
+def _env_bool(name, default='false'):
+    return os.environ.get(name, default).lower() in ['true', 'on', '1']
+
 class Config:
     """Base configuration"""
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-key-change-in-production-12345'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///edu_ride.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    
+
+    # Database connection pool (ignored for in-memory SQLite)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 10)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 20)
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT') or 10)
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE') or 1800)
+    DB_POOL_PRE_PING = _env_bool('DB_POOL_PRE_PING', 'true')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS') or 5000)
+
+    # Live updates
+    EVENT_BUS = os.environ.get('EVENT_BUS', 'local')
+    SSE_HEARTBEAT_SECONDS = 15
+    SSE_MAX_STREAM_SECONDS = 300
+    # Open streams per process on the threaded server (asgi.py needs no
+    # cap): each holds a thread, so past this /api/stream answers 503 and
+    # pages poll instead. Keep well below GUNICORN_THREADS
+    SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS') or int(os.environ.get('GUNICORN_THREADS') or 32) // 4)
+
+    # Driver location tracking
+    LOCATION_BUFFER_SIZE = 120       # fixes kept in memory per ride
+    LOCATION_PERSIST_INTERVAL = 30   # seconds between persisted fixes
+    LOCATION_FLUSH_SECONDS = 10
+    LOCATION_MAX_BATCH = 500
+    LOCATION_STATUS_RECHECK = 60     # seconds between ride status checks while tracking
+
+    # Nearby ride search
+    NEARBY_CELL_DEGREES = 0.01       # ~1.1 km grid cells
+    NEARBY_DEFAULT_RADIUS_M = 2000
+    NEARBY_MAX_RADIUS_M = 20000
+
+    # Group ride matching
+    MATCHING_INTERVAL_SECONDS = 5
+    MATCHING_BATCH_SIZE = 50000
+    MATCHING_MAX_DETOUR_M = 2000
+    MATCHING_MAX_WAIT_S = 1800
+
+    # Bulk rides and recurring schedules
+    BULK_RIDES_MAX = 200              # rides per /api/rides/bulk request
+    SCHEDULE_WINDOW_DAYS = 14         # how far ahead schedules are materialised
+    SCHEDULE_EXTEND_SECONDS = 3600
+
+    # Ride archive: finished rides move out of the hot tables after this long
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS') or 30)
+    ARCHIVE_BATCH_SIZE = 500          # rides per archive transaction
+    ARCHIVE_INTERVAL_SECONDS = 3600
+
+    # Admin access (/admin/*, exports of every driver) by username
+    ADMIN_USERNAMES = {name.strip() for name in os.environ.get('ADMIN_USERNAMES', '').split(',') if name.strip()}
+    EXPORT_BATCH_SIZE = 1000          # rows fetched per round trip when streaming exports
+
+    # Fare and ETA estimates
+    ROUTING_BACKEND = os.environ.get('ROUTING_BACKEND', 'haversine')  # 'haversine' or 'osrm'
+    OSRM_URL = os.environ.get('OSRM_URL')
+    ROUTE_ROAD_FACTOR = 1.35          # road distance / straight-line distance
+    ROUTE_SPEED_KMH = 20.0            # average city speed for the offline router
+    ROUTE_CACHE_PRECISION = 7         # geohash length; 7 is a ~150 m cell
+    ROUTE_CACHE_SIZE = 50000
+    FARE_BASE = 23.0                  # covers the first FARE_BASE_KM
+    FARE_BASE_KM = 1.5
+    FARE_PER_KM = 15.33
+    FARE_PER_MINUTE = 0.5
+    FARE_BATCH_MAX = 200
+
+    # Payments
+    UPI_PAYEE_VPA = os.environ.get('UPI_PAYEE_VPA', 'eduride@upi')
+    UPI_PAYEE_NAME = 'Edu-Ride'
+    UPI_WEBHOOK_SECRET = os.environ.get('UPI_WEBHOOK_SECRET')  # shared with the provider; webhook is off without it
+    PAYMENT_SETTLE_SECONDS = 2        # how often queued callbacks are applied
+    PAYMENT_SETTLE_BATCH = 200        # callbacks per settlement transaction
+    PAYMENT_EXPIRE_MINUTES = 30       # unpaid UPI payments expire after this long
+
+    # Static assets: serve the fingerprinted build from `flask build-assets`
+    USE_ASSET_MANIFEST = _env_bool('USE_ASSET_MANIFEST')
+    VENDOR_ASSETS = _env_bool('VENDOR_ASSETS')  # Bootstrap/Font Awesome from static/vendor, not CDNs
+
+    # Payment QR codes
+    QR_CACHE_SIZE = 512
+    QR_CACHE_DIR = os.environ.get('QR_CACHE_DIR')  # optional shared on-disk cache
+
+    # CPU worker pool for password hashing and QR rendering
+    WORKER_POOL_KIND = os.environ.get('WORKER_POOL_KIND', 'process')  # 'process', 'thread' or 'inline'
+    WORKER_POOL_SIZE = int(os.environ.get('WORKER_POOL_SIZE') or 0) or None  # default: CPU count
+    WORKER_POOL_QUEUE = int(os.environ.get('WORKER_POOL_QUEUE') or 16)
+    WORKER_POOL_TIMEOUT = 10
+
+    # Rate limits: endpoint (optionally 'METHOD endpoint') -> [(scope, count, per_seconds)];
+    # see ratelimit.py. RATE_LIMIT_STORAGE is 'local', a redis:// URL or 'module:Class'.
+    RATE_LIMIT_ENABLED = _env_bool('RATE_LIMIT_ENABLED', 'true')
+    RATE_LIMIT_STORAGE = os.environ.get('RATE_LIMIT_STORAGE', 'local')
+    RATE_LIMITS = {
+        'POST main.login': [('ip', 10, 60), ('username', 5, 300)],
+        'POST main.register': [('ip', 5, 3600)],
+        'main.api_rides': [('user', 120, 60)],
+        'main.api_notifications': [('user', 120, 60)],
+        'main.generate_qr': [('user', 30, 60)],
+        'main.qr_image': [('user', 30, 60)],
+        'main.payment_qr_image': [('user', 30, 60)],
+    }
+    PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR') or 0)  # proxies setting X-Forwarded-For
+
+    # Admission control: shed polling before booking when the process is overloaded
+    ADMISSION_CONTROL = _env_bool('ADMISSION_CONTROL', 'true')
+    ADMISSION_MAX_IN_FLIGHT = int(os.environ.get('ADMISSION_MAX_IN_FLIGHT') or 24)  # keep below server threads
+    ADMISSION_TARGET_MS = int(os.environ.get('ADMISSION_TARGET_MS') or 250)
+    ADMISSION_CRITICAL_FACTOR = 4     # also shed normal requests past this multiple of the target
+    ADMISSION_WINDOW_SECONDS = 5
+    ADMISSION_RETRY_AFTER = 2
+    ADMISSION_LOW_PRIORITY = {
+        'main.api_rides', 'main.api_ride_search', 'main.api_places', 'main.api_rides_nearby',
+        'main.api_notifications', 'main.api_ride_location', 'main.api_ride_eta', 'main.api_history',
+        'main.api_driver_stats', 'main.api_stream', 'main.generate_qr', 'main.qr_image',
+        'main.payment_qr_image',
+    }
+    ADMISSION_HIGH_PRIORITY = {
+        'main.api_book_ride', 'main.book_ride', 'main.api_start_ride', 'main.api_complete_ride',
+        'main.api_location', 'main.api_create_payment', 'main.upi_webhook', 'main.api_cash_received',
+    }
+    ADMISSION_EXEMPT = {'static', 'main.metrics', 'main.debug_workers'}
+    ADMISSION_UNTRACKED = {'main.api_stream', 'main.export_rides', 'main.export_payments'}
+
+    # Logged-in user lookups (Flask-Login user_loader)
+    IDENTITY_CACHE_SIZE = int(os.environ.get('IDENTITY_CACHE_SIZE') or 10000)
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL') or 60)  # bounds staleness of raw SQL writes
+
+    # Instrumentation
+    SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS') or 200)
+    PROFILE_REQUESTS = _env_bool('PROFILE_REQUESTS')
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+    PROFILE_THRESHOLD_MS = int(os.environ.get('PROFILE_THRESHOLD_MS') or 500)
+    SERVER_TIMING = True  # per-request app/SQL timings in a Server-Timing header
+
     # Email settings (for future use)
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
     MAIL_PORT = int(os.environ.get('MAIL_PORT') or 587)
-    MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', 'true').lower() in ['true', 'on', '1']
+    MAIL_USE_TLS = _env_bool('MAIL_USE_TLS', 'true')
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
 
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
-    SECRET_KEY = 'dev-key-for-development-only'
+    SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-key-for-development-only'
+
+class TestingConfig(Config):
+    """Test configuration: no background threads, in-thread CPU pool"""
+    TESTING = True
+    WORKER_POOL_KIND = os.environ.get('WORKER_POOL_KIND', 'thread')
+    UPI_WEBHOOK_SECRET = 'test-webhook-secret'
+    RATE_LIMIT_ENABLED = False
+    ADMISSION_CONTROL = False
 
 class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
-    # SECRET_KEY should be set via environment variable in production
+    USE_ASSET_MANIFEST = _env_bool('USE_ASSET_MANIFEST', 'true')
+    # SECRET_KEY must be set via environment variable in production
+    SECRET_KEY = os.environ.get('SECRET_KEY')
+
+def engine_options(uri, settings=Config):
+    """SQLALCHEMY_ENGINE_OPTIONS for a database URI"""
+    if uri == 'sqlite://' or (uri.startswith('sqlite') and ':memory:' in uri):
+        # In-memory SQLite uses a single shared connection, not a QueuePool
+        return {}
+    options = {
+        'pool_size': settings.DB_POOL_SIZE,
+        'max_overflow': settings.DB_MAX_OVERFLOW,
+        'pool_timeout': settings.DB_POOL_TIMEOUT,
+        'pool_recycle': settings.DB_POOL_RECYCLE,
+        'pool_pre_ping': settings.DB_POOL_PRE_PING,
+    }
+    if uri.startswith('sqlite'):
+        # Seconds pysqlite waits on a locked database before raising
+        options['connect_args'] = {'timeout': settings.SQLITE_BUSY_TIMEOUT_MS / 1000, 'check_same_thread': False}
+    return options
 
 # Configuration dictionary
 config = {
     'development': DevelopmentConfig,
+    'testing': TestingConfig,
     'production': ProductionConfig,
     'default': DevelopmentConfig
 }
@@ -0,0 +1,122 @@
+"""
+Shared pytest fixtures for Edu-Ride tests
+"""
+
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+from flask import g
+from sqlalchemy import event
+
+# Use a throwaway database file so tests never touch edu_ride.db. A file (not
+# :memory:) lets concurrency tests use one connection per thread.
+_db_dir = tempfile.mkdtemp(prefix='edu_ride_test_')
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(_db_dir, 'test.db')}")
+
+from app import create_app, db, User, Ride
+
+flask_app = create_app('testing')
+
+
+@pytest.fixture
+def app():
+    flask_app.config['TESTING'] = True
+    # In-memory runtime state outlives the per-test database
+    flask_app.extensions['ride_index'].clear()
+    flask_app.extensions['location_store'].clear()
+    flask_app.extensions['qr_cache'].clear()
+    flask_app.extensions['identity_cache'].clear()
+    flask_app.extensions['sync_feed'].close()
+    if flask_app.extensions.get('fare_engine') is not None:
+        flask_app.extensions['fare_engine'].clear()
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    counter = {'n': 0}
+
+    def _make_user(user_type='student', **fields):
+        counter['n'] += 1
+        n = counter['n']
+        user = User(
+            username=fields.pop('username', f'{user_type}{n}'),
+            email=fields.pop('email', f'{user_type}{n}@example.com'),
+            phone=fields.pop('phone', '9876543210'),
+            user_type=user_type,
+            # Hashing is deliberately slow; tests that log in set the session directly
+            password_hash=fields.pop('password_hash', 'not-a-real-hash'),
+            **fields
+        )
+        db.session.add(user)
+        db.session.commit()
+        return user
+
+    return _make_user
+
+
+@pytest.fixture
+def make_ride(app):
+    def _make_ride(driver, **fields):
+        fields.setdefault('pickup_location', 'Sion Station')
+        fields.setdefault('dropoff_location', 'Somaiya College')
+        fields.setdefault('pickup_time', datetime(2030, 1, 1, 8, 0) + timedelta(minutes=Ride.query.count()))
+        fields.setdefault('fare', 40.0)
+        ride = Ride(driver_id=driver.id, **fields)
+        db.session.add(ride)
+        db.session.commit()
+        return ride
+
+    return _make_ride
+
+
+@pytest.fixture
+def login(client):
+    def _login(user):
+        # Requests share the fixture's app context, so drop Flask-Login's cached user
+        g.pop('_login_user', None)
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user.id)
+            sess['_fresh'] = True
+        return client
+
+    return _login
+
+
+class QueryCounter:
+    """Counts SQL statements sent to the engine while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def __enter__(self):
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+
+@pytest.fixture
+def count_queries(app):
+    return lambda: QueryCounter(db.engine)
@@ -0,0 +1,159 @@
+"""
+Per-driver ride statistics
+
+Two summary tables (models in app.py) are maintained by database triggers
+on ``ride``, in the same transaction as the ride change:
+
+- ``driver_stats``: one row per driver and ride status with the number of
+  rides, the fares they are worth (what each passenger is charged x
+  passengers), payments collected and, for group rides, seats offered and
+  filled.
+- ``driver_daily_stats``: completed rides, earnings and collections per
+  driver and pickup day, for "today / this week / this month" totals.
+
+Each trigger subtracts the old row's contribution and adds the new one, so
+every write path (ORM flushes, bulk inserts, the conditional booking and
+matching UPDATEs, payment settlement) is covered. Deleting a finished ride
+(archiving) leaves the statistics alone; they are lifetime totals. Existing
+rides, archived ones included, are recounted whenever the triggers are
+installed or their definition changes.
+"""
+
+from sqlalchemy import text
+
+FINISHED = "('completed', 'cancelled')"
+
+# One passenger's fare, as app.ride_seat_fare charges it: a group ride's
+# fare split over its seats and rounded up, or the fare of a solo ride
+_SHARE = '({r}.fare / CASE WHEN coalesce({r}.max_passengers, 0) > 1 THEN {r}.max_passengers ELSE 1 END)'
+_SEAT_FARE = {
+    'sqlite': 'CASE WHEN {r}.is_group_ride THEN CAST({share} AS INTEGER) + ({share} > CAST({share} AS INTEGER)) '
+              'ELSE {r}.fare END',
+    'postgresql': 'CASE WHEN {r}.is_group_ride THEN ceil({share}) ELSE {r}.fare END',
+}
+
+# Column -> contribution of one ride row, with {r} standing for NEW/OLD
+_STATUS_COLUMNS = {
+    'rides': '1',
+    'earnings': '({seat_fare}) * coalesce({r}.current_passengers, 0)',
+    'collected': 'coalesce({r}.amount_paid, 0)',
+    'group_rides': 'CASE WHEN {r}.is_group_ride THEN 1 ELSE 0 END',
+    'seats_offered': 'CASE WHEN {r}.is_group_ride THEN coalesce({r}.max_passengers, 0) ELSE 0 END',
+    'seats_filled': 'CASE WHEN {r}.is_group_ride THEN coalesce({r}.current_passengers, 0) ELSE 0 END',
+}
+_DAILY_COLUMNS = {name: _STATUS_COLUMNS[name] for name in ('rides', 'earnings', 'collected')}
+_DAY = {'sqlite': 'date({r}.pickup_time)', 'postgresql': 'CAST({r}.pickup_time AS date)'}
+
+
+def _expr(expr, dialect, row):
+    seat_fare = _SEAT_FARE[dialect].replace('{share}', _SHARE)
+    return expr.replace('{seat_fare}', seat_fare).format(r=row)
+
+
+def _upsert(dialect, row, sign):
+    """Statements adding (sign '+') or removing (sign '-') one ride row"""
+    def values(columns):
+        return ', '.join(f'{sign}({_expr(expr, dialect, row)})' for expr in columns.values())
+
+    def assignments(table, columns):
+        return ', '.join(f'{name} = {table}.{name} + excluded.{name}' for name in columns)
+
+    status_columns = ', '.join(_STATUS_COLUMNS)
+    daily_columns = ', '.join(_DAILY_COLUMNS)
+    return (
+        f"INSERT INTO driver_stats (driver_id, status, {status_columns}) "
+        f"VALUES ({row}.driver_id, {row}.status, {values(_STATUS_COLUMNS)}) "
+        f"ON CONFLICT (driver_id, status) DO UPDATE SET {assignments('driver_stats', _STATUS_COLUMNS)}; "
+        f"INSERT INTO driver_daily_stats (driver_id, day, {daily_columns}) "
+        f"SELECT {row}.driver_id, {_DAY[dialect].format(r=row)}, {values(_DAILY_COLUMNS)} "
+        f"WHERE {row}.status = 'completed' "
+        f"ON CONFLICT (driver_id, day) DO UPDATE SET {assignments('driver_daily_stats', _DAILY_COLUMNS)};"
+    )
+
+
+def _backfill(dialect):
+    rides = ("(SELECT driver_id, status, pickup_time, fare, is_group_ride, max_passengers, current_passengers, "
+             "amount_paid FROM ride UNION ALL SELECT driver_id, status, pickup_time, fare, is_group_ride, "
+             "max_passengers, current_passengers, amount_paid FROM ride_archive) rides")
+    status_sums = ', '.join(f'sum({_expr(expr, dialect, "rides")})' for expr in _STATUS_COLUMNS.values())
+    daily_sums = ', '.join(f'sum({_expr(expr, dialect, "rides")})' for expr in _DAILY_COLUMNS.values())
+    day = _DAY[dialect].format(r='rides')
+    return [
+        ('reset driver_stats', 'DELETE FROM driver_stats'),
+        ('reset driver_daily_stats', 'DELETE FROM driver_daily_stats'),
+        ('backfill driver_stats',
+         f"INSERT INTO driver_stats (driver_id, status, {', '.join(_STATUS_COLUMNS)}) "
+         f"SELECT driver_id, status, {status_sums} FROM {rides} GROUP BY driver_id, status"),
+        ('backfill driver_daily_stats',
+         f"INSERT INTO driver_daily_stats (driver_id, day, {', '.join(_DAILY_COLUMNS)}) "
+         f"SELECT driver_id, {day}, {daily_sums} FROM {rides} WHERE status = 'completed' "
+         f"GROUP BY driver_id, {day}"),
+    ]
+
+
+def _sqlite_install():
+    return _backfill('sqlite') + [
+        ('create trigger ride_stats_ai',
+         f"CREATE TRIGGER ride_stats_ai AFTER INSERT ON ride BEGIN {_upsert('sqlite', 'new', '+')} END"),
+        ('create trigger ride_stats_au',
+         "CREATE TRIGGER ride_stats_au AFTER UPDATE OF driver_id, status, pickup_time, fare, is_group_ride, "
+         "max_passengers, current_passengers, amount_paid ON ride BEGIN "
+         f"{_upsert('sqlite', 'old', '-')} {_upsert('sqlite', 'new', '+')} END"),
+        ('create trigger ride_stats_ad',
+         f"CREATE TRIGGER ride_stats_ad AFTER DELETE ON ride WHEN old.status NOT IN {FINISHED} BEGIN "
+         f"{_upsert('sqlite', 'old', '-')} END"),
+    ]
+
+
+def _postgres_install():
+    return _backfill('postgresql') + [
+        ('create function ride_driver_stats',
+         "CREATE OR REPLACE FUNCTION ride_driver_stats() RETURNS trigger AS $$ BEGIN "
+         f"IF TG_OP = 'UPDATE' OR (TG_OP = 'DELETE' AND OLD.status NOT IN {FINISHED}) THEN "
+         f"{_upsert('postgresql', 'OLD', '-')} END IF; "
+         f"IF TG_OP <> 'DELETE' THEN {_upsert('postgresql', 'NEW', '+')} END IF; "
+         "RETURN NULL; END $$ LANGUAGE plpgsql"),
+        ('create trigger ride_driver_stats',
+         "CREATE TRIGGER ride_driver_stats AFTER INSERT OR UPDATE OR DELETE ON ride "
+         "FOR EACH ROW EXECUTE FUNCTION ride_driver_stats()"),
+    ]
+
+
+def install_driver_stats(conn):
+    """Create the statistics triggers if missing or outdated and recount
+    existing rides; returns the steps applied"""
+    dialect = conn.dialect.name
+    if dialect == 'sqlite':
+        steps = _sqlite_install()
+        installed = dict(conn.execute(text(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' "
+            "AND name IN ('ride_stats_ai', 'ride_stats_au', 'ride_stats_ad')"
+        )).all())
+        expected = {label.removeprefix('create trigger '): statement
+                    for label, statement in steps if label.startswith('create trigger')}
+        if installed == expected:
+            return []
+    elif dialect == 'postgresql':
+        steps = _postgres_install()
+        installed = conn.execute(text(
+            "SELECT p.prosrc FROM pg_trigger t JOIN pg_proc p ON p.oid = t.tgfoid "
+            "WHERE t.tgname = 'ride_driver_stats'"
+        )).scalar()
+        expected = dict(steps)['create function ride_driver_stats'].split('$$')[1]
+        if installed == expected:
+            return []
+    else:
+        return []
+    # Missing, half-installed or outdated: recount from scratch under fresh triggers
+    drop_driver_stats(conn)
+    for label, statement in steps:
+        conn.execute(text(statement))
+    return [label for label, _ in steps]
+
+
+def drop_driver_stats(conn):
+    if conn.dialect.name == 'sqlite':
+        for name in ('ride_stats_ai', 'ride_stats_au', 'ride_stats_ad'):
+            conn.execute(text(f'DROP TRIGGER IF EXISTS {name}'))
+    elif conn.dialect.name == 'postgresql':
+        conn.execute(text('DROP TRIGGER IF EXISTS ride_driver_stats ON ride'))
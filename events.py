@@ -0,0 +1,318 @@
+"""
+Publish/subscribe event bus for Edu-Ride live updates
+
+The default LocalEventBus fans events out to subscribers inside a single
+process. Several workers share one bus through RedisEventBus (the optional
+``redis`` package, EVENT_BUS=redis://...), or through any class with the
+same publish/subscribe interface named by EVENT_BUS
+(e.g. 'mypackage.kafka_bus:KafkaEventBus').
+
+ChannelFeed lets a process keep in-memory state current from a channel
+without a thread of its own.
+"""
+
+import asyncio
+import importlib
+import itertools
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+try:
+    import redis
+except ImportError:  # optional; only needed for EVENT_BUS=redis://...
+    redis = None
+
+logger = logging.getLogger('edu_ride.events')
+
+
+class Event:
+    """A single published event"""
+
+    __slots__ = ('id', 'channel', 'type', 'data')
+
+    def __init__(self, id, channel, type, data):
+        self.id = id
+        self.channel = channel
+        self.type = type
+        self.data = data
+
+    def __repr__(self):
+        return f'<Event {self.id} {self.channel} {self.type}>'
+
+
+class Subscription:
+    """A subscriber's bounded inbox.
+
+    A subscriber that falls behind is marked as overflowed instead of
+    silently losing events; the caller should drop the connection and let
+    the client resume from its last event id.
+    """
+
+    def __init__(self, bus, channels, maxsize):
+        self.bus = bus
+        self.channels = frozenset(channels)
+        self.overflowed = False
+        self.closed = False
+        self._queue = queue.Queue(maxsize)
+        self._waiter = None  # (loop, asyncio.Event) of a pending get_async()
+
+    def deliver(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+        self._notify()
+
+    def _notify(self):
+        waiter = self._waiter
+        if waiter is not None:
+            loop, ready = waiter
+            try:
+                loop.call_soon_threadsafe(ready.set)
+            except RuntimeError:  # loop already closed
+                pass
+
+    def get(self, timeout=None):
+        """Return the next event, or None if nothing arrived within timeout"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    async def get_async(self, timeout=None):
+        """get() for an event loop: waits without holding a thread"""
+        ready = asyncio.Event()
+        # Set before checking the queue so a concurrent deliver() always wakes us
+        self._waiter = (asyncio.get_running_loop(), ready)
+        try:
+            if self._queue.empty():
+                try:
+                    await asyncio.wait_for(ready.wait(), timeout)
+                except asyncio.TimeoutError:
+                    return None
+            return self._queue.get_nowait()
+        except queue.Empty:
+            return None
+        finally:
+            self._waiter = None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+    def wake(self):
+        """Mark the subscription closed and unblock a pending get()"""
+        self.closed = True
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        self._notify()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class LocalEventBus:
+    """In-process event bus with a short replay history"""
+
+    def __init__(self, history_size=1000, queue_size=256):
+        self.queue_size = queue_size
+        self._history = deque(maxlen=history_size)
+        self._subscribers = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, event_type, data):
+        with self._lock:
+            event = Event(next(self._ids), channel, event_type, data)
+            self._dispatch(event)
+        return event
+
+    def _dispatch(self, event):
+        # Callers hold the lock so every subscriber sees events in id order
+        self._history.append(event)
+        for subscription in self._subscribers.get(event.channel, ()):
+            subscription.deliver(event)
+
+    def subscribe(self, channels, last_event_id=None):
+        """Subscribe to channels, replaying history newer than last_event_id"""
+        subscription = Subscription(self, channels, self.queue_size)
+        with self._lock:
+            if last_event_id is not None:
+                for event in self._history:
+                    if event.id > last_event_id and event.channel in subscription.channels:
+                        subscription.deliver(event)
+            for channel in subscription.channels:
+                self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+    def close_all(self):
+        """Wake every subscriber so open streams end, e.g. on shutdown"""
+        with self._lock:
+            subscriptions = {s for subs in self._subscribers.values() for s in subs}
+        for subscription in subscriptions:
+            subscription.wake()
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._subscribers.get(channel, ()))
+            return len({s for subs in self._subscribers.values() for s in subs})
+
+
+# KEYS[1] id counter, KEYS[2] pub/sub channel; ARGV[1] the event as JSON.
+# Numbering and publishing in one script keeps ids in delivery order even
+# when several workers publish at once.
+_REDIS_PUBLISH = """
+local id = redis.call('INCR', KEYS[1])
+redis.call('PUBLISH', KEYS[2], id .. ' ' .. ARGV[1])
+return id
+"""
+
+
+class RedisEventBus(LocalEventBus):
+    """Event bus shared by every worker through Redis pub/sub.
+
+    publish() numbers and broadcasts each event in one script call. A
+    listener thread in each process receives every event and hands it to
+    local subscribers, keeping the replay history as LocalEventBus does, so
+    a client can resume on any worker. After a lost connection the listener
+    reconnects and marks open subscriptions overflowed, since events may
+    have been missed in between.
+    """
+
+    def __init__(self, url='redis://localhost:6379/0', prefix='edu_ride:events:', client=None,
+                 history_size=1000, queue_size=256):
+        super().__init__(history_size, queue_size)
+        if client is None:
+            if redis is None:
+                raise RuntimeError('EVENT_BUS=redis:// needs the redis package')
+            client = redis.Redis.from_url(url)
+        self._client = client
+        self._keys = [prefix + 'id', prefix + 'events']
+        self._publish = client.register_script(_REDIS_PUBLISH)
+        self._listener = None
+        self._listening = threading.Event()
+        self._listener_lock = threading.Lock()
+
+    def publish(self, channel, event_type, data):
+        event_id = self._publish(keys=self._keys, args=[json.dumps([channel, event_type, data])])
+        return Event(int(event_id), channel, event_type, data)
+
+    def subscribe(self, channels, last_event_id=None):
+        self._ensure_listener()
+        return super().subscribe(channels, last_event_id)
+
+    def _ensure_listener(self):
+        # Started lazily so each forked worker gets its own thread
+        if self._listener is not None and self._listener.is_alive():
+            return
+        with self._listener_lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listening.clear()
+                self._listener = threading.Thread(target=self._listen, name='event-bus-listener', daemon=True)
+                self._listener.start()
+        self._listening.wait(timeout=5)
+
+    def _listen(self):
+        reconnecting = False
+        while True:
+            pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self._keys[1])
+                if reconnecting:
+                    self._mark_overflowed()
+                self._listening.set()
+                for message in pubsub.listen():
+                    self._receive(message['data'])
+            except Exception:
+                logger.exception('Event bus listener lost its Redis connection; reconnecting')
+                reconnecting = True
+                time.sleep(1)
+            finally:
+                pubsub.close()
+
+    def _receive(self, message):
+        if isinstance(message, bytes):
+            message = message.decode()
+        event_id, _, body = message.partition(' ')
+        channel, event_type, data = json.loads(body)
+        with self._lock:
+            self._dispatch(Event(int(event_id), channel, event_type, data))
+
+    def _mark_overflowed(self):
+        with self._lock:
+            subscriptions = {s for subs in self._subscribers.values() for s in subs}
+        for subscription in subscriptions:
+            subscription.overflowed = True
+
+
+class ChannelFeed:
+    """Applies one channel's events to process-local state, in the reader's thread.
+
+    Readers call drain() before using the state: it subscribes on first use
+    and passes each pending event to handle(event) without blocking. If the
+    subscription overflowed, events were lost, so it is replaced and
+    reset() runs instead to rebuild the state from its source.
+    """
+
+    def __init__(self, bus, channel, handle, reset):
+        self.bus = bus
+        self.channel = channel
+        self.handle = handle
+        self.reset = reset
+        self.resets = 0
+        self._subscription = None
+        self._lock = threading.Lock()
+
+    def drain(self):
+        with self._lock:
+            if self._subscription is None or self._subscription.overflowed:
+                if self._subscription is not None:
+                    self._subscription.close()
+                    self.resets += 1
+                self._subscription = self.bus.subscribe([self.channel])
+                self.reset()
+            while True:
+                event = self._subscription.get(timeout=0)
+                if event is None:
+                    return
+                self.handle(event)
+
+    def close(self):
+        with self._lock:
+            if self._subscription is not None:
+                self._subscription.close()
+                self._subscription = None
+
+
+def load_event_bus(spec='local', **options):
+    """Create an event bus from 'local', a redis:// URL or a 'module:ClassName' spec"""
+    if spec in (None, '', 'local'):
+        return LocalEventBus(**options)
+    if spec.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisEventBus(spec, **options)
+    module_name, _, attr = spec.partition(':')
+    bus_class = getattr(importlib.import_module(module_name), attr)
+    return bus_class(**options)
+
+
+def format_sse(event):
+    """Serialize an Event as a text/event-stream message"""
+    return f'id: {event.id}\nevent: {event.type}\ndata: {json.dumps(event.data)}\n\n'
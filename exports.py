@@ -0,0 +1,80 @@
+"""
+Streaming CSV/NDJSON encoders for bulk exports
+
+Rows go in as an iterator of tuples and come out as an iterator of byte
+chunks of roughly CHUNK_SIZE, so a response can be streamed without ever
+holding the whole export in memory. `gzip_chunks` compresses on the fly.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+
+CHUNK_SIZE = 64 * 1024
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Cells starting with these are run as formulas by spreadsheet apps
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def csv_chunks(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_csv_value(value) for value in row])
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def ndjson_chunks(columns, rows):
+    lines, size = [], 0
+    for row in rows:
+        line = json.dumps({name: _json_value(value) for name, value in zip(columns, row)})
+        lines.append(line)
+        size += len(line) + 1
+        if size >= CHUNK_SIZE:
+            yield ('\n'.join(lines) + '\n').encode()
+            lines, size = [], 0
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode()
+
+
+def encode_chunks(fmt, columns, rows):
+    if fmt == 'csv':
+        return csv_chunks(columns, rows)
+    return ndjson_chunks(columns, rows)
+
+
+def gzip_chunks(chunks, level=6):
+    """Gzip a stream of byte chunks incrementally"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
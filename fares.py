@@ -0,0 +1,225 @@
+"""
+Fare and ETA estimation
+
+FareEngine prices a trip from its road distance and duration. Routes come
+from a pluggable router: HaversineRouter (offline great-circle distance
+times a road factor, the default) or OSRMRouter (an OSRM-compatible HTTP
+service). Both ends of a trip are snapped to geohash cells and the route
+between the cell centers is cached, in memory and optionally in a
+persistent store, so repeat corridors cost a dictionary lookup. Batches are
+routed and priced with NumPy in one pass.
+"""
+
+import json
+import logging
+import math
+import threading
+import urllib.request
+from collections import OrderedDict
+
+import numpy as np
+
+from geo import geohash_center, geohash_encode
+
+logger = logging.getLogger('edu_ride.fares')
+
+EARTH_RADIUS_M = 6371008.8
+
+
+class RoutingError(Exception):
+    pass
+
+
+class HaversineRouter:
+    """Great-circle distance scaled by a road factor at a fixed average speed"""
+
+    name = 'haversine'
+
+    def __init__(self, road_factor=1.35, speed_kmh=20.0):
+        self.road_factor = road_factor
+        self.speed_mps = speed_kmh / 3.6
+
+    def route_many(self, pickup_lat, pickup_lng, dropoff_lat, dropoff_lng):
+        """(distance_m, duration_s) arrays for paired pickups and drop-offs"""
+        phi1, phi2 = np.radians(pickup_lat), np.radians(dropoff_lat)
+        dphi = phi2 - phi1
+        dlmb = np.radians(np.asarray(dropoff_lng) - np.asarray(pickup_lng))
+        a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlmb / 2) ** 2
+        distance = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a)) * self.road_factor
+        return distance, distance / self.speed_mps
+
+
+class OSRMRouter:
+    """Client for the OSRM /route/v1 API (or anything that speaks it)"""
+
+    name = 'osrm'
+
+    def __init__(self, base_url, profile='driving', timeout=2.0):
+        self.base_url = base_url.rstrip('/')
+        self.profile = profile
+        self.timeout = timeout
+
+    def route(self, pickup_lat, pickup_lng, dropoff_lat, dropoff_lng):
+        url = (f'{self.base_url}/route/v1/{self.profile}/'
+               f'{pickup_lng:.6f},{pickup_lat:.6f};{dropoff_lng:.6f},{dropoff_lat:.6f}?overview=false')
+        try:
+            with urllib.request.urlopen(url, timeout=self.timeout) as response:
+                data = json.load(response)
+        except (OSError, ValueError) as e:
+            raise RoutingError(f'OSRM request failed: {e}') from e
+        if data.get('code') != 'Ok' or not data.get('routes'):
+            raise RoutingError(f"OSRM returned {data.get('code')}")
+        route = data['routes'][0]
+        return route['distance'], route['duration']
+
+    def route_many(self, pickup_lat, pickup_lng, dropoff_lat, dropoff_lng):
+        results = [self.route(*trip) for trip in zip(pickup_lat, pickup_lng, dropoff_lat, dropoff_lng)]
+        distance, duration = zip(*results) if results else ((), ())
+        return np.asarray(distance, dtype=np.float64), np.asarray(duration, dtype=np.float64)
+
+
+def load_router(name, osrm_url=None, road_factor=1.35, speed_kmh=20.0):
+    if name == 'osrm':
+        if not osrm_url:
+            raise ValueError('ROUTING_BACKEND=osrm needs OSRM_URL')
+        return OSRMRouter(osrm_url)
+    return HaversineRouter(road_factor=road_factor, speed_kmh=speed_kmh)
+
+
+class FareParams:
+    """Metered fare: a base fare covering the first base_km, then per km and per minute"""
+
+    def __init__(self, base_fare=23.0, base_km=1.5, per_km=15.33, per_minute=0.5, minimum=23.0):
+        self.base_fare = base_fare
+        self.base_km = base_km
+        self.per_km = per_km
+        self.per_minute = per_minute
+        self.minimum = minimum
+
+    def price(self, distance_m, duration_s):
+        """Fares in whole rupees for arrays of distances and durations"""
+        extra_km = np.maximum(np.asarray(distance_m) / 1000.0 - self.base_km, 0.0)
+        fare = self.base_fare + extra_km * self.per_km + np.asarray(duration_s) / 60.0 * self.per_minute
+        return np.ceil(np.maximum(fare, self.minimum))
+
+
+class FareEngine:
+    """Cached route lookups and fare pricing.
+
+    `lookup(keys)` and `store(entries)` connect a persistent cache: lookup
+    takes [(pickup_cell, dropoff_cell)] and returns {key: (distance_m,
+    duration_s)}; store takes the same mapping for newly routed corridors.
+    """
+
+    def __init__(self, router, params=None, precision=7, max_entries=50000,
+                 fallback=None, lookup=None, store=None):
+        self.router = router
+        self.params = params or FareParams()
+        self.precision = precision
+        self.max_entries = max_entries
+        self.fallback = fallback
+        self.lookup = lookup
+        self.store = store
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self._routes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cell_key(self, pickup_lat, pickup_lng, dropoff_lat, dropoff_lng):
+        return (geohash_encode(pickup_lat, pickup_lng, self.precision),
+                geohash_encode(dropoff_lat, dropoff_lng, self.precision))
+
+    def estimate_many(self, pickup_lat, pickup_lng, dropoff_lat, dropoff_lng):
+        """Route and price paired trips; returns a dict of NumPy arrays
+        (distance_m, duration_s, fare) plus a boolean `cached` mask."""
+        keys = [self.cell_key(*trip) for trip in zip(pickup_lat, pickup_lng, dropoff_lat, dropoff_lng)]
+        routes = {}
+        with self._lock:
+            for key in keys:
+                if key in self._routes:
+                    self._routes.move_to_end(key)
+                    routes[key] = self._routes[key]
+        cached = np.array([key in routes for key in keys], dtype=bool)
+        self.hits += int(cached.sum())
+
+        missing = list(dict.fromkeys(key for key in keys if key not in routes))
+        if missing and self.lookup is not None:
+            found = self.lookup(missing)
+            self.store_hits += len(found)
+            routes.update(found)
+            self._remember(found)
+            missing = [key for key in missing if key not in found]
+        if missing:
+            self.misses += len(missing)
+            routes.update(self._route_cells(missing))
+
+        distance = np.array([routes[key][0] for key in keys], dtype=np.float64)
+        duration = np.array([routes[key][1] for key in keys], dtype=np.float64)
+        return {
+            'distance_m': distance,
+            'duration_s': duration,
+            'fare': self.params.price(distance, duration),
+            'cached': cached,
+        }
+
+    def estimate(self, pickup_lat, pickup_lng, dropoff_lat, dropoff_lng):
+        result = self.estimate_many([pickup_lat], [pickup_lng], [dropoff_lat], [dropoff_lng])
+        return {
+            'distance_m': round(float(result['distance_m'][0])),
+            'duration_s': round(float(result['duration_s'][0])),
+            'fare': float(result['fare'][0]),
+            'cached': bool(result['cached'][0]),
+        }
+
+    def _route_cells(self, keys):
+        centers = [geohash_center(pickup) + geohash_center(dropoff) for pickup, dropoff in keys]
+        columns = [np.array(column, dtype=np.float64) for column in zip(*centers)]
+        persist = True
+        try:
+            distance, duration = self.router.route_many(*columns)
+        except RoutingError as e:
+            if self.fallback is None:
+                raise
+            logger.warning('Routing backend failed, using fallback: %s', e)
+            distance, duration = self.fallback.route_many(*columns)
+            persist = False  # don't pin fallback estimates in the shared cache
+        routes = {key: (float(d), float(t)) for key, d, t in zip(keys, distance, duration)}
+        self._remember(routes)
+        if persist and self.store is not None:
+            try:
+                self.store(routes)
+            except Exception as e:
+                logger.warning('Could not persist %d routes: %s', len(routes), e)
+        return routes
+
+    def _remember(self, routes):
+        with self._lock:
+            for key, value in routes.items():
+                self._routes[key] = value
+                self._routes.move_to_end(key)
+            while len(self._routes) > self.max_entries:
+                self._routes.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+
+    def stats(self):
+        total = self.hits + self.store_hits + self.misses
+        return {
+            'entries': len(self._routes),
+            'hits': self.hits,
+            'store_hits': self.store_hits,
+            'misses': self.misses,
+            'hit_ratio': (self.hits + self.store_hits) / total if total else 0.0,
+            'backend': self.router.name,
+        }
+
+    def __len__(self):
+        return len(self._routes)
+
+
+def format_duration(seconds):
+    minutes = max(1, math.ceil(seconds / 60))
+    return f'{minutes} min' if minutes < 60 else f'{minutes // 60} h {minutes % 60} min'
@@ -0,0 +1,147 @@
+"""
+Geospatial helpers for Edu-Ride
+
+GridIndex buckets available rides by pickup point into fixed-size lat/lng
+cells (the same idea as geohash prefixes). A radius query only inspects the
+handful of cells overlapping the search circle, so its cost depends on local
+ride density rather than on the total number of rides.
+"""
+
+import math
+import threading
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE_LAT = 111320.0
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """Great-circle distance in meters"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def valid_coordinates(lat, lng):
+    return lat is not None and lng is not None and -90 <= lat <= 90 and -180 <= lng <= 180
+
+
+_GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash_encode(lat, lng, precision=7):
+    """Standard base32 geohash; precision 7 is a ~150 m cell"""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lng_range, lng) if even else (lat_range, lat)
+        mid = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= mid:
+            value |= 1
+            interval[0] = mid
+        else:
+            interval[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def geohash_center(geohash):
+    """(lat, lng) at the center of a geohash cell"""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = _GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            interval = lng_range if even else lat_range
+            mid = (interval[0] + interval[1]) / 2
+            if value >> shift & 1:
+                interval[0] = mid
+            else:
+                interval[1] = mid
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lng_range[0] + lng_range[1]) / 2
+
+
+class GridIndex:
+    """Incrementally maintained point index with radius queries"""
+
+    def __init__(self, cell_degrees=0.01):
+        self.cell_degrees = cell_degrees
+        self._cells = {}
+        self._points = {}
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def _cell(self, lat, lng):
+        return (math.floor(lat / self.cell_degrees), math.floor(lng / self.cell_degrees))
+
+    def upsert(self, key, lat, lng, sort_value=0.0):
+        """Add or move a point; sort_value breaks distance ties (e.g. pickup time)"""
+        cell = self._cell(lat, lng)
+        with self._lock:
+            self._remove_locked(key)
+            self._cells.setdefault(cell, {})[key] = (lat, lng, sort_value)
+            self._points[key] = cell
+
+    def remove(self, key):
+        with self._lock:
+            self._remove_locked(key)
+
+    def _remove_locked(self, key):
+        cell = self._points.pop(key, None)
+        if cell is not None:
+            bucket = self._cells[cell]
+            del bucket[key]
+            if not bucket:
+                del self._cells[cell]
+
+    def nearby(self, lat, lng, radius_m, limit=None, order='distance'):
+        """Return [(key, distance_m)] within radius_m.
+
+        order='distance' sorts by distance then sort_value; order='time'
+        sorts by sort_value then distance.
+        """
+        dlat = radius_m / METERS_PER_DEGREE_LAT
+        cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+        dlng = min(radius_m / (METERS_PER_DEGREE_LAT * cos_lat), 180.0)
+        min_cell = self._cell(lat - dlat, lng - dlng)
+        max_cell = self._cell(lat + dlat, lng + dlng)
+
+        matches = []
+        with self._lock:
+            for x in range(min_cell[0], max_cell[0] + 1):
+                for y in range(min_cell[1], max_cell[1] + 1):
+                    bucket = self._cells.get((x, y))
+                    if not bucket:
+                        continue
+                    for key, (plat, plng, sort_value) in bucket.items():
+                        distance = haversine_m(lat, lng, plat, plng)
+                        if distance <= radius_m:
+                            matches.append((distance, sort_value, key))
+
+        if order == 'time':
+            matches.sort(key=lambda m: (m[1], m[0]))
+        else:
+            matches.sort()
+        if limit is not None:
+            matches = matches[:limit]
+        return [(key, distance) for distance, _, key in matches]
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._points.clear()
+            self.loaded = False
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, key):
+        return key in self._points
@@ -0,0 +1,71 @@
+"""
+Gunicorn settings for serving Edu-Ride in production
+
+Threaded workers: most requests wait on SQLite/SSE rather than the CPU, and
+CPU-heavy work already goes to the worker pool. Every setting can be
+overridden from the environment.
+"""
+
+import multiprocessing
+import os
+import signal
+
+bind = os.environ.get('BIND', f"{os.environ.get('FLASK_HOST', '0.0.0.0')}:{os.environ.get('FLASK_PORT', 5000)}")
+worker_class = 'gthread'
+# Import and build the app once in the master so workers fork with it
+# already loaded: faster worker start and more copy-on-write sharing.
+# Background threads and the CPU pool start lazily inside each worker.
+preload_app = True
+
+# One worker per core once EVENT_BUS is shared (redis://...): live events,
+# nearby-index updates and identity invalidations all travel over it, and
+# /api/rides ETags come from the database. The 'local' bus only reaches the
+# process that published, so without a shared bus there is one worker.
+_shared_bus = os.environ.get('EVENT_BUS', 'local') not in ('', 'local')
+workers = int(os.environ.get('WEB_CONCURRENCY') or (multiprocessing.cpu_count() if _shared_bus else 1))
+# Each open SSE stream holds a thread for up to SSE_MAX_STREAM_SECONDS;
+# SSE_MAX_STREAMS (a quarter of the threads by default) keeps the rest free
+threads = int(os.environ.get('GUNICORN_THREADS', 32))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG')
+errorlog = '-'
+
+
+def post_worker_init(worker):
+    """Close SSE streams as soon as the worker is asked to stop.
+
+    Gunicorn stops accepting connections on SIGTERM and waits up to
+    graceful_timeout for in-flight requests; long-lived event streams would
+    otherwise hold the worker for the whole window.
+    """
+    from app import event_bus
+
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def handle_term(signum, frame):
+        if hasattr(event_bus, 'close_all'):
+            event_bus.close_all()
+        if callable(previous):
+            previous(signum, frame)
+
+    signal.signal(signal.SIGTERM, handle_term)
+
+
+def worker_exit(server, worker):
+    # Final location flush and pool shutdown once in-flight requests are done
+    from app import shutdown_app
+    shutdown_app()
+
+
+def when_ready(server):
+    if workers > 1 and not _shared_bus:
+        server.log.warning('Running %d workers on the local EVENT_BUS: live updates, nearby search and '
+                           'cached identities only follow changes made in the same worker', workers)
+    if workers > 1 and os.environ.get('RATE_LIMIT_STORAGE', 'local') in ('', 'local'):
+        server.log.warning('Running %d workers with local RATE_LIMIT_STORAGE: each worker keeps its '
+                           'own buckets', workers)
@@ -0,0 +1,123 @@
+"""
+Cached identity for the logged-in user
+
+Flask-Login calls the user loader on every authenticated request, including
+every dashboard poll. IdentityCache keeps a small TTL+LRU map of immutable
+snapshots of user rows so those lookups skip the database. Snapshots are
+plain objects, never ORM instances, so they can be shared across threads
+and sessions safely. Writes to a user invalidate its entry on commit, in
+every worker sharing the event bus (see SYNC_CHANNEL in app.py); the TTL
+bounds staleness for writes that bypass the ORM session.
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from flask_login import UserMixin
+
+IDENTITY_FIELDS = ('id', 'username', 'email', 'phone', 'user_type', 'university',
+                   'license_number', 'vehicle_number', 'is_verified', 'created_at')
+
+
+class Identity(UserMixin):
+    """Read-only snapshot of a User row used as current_user"""
+
+    __slots__ = IDENTITY_FIELDS
+
+    def __init__(self, **fields):
+        for name in IDENTITY_FIELDS:
+            object.__setattr__(self, name, fields.get(name))
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(**{name: getattr(user, name) for name in IDENTITY_FIELDS})
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Identity is read-only; update the User row instead')
+
+    def __repr__(self):
+        return f'<Identity {self.id} {self.user_type}>'
+
+    def size(self):
+        """Approximate memory footprint in bytes"""
+        return sys.getsizeof(self) + sum(sys.getsizeof(getattr(self, name)) for name in IDENTITY_FIELDS)
+
+
+class IdentityCache:
+    """Thread-safe TTL+LRU cache of Identity snapshots keyed by user id"""
+
+    def __init__(self, max_entries=10000, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        self._entries = OrderedDict()  # user_id -> (expires_at, identity, size)
+        self._lock = threading.Lock()
+
+    def get(self, user_id, load):
+        """Return the cached identity, calling load(user_id) on a miss.
+
+        load returns a User (or None); misses for unknown ids are not cached.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        user = load(user_id)
+        if user is None:
+            self.invalidate(user_id)
+            return None
+        identity = Identity.from_user(user)
+        size = identity.size()
+        with self._lock:
+            old = self._entries.pop(user_id, None)
+            if old is not None:
+                self.bytes -= old[2]
+            self._entries[user_id] = (now + self.ttl, identity, size)
+            self.bytes += size
+            while len(self._entries) > self.max_entries:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+        return identity
+
+    def invalidate(self, user_id):
+        with self._lock:
+            entry = self._entries.pop(user_id, None)
+            if entry is not None:
+                self.bytes -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hit_ratio,
+                'bytes': self.bytes,
+            }
+
+    def __len__(self):
+        return len(self._entries)
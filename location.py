@@ -0,0 +1,155 @@
+"""
+Live driver location tracking for Edu-Ride
+
+Driver GPS fixes are kept in memory, one fixed-size ring buffer per ride,
+stored as flat float arrays rather than ORM rows. A background worker
+periodically persists a downsampled trail to the database so the SQL write
+rate depends on the number of active rides, not on the GPS update rate.
+"""
+
+import threading
+import time
+from array import array
+
+FIX_FIELDS = 3  # timestamp, lat, lng
+
+
+class FixRing:
+    """Fixed-capacity ring buffer of (timestamp, lat, lng) fixes"""
+
+    __slots__ = ('capacity', 'count', '_data', '_next')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.count = 0
+        self._data = array('d', [0.0]) * (capacity * FIX_FIELDS)
+        self._next = 0
+
+    def append(self, timestamp, lat, lng):
+        i = self._next * FIX_FIELDS
+        self._data[i] = timestamp
+        self._data[i + 1] = lat
+        self._data[i + 2] = lng
+        self._next = (self._next + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def latest(self):
+        if not self.count:
+            return None
+        i = ((self._next - 1) % self.capacity) * FIX_FIELDS
+        return tuple(self._data[i:i + FIX_FIELDS])
+
+    def snapshot(self, limit=None):
+        """Return fixes oldest-first, optionally only the newest `limit`"""
+        n = self.count if limit is None else min(limit, self.count)
+        start = (self._next - n) % self.capacity
+        fixes = []
+        for k in range(n):
+            i = ((start + k) % self.capacity) * FIX_FIELDS
+            fixes.append(tuple(self._data[i:i + FIX_FIELDS]))
+        return fixes
+
+
+class RideTrack:
+    """Location state for one active ride"""
+
+    __slots__ = ('ride_id', 'driver_id', 'fixes', 'last_persisted', 'last_update', 'checked_at', 'finished')
+
+    def __init__(self, ride_id, driver_id, capacity):
+        self.ride_id = ride_id
+        self.driver_id = driver_id
+        self.fixes = FixRing(capacity)
+        self.last_persisted = 0.0
+        self.last_update = 0.0
+        self.checked_at = 0.0  # when the ride's status was last confirmed active
+        self.finished = False
+
+
+class LocationStore:
+    """Thread-safe registry of ride tracks"""
+
+    def __init__(self, capacity=120, persist_interval=30, idle_timeout=3600, status_recheck=60):
+        self.capacity = capacity
+        self.persist_interval = persist_interval
+        self.idle_timeout = idle_timeout
+        self.status_recheck = status_recheck
+        self._tracks = {}
+        self._lock = threading.Lock()
+
+    def get(self, ride_id):
+        return self._tracks.get(ride_id)
+
+    def open(self, ride_id, driver_id):
+        """The ride's track, created if needed; call after confirming the ride is active"""
+        with self._lock:
+            track = self._tracks.get(ride_id)
+            if track is None:
+                track = self._tracks[ride_id] = RideTrack(ride_id, driver_id, self.capacity)
+            track.checked_at = time.time()
+            return track
+
+    def needs_check(self, track, now=None):
+        """Whether the ride's status should be re-read before taking more fixes"""
+        now = time.time() if now is None else now
+        return track.finished or now - track.checked_at > self.status_recheck
+
+    def append(self, track, points):
+        """Append (timestamp, lat, lng) points and return the newest fix"""
+        with self._lock:
+            for timestamp, lat, lng in sorted(points):
+                track.fixes.append(timestamp, lat, lng)
+            track.last_update = time.time()
+            return track.fixes.latest()
+
+    def latest(self, ride_id):
+        track = self._tracks.get(ride_id)
+        if track is None:
+            return None
+        with self._lock:
+            return track.fixes.latest()
+
+    def recent(self, ride_id, limit=None):
+        track = self._tracks.get(ride_id)
+        if track is None:
+            return []
+        with self._lock:
+            return track.fixes.snapshot(limit)
+
+    def finish(self, ride_id):
+        """Mark a ride's track for a final flush and removal"""
+        with self._lock:
+            track = self._tracks.get(ride_id)
+            if track is not None:
+                track.finished = True
+
+    def drain(self, now=None):
+        """Collect downsampled fixes not yet persisted.
+
+        Returns a list of (ride_id, timestamp, lat, lng). At most one fix per
+        persist_interval is kept per ride, plus the final fix of a finished
+        ride. Finished and idle tracks are dropped.
+        """
+        now = time.time() if now is None else now
+        rows = []
+        with self._lock:
+            for ride_id, track in list(self._tracks.items()):
+                for fix in track.fixes.snapshot():
+                    if fix[0] >= track.last_persisted + self.persist_interval:
+                        rows.append((ride_id,) + fix)
+                        track.last_persisted = fix[0]
+                if track.finished:
+                    final = track.fixes.latest()
+                    if final is not None and final[0] > track.last_persisted:
+                        rows.append((ride_id,) + final)
+                    del self._tracks[ride_id]
+                elif now - track.last_update > self.idle_timeout:
+                    del self._tracks[ride_id]
+        return rows
+
+    def clear(self):
+        with self._lock:
+            self._tracks.clear()
+
+    def __len__(self):
+        return len(self._tracks)
@@ -0,0 +1,312 @@
+"""
+Batch matching of student ride requests to group rides
+
+Given a batch of pending requests and the available group rides, compute
+cost matrices with NumPy (pickup detour, drop-off detour and time-window
+mismatch) and keep the cheapest few feasible rides per request. Those
+candidates are then assigned with an auction algorithm for the
+capacitated assignment problem, which minimises total cost plus a fixed
+penalty per unmatched request; the result is optimal over the candidates
+to within `epsilon` per request. Requests are processed in chunks so
+memory stays bounded at 50k x 5k scale.
+"""
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+
+
+class MatchParams:
+    """Tuning knobs for the matching cost"""
+
+    def __init__(self, max_detour_m=2000.0, max_wait_s=1800.0, seconds_weight=5.0,
+                 dropoff_weight=0.5, candidates=8, chunk_size=512, unmatched_cost=None, epsilon=1.0):
+        self.max_detour_m = max_detour_m      # farthest acceptable walk to the ride's pickup
+        self.max_wait_s = max_wait_s          # largest allowed miss of the requested time window
+        self.seconds_weight = seconds_weight  # meters of detour one second of mismatch is worth
+        self.dropoff_weight = dropoff_weight
+        self.candidates = candidates          # rides kept per request before assignment
+        self.chunk_size = chunk_size
+        self.unmatched_cost = unmatched_cost  # default: twice the dearest feasible pickup
+        self.epsilon = epsilon                # largest per-request gap from the optimal cost
+
+
+class RequestBatch:
+    """Column arrays describing pending requests.
+
+    Times are unix seconds; unknown drop-offs are NaN. `owners` identifies
+    the student behind each request so one student never gets two seats on
+    the same ride.
+    """
+
+    def __init__(self, pickup_lat, pickup_lng, earliest, latest,
+                 dropoff_lat=None, dropoff_lng=None, owners=None):
+        self.pickup_lat = np.asarray(pickup_lat, dtype=np.float64)
+        self.pickup_lng = np.asarray(pickup_lng, dtype=np.float64)
+        self.earliest = np.asarray(earliest, dtype=np.float64)
+        self.latest = np.asarray(latest, dtype=np.float64)
+        n = len(self.pickup_lat)
+        self.dropoff_lat = _optional(dropoff_lat, n)
+        self.dropoff_lng = _optional(dropoff_lng, n)
+        self.owners = np.arange(n) if owners is None else np.asarray(owners)
+
+    def __len__(self):
+        return len(self.pickup_lat)
+
+    def slice(self, start, stop):
+        return RequestBatch(self.pickup_lat[start:stop], self.pickup_lng[start:stop],
+                            self.earliest[start:stop], self.latest[start:stop],
+                            self.dropoff_lat[start:stop], self.dropoff_lng[start:stop],
+                            self.owners[start:stop])
+
+
+class RideBatch:
+    """Column arrays describing available group rides"""
+
+    def __init__(self, pickup_lat, pickup_lng, pickup_time, seats,
+                 dropoff_lat=None, dropoff_lng=None):
+        self.pickup_lat = np.asarray(pickup_lat, dtype=np.float64)
+        self.pickup_lng = np.asarray(pickup_lng, dtype=np.float64)
+        self.pickup_time = np.asarray(pickup_time, dtype=np.float64)
+        self.seats = np.asarray(seats, dtype=np.int64)
+        n = len(self.pickup_lat)
+        self.dropoff_lat = _optional(dropoff_lat, n)
+        self.dropoff_lng = _optional(dropoff_lng, n)
+
+    def __len__(self):
+        return len(self.pickup_lat)
+
+
+class MatchResult:
+    """Assignments plus quality statistics"""
+
+    def __init__(self, request_idx, ride_idx, detour_m, mismatch_s, cost, best_cost):
+        self.request_idx = request_idx
+        self.ride_idx = ride_idx
+        self.detour_m = detour_m
+        self.mismatch_s = mismatch_s
+        self.cost = cost
+        self.best_cost = best_cost
+
+    def __len__(self):
+        return len(self.request_idx)
+
+    def stats(self, total_requests):
+        matched = len(self)
+        return {
+            'requests': total_requests,
+            'matched': matched,
+            'match_rate': matched / total_requests if total_requests else 0.0,
+            'mean_detour_m': float(self.detour_m.mean()) if matched else 0.0,
+            'mean_mismatch_s': float(self.mismatch_s.mean()) if matched else 0.0,
+            # 1.0 means every matched request got its cheapest feasible ride
+            'cost_vs_unconstrained': float(self.cost.sum() / self.best_cost.sum())
+            if matched and self.best_cost.sum() > 0 else 1.0,
+        }
+
+
+def _optional(values, n):
+    if values is None:
+        return np.full(n, np.nan)
+    return np.asarray(values, dtype=np.float64)
+
+
+def project(lat, lng, ref_lat):
+    """Equirectangular projection to planar meters around ref_lat.
+
+    Within a city the error against great-circle distance is well under 1%,
+    and it turns each distance matrix into a few float32 subtract/multiply
+    passes instead of trigonometry per pair.
+    """
+    scale = np.pi / 180 * EARTH_RADIUS_M
+    x = (np.asarray(lng) * (scale * np.cos(np.radians(ref_lat)))).astype(np.float32)
+    y = (np.asarray(lat) * scale).astype(np.float32)
+    return x, y
+
+
+def distance_matrix(x1, y1, x2, y2):
+    """Pairwise planar distances in meters, shape (len(x1), len(x2))"""
+    dx = x1[:, None] - x2[None, :]
+    dy = y1[:, None] - y2[None, :]
+    return np.sqrt(dx * dx + dy * dy)
+
+
+class _Projected:
+    """Planar coordinates of a request or ride batch"""
+
+    def __init__(self, batch, ref_lat):
+        self.x, self.y = project(batch.pickup_lat, batch.pickup_lng, ref_lat)
+        self.has_dropoff = bool(np.isfinite(batch.dropoff_lat).any())
+        if self.has_dropoff:
+            self.dx, self.dy = project(batch.dropoff_lat, batch.dropoff_lng, ref_lat)
+
+
+def cost_matrices(requests, rides, params, ref_lat=None):
+    """Return (detour_m, mismatch_s, cost) matrices; infeasible pairs cost inf"""
+    if ref_lat is None:
+        ref_lat = float(np.mean(rides.pickup_lat))
+    req_xy = _Projected(requests, ref_lat)
+    ride_xy = _Projected(rides, ref_lat)
+    return _cost_matrices(requests, rides, req_xy, ride_xy, params)
+
+
+def _cost_matrices(requests, rides, req_xy, ride_xy, params):
+    detour = distance_matrix(req_xy.x, req_xy.y, ride_xy.x, ride_xy.y)
+    # Unix times are ~2**31 s, where float32 steps are 128 s apart; offsets
+    # from the earliest ride keep subsecond precision
+    t0 = rides.pickup_time.min()
+    t = (rides.pickup_time - t0).astype(np.float32)[None, :]
+    mismatch = (np.maximum((requests.earliest - t0).astype(np.float32)[:, None] - t, 0)
+                + np.maximum(t - (requests.latest - t0).astype(np.float32)[:, None], 0))
+
+    cost = detour + np.float32(params.seconds_weight) * mismatch
+    if params.dropoff_weight and req_xy.has_dropoff and ride_xy.has_dropoff:
+        dropoff = distance_matrix(req_xy.dx, req_xy.dy, ride_xy.dx, ride_xy.dy)
+        cost += np.float32(params.dropoff_weight) * np.nan_to_num(dropoff, nan=0.0)
+
+    infeasible = (detour > params.max_detour_m) | (mismatch > params.max_wait_s)
+    infeasible |= (rides.seats <= 0)[None, :]
+    cost[infeasible] = np.inf
+    return detour, mismatch, cost
+
+
+def _candidates(requests, rides, params):
+    """Cheapest feasible rides per request, as flat (cost, req, ride, detour, mismatch) arrays"""
+    parts = []
+    k = min(params.candidates, len(rides))
+    ref_lat = float(np.mean(rides.pickup_lat))
+    ride_xy = _Projected(rides, ref_lat)
+    for start in range(0, len(requests), params.chunk_size):
+        chunk = requests.slice(start, start + params.chunk_size)
+        detour, mismatch, cost = _cost_matrices(chunk, rides, _Projected(chunk, ref_lat), ride_xy, params)
+        if k < len(rides):
+            cols = np.argpartition(cost, k - 1, axis=1)[:, :k]
+        else:
+            cols = np.broadcast_to(np.arange(len(rides)), cost.shape)
+        rows = np.broadcast_to(np.arange(len(chunk))[:, None], cols.shape)
+        picked = cost[rows, cols]
+        keep = np.isfinite(picked)
+        parts.append((picked[keep], rows[keep] + start, cols[keep],
+                      detour[rows, cols][keep], mismatch[rows, cols][keep]))
+
+    if not parts:
+        empty = np.empty(0)
+        return empty, empty.astype(np.int64), empty.astype(np.int64), empty, empty
+    return tuple(np.concatenate(column) for column in zip(*parts))
+
+
+def _segments(starts, counts):
+    """Flat indexes of the runs [starts[i], starts[i] + counts[i]), and where each run begins"""
+    run_start = np.cumsum(counts) - counts
+    idx = np.arange(int(counts.sum())) - np.repeat(run_start, counts) + np.repeat(starts, counts)
+    return idx, run_start
+
+
+def auction(req, ride, cost, seats, n_requests, unmatched_cost, epsilon):
+    """Optimal capacitated assignment over candidate pairs.
+
+    Minimises the cost of the chosen pairs plus `unmatched_cost` per request
+    left out, to within `epsilon` per request, with at most seats[j]
+    requests on ride j. Bertsekas' auction, bidding for all unassigned
+    requests at once: a ride's price is the lowest bid it holds once full,
+    and each request bids what its best ride is worth over its next best
+    (or over staying unmatched). Returns the indexes of the chosen pairs.
+    """
+    order = np.flatnonzero(seats[ride] > 0)
+    order = order[np.argsort(req[order], kind='stable')]
+    req, ride, benefit = req[order], ride[order], unmatched_cost - cost[order]
+    counts = np.bincount(req, minlength=n_requests)
+    offsets = np.cumsum(counts) - counts
+    price = np.zeros(len(seats))
+    held = np.full(n_requests, -1)  # pair each request holds
+    held_bid = np.zeros(n_requests)
+    bidding = counts > 0
+    while True:
+        bidders = np.flatnonzero(bidding & (held < 0))
+        if not len(bidders):
+            break
+        idx, run_start = _segments(offsets[bidders], counts[bidders])
+        run = np.repeat(np.arange(len(bidders)), counts[bidders])
+        value = benefit[idx] - price[ride[idx]]
+        best = np.maximum.reduceat(value, run_start)
+        top = np.flatnonzero(value == best[run])
+        top = top[np.unique(run[top], return_index=True)[1]]
+        value[top] = -np.inf
+        second = np.maximum(np.maximum.reduceat(value, run_start), 0)
+        # Prices only rise, so a request no ride is worth anything to stays out
+        worth = best > 0
+        bidding[bidders[~worth]] = False
+        bidders, pair = bidders[worth], idx[top][worth]
+        bid = price[ride[pair]] + best[worth] - second[worth] + epsilon
+
+        # Each ride bid on keeps its highest bids among holders and bidders
+        contested = np.unique(ride[pair])
+        holders = np.flatnonzero(held >= 0)
+        holders = holders[np.isin(ride[held[holders]], contested)]
+        who = np.concatenate((holders, bidders))
+        what = np.concatenate((held[holders], pair))
+        amount = np.concatenate((held_bid[holders], bid))
+        rank_order = np.lexsort((-amount, ride[what]))
+        who, what, amount = who[rank_order], what[rank_order], amount[rank_order]
+        j = ride[what]
+        rank = np.arange(len(j)) - np.searchsorted(j, j)
+        keep = rank < seats[j]
+        held[who[~keep]] = -1
+        held[who[keep]] = what[keep]
+        held_bid[who[keep]] = amount[keep]
+        full = keep & (rank == seats[j] - 1)
+        price[contested] = 0
+        price[j[full]] = amount[full]
+
+    assigned = np.flatnonzero(held >= 0)
+    return order[held[assigned]]
+
+
+def match(requests, rides, params=None, blocked=()):
+    """Assign requests to rides at the least total cost.
+
+    `blocked` holds (owner, ride_idx) pairs that must not be assigned, e.g.
+    students who already sit on that ride.
+    """
+    params = params or MatchParams()
+    empty = MatchResult(*(np.empty(0, dtype=dtype) for dtype in
+                          (np.int64, np.int64, np.float64, np.float64, np.float64, np.float64)))
+    if not len(requests) or not len(rides):
+        return empty
+
+    cost, req, ride, detour, mismatch = _candidates(requests, rides, params)
+    if not len(cost):
+        return empty
+
+    # Cheapest candidate per request, for the quality report
+    best = np.full(len(requests), np.inf)
+    np.minimum.at(best, req, cost)
+
+    if blocked:
+        allowed = np.array([(owner, j) not in blocked
+                            for owner, j in zip(requests.owners[req].tolist(), ride.tolist())], dtype=bool)
+        cost, req, ride, detour, mismatch = (column[allowed] for column in (cost, req, ride, detour, mismatch))
+    unmatched_cost = params.unmatched_cost
+    if unmatched_cost is None:
+        unmatched_cost = 2 * (params.max_detour_m + params.seconds_weight * params.max_wait_s)
+    cost64 = cost.astype(np.float64)
+
+    # A student with several requests takes one seat per ride at most: when
+    # two of theirs land on one ride, the dearer pair is dropped and the
+    # batch solved again
+    usable = np.ones(len(cost), dtype=bool)
+    while True:
+        pairs = np.flatnonzero(usable)
+        chosen = pairs[auction(req[pairs], ride[pairs], cost64[pairs], rides.seats, len(requests),
+                               unmatched_cost, params.epsilon)]
+        chosen = chosen[np.lexsort((cost[chosen], ride[chosen], requests.owners[req[chosen]]))]
+        owner_ride = np.stack((requests.owners[req[chosen]], ride[chosen]))
+        repeat = np.zeros(len(chosen), dtype=bool)
+        repeat[1:] = (owner_ride[:, 1:] == owner_ride[:, :-1]).all(axis=0)
+        if not repeat.any():
+            break
+        usable[chosen[repeat]] = False
+
+    chosen = chosen[np.argsort(req[chosen], kind='stable')]
+    return MatchResult(req[chosen], ride[chosen], detour[chosen], mismatch[chosen],
+                       cost[chosen], best[req[chosen]])
@@ -0,0 +1,351 @@
+"""
+Request instrumentation for Edu-Ride
+
+Collects per-route latency histograms, SQL statement counts and time per
+request (from SQLAlchemy engine events), logs slow queries, and renders
+everything in the Prometheus text format. An opt-in sampling profiler
+records folded stacks (flamegraph.pl / speedscope input) for slow requests.
+Logging goes through a QueueHandler so request threads never block on I/O.
+"""
+
+import atexit
+import collections
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from contextvars import ContextVar
+
+from flask import g, request
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SQL_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+logger = logging.getLogger('edu_ride')
+
+# SQL stats of the request running in this context, if any
+_request_stats = ContextVar('edu_ride_request_stats', default=None)
+
+_listener = None  # this process's QueueListener
+
+
+def _start_listener(handler, target):
+    global _listener
+    if _listener is not None:
+        atexit.unregister(_listener.stop)
+    handler.queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(handler.queue, target, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def setup_logging(level=logging.INFO):
+    """Route the 'edu_ride' logger through a background queue listener.
+
+    Forked children (gunicorn workers with preload_app) inherit the handler
+    but not the listener thread, so each child starts its own.
+    """
+    if any(isinstance(h, logging.handlers.QueueHandler) for h in logger.handlers):
+        return logger
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(name)s: %(message)s'))
+    handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+    _start_listener(handler, stream)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=lambda: _start_listener(handler, stream))
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+    return logger
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def collect(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for values, total in items:
+            yield f'{self.name}{_labels(self.label_names, values)} {total}'
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *label_values):
+        series = self._series.get(label_values)
+        return series[2] if series else 0
+
+    def sum(self, *label_values):
+        series = self._series.get(label_values)
+        return series[1] if series else 0.0
+
+    def collect(self):
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._series.items())
+        for values, (counts, total, n) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                le = 'le="%s"' % bound
+                yield f'{self.name}_bucket{_labels(self.label_names, values, le)} {cumulative}'
+            inf = 'le="+Inf"'
+            yield f'{self.name}_bucket{_labels(self.label_names, values, inf)} {n}'
+            yield f'{self.name}_sum{_labels(self.label_names, values)} {total}'
+            yield f'{self.name}_count{_labels(self.label_names, values)} {n}'
+
+
+class Gauge:
+    """Gauge read from a callback at scrape time"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, read):
+        self.name = name
+        self.help = help_text
+        self.read = read
+
+    def collect(self):
+        try:
+            value = self.read()
+        except Exception as e:
+            logger.warning('Gauge %s failed: %s', self.name, e)
+            return
+        yield f'{self.name} {value}'
+
+
+class CallbackCounter(Gauge):
+    """Monotonic count kept elsewhere (e.g. a cache's hits), read at scrape time"""
+
+    kind = 'counter'
+
+
+class RequestStats:
+    """SQL activity of one request"""
+
+    __slots__ = ('statements', 'sql_seconds', 'started')
+
+    def __init__(self):
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.started = time.perf_counter()
+
+
+class SamplingProfiler(threading.Thread):
+    """Samples one thread's stack at a fixed interval into folded stacks"""
+
+    def __init__(self, thread_id, interval=0.005):
+        super().__init__(name='request-profiler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(names))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        return self.stacks
+
+    def folded(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class Instrumentation:
+    """Metrics registry plus the Flask and SQLAlchemy hooks that feed it"""
+
+    def __init__(self, app=None, engine=None):
+        self.metrics = []
+        self.requests = self.counter('edu_ride_requests_total', 'HTTP requests handled',
+                                     ('endpoint', 'method', 'status'))
+        self.latency = self.histogram('edu_ride_request_duration_seconds', 'Request latency',
+                                      ('endpoint', 'method'))
+        self.sql_count = self.histogram('edu_ride_request_sql_statements', 'SQL statements per request',
+                                        ('endpoint',), SQL_COUNT_BUCKETS)
+        self.sql_time = self.histogram('edu_ride_request_sql_seconds', 'SQL time per request',
+                                       ('endpoint',), SQL_TIME_BUCKETS)
+        self.slow_queries = self.counter('edu_ride_slow_queries_total', 'Statements over SLOW_QUERY_MS')
+        self.profiles = self.counter('edu_ride_profiles_written_total', 'Slow-request profiles dumped')
+        self.slow_query_seconds = 0.2
+        self.profile_dir = None
+        self.profile_threshold = 0.5
+        self.profile_interval = 0.005
+        self.server_timing = False
+        if app is not None:
+            self.init_app(app, engine)
+
+    def counter(self, name, help_text, labels=()):
+        metric = Counter(name, help_text, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help_text, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name, help_text, read):
+        metric = Gauge(name, help_text, read)
+        self.metrics.append(metric)
+        return metric
+
+    def callback_counter(self, name, help_text, read):
+        metric = CallbackCounter(name, help_text, read)
+        self.metrics.append(metric)
+        return metric
+
+    def init_app(self, app, engine):
+        self.slow_query_seconds = app.config.get('SLOW_QUERY_MS', 200) / 1000
+        self.profile_dir = app.config.get('PROFILE_DIR') if app.config.get('PROFILE_REQUESTS') else None
+        self.profile_threshold = app.config.get('PROFILE_THRESHOLD_MS', 500) / 1000
+        self.server_timing = app.config.get('SERVER_TIMING', False)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        app.extensions['metrics'] = self
+
+    # Flask hooks
+
+    def _before_request(self):
+        g._request_stats_token = _request_stats.set(RequestStats())
+        if self.profile_dir:
+            g._profiler = SamplingProfiler(threading.get_ident(), self.profile_interval)
+            g._profiler.start()
+
+    def _after_request(self, response):
+        stats = _request_stats.get()
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - stats.started
+        endpoint = request.endpoint or 'unmatched'
+        self.requests.inc(endpoint, request.method, response.status_code)
+        self.latency.observe(elapsed, endpoint, request.method)
+        self.sql_count.observe(stats.statements, endpoint)
+        self.sql_time.observe(stats.sql_seconds, endpoint)
+        if self.server_timing:
+            response.headers['Server-Timing'] = (
+                f'app;dur={elapsed * 1000:.1f}, '
+                f'sql;dur={stats.sql_seconds * 1000:.1f};desc="{stats.statements} statements"'
+            )
+
+        profiler = g.pop('_profiler', None)
+        if profiler is not None:
+            profiler.stop()
+            if elapsed >= self.profile_threshold and profiler.stacks:
+                self._write_profile(endpoint, elapsed, profiler)
+        return response
+
+    def _teardown_request(self, exc):
+        profiler = g.pop('_profiler', None)
+        if profiler is not None:
+            profiler.stop()
+        token = g.pop('_request_stats_token', None)
+        if token is not None:
+            _request_stats.reset(token)
+
+    def _write_profile(self, endpoint, elapsed, profiler):
+        try:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = os.path.join(self.profile_dir, f'{endpoint}-{int(time.time() * 1000)}-{elapsed * 1000:.0f}ms.folded')
+            with open(path, 'w') as f:
+                f.write(profiler.folded())
+            self.profiles.inc()
+            logger.info('Wrote profile for slow %s request (%.0f ms) to %s', endpoint, elapsed * 1000, path)
+        except OSError as e:
+            logger.error('Could not write profile: %s', e)
+
+    # SQLAlchemy hooks
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('query_start')
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.sql_seconds += elapsed
+        if elapsed >= self.slow_query_seconds:
+            self.slow_queries.inc()
+            # Statement text only; parameters may hold personal data
+            logger.warning('Slow query (%.0f ms): %s', elapsed * 1000, ' '.join(statement.split())[:500])
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,80 @@
+"""
+Idempotent schema migrations for Edu-Ride
+
+`upgrade` brings an existing database up to the current models without
+dropping anything: missing tables are created, missing nullable columns
+are added with ALTER TABLE, and missing indexes and unique constraints are
+created as indexes. Callables in metadata.info['upgrade_prepare_hooks'] run
+first, to fix existing rows a new unique index would reject; callables in
+metadata.info['upgrade_hooks'] then add dialect-specific objects. Running it
+again is a no-op.
+
+    flask --app app upgrade-db
+"""
+
+import click
+from flask import current_app
+from sqlalchemy import UniqueConstraint, inspect, text
+
+
+def upgrade(engine, metadata):
+    """Apply additive schema changes; returns a list of what was done"""
+    applied = []
+    with engine.begin() as conn:
+        for hook in metadata.info.get('upgrade_prepare_hooks', ()):
+            applied.extend(hook(conn))
+        inspector = inspect(conn)
+        existing_tables = set(inspector.get_table_names())
+
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                table.create(conn)
+                applied.append(f'create table {table.name}')
+                continue
+
+            existing_columns = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                if not column.nullable:
+                    raise RuntimeError(f'Cannot add NOT NULL column {table.name}.{column.name} to existing rows; '
+                                       f'add it as nullable and backfill first')
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                applied.append(f'add column {table.name}.{column.name}')
+
+            indexes = inspector.get_indexes(table.name)
+            uniques = inspector.get_unique_constraints(table.name)
+            existing_names = {i['name'] for i in indexes} | {u['name'] for u in uniques}
+            unique_columns = {tuple(u['column_names']) for u in uniques}
+            unique_columns |= {tuple(i['column_names']) for i in indexes if i.get('unique')}
+            for index in table.indexes:
+                if index.name not in existing_names:
+                    index.create(conn)
+                    applied.append(f'create index {index.name}')
+            for constraint in table.constraints:
+                if not isinstance(constraint, UniqueConstraint) or not constraint.name:
+                    continue
+                columns = tuple(c.name for c in constraint.columns)
+                if constraint.name in existing_names or columns in unique_columns:
+                    continue
+                # Tables can't gain constraints in SQLite; a unique index enforces the same rule
+                conn.execute(text(f'CREATE UNIQUE INDEX {constraint.name} ON {table.name} ({", ".join(columns)})'))
+                applied.append(f'create unique index {constraint.name}')
+
+        # Objects the models can't describe (full-text indexes, triggers) are
+        # installed by hooks registered in metadata.info; each returns its steps
+        for hook in metadata.info.get('upgrade_hooks', ()):
+            applied.extend(hook(conn))
+    return applied
+
+
+@click.command('upgrade-db')
+def upgrade_command():
+    """Create or upgrade the database schema in place."""
+    db = current_app.extensions['sqlalchemy']
+    applied = upgrade(db.engine, db.metadata)
+    for step in applied:
+        click.echo(f'[SUCCESS] {step}')
+    if not applied:
+        click.echo('[INFO] Database schema is up to date')
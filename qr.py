@@ -0,0 +1,117 @@
+"""
+Payment QR code rendering with caching
+
+QR images are pure functions of their payload, so each rendered image is
+cached under the SHA-256 of (format, payload): first in a bounded in-memory
+LRU, then optionally in an on-disk content-addressed directory shared by all
+workers. The same digest doubles as a strong ETag.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger('edu_ride.qr')
+
+FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+
+def qr_digest(payload, fmt):
+    return hashlib.sha256(f'{fmt}\n{payload}'.encode()).hexdigest()
+
+
+def render_qr(payload, fmt='png'):
+    """Render a payload to PNG or SVG bytes"""
+    # qrcode pulls in Pillow; import on first render, not at app startup
+    import qrcode
+    import qrcode.image.svg
+
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(payload)
+    qr.make(fit=True)
+
+    buffer = io.BytesIO()
+    if fmt == 'svg':
+        qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(buffer)
+    else:
+        qr.make_image(fill_color="black", back_color="white").save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class QRCache:
+    """Two-level cache of rendered QR images keyed by content digest"""
+
+    def __init__(self, max_entries=512, cache_dir=None, renderer=render_qr):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.renderer = renderer
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, payload, fmt='png'):
+        """Return (digest, image bytes), rendering only on a full miss"""
+        digest = qr_digest(payload, fmt)
+        with self._lock:
+            image = self._entries.get(digest)
+            if image is not None:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return digest, image
+
+        image = self._read_disk(digest, fmt)
+        if image is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            image = self.renderer(payload, fmt)
+            self._write_disk(digest, fmt, image)
+
+        with self._lock:
+            self._entries[digest] = image
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return digest, image
+
+    def _path(self, digest, fmt):
+        return os.path.join(self.cache_dir, digest[:2], f'{digest}.{fmt}')
+
+    def _read_disk(self, digest, fmt):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._path(digest, fmt), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_disk(self, digest, fmt, image):
+        if not self.cache_dir:
+            return
+        path = self._path(digest, fmt)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so concurrent readers never see a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(image)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error('Could not write QR cache file: %s', e)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,183 @@
+"""
+Token-bucket rate limiting per user, IP and route
+
+RATE_LIMITS maps endpoints (optionally prefixed with a method, e.g.
+'POST main.login') to rules of ``(scope, count, per_seconds)``: a bucket
+of ``count`` tokens refilled at ``count / per_seconds`` per second. The
+scope picks the bucket key:
+
+- ``ip``: the client address (see PROXY_FIX_X_FOR behind a proxy)
+- ``user``: the logged-in user, or the client address when anonymous
+- ``username``: the ``username`` form field, e.g. the account targeted by
+  login attempts; skipped when absent
+
+Buckets live in a store. LocalBucketStore keeps them in process memory.
+Several workers can share limits through RedisBucketStore (the optional
+``redis`` package), or through any class with the same ``take`` method,
+named by RATE_LIMIT_STORAGE (e.g. 'mypackage.buckets:MemcacheBucketStore').
+"""
+
+import importlib
+import math
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import current_app, request
+from flask_login import current_user
+
+try:
+    import redis
+except ImportError:  # optional; only needed for RATE_LIMIT_STORAGE=redis://...
+    redis = None
+
+Decision = namedtuple('Decision', 'allowed remaining retry_after')
+
+SCOPES = ('ip', 'user', 'username')
+
+
+class RateLimited(Exception):
+    """Raised when a request has used up one of its buckets"""
+
+    def __init__(self, retry_after, scope=None):
+        super().__init__(f'Rate limit exceeded, retry after {retry_after}s')
+        self.retry_after = retry_after
+        self.scope = scope
+
+
+def refill(tokens, updated, now, rate, burst, cost=1):
+    """Token-bucket step: returns (Decision, tokens left)"""
+    tokens = min(burst, tokens + max(now - updated, 0.0) * rate)
+    if tokens >= cost:
+        tokens -= cost
+        return Decision(True, int(tokens), 0), tokens
+    return Decision(False, 0, math.ceil((cost - tokens) / rate)), tokens
+
+
+class LocalBucketStore:
+    """Buckets in process memory, least recently used evicted first.
+
+    An evicted bucket comes back full, so max_entries should comfortably
+    exceed the number of clients active within a refill period.
+    """
+
+    def __init__(self, max_entries=100000, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, cost=1):
+        with self._lock:
+            now = self.clock()
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            decision, tokens = refill(tokens, updated, now, rate, burst, cost)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+        return decision
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+# KEYS[1] bucket; ARGV rate, burst, cost. Uses the server clock so every
+# worker sees the same time.
+_REDIS_TAKE = """
+local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(now - updated, 0) * rate)
+local allowed = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBucketStore:
+    """Buckets shared by every worker through Redis, one atomic script call
+    per check. Idle buckets expire once they would be full again."""
+
+    def __init__(self, url='redis://localhost:6379/0', prefix='edu_ride:ratelimit:', client=None):
+        if client is None:
+            if redis is None:
+                raise RuntimeError('RATE_LIMIT_STORAGE=redis:// needs the redis package')
+            client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._take = client.register_script(_REDIS_TAKE)
+
+    def take(self, key, rate, burst, cost=1):
+        allowed, tokens = self._take(keys=[self.prefix + key], args=[rate, burst, cost])
+        tokens = float(tokens)
+        if allowed:
+            return Decision(True, int(tokens), 0)
+        return Decision(False, 0, math.ceil((cost - tokens) / rate))
+
+
+def load_bucket_store(spec='local', **options):
+    """Create a bucket store from 'local', a redis:// URL or a 'module:ClassName' spec"""
+    if spec in (None, '', 'local'):
+        return LocalBucketStore(**options)
+    if spec.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBucketStore(spec, **options)
+    module_name, _, attr = spec.partition(':')
+    return getattr(importlib.import_module(module_name), attr)(**options)
+
+
+class RateLimiter:
+    """Checks each request against the RATE_LIMITS rules for its endpoint"""
+
+    def __init__(self, store, rules=None, on_limited=None):
+        self.store = store
+        self.rules = {}
+        self.on_limited = on_limited  # called with (endpoint, scope) for each rejection
+        for target, endpoint_rules in (rules or {}).items():
+            for scope, count, per_seconds in endpoint_rules:
+                if scope not in SCOPES:
+                    raise ValueError(f'Unknown rate limit scope {scope!r} for {target}')
+                self.rules.setdefault(target, []).append((scope, count / per_seconds, count))
+
+    def init_app(self, app):
+        app.before_request(self.check)
+        app.extensions['rate_limiter'] = self
+
+    def _key_value(self, scope):
+        if scope == 'user' and current_user.is_authenticated:
+            return f'u{current_user.id}'
+        if scope == 'username':
+            return request.form.get('username', '').strip().lower() or None
+        return request.remote_addr or 'unknown'
+
+    def check(self):
+        """before_request hook; raises RateLimited"""
+        if not current_app.config['RATE_LIMIT_ENABLED'] or request.endpoint is None:
+            return
+        self.check_endpoint(request.endpoint, request.method, self._key_value)
+
+    def check_endpoint(self, endpoint, method, key_value):
+        """Take a token from every bucket of endpoint's rules; raises RateLimited.
+
+        key_value(scope) names the client for a scope, or None to skip the rule.
+        """
+        rules = self.rules.get(endpoint, []) + self.rules.get(f'{method} {endpoint}', [])
+        for scope, rate, burst in rules:
+            value = key_value(scope)
+            if value is None:
+                continue
+            decision = self.store.take(f'{endpoint}:{scope}:{value}', rate, burst)
+            if not decision.allowed:
+                if self.on_limited is not None:
+                    self.on_limited(endpoint, scope)
+                raise RateLimited(max(1, decision.retry_after), scope)
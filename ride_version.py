@@ -0,0 +1,73 @@
+"""
+Database-wide version of the ride table
+
+/api/rides answers unchanged polls with 304 using an ETag seeded from the
+single ``ride_version`` row (model in app.py). Triggers on ``ride`` bump it
+in the same transaction as every insert, update and delete, so writes from
+any web worker, CLI command or bulk statement change the ETag, and readers
+never see the new version before the change itself commits.
+
+Every ride write also updates this one row, so on PostgreSQL concurrent
+ride writes queue behind each other until commit; SQLite serialises writers
+anyway. The PostgreSQL trigger fires once per statement, so a bulk insert
+bumps the version once.
+"""
+
+from sqlalchemy import text
+
+_BUMP = 'UPDATE ride_version SET version = version + 1 WHERE id = 1'
+_SQLITE_TRIGGERS = {'ride_version_ai': 'INSERT', 'ride_version_au': 'UPDATE', 'ride_version_ad': 'DELETE'}
+
+
+def _sqlite_install():
+    return [
+        (f'create trigger {name}', f'CREATE TRIGGER {name} AFTER {operation} ON ride BEGIN {_BUMP}; END')
+        for name, operation in _SQLITE_TRIGGERS.items()
+    ]
+
+
+def _postgres_install():
+    return [
+        ('create function ride_version_bump',
+         "CREATE OR REPLACE FUNCTION ride_version_bump() RETURNS trigger AS $$ BEGIN "
+         f"{_BUMP}; RETURN NULL; END $$ LANGUAGE plpgsql"),
+        ('create trigger ride_version_bump',
+         "CREATE TRIGGER ride_version_bump AFTER INSERT OR UPDATE OR DELETE ON ride "
+         "FOR EACH STATEMENT EXECUTE FUNCTION ride_version_bump()"),
+    ]
+
+
+def install_ride_version(conn):
+    """Create the version row and its triggers if missing; returns the steps applied"""
+    steps = []
+    if conn.execute(text('SELECT 1 FROM ride_version WHERE id = 1')).first() is None:
+        conn.execute(text('INSERT INTO ride_version (id, version) VALUES (1, 0)'))
+        steps.append('seed ride_version')
+
+    dialect = conn.dialect.name
+    if dialect == 'sqlite':
+        existing = conn.execute(text(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name IN "
+            f"({', '.join(repr(name) for name in _SQLITE_TRIGGERS)})"
+        )).scalar()
+        if existing == len(_SQLITE_TRIGGERS):
+            return steps
+        install = _sqlite_install()
+    elif dialect == 'postgresql':
+        if conn.execute(text("SELECT 1 FROM pg_trigger WHERE tgname = 'ride_version_bump'")).first():
+            return steps
+        install = _postgres_install()
+    else:
+        return steps
+    drop_ride_version(conn)
+    for label, statement in install:
+        conn.execute(text(statement))
+    return steps + [label for label, _ in install]
+
+
+def drop_ride_version(conn):
+    if conn.dialect.name == 'sqlite':
+        for name in _SQLITE_TRIGGERS:
+            conn.execute(text(f'DROP TRIGGER IF EXISTS {name}'))
+    elif conn.dialect.name == 'postgresql':
+        conn.execute(text('DROP TRIGGER IF EXISTS ride_version_bump ON ride'))
@@ -6,13 +6,26 @@ Simple script to run the Flask application with proper setup
 
 import os
 import sys
-from app import app, db
+from app import create_app, db
+import migrations
+
+app = create_app()
 
 def setup_database():
-    """Initialize the database with tables"""
+    """Create missing tables/columns/indexes; never drops data"""
     with app.app_context():
-        db.create_all()
-        print("✅ Database initialized successfully!")
+        applied = migrations.upgrade(db.engine, db.metadata)
+        print(f"✅ Database ready ({len(applied)} schema change(s) applied)")
+
+def run_production():
+    """Replace this process with gunicorn (multi-threaded, graceful SIGTERM)"""
+    root = os.path.dirname(os.path.abspath(__file__))
+    config_path = os.path.join(root, 'gunicorn.conf.py')
+    try:
+        os.execvp('gunicorn', ['gunicorn', '-c', config_path, '--chdir', root, 'wsgi:app'])
+    except OSError as e:
+        print(f"❌ Could not start gunicorn ({e}); install it with: pip install gunicorn")
+        sys.exit(1)
 
 def main():
     """Main function to run the application"""
@@ -22,6 +35,9 @@ def main():
     # Setup database
     setup_database()
     
+    if os.environ.get('FLASK_ENV') == 'production':
+        run_production()
+    
     # Get configuration
     debug_mode = os.environ.get('FLASK_DEBUG', 'True').lower() == 'true'
     host = os.environ.get('FLASK_HOST', '127.0.0.1')
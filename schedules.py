@@ -0,0 +1,58 @@
+"""
+Recurring ride schedules
+
+A schedule is a route that repeats on some weekdays at a fixed departure
+time ("weekdays at 08:00, hostel to campus"). Weekdays are stored as a
+7-bit mask, Monday = bit 0. Only a rolling window of upcoming rides is
+materialised; `occurrences` yields the pickup times for one slice of it.
+"""
+
+from datetime import datetime, time, timedelta
+
+WEEKDAY_NAMES = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+WEEKDAY_ALIASES = {
+    'daily': 0b1111111,
+    'weekdays': 0b0011111,
+    'weekends': 0b1100000,
+}
+
+
+def parse_weekdays(value):
+    """Weekday mask from 'weekdays', 'mon,wed,fri', ['mon', 'tue'] or [0, 2].
+
+    Raises ValueError for unknown names or an empty selection.
+    """
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if value in WEEKDAY_ALIASES:
+            return WEEKDAY_ALIASES[value]
+        value = [part for part in value.replace(' ', '').split(',') if part]
+    mask = 0
+    for day in value:
+        if isinstance(day, int) and 0 <= day < 7:
+            mask |= 1 << day
+        elif isinstance(day, str) and day.lower()[:3] in WEEKDAY_NAMES:
+            mask |= 1 << WEEKDAY_NAMES.index(day.lower()[:3])
+        else:
+            raise ValueError(f'Unknown weekday: {day!r}')
+    if not mask:
+        raise ValueError('At least one weekday is required')
+    return mask
+
+
+def format_weekdays(mask):
+    return [name for i, name in enumerate(WEEKDAY_NAMES) if mask & (1 << i)]
+
+
+def parse_departure_time(value):
+    """'08:00' or '08:00:00' -> datetime.time"""
+    return time.fromisoformat(value)
+
+
+def occurrences(mask, departure_time, first_day, last_day):
+    """Pickup datetimes on the masked weekdays from first_day to last_day inclusive"""
+    day = first_day
+    while day <= last_day:
+        if mask & (1 << day.weekday()):
+            yield datetime.combine(day, departure_time)
+        day += timedelta(days=1)
@@ -0,0 +1,192 @@
+"""
+Full-text place search
+
+Two indexes back ride search and place-name typeahead:
+
+- ``ride_search`` holds the pickup and drop-off names of *available* rides
+  only, so its size tracks the open ride list rather than ride history.
+- ``place`` (a model in app.py) counts how often each name has been used
+  over all rides ever created; ``place_search`` indexes the names for
+  prefix matching, ranked by that count.
+
+On SQLite they are FTS5 tables kept in sync by triggers on ``ride``, so
+every write path (ORM, bulk inserts, conditional UPDATEs, archiving) is
+covered. On PostgreSQL the same queries run against GIN ``tsvector``
+expression indexes and a trigger maintains the place counts. Other
+databases fall back to LIKE prefix matching.
+"""
+
+import re
+
+from sqlalchemy import bindparam, text
+
+TOKEN = re.compile(r'\w+', re.UNICODE)
+MAX_TERMS = 8
+
+# Kept as one expression so PostgreSQL can match it against the GIN index
+PG_RIDE_DOCUMENT = "to_tsvector('simple', pickup_location || ' ' || dropoff_location)"
+PG_PLACE_DOCUMENT = "to_tsvector('simple', name)"
+
+_SQLITE_INSTALL = [
+    ('create fts table ride_search',
+     "CREATE VIRTUAL TABLE ride_search USING fts5(pickup_location, dropoff_location, "
+     "content='ride', content_rowid='id', prefix='2 3')"),
+    ('create fts table place_search',
+     "CREATE VIRTUAL TABLE place_search USING fts5(name, content='place', content_rowid='id', prefix='1 2 3')"),
+    ('backfill place',
+     "INSERT INTO place (name, ride_count) SELECT name, count(*) FROM ("
+     "SELECT pickup_location AS name FROM ride UNION ALL SELECT dropoff_location FROM ride "
+     "UNION ALL SELECT pickup_location FROM ride_archive UNION ALL SELECT dropoff_location FROM ride_archive"
+     ") WHERE name IS NOT NULL GROUP BY name ON CONFLICT(name) DO NOTHING"),
+    ('backfill place_search', "INSERT INTO place_search(place_search) VALUES ('rebuild')"),
+    ('create trigger place_search_ai',
+     "CREATE TRIGGER place_search_ai AFTER INSERT ON place BEGIN "
+     "INSERT INTO place_search(rowid, name) VALUES (new.id, new.name); END"),
+    ('create trigger place_search_ad',
+     "CREATE TRIGGER place_search_ad AFTER DELETE ON place BEGIN "
+     "INSERT INTO place_search(place_search, rowid, name) VALUES ('delete', old.id, old.name); END"),
+    ('backfill ride_search',
+     "INSERT INTO ride_search(rowid, pickup_location, dropoff_location) "
+     "SELECT id, pickup_location, dropoff_location FROM ride WHERE status = 'available'"),
+    ('create trigger ride_search_ai',
+     "CREATE TRIGGER ride_search_ai AFTER INSERT ON ride BEGIN "
+     "INSERT INTO ride_search(rowid, pickup_location, dropoff_location) "
+     "SELECT new.id, new.pickup_location, new.dropoff_location WHERE new.status = 'available'; "
+     "INSERT INTO place (name, ride_count) VALUES (new.pickup_location, 1) "
+     "ON CONFLICT(name) DO UPDATE SET ride_count = ride_count + 1; "
+     "INSERT INTO place (name, ride_count) VALUES (new.dropoff_location, 1) "
+     "ON CONFLICT(name) DO UPDATE SET ride_count = ride_count + 1; END"),
+    ('create trigger ride_search_au',
+     "CREATE TRIGGER ride_search_au AFTER UPDATE OF status, pickup_location, dropoff_location ON ride "
+     "WHEN old.status IS NOT new.status OR old.pickup_location IS NOT new.pickup_location "
+     "OR old.dropoff_location IS NOT new.dropoff_location BEGIN "
+     "INSERT INTO ride_search(ride_search, rowid, pickup_location, dropoff_location) "
+     "SELECT 'delete', old.id, old.pickup_location, old.dropoff_location WHERE old.status = 'available'; "
+     "INSERT INTO ride_search(rowid, pickup_location, dropoff_location) "
+     "SELECT new.id, new.pickup_location, new.dropoff_location WHERE new.status = 'available'; END"),
+    ('create trigger ride_search_ad',
+     "CREATE TRIGGER ride_search_ad AFTER DELETE ON ride WHEN old.status = 'available' BEGIN "
+     "INSERT INTO ride_search(ride_search, rowid, pickup_location, dropoff_location) "
+     "VALUES ('delete', old.id, old.pickup_location, old.dropoff_location); END"),
+]
+
+_POSTGRES_INSTALL = [
+    ('create index ix_ride_search',
+     f"CREATE INDEX IF NOT EXISTS ix_ride_search ON ride USING gin ({PG_RIDE_DOCUMENT}) "
+     f"WHERE status = 'available'"),
+    ('create index ix_place_search',
+     f"CREATE INDEX IF NOT EXISTS ix_place_search ON place USING gin ({PG_PLACE_DOCUMENT})"),
+    ('backfill place',
+     "INSERT INTO place (name, ride_count) SELECT name, count(*) FROM ("
+     "SELECT pickup_location AS name FROM ride UNION ALL SELECT dropoff_location FROM ride "
+     "UNION ALL SELECT pickup_location FROM ride_archive UNION ALL SELECT dropoff_location FROM ride_archive"
+     ") names WHERE name IS NOT NULL GROUP BY name ON CONFLICT (name) DO NOTHING"),
+    ('create function ride_count_places',
+     "CREATE OR REPLACE FUNCTION ride_count_places() RETURNS trigger AS $$ BEGIN "
+     "INSERT INTO place (name, ride_count) VALUES (NEW.pickup_location, 1) "
+     "ON CONFLICT (name) DO UPDATE SET ride_count = place.ride_count + 1; "
+     "INSERT INTO place (name, ride_count) VALUES (NEW.dropoff_location, 1) "
+     "ON CONFLICT (name) DO UPDATE SET ride_count = place.ride_count + 1; "
+     "RETURN NEW; END $$ LANGUAGE plpgsql"),
+    ('create trigger ride_count_places',
+     "CREATE TRIGGER ride_count_places AFTER INSERT ON ride "
+     "FOR EACH ROW EXECUTE FUNCTION ride_count_places()"),
+]
+
+
+def install_search_index(conn):
+    """Create the full-text tables/indexes and triggers if missing; returns
+    the steps applied. Existing rides are indexed when first installed."""
+    dialect = conn.dialect.name
+    if dialect == 'sqlite':
+        existing = conn.execute(text(
+            "SELECT count(*) FROM sqlite_master WHERE name IN ('ride_search', 'place_search', 'ride_search_ad')"
+        )).scalar()
+        if existing == 3:
+            return []
+        # Missing or half-installed: (re)build everything from the ride tables
+        drop_search_index(conn)
+        steps = _SQLITE_INSTALL
+    elif dialect == 'postgresql':
+        installed = conn.execute(text(
+            "SELECT 1 FROM pg_trigger WHERE tgname = 'ride_count_places'")).first()
+        if installed:
+            return []
+        steps = _POSTGRES_INSTALL
+    else:
+        return []
+    for label, statement in steps:
+        conn.execute(text(statement))
+    return [label for label, _ in steps]
+
+
+def drop_search_index(conn):
+    if conn.dialect.name == 'sqlite':
+        for name in ('ride_search_ai', 'ride_search_au', 'ride_search_ad', 'place_search_ai', 'place_search_ad'):
+            conn.execute(text(f'DROP TRIGGER IF EXISTS {name}'))
+        for name in ('ride_search', 'place_search'):
+            conn.execute(text(f'DROP TABLE IF EXISTS {name}'))
+    elif conn.dialect.name == 'postgresql':
+        conn.execute(text('DROP TRIGGER IF EXISTS ride_count_places ON ride'))
+
+
+def parse_terms(value):
+    """Lower-cased word tokens of a search string; the last one is a prefix"""
+    return TOKEN.findall((value or '').lower())[:MAX_TERMS]
+
+
+def fts5_query(terms, column=None):
+    """FTS5 MATCH expression: every term must match, the last as a prefix"""
+    phrases = [f'"{term}"' for term in terms]
+    phrases[-1] += '*'
+    expression = ' AND '.join(phrases)
+    return f'{column} : ({expression})' if column else expression
+
+
+def tsquery(terms):
+    return ' & '.join(terms[:-1] + [terms[-1] + ':*'])
+
+
+def ride_match_clause(dialect, q=None, pickup=None, dropoff=None):
+    """WHERE clause selecting available rides whose place names match.
+
+    ``q`` matches either name; ``pickup``/``dropoff`` match one column each.
+    Raises ValueError when there is nothing to search for.
+    """
+    fields = [(terms, column) for terms, column in ((parse_terms(q), None),
+                                                    (parse_terms(pickup), 'pickup_location'),
+                                                    (parse_terms(dropoff), 'dropoff_location')) if terms]
+    if not fields:
+        raise ValueError('No search terms')
+
+    if dialect == 'sqlite':
+        match = ' AND '.join(fts5_query(terms, column) for terms, column in fields)
+        return text('ride.id IN (SELECT rowid FROM ride_search WHERE ride_search MATCH :match)') \
+            .bindparams(match=match)
+
+    clauses, params = [], {}
+    for i, (terms, column) in enumerate(fields):
+        if dialect == 'postgresql':
+            document = PG_RIDE_DOCUMENT if column is None else f"to_tsvector('simple', {column})"
+            clauses.append(f"{document} @@ to_tsquery('simple', :q{i})")
+            params[f'q{i}'] = tsquery(terms)
+        else:
+            for j, term in enumerate(terms):
+                columns = [column] if column else ['pickup_location', 'dropoff_location']
+                clauses.append('(' + ' OR '.join(f'lower({c}) LIKE :q{i}_{j}' for c in columns) + ')')
+                params[f'q{i}_{j}'] = f'%{term}%'
+    return text(' AND '.join(clauses)).bindparams(*[bindparam(k, v) for k, v in params.items()])
+
+
+def place_match_clause(dialect, q):
+    """WHERE clause selecting places whose name matches a typeahead prefix"""
+    terms = parse_terms(q)
+    if not terms:
+        raise ValueError('No search terms')
+    if dialect == 'sqlite':
+        return text('place.id IN (SELECT rowid FROM place_search WHERE place_search MATCH :match)') \
+            .bindparams(match=fts5_query(terms))
+    if dialect == 'postgresql':
+        return text(f"{PG_PLACE_DOCUMENT} @@ to_tsquery('simple', :match)").bindparams(match=tsquery(terms))
+    clauses = ' AND '.join(f'lower(place.name) LIKE :q{i}' for i in range(len(terms)))
+    return text(clauses).bindparams(*[bindparam(f'q{i}', f'%{term}%') for i, term in enumerate(terms)])
@@ -0,0 +1,31 @@
+// Create ride form: group ride fields, pickup pin and default pickup time
+
+function toggleGroupFields() {
+    const isGroupRide = document.getElementById('is_group_ride').checked;
+    const groupFields = document.getElementById('group-fields');
+    
+    if (isGroupRide) {
+        groupFields.style.display = 'block';
+    } else {
+        groupFields.style.display = 'none';
+    }
+}
+
+// Attach GPS coordinates to the pickup so students can find the ride nearby
+function usePickupLocation() {
+    if (!navigator.geolocation) return;
+    navigator.geolocation.getCurrentPosition(function(position) {
+        document.getElementById('pickup_lat').value = position.coords.latitude;
+        document.getElementById('pickup_lng').value = position.coords.longitude;
+        document.getElementById('pickup-coords').textContent =
+            `Pinned at ${position.coords.latitude.toFixed(5)}, ${position.coords.longitude.toFixed(5)}`;
+    });
+}
+
+// Set default pickup time to current time + 30 minutes
+document.addEventListener('DOMContentLoaded', function() {
+    const now = new Date();
+    now.setMinutes(now.getMinutes() + 30);
+    const timeString = now.toISOString().slice(0, 16);
+    document.getElementById('pickup_time').value = timeString;
+});
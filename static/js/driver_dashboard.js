@@ -0,0 +1,91 @@
+// Driver dashboard: ride actions and the paged ride history
+
+function startRide(rideId) {
+    if (confirm('Start this ride?')) {
+        // Update ride status to in_progress
+        fetch('/api/start_ride', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({
+                ride_id: rideId
+            })
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                alert('Ride started!');
+                location.reload();
+            } else {
+                alert('Error: ' + data.error);
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            alert('An error occurred while starting the ride');
+        });
+    }
+}
+
+function completeRide(rideId) {
+    if (confirm('Mark this ride as completed?')) {
+        // Update ride status to completed
+        fetch('/api/complete_ride', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({
+                ride_id: rideId
+            })
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                alert('Ride completed!');
+                location.reload();
+            } else {
+                alert('Error: ' + data.error);
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            alert('An error occurred while completing the ride');
+        });
+    }
+}
+
+function generateQR(rideId) {
+    window.open('/generate_qr/' + rideId, '_blank');
+}
+
+// Past rides are paged in on demand, including archived ones
+let historyCursor = null;
+
+async function loadHistory() {
+    const button = document.getElementById('history-more');
+    try {
+        const url = historyCursor ? `/api/history?cursor=${encodeURIComponent(historyCursor)}` : '/api/history';
+        const response = await fetch(url);
+        const rides = await response.json();
+        historyCursor = response.headers.get('X-Next-Cursor');
+        
+        const list = document.getElementById('history-list');
+        if (rides.length === 0 && !list.children.length) {
+            list.innerHTML = '<li class="list-group-item text-muted text-center">No past rides</li>';
+        }
+        list.insertAdjacentHTML('beforeend', rides.map(ride => `
+            <li class="list-group-item d-flex justify-content-between">
+                <span>${ride.pickup_location} → ${ride.dropoff_location}
+                    <span class="text-muted small ms-2">${formatDateTime(ride.pickup_time)}</span></span>
+                <span><span class="badge bg-${ride.status === 'completed' ? 'secondary' : 'danger'}">${ride.status}</span>
+                    <span class="fw-bold ms-2">${formatCurrency(ride.fare)}</span></span>
+            </li>
+        `).join(''));
+        button.innerHTML = '<i class="fas fa-chevron-down me-1"></i>Load more';
+        button.hidden = !historyCursor;
+    } catch (error) {
+        console.error('Error loading ride history:', error);
+    }
+}
@@ -163,7 +163,49 @@ async function completeRide(rideId) {
 }
 
 // Real-time Updates
-function startRealTimeUpdates() {
+const RIDE_EVENTS = ['ride.created', 'ride.booked', 'ride.started', 'ride.completed'];
+
+function startRealTimeUpdates(streamUrl = '/api/stream', fallback = startPolling) {
+    // Prefer the server push channel; fall back to polling on old browsers
+    if (!window.EventSource) {
+        fallback();
+        return null;
+    }
+
+    const source = new EventSource(streamUrl);
+    RIDE_EVENTS.forEach(type => {
+        source.addEventListener(type, (e) => applyRideEvent(type, JSON.parse(e.data)));
+    });
+    // Bulk and scheduled rides arrive as one event; reload the list instead
+    ['rides.bulk_created', 'rides.bulk_cancelled'].forEach(type => {
+        source.addEventListener(type, async () => {
+            if (document.getElementById('rides-container')) {
+                updateRidesDisplay(await fetchRides());
+            }
+        });
+    });
+    source.addEventListener('location', (e) => {
+        document.dispatchEvent(new CustomEvent('edu-ride:location', { detail: JSON.parse(e.data) }));
+    });
+    source.addEventListener('notification', (e) => {
+        const data = JSON.parse(e.data);
+        if (typeof loadNotifications === 'function') {
+            loadNotifications();
+        }
+        document.dispatchEvent(new CustomEvent('edu-ride:notification', { detail: data }));
+    });
+    // EventSource reconnects on its own and resumes from the last event id,
+    // but gives up when the server refuses the stream (503 once a worker
+    // holds its share of streams): poll instead
+    source.addEventListener('error', () => {
+        if (source.readyState === EventSource.CLOSED) {
+            fallback();
+        }
+    });
+    return source;
+}
+
+function startPolling() {
     // Update rides every 30 seconds
     setInterval(async () => {
         try {
@@ -175,47 +217,88 @@ function startRealTimeUpdates() {
     }, 30000);
 }
 
-function updateRidesDisplay(rides) {
+function applyRideEvent(type, ride) {
+    document.dispatchEvent(new CustomEvent('edu-ride:ride', { detail: { type: type, ride: ride } }));
+
     const container = document.getElementById('rides-container');
     if (!container) return;
 
-    if (rides.length === 0) {
-        container.innerHTML = `
-            <div class="col-12">
-                <div class="text-center py-4">
-                    <i class="fas fa-search text-muted display-4 mb-3"></i>
-                    <h5 class="text-muted">No rides available at the moment</h5>
-                    <p class="text-muted">Check back later for new ride offers</p>
-                </div>
-            </div>
-        `;
+    const card = container.querySelector(`[data-ride-id="${ride.id}"]`);
+    if (type === 'ride.created') {
+        if (card) return;
+        const empty = container.querySelector('.rides-empty');
+        if (empty) empty.remove();
+        container.insertAdjacentHTML('beforeend', renderRideCard(ride));
+        return;
+    }
+    if (!card) return;
+
+    if (ride.status !== 'available') {
+        card.remove();
+        if (!container.querySelector('[data-ride-id]')) {
+            container.innerHTML = renderEmptyRides();
+        }
     } else {
-        container.innerHTML = rides.map(ride => `
-            <div class="col-md-6 mb-3">
-                <div class="card border ride-card">
-                    <div class="card-body">
-                        <div class="d-flex justify-content-between align-items-start mb-2">
-                            <h6 class="card-title mb-0">${ride.pickup_location} → ${ride.dropoff_location}</h6>
-                            <span class="badge bg-primary">${formatCurrency(ride.fare)}</span>
-                        </div>
-                        <p class="card-text text-muted small mb-2">
-                            <i class="fas fa-clock me-1"></i>${formatDateTime(ride.pickup_time)}
-                        </p>
-                        <p class="card-text text-muted small mb-2">
-                            <i class="fas fa-user me-1"></i>Driver: ${ride.driver_name}
-                        </p>
-                        ${ride.is_group_ride ? `
-                        <p class="card-text text-muted small mb-3">
-                            <i class="fas fa-users me-1"></i>Group Ride: ${ride.current_passengers}/${ride.max_passengers} passengers
-                        </p>
-                        ` : ''}
-                        <button class="btn btn-primary btn-sm" onclick="bookRide(${ride.id})">
-                            <i class="fas fa-bookmark me-1"></i>Book Ride
-                        </button>
+        const passengers = card.querySelector('.ride-passengers');
+        if (passengers) {
+            passengers.textContent = `${ride.current_passengers}/${ride.max_passengers}`;
+        }
+    }
+}
+
+function renderEmptyRides() {
+    return `
+        <div class="col-12 rides-empty">
+            <div class="text-center py-4">
+                <i class="fas fa-search text-muted display-4 mb-3"></i>
+                <h5 class="text-muted">No rides available at the moment</h5>
+                <p class="text-muted">Check back later for new ride offers</p>
+            </div>
+        </div>
+    `;
+}
+
+function renderRideCard(ride) {
+    return `
+        <div class="col-md-6 mb-3" data-ride-id="${ride.id}">
+            <div class="card border ride-card">
+                <div class="card-body">
+                    <div class="d-flex justify-content-between align-items-start mb-2">
+                        <h6 class="card-title mb-0">${ride.pickup_location} → ${ride.dropoff_location}</h6>
+                        <span class="badge bg-primary">${formatCurrency(ride.fare)}</span>
                     </div>
+                    <p class="card-text text-muted small mb-2">
+                        <i class="fas fa-clock me-1"></i>${formatDateTime(ride.pickup_time)}
+                    </p>
+                    <p class="card-text text-muted small mb-2">
+                        <i class="fas fa-user me-1"></i>Driver: ${ride.driver_name}
+                    </p>
+                    <p class="card-text text-muted small mb-2 ride-estimate" hidden></p>
+                    ${ride.is_group_ride ? `
+                    <p class="card-text text-muted small mb-3">
+                        <i class="fas fa-users me-1"></i>Group Ride: <span class="ride-passengers">${ride.current_passengers}/${ride.max_passengers}</span> passengers
+                    </p>
+                    ` : ''}
+                    <button class="btn btn-primary btn-sm" onclick="bookRide(${ride.id})">
+                        <i class="fas fa-bookmark me-1"></i>Book Ride
+                    </button>
+                    <a href="/track_ride/${ride.id}" class="btn btn-info btn-sm ms-1">
+                        <i class="fas fa-map-marked-alt me-1"></i>Track
+                    </a>
                 </div>
             </div>
-        `).join('');
+        </div>
+    `;
+}
+
+function updateRidesDisplay(rides) {
+    const container = document.getElementById('rides-container');
+    if (!container) return;
+
+    if (rides.length === 0) {
+        container.innerHTML = renderEmptyRides();
+    } else {
+        container.innerHTML = rides.map(renderRideCard).join('');
     }
 }
 
@@ -0,0 +1,210 @@
+// Live tracking page: map, driver location, ETA and payment
+
+// Page data comes from the #tracking element's data attributes
+const TRACKING = document.getElementById('tracking').dataset;
+const RIDE_ID = Number(TRACKING.rideId);
+let map;
+let driverMarker;
+let routePolyline;
+
+// Initialize map
+function initMap() {
+    // Default center (Sion Station)
+    const defaultCenter = { lat: 19.0330, lng: 72.8570 };
+    
+    map = new google.maps.Map(document.getElementById("map"), {
+        zoom: 15,
+        center: defaultCenter,
+        mapTypeId: google.maps.MapTypeId.ROADMAP
+    });
+    
+    // Place the driver marker; live fixes move it as they arrive
+    createDriverMarker();
+}
+
+// Driver marker, starting at the default center until the first fix arrives
+function createDriverMarker() {
+    const driverLocation = { lat: 19.0330, lng: 72.8570 };
+    
+    driverMarker = new google.maps.Marker({
+        position: driverLocation,
+        map: map,
+        title: "Driver Location",
+        icon: {
+            url: "data:image/svg+xml;charset=UTF-8," + encodeURIComponent(`
+                <svg width="40" height="40" viewBox="0 0 40 40" xmlns="http://www.w3.org/2000/svg">
+                    <circle cx="20" cy="20" r="18" fill="#007bff" stroke="#fff" stroke-width="2"/>
+                    <path d="M12 16h16v8H12z" fill="#fff"/>
+                    <circle cx="16" cy="20" r="2" fill="#007bff"/>
+                    <circle cx="24" cy="20" r="2" fill="#007bff"/>
+                </svg>
+            `),
+            scaledSize: new google.maps.Size(40, 40)
+        }
+    });
+    
+    // Show the last known driver position
+    refreshLocation();
+}
+
+// ETA and distance come from the server's cached route estimates
+let lastEtaRefresh = 0;
+
+async function refreshEta() {
+    lastEtaRefresh = Date.now();
+    try {
+        const response = await fetch(`/api/rides/${RIDE_ID}/eta`);
+        if (!response.ok) return;
+        const data = await response.json();
+        document.getElementById('eta').textContent = data.eta_text;
+        document.getElementById('distance').textContent = data.distance_text;
+    } catch (error) {
+        console.error('Error refreshing ETA:', error);
+    }
+}
+
+// Move the driver marker to a pushed or fetched fix
+function setDriverLocation(point) {
+    if (driverMarker) {
+        driverMarker.setPosition({ lat: point.lat, lng: point.lng });
+    }
+}
+
+// Refresh driver location from the server
+async function refreshLocation() {
+    try {
+        const response = await fetch(`/api/rides/${RIDE_ID}/location?limit=1`);
+        const data = await response.json();
+        if (data.points && data.points.length) {
+            setDriverLocation(data.points[data.points.length - 1]);
+        }
+    } catch (error) {
+        console.error('Error refreshing location:', error);
+    }
+}
+
+// Drivers share their GPS position, batched to keep request rates low
+function startLocationSharing() {
+    if (!navigator.geolocation) return;
+
+    let pending = [];
+    navigator.geolocation.watchPosition(function(position) {
+        pending.push([position.coords.latitude, position.coords.longitude, position.timestamp / 1000]);
+    }, null, { enableHighAccuracy: true });
+
+    setInterval(function() {
+        if (!pending.length) return;
+        const points = pending;
+        pending = [];
+        fetch('/api/location', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ ride_id: RIDE_ID, points: points })
+        }).catch(error => console.error('Error sending location:', error));
+    }, 5000);
+}
+
+// Call driver
+function callDriver() {
+    const phoneNumber = document.getElementById('driver-phone').textContent;
+    window.open(`tel:${phoneNumber}`, '_self');
+}
+
+// Cancel ride
+function cancelRide() {
+    if (confirm('Are you sure you want to cancel this ride?')) {
+        alert('Ride cancelled. You will be charged a cancellation fee.');
+        // Redirect to dashboard
+        window.location.href = '/student/dashboard';
+    }
+}
+
+// Share location
+function shareLocation() {
+    if (navigator.share) {
+        navigator.share({
+            title: 'My Ride Location',
+            text: 'I\'m currently on a ride with Edu-Ride',
+            url: window.location.href
+        });
+    } else {
+        // Fallback for browsers that don't support Web Share API
+        navigator.clipboard.writeText(window.location.href).then(() => {
+            alert('Location link copied to clipboard!');
+        });
+    }
+}
+
+// Pay for the ride. The key is kept per ride and method so a retried tap
+// returns the payment the first one created instead of charging twice.
+function payRide(method) {
+    const storageKey = `payment-key-${RIDE_ID}-${method}`;
+    let key = sessionStorage.getItem(storageKey);
+    if (!key) {
+        key = crypto.randomUUID();
+        sessionStorage.setItem(storageKey, key);
+    }
+    fetch('/api/payments', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'Idempotency-Key': key },
+        body: JSON.stringify({ ride_id: RIDE_ID, payment_method: method })
+    })
+        .then(response => response.json().then(data => ({ ok: response.ok, data: data })))
+        .then(({ ok, data }) => {
+            if (!ok) {
+                showNotification(data.error || 'Could not start the payment', 'danger');
+            } else if (data.upi_uri) {
+                window.location.href = data.upi_uri;
+            } else {
+                showNotification('Pay the driver in cash; they will confirm it.', 'info');
+            }
+        })
+        .catch(() => showNotification('Could not start the payment', 'danger'));
+}
+
+document.addEventListener('edu-ride:notification', function(e) {
+    if (e.detail.ride_id === RIDE_ID && e.detail.event === 'payment.completed') {
+        showNotification('Payment received. Thank you!', 'success');
+    }
+});
+
+// Update ride status as the server pushes changes for this ride
+function setRideStatus(status) {
+    const label = status.replace('_', ' ').replace(/\b\w/g, c => c.toUpperCase());
+    document.getElementById('ride-status').textContent = label;
+}
+
+document.addEventListener('edu-ride:ride', function(e) {
+    if (e.detail.ride.id === RIDE_ID) {
+        setRideStatus(e.detail.ride.status);
+    }
+});
+
+document.addEventListener('edu-ride:location', function(e) {
+    if (e.detail.ride_id === RIDE_ID) {
+        setDriverLocation(e.detail);
+        if (Date.now() - lastEtaRefresh > 30000) {
+            refreshEta();
+        }
+    }
+});
+
+document.addEventListener('DOMContentLoaded', function() {
+    startRealTimeUpdates('/api/stream?ride=' + RIDE_ID, function() {
+        setInterval(refreshLocation, 30000);
+    });
+    refreshEta();
+    if (TRACKING.shareLocation === 'true') {
+        startLocationSharing();
+    }
+});
+
+// Initialize map when page loads
+document.addEventListener('DOMContentLoaded', function() {
+    // Check if Google Maps is loaded
+    if (typeof google !== 'undefined') {
+        initMap();
+    } else {
+        console.error('Google Maps API not loaded');
+    }
+});
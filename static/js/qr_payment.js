@@ -0,0 +1,18 @@
+// Payment QR page: drivers confirm cash collected
+
+// The ride comes from the #payment element's data attributes
+const RIDE_ID = Number(document.getElementById('payment').dataset.rideId);
+
+function markAsPaid() {
+    if (!confirm('Confirm cash received from all passengers?')) return;
+    fetch(`/api/rides/${RIDE_ID}/cash_received`, { method: 'POST' })
+        .then(response => response.json().then(data => ({ ok: response.ok, data: data })))
+        .then(({ ok, data }) => {
+            if (ok) {
+                showNotification('Payment recorded. It will show in your earnings shortly.', 'success');
+            } else {
+                showNotification(data.error || 'Could not record the payment', 'danger');
+            }
+        })
+        .catch(() => showNotification('Could not record the payment', 'danger'));
+}
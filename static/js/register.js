@@ -0,0 +1,18 @@
+// Registration form: show the fields for the chosen account type
+
+function toggleDriverFields() {
+    const userType = document.getElementById('user_type').value;
+    const studentFields = document.getElementById('student-fields');
+    const driverFields = document.getElementById('driver-fields');
+    
+    if (userType === 'student') {
+        studentFields.style.display = 'block';
+        driverFields.style.display = 'none';
+    } else if (userType === 'driver') {
+        studentFields.style.display = 'none';
+        driverFields.style.display = 'block';
+    } else {
+        studentFields.style.display = 'none';
+        driverFields.style.display = 'none';
+    }
+}
@@ -0,0 +1,130 @@
+// Student dashboard: booking, the notification feed and fare estimates
+
+function bookRide(rideId) {
+    if (confirm('Are you sure you want to book this ride?')) {
+        fetch('/api/book_ride', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({
+                ride_id: rideId
+            })
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                alert('Ride booked successfully!');
+                location.reload();
+            } else {
+                alert('Error: ' + data.error);
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            alert('An error occurred while booking the ride');
+        });
+    }
+}
+
+// Load notifications; after the first call only new ones are fetched
+let notificationCursor = null;
+let notificationItems = [];
+
+async function loadNotifications() {
+    try {
+        const url = notificationCursor === null
+            ? '/api/notifications'
+            : `/api/notifications?since=${encodeURIComponent(notificationCursor)}`;
+        const response = await fetch(url);
+        const notifications = await response.json();
+        notificationCursor = response.headers.get('X-Next-Cursor');
+        if (notificationItems.length > 0 && notifications.length === 0) {
+            return;
+        }
+        notificationItems = notifications.concat(notificationItems).slice(0, 20);
+        
+        const container = document.getElementById('notifications-container');
+        if (notificationItems.length === 0) {
+            container.innerHTML = '<div class="text-muted text-center">No notifications</div>';
+        } else {
+            container.innerHTML = notificationItems.map(notif => `
+                <div class="alert alert-${notif.type} alert-sm mb-2">
+                    <div class="small">${notif.message}</div>
+                    <div class="text-muted" style="font-size: 0.75rem;">${new Date(notif.timestamp).toLocaleString()}</div>
+                </div>
+            `).join('');
+        }
+    } catch (error) {
+        console.error('Error loading notifications:', error);
+        document.getElementById('notifications-container').innerHTML = '<div class="text-danger text-center">Failed to load notifications</div>';
+    }
+}
+
+// Distance and trip time for every listed ride, priced in one request
+async function loadEstimates() {
+    const cards = Array.from(document.querySelectorAll('#rides-container [data-ride-id]'));
+    if (!cards.length) return;
+    try {
+        const response = await fetch('/api/fare/batch', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ ride_ids: cards.map(card => Number(card.dataset.rideId)) })
+        });
+        const estimates = await response.json();
+        cards.forEach(card => {
+            const estimate = estimates[card.dataset.rideId];
+            const line = card.querySelector('.ride-estimate');
+            if (!estimate || !line) return;
+            line.innerHTML = `<i class="fas fa-road me-1"></i>${estimate.distance_text} · ~${estimate.eta_text}`;
+            line.hidden = false;
+        });
+    } catch (error) {
+        console.error('Error loading estimates:', error);
+    }
+}
+
+// Search by place: suggestions come from /api/places while typing and the
+// ride list is replaced with /api/rides/search results
+let searchTimer = null;
+let searchController = null;
+
+async function searchRides(value) {
+    if (searchController) searchController.abort();
+    searchController = new AbortController();
+    const signal = searchController.signal;
+    try {
+        if (!value.trim()) {
+            updateRidesDisplay(await fetchRides());
+            return;
+        }
+        const query = encodeURIComponent(value);
+        const [places, rides] = await Promise.all([
+            fetch(`/api/places?q=${query}`, { signal }).then(response => response.json()),
+            fetch(`/api/rides/search?q=${query}`, { signal }).then(response => response.json())
+        ]);
+        const suggestions = document.getElementById('place-suggestions');
+        suggestions.innerHTML = '';
+        places.forEach(place => {
+            const option = document.createElement('option');
+            option.value = place.name;
+            suggestions.appendChild(option);
+        });
+        updateRidesDisplay(Array.isArray(rides) ? rides : []);
+        loadEstimates();
+    } catch (error) {
+        if (error.name !== 'AbortError') {
+            console.error('Error searching rides:', error);
+        }
+    }
+}
+
+// Live ride updates are started by main.js; load the initial notifications here
+document.addEventListener('DOMContentLoaded', function() {
+    loadNotifications();
+    loadEstimates();
+    document.getElementById('ride-search').addEventListener('input', function(e) {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(() => searchRides(e.target.value), 150);
+    });
+});
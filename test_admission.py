@@ -0,0 +1,86 @@
+"""
+Tests for priority-based admission control
+"""
+
+import pytest
+
+from admission import AdmissionController, Overloaded
+
+
+def _controller(now, **options):
+    return AdmissionController(max_in_flight=2, target_seconds=0.1, critical_factor=4, window_seconds=5,
+                               clock=lambda: now[0], **options)
+
+
+def _finish(controller, now, seconds, count=20):
+    # A burst of concurrent requests that each take `seconds`
+    started = [controller.admit('high') for _ in range(count)]
+    now[0] += seconds
+    for at in started:
+        controller.release(at)
+
+
+def test_sheds_low_priority_first_and_never_high():
+    now = [0.0]
+    controller = _controller(now)
+    held = [controller.admit('normal'), controller.admit('normal')]
+    assert controller.shed_level() == 1  # in-flight limit reached
+    with pytest.raises(Overloaded):
+        controller.admit('low')
+    controller.release(controller.admit('normal'))
+    for started in held:
+        controller.release(started)
+
+    _finish(controller, now, 0.2)  # latency over target
+    assert controller.shed_level() == 1
+    _finish(controller, now, 1.0)  # past the critical factor
+    assert controller.shed_level() == 2
+    with pytest.raises(Overloaded):
+        controller.admit('normal')
+    controller.release(controller.admit('high'))
+    assert controller.stats()['shed'] == 2
+
+
+def test_shedding_stops_once_slow_requests_leave_the_window():
+    now = [0.0]
+    controller = _controller(now)
+    _finish(controller, now, 0.5)
+    assert controller.shed_level() == 2
+
+    now[0] += 6
+    assert controller.latency() is None and controller.shed_level() == 0
+    controller.release(controller.admit('low'))
+
+
+def test_one_slow_request_does_not_trip_shedding():
+    now = [0.0]
+    controller = _controller(now)
+    _finish(controller, now, 60, count=1)  # e.g. a large export
+    _finish(controller, now, 0.01, count=19)
+    assert controller.latency() < 0.1
+    assert controller.shed_level() == 0
+
+
+def test_polling_is_shed_before_booking(app, client, login, make_user, make_ride, monkeypatch):
+    monkeypatch.setitem(app.config, 'ADMISSION_CONTROL', True)
+    admission = app.extensions['admission']
+    monkeypatch.setattr(admission, 'max_in_flight', 0)  # as if every thread were busy
+    ride = make_ride(make_user('driver'))
+    login(make_user('student'))
+
+    polled = client.get('/api/rides')
+    assert polled.status_code == 503 and polled.headers['Retry-After'] == str(admission.retry_after)
+    assert client.get('/api/notifications').status_code == 503
+    assert client.post('/api/book_ride', json={'ride_id': ride.id}).get_json()['success']
+    assert client.get('/metrics').status_code == 200
+    assert admission.in_flight == 0
+
+
+def test_exports_are_not_timed(app, client, login, make_user, monkeypatch):
+    monkeypatch.setitem(app.config, 'ADMISSION_CONTROL', True)
+    admission = app.extensions['admission']
+    login(make_user('driver'))
+    samples = len(admission._samples)
+
+    assert client.get('/api/export/rides.csv').status_code == 200
+    assert admission.in_flight == 0 and len(admission._samples) == samples
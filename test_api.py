@@ -0,0 +1,216 @@
+"""
+Tests for the Edu-Ride JSON API
+"""
+
+import threading
+from datetime import datetime
+
+from sqlalchemy import text
+
+from app import db, Ride
+
+
+def test_api_rides_lists_available_rides_in_pickup_order(client, make_user, make_ride):
+    driver = make_user('driver')
+    late = make_ride(driver, pickup_time=datetime(2030, 1, 2, 9, 0))
+    early = make_ride(driver, pickup_time=datetime(2030, 1, 1, 9, 0))
+    make_ride(driver, status='booked')
+
+    response = client.get('/api/rides')
+
+    assert response.status_code == 200
+    assert [r['id'] for r in response.get_json()] == [early.id, late.id]
+    assert response.get_json()[0]['driver_name'] == driver.username
+
+
+def test_api_rides_keyset_pagination(client, make_user, make_ride):
+    driver = make_user('driver')
+    same_time = datetime(2030, 1, 1, 8, 0)
+    rides = [make_ride(driver, pickup_time=same_time) for _ in range(3)]
+    rides += [make_ride(driver, pickup_time=datetime(2030, 1, 1, 9, 0)) for _ in range(2)]
+
+    seen = []
+    url = '/api/rides?limit=2'
+    while url:
+        response = client.get(url)
+        seen += [r['id'] for r in response.get_json()]
+        cursor = response.headers.get('X-Next-Cursor')
+        url = f'/api/rides?limit=2&cursor={cursor}' if cursor else None
+
+    assert seen == [r.id for r in rides]
+
+
+def test_api_rides_pages_by_default(client, make_user, make_ride, monkeypatch):
+    import app as app_module
+
+    monkeypatch.setattr(app_module, 'RIDES_PAGE_SIZE', 2)
+    driver = make_user('driver')
+    for _ in range(3):
+        make_ride(driver)
+
+    response = client.get('/api/rides')
+
+    assert len(response.get_json()) == 2
+    assert response.headers['Link'].startswith('</api/rides?cursor=')
+
+
+def test_api_rides_filters(client, make_user, make_ride):
+    driver = make_user('driver')
+    match = make_ride(driver, pickup_location='Sion Station East', fare=30.0, is_group_ride=True,
+                      pickup_time=datetime(2030, 1, 1, 8, 30))
+    make_ride(driver, pickup_location='Kurla', fare=30.0, is_group_ride=True,
+              pickup_time=datetime(2030, 1, 1, 8, 30))
+    make_ride(driver, pickup_location='Sion Station', fare=90.0, is_group_ride=True,
+              pickup_time=datetime(2030, 1, 1, 8, 30))
+    make_ride(driver, pickup_location='Sion Station', fare=30.0, is_group_ride=False,
+              pickup_time=datetime(2030, 1, 1, 8, 30))
+    make_ride(driver, pickup_location='Sion Station', fare=30.0, is_group_ride=True,
+              pickup_time=datetime(2030, 1, 1, 11, 0))
+
+    response = client.get('/api/rides?pickup=sion&max_fare=50&group=true'
+                          '&from=2030-01-01T08:00&to=2030-01-01T09:00')
+
+    assert [r['id'] for r in response.get_json()] == [match.id]
+    assert client.get('/api/rides?min_fare=abc').status_code == 400
+
+
+def test_api_rides_conditional_get(client, make_user, make_ride):
+    driver = make_user('driver')
+    ride = make_ride(driver)
+
+    first = client.get('/api/rides')
+    etag = first.headers['ETag']
+
+    unchanged = client.get('/api/rides', headers={'If-None-Match': etag})
+    assert unchanged.status_code == 304
+    assert unchanged.data == b''
+
+    ride.status = 'booked'
+    db.session.commit()
+
+    changed = client.get('/api/rides', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.get_json() == []
+    assert changed.headers['ETag'] != etag
+
+
+def test_ride_listing_indexes_exist(app):
+    index_names = {index.name for index in Ride.__table__.indexes}
+    assert {'ix_ride_status_pickup_time', 'ix_ride_driver_created_at'} <= index_names
+
+
+def _queries_per_request(client, count_queries, url):
+    client.get(url)  # warm the identity cache so only steady-state queries are counted
+    with count_queries() as counter:
+        response = client.get(url)
+    assert response.status_code == 200
+    return counter.count
+
+
+def test_ride_listings_use_constant_queries(client, login, make_user, make_ride, count_queries):
+    student = make_user('student')
+    login(student)
+    drivers = [make_user('driver') for _ in range(3)]
+    urls = ['/api/rides', '/api/notifications', '/student/dashboard']
+
+    def add_rides(n):
+        for i in range(n):
+            make_ride(drivers[i % len(drivers)])
+            make_ride(drivers[i % len(drivers)], student_id=student.id, status='in_progress')
+
+    add_rides(2)
+    baseline = {url: _queries_per_request(client, count_queries, url) for url in urls}
+    add_rides(20)
+    grown = {url: _queries_per_request(client, count_queries, url) for url in urls}
+
+    assert grown == baseline
+
+
+def test_driver_dashboard_uses_constant_queries(client, login, make_user, make_ride, count_queries):
+    driver = make_user('driver')
+    login(driver)
+
+    def add_rides(n):
+        for _ in range(n):
+            student = make_user('student')
+            make_ride(driver, student_id=student.id, status='booked', is_group_ride=True)
+
+    add_rides(2)
+    baseline = _queries_per_request(client, count_queries, '/driver/dashboard')
+    add_rides(20)
+
+    assert _queries_per_request(client, count_queries, '/driver/dashboard') == baseline
+
+
+def test_api_rides_not_modified_reads_only_the_version(client, make_user, make_ride, count_queries):
+    make_ride(make_user('driver'))
+    etag = client.get('/api/rides').headers['ETag']
+
+    with count_queries() as counter:
+        response = client.get('/api/rides', headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert counter.count == 1 and 'ride_version' in counter.statements[0]
+
+
+def test_api_rides_etag_sees_writes_from_other_processes(client, make_user, make_ride):
+    ride = make_ride(make_user('driver'))
+    etag = client.get('/api/rides').headers['ETag']
+
+    # As another worker or a CLI command would: its own connection, no ORM session
+    with db.engine.begin() as conn:
+        conn.execute(text('UPDATE ride SET fare = 99 WHERE id = :id'), {'id': ride.id})
+
+    response = client.get('/api/rides', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def _read_stream_until(response, text):
+    received = ''
+    for chunk in response.response:
+        received += chunk.decode() if isinstance(chunk, bytes) else chunk
+        if text in received:
+            return received
+    return received
+
+
+def test_stream_pushes_ride_transitions(app, client, login, make_user, make_ride):
+    app.config.update(SSE_HEARTBEAT_SECONDS=0.01, SSE_MAX_STREAM_SECONDS=1)
+    driver = make_user('driver')
+    student = make_user('student')
+    ride = make_ride(driver)
+    login(student)
+    stream = client.get('/api/stream', buffered=False)
+    assert stream.mimetype == 'text/event-stream'
+
+    client.post('/api/book_ride', json={'ride_id': ride.id})
+
+    received = _read_stream_until(stream, 'event: notification')
+    stream.close()
+
+    assert 'event: ride.booked' in received
+    assert f'"id": {ride.id}' in received
+    assert '"status": "booked"' in received
+    assert '"event": "ride.booked"' in received
+    assert app.extensions['event_bus'].subscriber_count('rides') == 0
+
+
+def test_stream_for_single_ride_requires_login(client):
+    assert client.get('/api/stream?ride=1').status_code == 401
+
+
+def test_stream_refused_once_the_worker_holds_its_share(app, client, monkeypatch):
+    app.config.update(SSE_HEARTBEAT_SECONDS=0.01, SSE_MAX_STREAM_SECONDS=1)
+    monkeypatch.setattr('app.stream_slots', threading.BoundedSemaphore(1))
+    first = client.get('/api/stream', buffered=False)
+    assert first.status_code == 200
+
+    refused = client.get('/api/stream')
+    assert refused.status_code == 503
+    assert refused.headers['Retry-After'] == '30'
+
+    first.close()
+    second = client.get('/api/stream', buffered=False)
+    assert second.status_code == 200
+    second.close()
@@ -0,0 +1,84 @@
+"""
+Tests for ride archival and history paging
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from app import (db, archive_finished_rides, group_ride_archive, payment_archive, ride_archive,
+                 GroupRide, Notification, Payment, Ride, RideLocation)
+
+NOW = datetime(2030, 6, 1, 12, 0)
+
+
+def _count(table):
+    return db.session.scalar(select(func.count()).select_from(table))
+
+
+def test_archive_moves_old_finished_rides_with_children(app, make_user, make_ride):
+    driver, student = make_user('driver'), make_user('student')
+    old = make_ride(driver, status='completed', is_group_ride=True, max_passengers=3,
+                    pickup_time=NOW - timedelta(days=40))
+    recent = make_ride(driver, status='completed', pickup_time=NOW - timedelta(days=5))
+    active = make_ride(driver, pickup_time=NOW - timedelta(days=40))
+    db.session.add_all([
+        GroupRide(ride_id=old.id, student_id=student.id),
+        Payment(ride_id=old.id, student_id=student.id, amount=40, payment_method='upi'),
+        RideLocation(ride_id=old.id, lat=19.0, lng=72.8, recorded_at=NOW - timedelta(days=40)),
+        Notification(user_id=student.id, ride_id=old.id, event='ride.completed', message='done'),
+    ])
+    db.session.commit()
+    old_id = old.id
+
+    assert archive_finished_rides(now=NOW) == 1
+    assert {r.id for r in Ride.query} == {recent.id, active.id}
+    assert (GroupRide.query.count(), Payment.query.count(), RideLocation.query.count()) == (0, 0, 0)
+    assert (_count(ride_archive), _count(group_ride_archive), _count(payment_archive)) == (1, 1, 1)
+    assert db.session.execute(select(ride_archive.c.status).where(ride_archive.c.id == old_id)).scalar() == 'completed'
+    assert Notification.query.one().ride_id is None
+
+    # Nothing left to do on the next run
+    assert archive_finished_rides(now=NOW) == 0
+
+
+def test_archive_runs_in_batches(app, make_user, make_ride):
+    app.config['ARCHIVE_BATCH_SIZE'] = 2
+    try:
+        driver = make_user('driver')
+        for i in range(5):
+            make_ride(driver, status='cancelled', pickup_time=NOW - timedelta(days=60, minutes=i))
+        assert archive_finished_rides(now=NOW, max_batches=1) == 2
+        assert archive_finished_rides(now=NOW) == 3
+    finally:
+        app.config['ARCHIVE_BATCH_SIZE'] = 500
+
+
+def test_history_pages_across_hot_and_archive(client, login, make_user, make_ride):
+    driver, student = make_user('driver'), make_user('student')
+    ride_ids = [make_ride(driver, student_id=student.id, status='completed', pickup_time=NOW - timedelta(days=d)).id
+                for d in (10, 20, 50, 60, 70)]
+    make_ride(driver, student_id=student.id, status='booked', pickup_time=NOW + timedelta(days=1))
+    archive_finished_rides(now=NOW)
+    assert _count(ride_archive) == 3
+
+    for user in (driver, student):
+        login(user)
+        seen, archived, url = [], [], '/api/history?limit=2'
+        while url:
+            response = client.get(url)
+            seen += [r['id'] for r in response.get_json()]
+            archived += [r['archived'] for r in response.get_json()]
+            cursor = response.headers.get('X-Next-Cursor')
+            url = f'/api/history?limit=2&cursor={cursor}' if cursor else None
+        assert seen == ride_ids
+        assert archived == [False, False, True, True, True]
+
+
+def test_driver_dashboard_lists_only_active_rides(client, login, make_user, make_ride):
+    driver = make_user('driver')
+    make_ride(driver, pickup_location='Finished Stop', status='completed')
+    make_ride(driver, pickup_location='Upcoming Stop')
+    login(driver)
+    html = client.get('/driver/dashboard').get_data(as_text=True)
+    assert 'Upcoming Stop' in html and 'Finished Stop' not in html
@@ -0,0 +1,146 @@
+"""
+Tests for the async API (async_api.py)
+"""
+
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+from flask import g
+
+pytest.importorskip('aiosqlite')
+pytest.importorskip('a2wsgi')
+
+from app import Notification, RideLocation, db, publish_ride_event
+from async_api import AsyncAPI, async_database_url
+
+
+@pytest.fixture
+def api(app):
+    return AsyncAPI(app, wsgi_threads=2)
+
+
+def run(api, scenario):
+    async def main():
+        try:
+            return await scenario()
+        finally:
+            await api.engine.dispose()
+    return asyncio.run(main())
+
+
+async def fetch(api, path, headers=None, until=None):
+    """Call the ASGI app; with until, disconnect once the body contains it"""
+    path, _, query = path.partition('?')
+    scope = {
+        'type': 'http', 'method': 'GET', 'path': path, 'query_string': query.encode(), 'root_path': '',
+        'http_version': '1.1', 'scheme': 'http', 'server': ('testserver', 80), 'client': ('127.0.0.1', 1234),
+        'headers': [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+    }
+    response = {'body': b''}
+    disconnect = asyncio.Event()
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+            response['headers'] = {name.decode(): value.decode() for name, value in message['headers']}
+        else:
+            response['body'] += message.get('body', b'')
+            if until is not None and until in response['body']:
+                disconnect.set()
+
+    await asyncio.wait_for(api(scope, receive, send), 5)
+    return response
+
+
+def session_cookie(client):
+    return {'Cookie': f"session={client.get_cookie('session').value}"}
+
+
+def test_async_database_url():
+    assert async_database_url('sqlite:////tmp/edu.db') == 'sqlite+aiosqlite:////tmp/edu.db'
+    assert async_database_url('postgresql+psycopg2://u@db/edu') == 'postgresql+asyncpg://u@db/edu'
+    with pytest.raises(ValueError):
+        async_database_url('mysql://u@db/edu')
+
+
+def test_rides_match_the_flask_view(api, client, make_user, make_ride):
+    driver = make_user('driver')
+    for _ in range(3):
+        make_ride(driver)
+    expected = client.get('/api/rides?limit=2&pickup=sion')
+
+    async def scenario():
+        page = await fetch(api, '/api/rides?limit=2&pickup=sion')
+        cached = await fetch(api, '/api/rides?limit=2&pickup=sion', {'If-None-Match': page['headers']['etag']})
+        bad = await fetch(api, '/api/rides?limit=0')
+        return page, cached, bad
+
+    page, cached, bad = run(api, scenario)
+    assert page['status'] == 200 and json.loads(page['body']) == expected.get_json()
+    for header in ('ETag', 'X-Next-Cursor', 'Link'):
+        assert page['headers'][header.lower()] == expected.headers[header]
+    assert cached['status'] == 304 and bad['status'] == 400
+
+
+def test_notifications_use_the_flask_session(api, client, login, make_user, make_ride):
+    student = make_user('student')
+    ride = make_ride(make_user('driver'))
+    db.session.add_all([Notification(user_id=student.id, ride=ride, event='ride.booked', message=f'n{i}')
+                        for i in range(3)])
+    db.session.commit()
+    login(student)
+    expected = client.get('/api/notifications?since=1')
+    # Flask runs on a2wsgi threads inside this test's app context; drop its cached user
+    g.pop('_login_user', None)
+
+    async def scenario():
+        polled = await fetch(api, '/api/notifications?since=1', session_cookie(client))
+        anonymous = await fetch(api, '/api/notifications')  # handed to Flask
+        return polled, anonymous
+
+    polled, anonymous = run(api, scenario)
+    assert json.loads(polled['body']) == expected.get_json()
+    assert polled['headers']['x-next-cursor'] == expected.headers['X-Next-Cursor']
+    assert anonymous['status'] == 302 and '/login' in anonymous['headers']['location']
+
+
+def test_location_trail_and_event_stream(app, api, client, login, make_user, make_ride):
+    driver = make_user('driver')
+    ride = make_ride(driver, status='in_progress')
+    # Not in the live buffer, so both read the persisted trail
+    db.session.add_all([RideLocation(ride_id=ride.id, lat=19.07, lng=72.87 + i / 100,
+                                     recorded_at=datetime(2030, 1, 1, 8, i)) for i in range(3)])
+    db.session.commit()
+    login(make_user('student'))
+    outsider = session_cookie(client)
+    login(driver)
+
+    async def scenario():
+        refused = [(await fetch(api, path, outsider))['status']
+                   for path in (f'/api/rides/{ride.id}/location', f'/api/stream?ride={ride.id}')]
+        assert refused == [403, 403]
+        trail = await fetch(api, f'/api/rides/{ride.id}/location?limit=2', session_cookie(client))
+        stream = asyncio.ensure_future(fetch(api, f'/api/stream?ride={ride.id}', session_cookie(client),
+                                             until=b'event: ride.completed'))
+        while not app.extensions['event_bus'].subscriber_count(f'ride:{ride.id}'):
+            await asyncio.sleep(0.01)
+        publish_ride_event('ride.completed', ride)
+        return trail, await stream
+
+    trail, stream = run(api, scenario)
+    expected = client.get(f'/api/rides/{ride.id}/location?limit=2').get_json()
+    assert json.loads(trail['body']) == expected and len(expected['points']) == 2
+    assert stream['headers']['content-type'].startswith('text/event-stream')
+    assert stream['body'].startswith(b'retry: 3000') and b'"status": "in_progress"' in stream['body']
+    assert app.extensions['event_bus'].subscriber_count(f'ride:{ride.id}') == 0
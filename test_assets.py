@@ -0,0 +1,80 @@
+"""
+Tests for the fingerprinted, precompressed static asset build
+"""
+
+import gzip
+import json
+
+from flask import url_for
+
+from assets import build_assets, minify_css, minify_js
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def test_minifiers_are_conservative():
+    js = minify_js('// header\nfunction f() {\n    // inline\n    return `\n  // kept\n  <b>x</b>`;\n}\n\n')
+    assert js == 'function f() {\nreturn `\n  // kept\n  <b>x</b>`;\n}\n'
+    assert minify_css('/* c */\n.a ,\n.b {\n  color: red;\n  margin: 0 auto;\n}\n') == '.a,.b{color: red;margin: 0 auto}'
+
+
+def test_build_fingerprints_rewrites_and_precompresses(tmp_path):
+    write(tmp_path / 'js' / 'app.js', '// app\n' + 'console.log("hello");\n' * 50)
+    write(tmp_path / 'fonts' / 'icons.woff2', 'font')
+    write(tmp_path / 'css' / 'site.css', '@font-face { src: url("../fonts/icons.woff2?v=1"); }\n')
+
+    manifest = build_assets(str(tmp_path))
+    assert manifest['js/app.js'].startswith('js/app.') and manifest['js/app.js'].endswith('.js')
+    assert json.loads((tmp_path / 'dist' / 'manifest.json').read_text()) == manifest
+
+    css = (tmp_path / 'dist' / manifest['css/site.css']).read_text()
+    assert f"url(../{manifest['fonts/icons.woff2']}?v=1)" in css
+    built_js = tmp_path / 'dist' / manifest['js/app.js']
+    assert gzip.decompress((tmp_path / 'dist' / (manifest['js/app.js'] + '.gz')).read_bytes()) == built_js.read_bytes()
+
+    # Unchanged sources keep their names; a change gets a new one
+    assert build_assets(str(tmp_path))['js/app.js'] == manifest['js/app.js']
+    write(tmp_path / 'js' / 'app.js', 'console.log("changed");\n')
+    assert build_assets(str(tmp_path))['js/app.js'] != manifest['js/app.js']
+
+
+def test_manifest_urls_are_served_precompressed_and_immutable(app, client, tmp_path, monkeypatch):
+    write(tmp_path / 'js' / 'app.js', 'console.log("hello");\n' * 50)
+    manifest = build_assets(str(tmp_path))
+    monkeypatch.setattr(app, 'static_folder', str(tmp_path))
+    monkeypatch.setitem(app.extensions, 'asset_manifest', manifest)
+
+    with app.test_request_context():
+        url = url_for('static', filename='js/app.js')
+    assert url == f"/static/dist/{manifest['js/app.js']}"
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.mimetype == 'text/javascript'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.data).startswith(b'console.log')
+
+    plain = client.get(url)
+    assert 'Content-Encoding' not in plain.headers and plain.data.startswith(b'console.log')
+
+
+def test_page_scripts_are_static_files(client, login, make_user):
+    login(make_user('student'))
+    html = client.get('/student/dashboard').get_data(as_text=True)
+    assert 'function bookRide' not in html
+    assert '/static/js/student_dashboard.js' in html
+
+
+def test_driver_pages_have_no_inline_scripts(client, login, make_user, make_ride):
+    driver = make_user('driver')
+    ride = make_ride(driver)
+    login(driver)
+    for url, script in (('/driver/dashboard', 'driver_dashboard.js'), ('/create_ride', 'create_ride.js'),
+                        (f'/generate_qr/{ride.id}', 'qr_payment.js')):
+        html = client.get(url).get_data(as_text=True)
+        assert '<script>' not in html
+        assert f'/static/js/{script}' in html
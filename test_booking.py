@@ -0,0 +1,98 @@
+"""
+Concurrency tests for ride booking
+"""
+
+import threading
+
+from app import db, Ride, GroupRide
+
+
+def _book_concurrently(app, students, ride_ids):
+    """Have every student try to book every ride from its own thread.
+
+    Returns the status code of every attempt.
+    """
+    barrier = threading.Barrier(len(students))
+    outcomes = []
+    lock = threading.Lock()
+
+    def worker(student_id):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(student_id)
+        barrier.wait()
+        for ride_id in ride_ids:
+            response = client.post('/api/book_ride', json={'ride_id': ride_id})
+            with lock:
+                outcomes.append(response.status_code)
+
+    threads = [threading.Thread(target=worker, args=(student_id,)) for student_id in students]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return outcomes
+
+
+def test_concurrent_booking_never_overbooks(app, make_user, make_ride):
+    driver = make_user('driver')
+    students = [make_user('student').id for _ in range(16)]
+    solo_rides = [make_ride(driver).id for _ in range(5)]
+    group_rides = [make_ride(driver, is_group_ride=True, max_passengers=3).id for _ in range(5)]
+    db.session.remove()
+
+    outcomes = _book_concurrently(app, students, solo_rides + group_rides)
+    successes = outcomes.count(200)
+
+    # Every attempt is answered: a booking or a clean rejection, never a lock error
+    assert len(outcomes) == len(students) * len(solo_rides + group_rides)
+    assert set(outcomes) <= {200, 400}
+    assert successes == len(solo_rides) * 1 + len(group_rides) * 3
+    for ride in Ride.query.filter(Ride.id.in_(solo_rides)):
+        assert (ride.status, ride.current_passengers) == ('booked', 1)
+        assert ride.student_id in students
+    for ride in Ride.query.filter(Ride.id.in_(group_rides)):
+        assert (ride.status, ride.current_passengers) == ('booked', 3)
+        assert ride.student_id is None
+        assert GroupRide.query.filter_by(ride_id=ride.id).count() == 3
+
+
+def test_group_ride_member_cannot_join_twice(client, login, make_user, make_ride):
+    ride = make_ride(make_user('driver'), is_group_ride=True, max_passengers=4)
+    login(make_user('student'))
+
+    assert client.post('/api/book_ride', json={'ride_id': ride.id}).status_code == 200
+    second = client.post('/api/book_ride', json={'ride_id': ride.id})
+
+    assert second.status_code == 400
+    assert second.get_json()['error'] == 'You have already joined this ride'
+    db.session.refresh(ride)
+    assert (ride.status, ride.current_passengers) == ('available', 1)
+
+
+def test_full_group_ride_is_rejected(client, login, make_user, make_ride):
+    ride = make_ride(make_user('driver'), is_group_ride=True, max_passengers=1)
+    login(make_user('student'))
+    client.post('/api/book_ride', json={'ride_id': ride.id})
+
+    login(make_user('student'))
+    response = client.post('/api/book_ride', json={'ride_id': ride.id})
+
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Ride not available'
+
+
+def test_sqlite_connections_use_wal_and_busy_timeout(app):
+    with db.engine.connect() as conn:
+        assert conn.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+        assert conn.exec_driver_sql('PRAGMA busy_timeout').scalar() == app.config['SQLITE_BUSY_TIMEOUT_MS']
+
+
+def test_engine_options_skip_pooling_for_memory_sqlite():
+    from config import engine_options
+    assert engine_options('sqlite://') == {}
+    assert engine_options('sqlite:///:memory:') == {}
+    options = engine_options('postgresql://db/edu_ride')
+    assert options['pool_pre_ping'] and options['pool_size'] > 0
+    assert 'connect_args' not in options
@@ -0,0 +1,96 @@
+"""
+Tests for the trigger-maintained driver statistics and the paged dashboard
+"""
+
+from datetime import date, datetime
+
+from sqlalchemy import create_engine, text
+
+import migrations
+from app import archive_finished_rides, db, driver_summary, settle_payments, Payment, Ride
+
+
+def test_stats_follow_a_group_ride_through_its_lifecycle(client, login, make_user, make_ride):
+    driver = make_user('driver')
+    ride = make_ride(driver, is_group_ride=True, max_passengers=3, fare=50.0,
+                     pickup_time=datetime(2030, 1, 7, 8, 0))
+    make_ride(driver, pickup_time=datetime(2030, 1, 20, 8, 0))
+    for _ in range(2):
+        login(make_user('student'))
+        assert client.post('/api/book_ride', json={'ride_id': ride.id}).status_code == 200
+
+    login(driver)
+    client.post('/api/start_ride', json={'ride_id': ride.id})
+    assert client.get('/api/driver/stats').get_json()['rides']['in_progress'] == 1
+    client.post('/api/complete_ride', json={'ride_id': ride.id})
+    client.post(f'/api/rides/{ride.id}/cash_received')
+    settle_payments()
+
+    # Earnings count what each passenger is charged: ceil(50 / 3) per seat
+    charged = sum(payment.amount for payment in Payment.query)
+    summary = driver_summary(driver.id, today=date(2030, 1, 9))
+    assert summary['rides'] == {'available': 1, 'booked': 0, 'in_progress': 0, 'completed': 1, 'cancelled': 0}
+    assert summary['active_rides'] == 1
+    assert summary['earnings'] == {'today': 0, 'week': 34.0, 'month': 34.0, 'total': 34.0}
+    assert summary['collected'] == charged == 34.0
+    assert summary['group_fill_rate'] == 0.667
+
+
+def test_archiving_keeps_totals_and_cancelling_moves_them(app, make_user, make_ride):
+    driver = make_user('driver')
+    make_ride(driver, status='completed', student_id=make_user('student').id, current_passengers=1,
+              pickup_time=datetime(2020, 1, 1, 8, 0))
+    upcoming = make_ride(driver)
+    archive_finished_rides()
+    upcoming.status = 'cancelled'
+    db.session.commit()
+
+    summary = driver_summary(driver.id)
+    assert summary['rides']['completed'] == 1 and summary['rides']['cancelled'] == 1
+    assert summary['earnings']['total'] == 40.0
+    assert summary['active_rides'] == 0
+
+
+def test_dashboard_pages_upcoming_rides(client, login, make_user, make_ride):
+    driver = make_user('driver')
+    for i in range(25):
+        make_ride(driver, pickup_location=f'Stop {i:02d}')
+    login(driver)
+
+    first = client.get('/driver/dashboard').get_data(as_text=True)
+    assert 'Stop 19' in first and 'Stop 20' not in first
+    cursor = first.split('cursor=')[1].split('"')[0]
+    rest = client.get(f'/driver/dashboard?cursor={cursor}').get_data(as_text=True)
+    assert 'Stop 20' in rest and 'Stop 24' in rest and 'Stop 19' not in rest
+    assert client.get('/driver/dashboard?cursor=junk').status_code == 302
+
+
+def test_upgrade_counts_existing_rides(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TRIGGER ride_stats_ad"))
+        conn.execute(text("INSERT INTO ride (id, ride_id, driver_id, pickup_location, dropoff_location, "
+                          "pickup_time, status, fare, current_passengers) VALUES (1, 'r1', 1, 'Sion', "
+                          "'Kurla', '2030-01-01 08:00:00', 'completed', 40, 1)"))
+
+    assert 'backfill driver_stats' in migrations.upgrade(engine, db.metadata)
+    assert migrations.upgrade(engine, db.metadata) == []
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT status, rides, earnings FROM driver_stats")).all() == [('completed', 1, 40.0)]
+        assert conn.execute(text("SELECT day, earnings FROM driver_daily_stats")).all() == [('2030-01-01', 40.0)]
+
+
+def test_upgrade_replaces_outdated_triggers(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TRIGGER ride_stats_ai"))
+        conn.execute(text("CREATE TRIGGER ride_stats_ai AFTER INSERT ON ride BEGIN SELECT 1; END"))
+        conn.execute(text("INSERT INTO ride (id, ride_id, driver_id, pickup_location, dropoff_location, "
+                          "pickup_time, status, fare, is_group_ride, max_passengers, current_passengers) "
+                          "VALUES (1, 'r1', 1, 'Sion', 'Kurla', '2030-01-01 08:00:00', 'completed', 50, 1, 3, 2)"))
+
+    assert 'create trigger ride_stats_ai' in migrations.upgrade(engine, db.metadata)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT earnings FROM driver_stats")).scalar() == 34.0
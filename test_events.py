@@ -0,0 +1,150 @@
+"""
+Tests for the live-update event bus
+"""
+
+import asyncio
+import queue
+import threading
+import time
+
+from events import ChannelFeed, LocalEventBus, RedisEventBus, load_event_bus, format_sse
+
+
+class FakeRedis:
+    """The parts of a Redis server RedisEventBus uses: its publish script and pub/sub"""
+
+    def __init__(self):
+        self.last_id = 0
+        self.listeners = []
+        self.lock = threading.Lock()
+
+    def register_script(self, source):
+        def publish(keys, args):
+            with self.lock:
+                self.last_id += 1
+                for inbox in self.listeners:
+                    inbox.put({'type': 'message', 'data': f'{self.last_id} {args[0]}'.encode()})
+                return self.last_id
+        return publish
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        server, inbox = self, queue.Queue()
+
+        class PubSub:
+            def subscribe(self, channel):
+                server.listeners.append(inbox)
+
+            def listen(self):
+                while True:
+                    yield inbox.get()
+
+            def close(self):
+                pass
+        return PubSub()
+
+
+def test_publish_reaches_only_matching_subscribers():
+    bus = LocalEventBus()
+    rides = bus.subscribe(['rides'])
+    other = bus.subscribe(['ride:1'])
+
+    bus.publish('rides', 'ride.created', {'id': 1})
+
+    event = rides.get(timeout=0.1)
+    assert (event.type, event.data) == ('ride.created', {'id': 1})
+    assert other.get(timeout=0.01) is None
+
+
+def test_subscribe_replays_history_after_last_event_id():
+    bus = LocalEventBus()
+    first = bus.publish('rides', 'ride.created', {'id': 1})
+    bus.publish('ride:1', 'ride.booked', {'id': 1})
+    bus.publish('rides', 'ride.booked', {'id': 1})
+
+    subscription = bus.subscribe(['rides'], last_event_id=first.id)
+
+    assert subscription.get(timeout=0.1).type == 'ride.booked'
+    assert subscription.get(timeout=0.01) is None
+
+
+def test_slow_subscriber_is_marked_overflowed():
+    bus = LocalEventBus(queue_size=2)
+    subscription = bus.subscribe(['rides'])
+
+    for i in range(3):
+        bus.publish('rides', 'ride.created', {'id': i})
+
+    assert subscription.overflowed
+
+
+def test_closed_subscription_is_removed():
+    bus = LocalEventBus()
+    with bus.subscribe(['rides', 'user:1']):
+        assert bus.subscriber_count() == 1
+    assert bus.subscriber_count() == 0
+
+
+def test_close_all_wakes_blocked_subscribers():
+    bus = LocalEventBus()
+    subscription = bus.subscribe(['rides'])
+    threading.Timer(0.05, bus.close_all).start()
+
+    started = time.monotonic()
+    assert subscription.get(timeout=5) is None
+    assert subscription.closed
+    assert time.monotonic() - started < 1
+
+
+def test_get_async_wakes_on_publish_from_another_thread():
+    bus = LocalEventBus()
+    subscription = bus.subscribe(['rides'])
+
+    async def wait():
+        assert await subscription.get_async(timeout=0.01) is None
+        threading.Timer(0.05, bus.publish, args=('rides', 'ride.created', {'id': 1})).start()
+        return await subscription.get_async(timeout=5)
+
+    started = time.monotonic()
+    assert asyncio.run(wait()).type == 'ride.created'
+    assert time.monotonic() - started < 1
+
+
+def test_redis_bus_delivers_across_workers():
+    server = FakeRedis()
+    worker_a, worker_b = RedisEventBus(client=server), RedisEventBus(client=server)
+    subscription = worker_b.subscribe(['rides'])
+
+    first = worker_a.publish('rides', 'ride.created', {'id': 1})
+    worker_b.publish('ride:1', 'ride.booked', {'id': 1})
+    worker_a.publish('rides', 'ride.booked', {'id': 1})
+
+    received = [subscription.get(timeout=1), subscription.get(timeout=1)]
+    assert [(e.id, e.type, e.data) for e in received] == [(1, 'ride.created', {'id': 1}), (3, 'ride.booked', {'id': 1})]
+    resumed = worker_b.subscribe(['rides'], last_event_id=first.id)
+    assert resumed.get(timeout=1).id == 3
+
+
+def test_channel_feed_applies_events_and_resets_after_overflow():
+    bus = LocalEventBus(queue_size=2)
+    handled, resets = [], []
+    feed = ChannelFeed(bus, 'sync', lambda event: handled.append(event.data), lambda: resets.append(True))
+
+    feed.drain()
+    bus.publish('sync', 'index', 1)
+    bus.publish('rides', 'ride.created', 2)
+    feed.drain()
+    assert (handled, len(resets)) == ([1], 1)
+
+    for i in range(3):
+        bus.publish('sync', 'index', i)
+    feed.drain()
+    assert (handled, len(resets), feed.resets) == ([1], 2, 1)
+
+
+def test_load_event_bus_accepts_import_spec():
+    assert isinstance(load_event_bus('events:LocalEventBus'), LocalEventBus)
+
+
+def test_format_sse():
+    event = LocalEventBus().publish('rides', 'ride.created', {'id': 7})
+    assert format_sse(event) == f'id: {event.id}\nevent: ride.created\ndata: {{"id": 7}}\n\n'
@@ -0,0 +1,79 @@
+"""
+Tests for streaming exports and the admin user listing
+"""
+
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timedelta
+
+from app import db, archive_finished_rides, Payment
+from exports import csv_chunks, gzip_chunks
+
+
+def test_csv_chunks_escape_formulas_and_stream():
+    rows = ((i, '=HYPERLINK("x")' if i == 0 else f'stop {i}') for i in range(5000))
+    chunks = list(csv_chunks(('id', 'name'), rows))
+    assert len(chunks) > 1
+    parsed = list(csv.reader(io.StringIO(b''.join(chunks).decode())))
+    assert parsed[1] == ['0', '\'=HYPERLINK("x")']
+    assert len(parsed) == 5001
+
+    assert gzip.decompress(b''.join(gzip_chunks(iter(chunks)))) == b''.join(chunks)
+
+
+def test_driver_exports_only_own_rides(client, login, make_user, make_ride):
+    driver, other = make_user('driver'), make_user('driver')
+    mine = make_ride(driver, pickup_time=datetime(2030, 1, 1, 8), status='completed')
+    make_ride(driver, pickup_time=datetime(2030, 2, 1, 8))
+    make_ride(other)
+    login(driver)
+
+    response = client.get('/api/export/rides.csv?from=2030-01-01&to=2030-01-31')
+    assert response.is_streamed
+    assert response.mimetype == 'text/csv'
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [int(r['id']) for r in rows] == [mine.id]
+
+    assert client.get(f'/api/export/rides.csv?driver_id={other.id}').status_code == 403
+    assert client.get('/api/export/rides.xml').status_code == 404
+    login(make_user('student'))
+    assert client.get('/api/export/rides.csv').status_code == 403
+
+
+def test_payment_export_ndjson_gzip_includes_archive(client, login, make_user, make_ride):
+    driver, student = make_user('driver'), make_user('student')
+    now = datetime(2030, 6, 1)
+    for days in (60, 1):
+        ride = make_ride(driver, student_id=student.id, status='completed', pickup_time=now - timedelta(days=days))
+        db.session.add(Payment(ride_id=ride.id, student_id=student.id, amount=days, payment_method='upi',
+                               created_at=now - timedelta(days=days)))
+    db.session.commit()
+    assert archive_finished_rides(now=now) == 1
+    login(driver)
+
+    response = client.get('/api/export/payments.ndjson', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    lines = gzip.decompress(response.get_data()).decode().splitlines()
+    payments = [json.loads(line) for line in lines]
+    assert [(p['amount'], p['archived'], p['driver_id']) for p in payments] == [(1, False, driver.id),
+                                                                                (60, True, driver.id)]
+
+
+def test_admin_user_listing_is_paginated_and_restricted(app, client, login, make_user, monkeypatch):
+    admin = make_user('driver', username='ops')
+    users = [make_user() for _ in range(4)]
+    login(users[0])
+    assert client.get('/admin/users').status_code == 403
+    assert client.get('/debug/users').status_code == 404
+
+    monkeypatch.setitem(app.config, 'ADMIN_USERNAMES', {'ops'})
+    login(admin)
+    seen, url = [], '/admin/users?limit=2&user_type=student'
+    while url:
+        response = client.get(url)
+        seen += [u['id'] for u in response.get_json()]
+        cursor = response.headers.get('X-Next-Cursor')
+        url = f'/admin/users?limit=2&user_type=student&cursor={cursor}' if cursor else None
+    assert seen == [u.id for u in users]
@@ -0,0 +1,141 @@
+"""
+Tests for fare and ETA estimation
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import numpy as np
+import pytest
+
+from app import CachedRoute, Ride
+from fares import FareEngine, FareParams, HaversineRouter, OSRMRouter, RoutingError
+from geo import haversine_m
+
+SION = (19.0330, 72.8570)
+SOMAIYA = (19.0728, 72.8997)
+
+
+class CountingRouter(HaversineRouter):
+    name = 'counting'
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def route_many(self, *columns):
+        self.calls.append(len(columns[0]))
+        return super().route_many(*columns)
+
+
+class OSRMStandIn(BaseHTTPRequestHandler):
+    """Answers /route/v1 like OSRM, with a fixed 1.5x road factor at 10 m/s"""
+
+    def do_GET(self):
+        coords = self.path.split('/')[-1].split('?')[0]
+        (lng1, lat1), (lng2, lat2) = [map(float, point.split(',')) for point in coords.split(';')]
+        distance = haversine_m(lat1, lng1, lat2, lng2) * 1.5
+        body = json.dumps({'code': 'Ok', 'routes': [{'distance': distance, 'duration': distance / 10}]})
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def osrm_url():
+    server = HTTPServer(('127.0.0.1', 0), OSRMStandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+
+
+def test_haversine_router_is_vectorised():
+    router = HaversineRouter(road_factor=1.3, speed_kmh=18)
+    distance, duration = router.route_many([SION[0]] * 2, [SION[1]] * 2, [SOMAIYA[0], SION[0]], [SOMAIYA[1], SION[1]])
+    assert distance[0] == pytest.approx(haversine_m(*SION, *SOMAIYA) * 1.3)
+    assert distance[1] == 0
+    assert duration[0] == pytest.approx(distance[0] / 5)
+
+
+def test_fare_params_price():
+    params = FareParams(base_fare=23, base_km=1.5, per_km=15, per_minute=0, minimum=23)
+    assert list(params.price(np.array([500, 5500]), np.array([60, 600]))) == [23, 83]
+
+
+def test_engine_caches_corridors_by_cell():
+    router = CountingRouter()
+    engine = FareEngine(router)
+    first = engine.estimate(*SION, *SOMAIYA)
+    # A few meters away is the same pair of cells
+    again = engine.estimate(SION[0] + 0.0001, SION[1], *SOMAIYA)
+    assert router.calls == [1]
+    assert again == dict(first, cached=True)
+
+    batch = engine.estimate_many([SION[0], SOMAIYA[0], SION[0]], [SION[1], SOMAIYA[1], SION[1]],
+                                 [SOMAIYA[0], SION[0], SOMAIYA[0]], [SOMAIYA[1], SION[1], SOMAIYA[1]])
+    assert router.calls == [1, 1]  # only the reverse corridor was routed
+    assert list(batch['cached']) == [True, False, True]
+
+
+def test_engine_uses_persistent_store():
+    stored = {}
+    first = FareEngine(CountingRouter(), store=stored.update)
+    first.estimate(*SION, *SOMAIYA)
+    router = CountingRouter()
+    second = FareEngine(router, lookup=lambda keys: {k: stored[k] for k in keys if k in stored})
+    second.estimate(*SION, *SOMAIYA)
+    assert router.calls == [] and second.store_hits == 1
+
+
+def test_osrm_router_and_fallback(osrm_url):
+    router = OSRMRouter(osrm_url)
+    distance, duration = router.route(*SION, *SOMAIYA)
+    assert distance == pytest.approx(haversine_m(*SION, *SOMAIYA) * 1.5, rel=1e-4)
+    assert duration == pytest.approx(distance / 10)
+
+    down = OSRMRouter('http://127.0.0.1:9', timeout=0.5)
+    with pytest.raises(RoutingError):
+        down.route(*SION, *SOMAIYA)
+    stored = {}
+    engine = FareEngine(down, fallback=HaversineRouter(), store=stored.update)
+    assert engine.estimate(*SION, *SOMAIYA)['distance_m'] > 0
+    assert stored == {}
+
+
+def test_fare_api_persists_routes_and_prices_rides(client, login, make_user, make_ride):
+    driver = make_user('driver')
+    priced = make_ride(driver, pickup_lat=SION[0], pickup_lng=SION[1], dropoff_lat=SOMAIYA[0],
+                       dropoff_lng=SOMAIYA[1], is_group_ride=True, max_passengers=3)
+    unpinned = make_ride(driver)
+    login(make_user('student'))
+
+    response = client.get('/api/fare/estimate', query_string={
+        'pickup_lat': SION[0], 'pickup_lng': SION[1], 'dropoff_lat': SOMAIYA[0], 'dropoff_lng': SOMAIYA[1]})
+    estimate = response.get_json()
+    assert estimate['distance_m'] > 5000 and estimate['fare'] >= 23
+    assert CachedRoute.query.count() == 1
+
+    batch = client.post('/api/fare/batch', json={'ride_ids': [priced.id, unpinned.id]}).get_json()
+    assert batch[str(unpinned.id)] is None
+    assert batch[str(priced.id)]['per_seat_fare'] == -(-estimate['fare'] // 3)
+    assert client.get('/api/fare/estimate?pickup_lat=200').status_code == 400
+
+
+def test_create_ride_suggests_fare_when_blank(client, login, make_user):
+    login(make_user('driver'))
+    form = {'pickup_location': 'Sion', 'dropoff_location': 'Somaiya', 'pickup_time': '2030-01-01T08:00',
+            'fare': '', 'pickup_lat': SION[0], 'pickup_lng': SION[1],
+            'dropoff_lat': SOMAIYA[0], 'dropoff_lng': SOMAIYA[1]}
+    client.post('/create_ride', data=form)
+    ride = Ride.query.one()
+    assert ride.fare >= 23
+
+    response = client.get(f'/api/rides/{ride.id}/eta')
+    assert response.get_json()['source'] == 'pickup'
+    assert response.get_json()['distance_m'] > 5000
@@ -0,0 +1,101 @@
+"""
+Tests for the nearby-ride spatial index
+"""
+
+import random
+
+from app import SYNC_CHANNEL, ride_index_entry
+from geo import GridIndex, geohash_center, geohash_encode, haversine_m
+
+SION = (19.0390, 72.8619)
+SOMAIYA = (19.0728, 72.8997)
+
+
+def test_haversine_known_distance():
+    assert 5000 < haversine_m(*SION, *SOMAIYA) < 5500
+
+
+def test_geohash_round_trip():
+    assert geohash_encode(57.64911, 10.40744, 11) == 'u4pruydqqvj'
+    lat, lng = geohash_center(geohash_encode(19.0330, 72.8570, 7))
+    assert haversine_m(lat, lng, 19.0330, 72.8570) < 110
+
+
+def test_grid_index_matches_brute_force():
+    rng = random.Random(42)
+    index = GridIndex(cell_degrees=0.01)
+    points = {}
+    for key in range(2000):
+        lat = SION[0] + rng.uniform(-0.1, 0.1)
+        lng = SION[1] + rng.uniform(-0.1, 0.1)
+        points[key] = (lat, lng)
+        index.upsert(key, lat, lng)
+
+    expected = sorted((haversine_m(*SION, lat, lng), key) for key, (lat, lng) in points.items()
+                      if haversine_m(*SION, lat, lng) <= 3000)
+
+    assert [key for key, _ in index.nearby(*SION, 3000)] == [key for _, key in expected]
+
+
+def test_grid_index_upsert_moves_and_remove_deletes():
+    index = GridIndex()
+    index.upsert('ride', *SION)
+    index.upsert('ride', *SOMAIYA)
+
+    assert [key for key, _ in index.nearby(*SION, 1000)] == []
+    assert [key for key, _ in index.nearby(*SOMAIYA, 1000)] == ['ride']
+
+    index.remove('ride')
+    assert len(index) == 0
+
+
+def test_grid_index_time_order():
+    index = GridIndex()
+    index.upsert('near_late', SION[0], SION[1], sort_value=200)
+    index.upsert('far_early', SION[0] + 0.005, SION[1], sort_value=100)
+
+    assert [key for key, _ in index.nearby(*SION, 2000)] == ['near_late', 'far_early']
+    assert [key for key, _ in index.nearby(*SION, 2000, order='time')] == ['far_early', 'near_late']
+
+
+def test_api_rides_nearby_tracks_ride_lifecycle(client, login, make_user, make_ride):
+    driver = make_user('driver')
+    near = make_ride(driver, pickup_lat=SION[0] + 0.001, pickup_lng=SION[1])
+    make_ride(driver, pickup_lat=SOMAIYA[0], pickup_lng=SOMAIYA[1])
+    make_ride(driver)  # no coordinates
+
+    url = f'/api/rides/nearby?lat={SION[0]}&lng={SION[1]}&radius=1000'
+    response = client.get(url)
+    assert [r['id'] for r in response.get_json()] == [near.id]
+    assert 100 <= response.get_json()[0]['distance_m'] <= 120
+
+    # Rides created after the index is loaded are added incrementally
+    login(driver)
+    client.post('/create_ride', data={
+        'pickup_location': 'Sion Circle', 'dropoff_location': 'Somaiya', 'fare': '40',
+        'pickup_time': '2030-01-01T07:00', 'pickup_lat': str(SION[0]), 'pickup_lng': str(SION[1])
+    })
+    created = client.get(url).get_json()
+    assert [r['pickup_location'] for r in created] == ['Sion Circle', near.pickup_location]
+
+    # Booked rides drop out
+    login(make_user('student'))
+    client.post('/api/book_ride', json={'ride_id': near.id})
+    assert [r['pickup_location'] for r in client.get(url).get_json()] == ['Sion Circle']
+
+
+def test_api_rides_nearby_follows_rides_indexed_by_another_worker(app, client, make_user, make_ride):
+    url = f'/api/rides/nearby?lat={SION[0]}&lng={SION[1]}&radius=1000'
+    assert client.get(url).get_json() == []
+
+    # Committed and announced elsewhere: this worker only learns of it from the bus
+    ride = make_ride(make_user('driver'), pickup_lat=SION[0], pickup_lng=SION[1])
+    assert client.get(url).get_json() == []
+    app.extensions['event_bus'].publish(SYNC_CHANNEL, 'index', {'rides': [ride_index_entry(ride)]})
+    assert [r['id'] for r in client.get(url).get_json()] == [ride.id]
+
+
+def test_api_rides_nearby_validates_input(client):
+    assert client.get('/api/rides/nearby?lat=100&lng=72').status_code == 400
+    assert client.get('/api/rides/nearby?lat=19&lng=72&radius=999999').status_code == 400
+    assert client.get('/api/rides/nearby?lat=19&lng=72&sort=price').status_code == 400
@@ -0,0 +1,106 @@
+"""
+Tests for the cached current-user identity
+"""
+
+import time
+
+import pytest
+
+from app import db, SYNC_CHANNEL, User
+from identity import Identity, IdentityCache
+
+
+class FakeUser:
+    def __init__(self, user_id, username='alice'):
+        self.id = user_id
+        self.username = username
+        self.email = f'{username}@example.com'
+        self.phone = '9876543210'
+        self.user_type = 'student'
+        self.university = None
+        self.license_number = None
+        self.vehicle_number = None
+        self.is_verified = False
+        self.created_at = None
+
+
+def test_identity_cache_hits_expires_and_evicts(monkeypatch):
+    loads = []
+    cache = IdentityCache(max_entries=2, ttl=60)
+
+    def load(user_id):
+        loads.append(user_id)
+        return FakeUser(user_id)
+
+    first = cache.get(1, load)
+    assert cache.get(1, load) is first
+    assert loads == [1]
+    assert cache.bytes > 0
+
+    cache.get(2, load)
+    cache.get(3, load)  # evicts 1, the least recently used
+    assert len(cache) == 2 and cache.evictions == 1
+    cache.get(1, load)
+    assert loads == [1, 2, 3, 1]
+
+    now = time.monotonic()
+    monkeypatch.setattr('identity.time.monotonic', lambda: now + 61)
+    cache.get(1, load)
+    assert loads[-1] == 1 and cache.hits == 1
+
+
+def test_identity_cache_does_not_cache_unknown_users():
+    cache = IdentityCache()
+    assert cache.get(1, lambda uid: None) is None
+    assert len(cache) == 0 and cache.bytes == 0
+
+
+def test_identity_is_read_only():
+    identity = Identity.from_user(FakeUser(1))
+    assert identity.get_id() == '1' and identity.is_authenticated
+    with pytest.raises(AttributeError):
+        identity.user_type = 'driver'
+
+
+def test_cached_identity_skips_user_query(client, login, make_user, count_queries):
+    user = make_user()
+    login(user)
+    client.get('/api/notifications')
+
+    with count_queries() as counter:
+        assert client.get('/api/notifications').status_code == 200
+    assert not any('FROM user' in statement for statement in counter.statements)
+
+
+def test_user_update_invalidates_identity_on_commit(app, client, login, make_user):
+    user = make_user()
+    login(user)
+    client.get('/api/notifications')
+    cache = app.extensions['identity_cache']
+    assert len(cache) == 1
+
+    user.user_type = 'driver'
+    db.session.flush()
+    assert len(cache) == 1  # not until the commit
+    db.session.commit()
+    assert len(cache) == 0
+
+    login(user)
+    client.get('/api/notifications')
+    assert cache.get(user.id, lambda uid: None).user_type == 'driver'
+
+    db.session.query(User).filter_by(id=user.id).delete()
+    db.session.commit()
+    assert len(cache) == 0
+
+
+def test_identity_dropped_when_another_worker_changes_the_user(app, client, login, make_user):
+    user = make_user()
+    login(user)
+    client.get('/api/notifications')
+    cache = app.extensions['identity_cache']
+    assert len(cache) == 1
+
+    app.extensions['event_bus'].publish(SYNC_CHANNEL, 'identity', {'users': [user.id]})
+    app.extensions['sync_feed'].drain()
+    assert len(cache) == 0
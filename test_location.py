@@ -0,0 +1,120 @@
+"""
+Tests for live location ingestion and persistence
+"""
+
+from location import FixRing, LocationStore
+
+
+def test_fix_ring_keeps_newest_fixes():
+    ring = FixRing(3)
+    for i in range(5):
+        ring.append(float(i), 19.0 + i, 72.0 + i)
+
+    assert ring.count == 3
+    assert ring.latest() == (4.0, 23.0, 76.0)
+    assert [fix[0] for fix in ring.snapshot()] == [2.0, 3.0, 4.0]
+    assert [fix[0] for fix in ring.snapshot(2)] == [3.0, 4.0]
+
+
+def test_drain_downsamples_and_drops_finished_tracks():
+    store = LocationStore(capacity=100, persist_interval=30)
+    track = store.open(1, driver_id=7)
+    store.append(track, [(float(t), 19.0, 72.0) for t in range(0, 100, 5)])
+
+    rows = store.drain()
+    assert [row[1] for row in rows] == [30.0, 60.0, 90.0]
+    assert store.drain() == []
+
+    store.finish(1)
+    assert [row[1] for row in store.drain()] == [95.0]
+    assert store.get(1) is None
+
+
+def _post_location(client, ride_id, points):
+    return client.post('/api/location', json={'ride_id': ride_id, 'points': points})
+
+
+def test_api_location_ingests_and_persists(app, client, login, make_user, make_ride):
+    from app import RideLocation, flush_locations
+
+    driver = make_user('driver')
+    ride = make_ride(driver, status='in_progress')
+    login(driver)
+
+    response = _post_location(client, ride.id, [[19.03, 72.85, 1000.0], [19.04, 72.86, 1040.0]])
+    assert response.get_json() == {'success': True, 'accepted': 2}
+    response = _post_location(client, ride.id, [{'lat': 19.05, 'lng': 72.87, 'ts': 1045.0}])
+    assert response.status_code == 200
+
+    latest = client.get(f'/api/rides/{ride.id}/location?limit=1').get_json()
+    assert latest['points'] == [{'lat': 19.05, 'lng': 72.87, 'ts': 1045.0}]
+
+    assert flush_locations() == 2
+    assert RideLocation.query.filter_by(ride_id=ride.id).count() == 2
+
+
+def test_api_location_rejects_bad_requests(app, client, login, make_user, make_ride):
+    driver = make_user('driver')
+    other_driver = make_user('driver')
+    active = make_ride(driver, status='in_progress')
+    available = make_ride(driver)
+
+    login(driver)
+    assert _post_location(client, active.id, [[91, 72.85]]).status_code == 400
+    assert _post_location(client, active.id, []).status_code == 400
+    assert _post_location(client, available.id, [[19.0, 72.8]]).status_code == 400
+    assert _post_location(client, 9999, [[19.0, 72.8]]).status_code == 404
+
+    login(other_driver)
+    assert _post_location(client, active.id, [[19.0, 72.8]]).status_code == 403
+
+
+def test_api_location_pushes_to_ride_channel(app, client, login, make_user, make_ride):
+    driver = make_user('driver')
+    ride = make_ride(driver, status='in_progress')
+    login(driver)
+
+    with app.extensions['event_bus'].subscribe([f'ride:{ride.id}']) as subscription:
+        _post_location(client, ride.id, [[19.03, 72.85, 1000.0]])
+        event = subscription.get(timeout=0.1)
+
+    assert event.type == 'location'
+    assert event.data == {'lat': 19.03, 'lng': 72.85, 'ts': 1000.0, 'ride_id': ride.id}
+
+
+def test_ride_tracking_is_limited_to_driver_and_passengers(app, client, login, make_user, make_ride):
+    from app import GroupRide, db
+
+    driver, student, member, outsider = make_user('driver'), make_user(), make_user(), make_user()
+    ride = make_ride(driver, status='in_progress', student_id=student.id)
+    group = make_ride(driver, status='in_progress', is_group_ride=True)
+    db.session.add(GroupRide(ride_id=group.id, student_id=member.id))
+    db.session.commit()
+
+    for user, allowed in ((driver, True), (student, True), (outsider, False)):
+        login(user)
+        assert client.get(f'/api/rides/{ride.id}/location').status_code == (200 if allowed else 403)
+    assert client.get(f'/api/rides/{ride.id}/eta').status_code == 403
+    assert client.get(f'/api/stream?ride={ride.id}').status_code == 403
+    assert client.get('/api/rides/9999/location').status_code == 404
+    login(member)
+    assert client.get(f'/api/rides/{group.id}/location').status_code == 200
+    assert client.get(f'/api/rides/{ride.id}/location').status_code == 403
+
+
+def test_tracking_stops_once_the_ride_is_no_longer_active(app, client, login, make_user, make_ride, monkeypatch):
+    from app import db
+
+    driver = make_user('driver')
+    ride = make_ride(driver, status='booked')
+    login(driver)
+    assert _post_location(client, ride.id, [[19.0, 72.8, 1000.0]]).status_code == 200
+
+    ride.status = 'cancelled'
+    db.session.commit()
+    # Within the recheck interval the buffered track keeps serving...
+    assert _post_location(client, ride.id, [[19.0, 72.8, 1010.0]]).status_code == 200
+    # ...and once it is due, the status is read again and the track closed
+    monkeypatch.setattr(app.extensions['location_store'], 'status_recheck', 0)
+    assert _post_location(client, ride.id, [[19.0, 72.8, 1020.0]]).status_code == 400
+    assert app.extensions['location_store'].get(ride.id).finished
@@ -0,0 +1,172 @@
+"""
+Tests for the group ride matching engine
+"""
+
+import itertools
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app import db, GroupRide, Notification, RideRequest, run_matching_batch
+from matching import MatchParams, RequestBatch, RideBatch, auction, cost_matrices, match
+
+T0 = 1_900_000_000.0
+SION = (19.0390, 72.8619)
+
+
+def _requests(points, owners=None, window=(0, 900)):
+    lats, lngs = zip(*points)
+    n = len(points)
+    return RequestBatch(lats, lngs, [T0 + window[0]] * n, [T0 + window[1]] * n, owners=owners)
+
+
+def _rides(points, seats, times=None):
+    lats, lngs = zip(*points)
+    return RideBatch(lats, lngs, times or [T0 + 300] * len(points), seats)
+
+
+def test_match_prefers_nearest_ride_and_respects_capacity():
+    near, far = SION, (SION[0] + 0.009, SION[1])
+    requests = _requests([near, near, near])
+    rides = _rides([near, far], seats=[2, 5])
+
+    result = match(requests, rides)
+
+    assigned = result.ride_idx.tolist()
+    assert assigned.count(0) == 2
+    assert assigned.count(1) == 1
+    assert result.stats(3)['match_rate'] == 1.0
+
+
+def test_match_skips_infeasible_pairs():
+    requests = _requests([SION, (SION[0] + 0.1, SION[1])], window=(0, 60))
+    rides = _rides([SION, SION], seats=[4, 4], times=[T0 + 30, T0 + 7200])
+
+    result = match(requests, rides, MatchParams(max_detour_m=2000, max_wait_s=600))
+
+    assert result.request_idx.tolist() == [0]
+    assert result.ride_idx.tolist() == [0]
+
+
+def test_match_honours_blocked_pairs_and_owners():
+    # Student 7 already rides on ride 0 and filed two requests
+    requests = _requests([SION, SION], owners=[7, 7])
+    rides = _rides([SION, SION, SION], seats=[4, 4, 4])
+
+    result = match(requests, rides, blocked={(7, 0)})
+
+    assert 0 not in result.ride_idx.tolist()
+    assert len(set(result.ride_idx.tolist())) == 2
+
+
+def test_mismatch_keeps_second_precision_at_current_epochs():
+    t0 = 1_760_000_000.0
+    requests = RequestBatch([SION[0]], [SION[1]], [t0], [t0])
+    rides = RideBatch([SION[0], SION[0]], [SION[1], SION[1]], [t0 - 3600, t0 + 60], [4, 4])
+
+    _, mismatch, cost = cost_matrices(requests, rides, MatchParams(seconds_weight=5))
+
+    assert mismatch[0].tolist() == [3600, 60]
+    assert cost[0, 1] == 300
+
+
+def test_match_finds_the_assignment_greedy_misses():
+    # One seat each on X and Y. A is a little closer to X than B is, but B
+    # can only reach X; the cheapest-first pick would leave B unmatched
+    x, y = SION, (SION[0], SION[1] + 0.0142)
+    a, b = (SION[0], SION[1] + 0.0066), (SION[0], SION[1] - 0.0076)
+    requests = _requests([a, b])
+    rides = _rides([x, y], seats=[1, 1])
+
+    result = match(requests, rides)
+
+    assert dict(zip(result.request_idx.tolist(), result.ride_idx.tolist())) == {0: 1, 1: 0}
+
+
+def test_auction_matches_brute_force():
+    rng = np.random.default_rng(5)
+    for _ in range(50):
+        n, m = int(rng.integers(1, 6)), int(rng.integers(1, 4))
+        seats = rng.integers(0, 3, m)
+        pairs = [(r, j) for r in range(n) for j in range(m) if rng.random() < 0.7]
+        req = np.array([r for r, _ in pairs], dtype=np.int64)
+        ride = np.array([j for _, j in pairs], dtype=np.int64)
+        cost = rng.uniform(0, 100, len(pairs))
+
+        def total(chosen):
+            return cost[chosen].sum() + 250 * (n - len(chosen))
+
+        optimal = min(
+            total([k for k in combo if k is not None])
+            for combo in itertools.product(*([None] + [k for k in range(len(pairs)) if req[k] == r]
+                                             for r in range(n)))
+            if (np.bincount([ride[k] for k in combo if k is not None], minlength=m) <= seats).all()
+        )
+        chosen = auction(req, ride, cost, seats, n, 250, 0.01)
+        assert (np.bincount(ride[chosen], minlength=m) <= seats).all()
+        assert len(set(req[chosen].tolist())) == len(chosen)
+        assert total(chosen) <= optimal + n * 0.01
+
+
+def test_match_chunked_equals_unchunked():
+    rng = np.random.default_rng(3)
+    n, m = 300, 40
+    earliest = T0 + rng.uniform(0, 3600, n)
+    requests = RequestBatch(SION[0] + rng.uniform(-0.02, 0.02, n), SION[1] + rng.uniform(-0.02, 0.02, n),
+                            earliest, earliest + 600)
+    rides = RideBatch(SION[0] + rng.uniform(-0.02, 0.02, m), SION[1] + rng.uniform(-0.02, 0.02, m),
+                      T0 + rng.uniform(0, 3600, m), rng.integers(1, 5, m))
+
+    whole = match(requests, rides, MatchParams(chunk_size=10000))
+    chunked = match(requests, rides, MatchParams(chunk_size=32))
+
+    assert whole.request_idx.tolist() == chunked.request_idx.tolist()
+    assert whole.ride_idx.tolist() == chunked.ride_idx.tolist()
+
+
+def test_run_matching_batch_writes_group_rides(client, login, make_user, make_ride):
+    driver = make_user('driver')
+    pickup_time = datetime.utcnow() + timedelta(hours=1)
+    ride = make_ride(driver, is_group_ride=True, max_passengers=2, pickup_time=pickup_time,
+                     pickup_lat=SION[0], pickup_lng=SION[1])
+    students = [make_user('student') for _ in range(3)]
+    for student in students:
+        login(student)
+        response = client.post('/api/ride_requests', json={
+            'pickup_lat': SION[0], 'pickup_lng': SION[1] + 0.001,
+            'earliest': (pickup_time - timedelta(minutes=10)).isoformat(),
+            'latest': (pickup_time + timedelta(minutes=10)).isoformat()
+        })
+        assert response.status_code == 201
+
+    stats = run_matching_batch()
+
+    assert stats['matched'] == 2
+    db.session.refresh(ride)
+    assert (ride.status, ride.current_passengers) == ('booked', 2)
+    assert GroupRide.query.filter_by(ride_id=ride.id).count() == 2
+    statuses = sorted(r.status for r in RideRequest.query.all())
+    assert statuses == ['matched', 'matched', 'pending']
+    assert client.get('/api/ride_requests').get_json()[0]['status'] in ('matched', 'pending')
+
+    matched = Notification.query.filter_by(ride_id=ride.id, event='ride.booked')
+    assert sorted(n.user_id for n in matched) == sorted([driver.id] + [g.student_id for g in GroupRide.query])
+    assert all(n.level == 'info' and 'Sion' in n.message for n in matched)
+
+
+def test_run_matching_batch_expires_stale_requests(make_user):
+    student = make_user('student')
+    db.session.add(RideRequest(student_id=student.id, pickup_lat=SION[0], pickup_lng=SION[1],
+                               earliest_pickup=datetime(2020, 1, 1, 8), latest_pickup=datetime(2020, 1, 1, 9)))
+    db.session.commit()
+
+    run_matching_batch()
+
+    assert RideRequest.query.one().status == 'expired'
+
+
+def test_api_ride_requests_validates_input(client, login, make_user):
+    login(make_user('student'))
+    bad = {'pickup_lat': 19.0, 'pickup_lng': 72.8, 'earliest': '2030-01-01T09:00', 'latest': '2030-01-01T08:00'}
+    assert client.post('/api/ride_requests', json=bad).status_code == 400
+    assert client.post('/api/ride_requests', json={'pickup_lat': 19.0}).status_code == 400
@@ -0,0 +1,128 @@
+"""
+Tests for request instrumentation and the /metrics endpoint
+"""
+
+import logging
+import os
+import time
+
+import pytest
+
+import metrics
+from metrics import Histogram, SamplingProfiler
+
+
+def test_histogram_renders_cumulative_buckets():
+    hist = Histogram('latency', 'test', ('route',), buckets=(0.1, 1.0))
+    hist.observe(0.05, 'a')
+    hist.observe(0.5, 'a')
+    hist.observe(5, 'a')
+
+    lines = list(hist.collect())
+    assert 'latency_bucket{route="a",le="0.1"} 1' in lines
+    assert 'latency_bucket{route="a",le="1.0"} 2' in lines
+    assert 'latency_bucket{route="a",le="+Inf"} 3' in lines
+    assert 'latency_count{route="a"} 3' in lines
+
+
+def test_metrics_endpoint_reports_routes_and_sql(app, client, make_user, make_ride):
+    make_ride(make_user('driver'))
+    client.get('/api/rides')
+
+    response = client.get('/metrics')
+    body = response.get_data(as_text=True)
+    assert response.mimetype == 'text/plain'
+    assert 'edu_ride_request_duration_seconds_count{endpoint="main.api_rides",method="GET"}' in body
+    assert 'edu_ride_requests_total{endpoint="main.api_rides",method="GET",status="200"}' in body
+    assert 'edu_ride_worker_pool_queue_depth 0' in body
+
+    instrumentation = app.extensions['metrics']
+    assert instrumentation.sql_count.sum('main.api_rides') >= 1
+
+
+def test_totals_are_exposed_as_counters(client):
+    body = client.get('/metrics').get_data(as_text=True)
+
+    types = dict(line.split()[2:4] for line in body.splitlines() if line.startswith('# TYPE'))
+    totals = {name: kind for name, kind in types.items() if name.endswith('_total')}
+    assert totals['edu_ride_worker_pool_rejected_total'] == 'counter'
+    assert set(totals.values()) == {'counter'}
+    assert 'edu_ride_qr_cache_hits_total 0' in body
+
+
+def test_server_timing_header_counts_statements(client, make_user, make_ride):
+    make_ride(make_user('driver'))
+    response = client.get('/api/rides')
+    assert 'sql;dur=' in response.headers['Server-Timing']
+    assert 'statements' in response.headers['Server-Timing']
+
+
+def test_slow_queries_are_counted(app, client, make_user):
+    instrumentation = app.extensions['metrics']
+    before = instrumentation.slow_queries.value()
+    instrumentation.slow_query_seconds = 0
+    try:
+        make_user('student')
+        client.get('/api/rides')
+    finally:
+        instrumentation.slow_query_seconds = app.config['SLOW_QUERY_MS'] / 1000
+    assert instrumentation.slow_queries.value() > before
+
+
+def test_slow_request_profile_is_written(app, tmp_path):
+    instrumentation = app.extensions['metrics']
+    instrumentation.profile_dir = str(tmp_path)
+    profiler = SamplingProfiler(0)
+    profiler.stacks['main (app.py:1);api_rides (app.py:2)'] = 3
+    try:
+        instrumentation._write_profile('api_rides', 0.75, profiler)
+    finally:
+        instrumentation.profile_dir = None
+
+    [name] = os.listdir(tmp_path)
+    assert name.startswith('api_rides-') and name.endswith('-750ms.folded')
+    assert (tmp_path / name).read_text() == 'main (app.py:1);api_rides (app.py:2) 3\n'
+
+
+def test_sampling_profiler_collects_stacks():
+    import threading
+    profiler = SamplingProfiler(threading.get_ident(), interval=0.001)
+    profiler.start()
+    deadline = time.perf_counter() + 0.05
+    while time.perf_counter() < deadline:
+        pass
+    stacks = profiler.stop()
+    assert stacks
+    assert all(line.rsplit(' ', 1)[1].strip().isdigit() for line in profiler.folded().splitlines())
+
+
+def test_login_logs_do_not_include_username(client, make_user, caplog):
+    import logging
+    make_user('student', username='private-name')
+    logger = logging.getLogger('edu_ride')
+    logger.addHandler(caplog.handler)
+    try:
+        client.post('/login', data={'username': 'private-name', 'password': 'wrong'})
+        client.post('/login', data={'username': 'nobody-here', 'password': 'wrong'})
+    finally:
+        logger.removeHandler(caplog.handler)
+    assert caplog.records
+    assert 'private-name' not in caplog.text and 'nobody-here' not in caplog.text
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_forked_child_keeps_logging(app):
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(read_fd)
+            metrics._listener.handlers[0].setStream(os.fdopen(write_fd, 'w'))
+            logging.getLogger('edu_ride').warning('logged after fork')
+            metrics._listener.stop()
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    os.waitpid(pid, 0)
+    with os.fdopen(read_fd) as output:
+        assert 'logged after fork' in output.read()
@@ -0,0 +1,76 @@
+"""
+Tests for the idempotent schema upgrade
+"""
+
+from sqlalchemy import create_engine, inspect, text
+
+import migrations
+from app import db
+
+
+def _legacy_database(path):
+    """A database created by an older release: no coordinates, no indexes"""
+    engine = create_engine(f'sqlite:///{path}')
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE user (id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE, '
+                          'email VARCHAR(120) NOT NULL UNIQUE, password_hash VARCHAR(120) NOT NULL, '
+                          'phone VARCHAR(15) NOT NULL, user_type VARCHAR(20) NOT NULL, created_at DATETIME, '
+                          'license_number VARCHAR(50), vehicle_number VARCHAR(20), is_verified BOOLEAN, '
+                          'university VARCHAR(100))'))
+        conn.execute(text('CREATE TABLE ride (id INTEGER PRIMARY KEY, ride_id VARCHAR(36) NOT NULL UNIQUE, '
+                          'driver_id INTEGER NOT NULL, student_id INTEGER, pickup_location VARCHAR(200) NOT NULL, '
+                          'dropoff_location VARCHAR(200) NOT NULL, pickup_time DATETIME NOT NULL, '
+                          'status VARCHAR(20), fare FLOAT NOT NULL, is_group_ride BOOLEAN, '
+                          'max_passengers INTEGER, current_passengers INTEGER, created_at DATETIME)'))
+        conn.execute(text("INSERT INTO user VALUES (1, 'd', 'd@x', 'h', '1', 'driver', NULL, NULL, NULL, 0, NULL)"))
+        conn.execute(text("INSERT INTO ride (id, ride_id, driver_id, pickup_location, dropoff_location, "
+                          "pickup_time, status, fare) VALUES (1, 'r1', 1, 'A', 'B', '2030-01-01', 'available', 40)"))
+    return engine
+
+
+def test_upgrade_adds_missing_schema_and_keeps_data(tmp_path):
+    engine = _legacy_database(tmp_path / 'legacy.db')
+
+    applied = migrations.upgrade(engine, db.metadata)
+
+    assert 'add column ride.pickup_lat' in applied
+    assert 'create index ix_ride_status_pickup_time' in applied
+    assert 'create table group_ride' in applied
+    inspector = inspect(engine)
+    assert {'pickup_lat', 'dropoff_lng'} <= {c['name'] for c in inspector.get_columns('ride')}
+    with engine.connect() as conn:
+        assert conn.execute(text('SELECT ride_id FROM ride')).scalar() == 'r1'
+
+
+def test_upgrade_is_idempotent(tmp_path):
+    engine = _legacy_database(tmp_path / 'legacy.db')
+    migrations.upgrade(engine, db.metadata)
+    assert migrations.upgrade(engine, db.metadata) == []
+
+
+def test_upgrade_adds_unique_constraint_as_index(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE group_ride (id INTEGER PRIMARY KEY, group_id VARCHAR(36) NOT NULL UNIQUE, '
+                          'ride_id INTEGER NOT NULL, student_id INTEGER NOT NULL, joined_at DATETIME)'))
+
+    assert 'create unique index uq_group_ride_member' in migrations.upgrade(engine, db.metadata)
+    indexes = {i['name']: i for i in inspect(engine).get_indexes('group_ride')}
+    assert indexes['uq_group_ride_member']['unique']
+
+
+def test_upgrade_expires_duplicate_pending_payments(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text('DROP INDEX uq_payment_pending'))
+        for payment_id in ('p1', 'p2'):
+            conn.execute(text("INSERT INTO payment (payment_id, ride_id, student_id, amount, payment_method, status) "
+                              "VALUES (:payment_id, 1, 2, 45, 'upi', 'pending')"), {'payment_id': payment_id})
+
+    applied = migrations.upgrade(engine, db.metadata)
+
+    assert applied == ['expire 1 duplicate pending payments', 'create index uq_payment_pending']
+    with engine.connect() as conn:
+        statuses = dict(conn.execute(text('SELECT payment_id, status FROM payment')).all())
+    assert statuses == {'p1': 'expired', 'p2': 'pending'}
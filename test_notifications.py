@@ -0,0 +1,67 @@
+"""
+Tests for the persisted, incremental notification feed
+"""
+
+from app import db, Notification
+
+
+def test_ride_lifecycle_writes_notifications(client, login, make_user, make_ride):
+    driver = make_user('driver')
+    student = make_user('student')
+    ride = make_ride(driver, pickup_location='Sion', dropoff_location='Campus')
+
+    login(student)
+    assert client.post('/api/book_ride', json={'ride_id': ride.id}).status_code == 200
+    login(driver)
+    assert client.post('/api/start_ride', json={'ride_id': ride.id}).status_code == 200
+    assert client.post('/api/complete_ride', json={'ride_id': ride.id}).status_code == 200
+
+    login(student)
+    feed = client.get('/api/notifications').get_json()
+    assert [n['event'] for n in feed] == ['ride.completed', 'ride.started', 'ride.booked']
+    assert feed[1]['message'] == f'Your ride is on the way! Driver: {driver.username}'
+    assert feed[2]['message'] == 'Your ride from Sion to Campus is confirmed!'
+
+    login(driver)
+    assert [n['message'] for n in client.get('/api/notifications').get_json()] == ['New booking: Sion to Campus']
+
+
+def test_since_cursor_returns_only_new_notifications(client, login, make_user, make_ride, count_queries):
+    driver = make_user('driver')
+    student = make_user('student')
+    first, second = make_ride(driver), make_ride(driver)
+    login(student)
+    client.post('/api/book_ride', json={'ride_id': first.id})
+
+    response = client.get('/api/notifications')
+    cursor = response.headers['X-Next-Cursor']
+    assert len(response.get_json()) == 1
+
+    with count_queries() as counter:
+        empty = client.get(f'/api/notifications?since={cursor}')
+    assert empty.get_json() == [] and empty.headers['X-Next-Cursor'] == cursor
+    assert counter.count == 1
+
+    client.post('/api/book_ride', json={'ride_id': second.id})
+    new = client.get(f'/api/notifications?since={cursor}').get_json()
+    assert [n['ride_id'] for n in new] == [second.id]
+
+
+def test_since_drains_backlog_in_order(client, login, make_user):
+    student = make_user('student')
+    for i in range(5):
+        db.session.add(
+            Notification(user_id=student.id, event='ride.booked', message=f'n{i}'))
+    db.session.commit()
+    login(student)
+
+    seen, cursor = [], 0
+    while True:
+        response = client.get(f'/api/notifications?since={cursor}&limit=2')
+        page = response.get_json()
+        if not page:
+            break
+        seen = [n['message'] for n in page] + seen
+        cursor = response.headers['X-Next-Cursor']
+    assert seen == ['n4', 'n3', 'n2', 'n1', 'n0']
+    assert client.get('/api/notifications?since=-1').status_code == 400
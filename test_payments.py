@@ -0,0 +1,185 @@
+"""
+Tests for idempotent payment creation, the UPI webhook and settlement
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db, settle_payments, Payment, PaymentEvent, Ride
+from upi import FakeUPIProvider
+
+
+@pytest.fixture
+def provider(app, client):
+    def post(body, headers):
+        return client.post('/api/payments/webhook/upi', data=body, headers=headers)
+    return FakeUPIProvider(app.config['UPI_WEBHOOK_SECRET'], post)
+
+
+@pytest.fixture
+def booked_ride(client, login, make_user, make_ride):
+    driver = make_user('driver')
+    student = make_user('student')
+    ride = make_ride(driver, fare=45.0)
+    login(student)
+    client.post('/api/book_ride', json={'ride_id': ride.id})
+    return driver, student, ride
+
+
+def pay(client, ride, key, method='upi'):
+    return client.post('/api/payments', json={'ride_id': ride.id, 'payment_method': method},
+                       headers={'Idempotency-Key': key})
+
+
+def test_retried_submission_returns_the_same_payment(client, booked_ride):
+    _, student, ride = booked_ride
+
+    first = pay(client, ride, 'key-1')
+    assert first.status_code == 201
+    assert first.get_json()['upi_uri'].startswith('upi://pay?')
+    retry = pay(client, ride, 'key-1')
+    assert retry.status_code == 200
+    assert retry.get_json()['payment_id'] == first.get_json()['payment_id']
+    assert Payment.query.filter_by(student_id=student.id).count() == 1
+
+    assert pay(client, ride, 'key-1', method='cash').status_code == 422
+    assert client.post('/api/payments', json={'ride_id': ride.id}).status_code == 400
+
+
+def test_group_ride_passengers_pay_their_seat(client, login, make_user, make_ride):
+    ride = make_ride(make_user('driver'), is_group_ride=True, max_passengers=3, fare=50.0)
+    login(make_user('student'))
+    client.post('/api/book_ride', json={'ride_id': ride.id})
+
+    payment = pay(client, ride, 'key-1').get_json()
+    assert payment['amount'] == 17.0  # ceil(50 / 3), as /api/fare quotes per_seat_fare
+
+
+def test_only_passengers_can_pay(client, login, make_user, booked_ride):
+    _, _, ride = booked_ride
+    login(make_user('student'))
+    assert pay(client, ride, 'key-1').status_code == 403
+
+
+def test_webhook_queues_and_settlement_updates_payment_and_ride(client, login, provider, booked_ride):
+    driver, _, ride = booked_ride
+    payment = pay(client, ride, 'key-1').get_json()
+
+    response = provider.callback(payment['payment_id'], 45.0)
+    assert response.status_code == 202
+    assert Payment.query.one().status == 'pending'  # nothing applied in the request
+
+    # Providers redeliver on timeouts; the same event is only queued once
+    assert provider.deliver(provider.sent[0]).status_code == 200
+    assert PaymentEvent.query.count() == 1
+
+    assert settle_payments() == 1
+    settled = Payment.query.one()
+    assert settled.status == 'completed' and settled.settled_at is not None
+    assert settled.provider_ref == provider.sent[0]['provider_ref']
+    assert db.session.get(Ride, ride.id).amount_paid == 45.0
+    assert PaymentEvent.query.one().result == 'completed'
+
+    # A second SUCCESS for a settled payment changes nothing
+    provider.callback(payment['payment_id'], 45.0)
+    assert settle_payments() == 0
+    assert db.session.get(Ride, ride.id).amount_paid == 45.0
+
+    login(driver)
+    assert client.get('/api/notifications').get_json()[0]['event'] == 'payment.completed'
+    assert pay(client, ride, 'key-2').status_code == 403
+
+
+def test_webhook_rejects_bad_signatures(provider):
+    provider.secret = 'not-the-secret'
+    assert provider.callback('unknown', 10.0).status_code == 401
+    assert PaymentEvent.query.count() == 0
+
+
+def test_settlement_handles_failures_mismatches_and_expiry(client, provider, booked_ride):
+    _, _, ride = booked_ride
+    failed = pay(client, ride, 'key-1').get_json()['payment_id']
+    provider.callback(failed, 45.0, status='FAILURE')
+    settle_payments()
+    short = pay(client, ride, 'key-2').get_json()['payment_id']
+    provider.callback(short, 5.0)
+    settle_payments()
+    assert Payment.query.filter_by(payment_id=failed).one().status == 'failed'
+    assert Payment.query.filter_by(payment_id=short).one().status == 'pending'
+    assert PaymentEvent.query.filter_by(payment_id=short).one().result == 'amount_mismatch'
+
+    # Abandoned UPI payments expire, but a late SUCCESS still completes them
+    settle_payments(now=datetime.utcnow() + timedelta(hours=1))
+    assert Payment.query.filter_by(payment_id=short).one().status == 'expired'
+    provider.callback(short, 45.0)
+    assert settle_payments() == 1
+    assert Payment.query.filter_by(payment_id=short).one().status == 'completed'
+    assert db.session.get(Ride, ride.id).amount_paid == 45.0
+
+
+def test_cash_confirmation_settles_every_passenger_once(client, login, make_user, make_ride):
+    driver = make_user('driver')
+    ride = make_ride(driver, is_group_ride=True, max_passengers=3, fare=30.0)
+    students = [make_user('student') for _ in range(2)]
+    for student in students:
+        login(student)
+        client.post('/api/book_ride', json={'ride_id': ride.id})
+
+    login(driver)
+    assert client.post(f'/api/rides/{ride.id}/cash_received').status_code == 202
+    assert client.post(f'/api/rides/{ride.id}/cash_received').status_code == 202
+    assert Payment.query.count() == 2 and PaymentEvent.query.count() == 2
+
+    assert settle_payments() == 2
+    assert {p.amount for p in Payment.query} == {10.0}  # each passenger pays a seat
+    assert db.session.get(Ride, ride.id).amount_paid == 20.0
+    assert {p.status for p in Payment.query} == {'completed'}
+
+
+def test_new_key_reuses_the_pending_payment(client, provider, booked_ride):
+    _, student, ride = booked_ride
+    first = pay(client, ride, 'key-1').get_json()
+
+    retry = pay(client, ride, 'key-2')
+    assert retry.status_code == 200
+    assert retry.get_json()['payment_id'] == first['payment_id']
+    other_method = pay(client, ride, 'key-3', method='cash')
+    assert other_method.status_code == 409
+    assert other_method.get_json()['payment']['payment_id'] == first['payment_id']
+    assert Payment.query.filter_by(student_id=student.id).count() == 1
+
+    provider.callback(first['payment_id'], 45.0)
+    settle_payments()
+    assert pay(client, ride, 'key-4').status_code == 409
+
+
+def test_second_payment_for_a_paid_ride_never_completes(client, provider, booked_ride):
+    _, student, ride = booked_ride
+    late = pay(client, ride, 'key-1').get_json()['payment_id']
+    settle_payments(now=datetime.utcnow() + timedelta(hours=1))
+    paid = pay(client, ride, 'key-2').get_json()['payment_id']
+    assert paid != late
+
+    provider.callback(paid, 45.0)
+    provider.callback(late, 45.0)
+    assert settle_payments() == 1
+    assert Payment.query.filter_by(payment_id=late).one().status == 'expired'
+    assert PaymentEvent.query.filter_by(payment_id=late).one().result == 'already_paid'
+    assert db.session.get(Ride, ride.id).amount_paid == 45.0
+
+
+def test_cash_confirmation_expires_pending_upi_payment(client, login, provider, booked_ride):
+    driver, _, ride = booked_ride
+    upi = pay(client, ride, 'key-1').get_json()['payment_id']
+
+    login(driver)
+    assert client.post(f'/api/rides/{ride.id}/cash_received').status_code == 202
+    assert Payment.query.filter_by(payment_id=upi).one().status == 'expired'
+    assert settle_payments() == 1
+
+    # The student's UPI transfer lands after the driver took cash
+    provider.callback(upi, 45.0)
+    assert settle_payments() == 0
+    assert db.session.get(Ride, ride.id).amount_paid == 45.0
+    assert Payment.query.filter_by(status='completed').one().payment_method == 'cash'
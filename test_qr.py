@@ -0,0 +1,71 @@
+"""
+Tests for payment QR rendering and caching
+"""
+
+from app import db
+from qr import QRCache, render_qr
+
+
+def test_qr_cache_renders_once():
+    renders = []
+    cache = QRCache(max_entries=2, renderer=lambda payload, fmt: renders.append(fmt) or render_qr(payload, fmt))
+
+    digest, png = cache.get('{"ride_id": 1}')
+    again_digest, again = cache.get('{"ride_id": 1}')
+
+    assert png.startswith(b'\x89PNG')
+    assert (again_digest, again) == (digest, png)
+    assert renders == ['png']
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_qr_cache_is_bounded_and_uses_disk(tmp_path):
+    cache = QRCache(max_entries=1, cache_dir=str(tmp_path))
+    cache.get('a')
+    cache.get('b')
+    assert len(cache) == 1
+
+    # A fresh process-level cache finds the image on disk instead of re-rendering
+    other = QRCache(cache_dir=str(tmp_path))
+    _, image = other.get('a')
+    assert image.startswith(b'\x89PNG')
+    assert (other.disk_hits, other.misses) == (1, 0)
+
+
+def test_qr_cache_svg():
+    _, svg = QRCache().get('payload', 'svg')
+    assert b'<svg' in svg
+
+
+def test_generate_qr_links_cacheable_image(client, login, make_user, make_ride):
+    driver = make_user('driver')
+    ride = make_ride(driver, fare=45.0)
+    login(driver)
+
+    page = client.get(f'/generate_qr/{ride.id}')
+    assert page.status_code == 200
+    assert b'base64' not in page.data
+    assert f'/qr/{ride.id}.png?v='.encode() in page.data
+
+    url = page.data.split(f'/qr/{ride.id}.png?v='.encode())[1].split(b'"')[0].decode()
+    image = client.get(f'/qr/{ride.id}.png?v={url}')
+    assert image.mimetype == 'image/png'
+    assert 'immutable' in image.headers['Cache-Control']
+
+    revalidated = client.get(f'/qr/{ride.id}.png', headers={'If-None-Match': image.headers['ETag']})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+
+    ride.fare = 50.0
+    db.session.commit()
+    changed = client.get(f'/qr/{ride.id}.png', headers={'If-None-Match': image.headers['ETag']})
+    assert changed.status_code == 200
+
+
+def test_qr_image_formats(client, login, make_user, make_ride):
+    driver = make_user('driver')
+    ride = make_ride(driver)
+    login(driver)
+
+    assert client.get(f'/qr/{ride.id}.svg').mimetype == 'image/svg+xml'
+    assert client.get(f'/qr/{ride.id}.gif').status_code == 404
@@ -0,0 +1,60 @@
+"""
+Tests for token-bucket rate limiting
+"""
+
+import pytest
+from flask_login import login_user
+
+from ratelimit import LocalBucketStore, RateLimited, RateLimiter
+
+
+def test_bucket_allows_bursts_then_refills():
+    now = [0.0]
+    store = LocalBucketStore(clock=lambda: now[0])
+    assert [store.take('k', rate=1, burst=2).allowed for _ in range(3)] == [True, True, False]
+    assert store.take('k', rate=1, burst=2).retry_after == 1
+
+    now[0] = 1.5
+    assert store.take('k', rate=1, burst=2) == (True, 0, 0)
+    assert store.take('other', rate=1, burst=2).remaining == 1
+
+
+def test_login_is_limited_per_ip_and_per_target_account(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'RATE_LIMIT_ENABLED', True)
+    app.extensions['rate_limiter'].store.clear()
+    metrics = app.extensions['metrics']
+
+    # Spread over addresses, attempts on one account still run out
+    statuses = [client.post('/login', data={'username': 'victim', 'password': 'guess'},
+                            environ_base={'REMOTE_ADDR': f'10.0.0.{i}'}).status_code for i in range(6)]
+    assert statuses == [200] * 5 + [429]
+    # One address trying many accounts runs out too
+    statuses = [client.post('/login', data={'username': f'user{i}', 'password': 'guess'},
+                            environ_base={'REMOTE_ADDR': '10.0.1.1'}).status_code for i in range(11)]
+    assert statuses[-1] == 429 and statuses.count(429) == 1
+
+    limited = client.post('/login', data={'username': 'someone'}, environ_base={'REMOTE_ADDR': '10.0.1.1'})
+    assert int(limited.headers['Retry-After']) >= 1
+    # Only POSTs are limited; the form itself still loads
+    assert client.get('/login', environ_base={'REMOTE_ADDR': '10.0.1.1'}).status_code == 200
+    assert 'edu_ride_rate_limited_total{endpoint="main.login",scope="username"} 1' in metrics.render()
+
+
+def test_workers_sharing_a_store_share_limits(app, make_user, monkeypatch):
+    monkeypatch.setitem(app.config, 'RATE_LIMIT_ENABLED', True)
+    store = LocalBucketStore()
+    workers = [RateLimiter(store, {'main.api_rides': [('user', 2, 60)]}) for _ in range(2)]
+    student, other = make_user('student'), make_user('student')
+
+    with app.test_request_context('/api/rides'):
+        login_user(student)
+        workers[0].check()
+        workers[1].check()
+        with pytest.raises(RateLimited) as exc:
+            workers[0].check()
+        assert exc.value.scope == 'user' and exc.value.retry_after == 30
+        login_user(other)
+        workers[1].check()
+
+    with pytest.raises(ValueError):
+        RateLimiter(store, {'main.api_rides': [('session', 1, 1)]})
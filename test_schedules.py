@@ -0,0 +1,92 @@
+"""
+Tests for bulk ride creation and recurring schedules
+"""
+
+from datetime import date, datetime, time
+
+import pytest
+
+from app import db, extend_schedules, Ride, RideSchedule
+from schedules import format_weekdays, occurrences, parse_weekdays
+
+
+def test_parse_weekdays():
+    assert format_weekdays(parse_weekdays('weekdays')) == ['mon', 'tue', 'wed', 'thu', 'fri']
+    assert format_weekdays(parse_weekdays('Mon, wed')) == ['mon', 'wed']
+    assert format_weekdays(parse_weekdays([5, 'sunday'])) == ['sat', 'sun']
+    for bad in ('', 'someday', [7]):
+        with pytest.raises(ValueError):
+            parse_weekdays(bad)
+
+
+def test_occurrences_follow_mask():
+    # 2030-01-07 is a Monday
+    days = list(occurrences(parse_weekdays('mon,fri'), time(8, 0), date(2030, 1, 7), date(2030, 1, 14)))
+    assert days == [datetime(2030, 1, 7, 8), datetime(2030, 1, 11, 8), datetime(2030, 1, 14, 8)]
+
+
+def test_bulk_rides_insert_in_one_transaction(client, login, make_user, count_queries):
+    driver = make_user('driver')
+    login(driver)
+    rides = [{'pickup_location': 'Hostel', 'dropoff_location': 'Campus', 'fare': 30,
+              'pickup_time': f'2030-01-{day:02d}T08:00'} for day in range(1, 21)]
+
+    client.post('/api/rides/bulk', json={'rides': rides[:1]})
+    with count_queries() as counter:
+        response = client.post('/api/rides/bulk', json={'rides': rides[1:]})
+    assert response.status_code == 201
+    assert response.get_json()['created'] == 19
+    assert counter.count <= 3
+    assert Ride.query.filter_by(driver_id=driver.id, status='available').count() == 20
+
+
+def test_bulk_rides_rejects_any_invalid_ride(client, login, make_user):
+    login(make_user('driver'))
+    rides = [{'pickup_location': 'Hostel', 'dropoff_location': 'Campus', 'fare': 30,
+              'pickup_time': '2030-01-01T08:00'}, {'pickup_location': 'Hostel', 'fare': 30}]
+    response = client.post('/api/rides/bulk', json={'rides': rides})
+    assert response.status_code == 400
+    assert 'index 1' in response.get_json()['error']
+    assert Ride.query.count() == 0
+
+
+def test_schedule_materialises_rolling_window(app, client, login, make_user):
+    driver = make_user('driver')
+    login(driver)
+    response = client.post('/api/schedules', json={
+        'pickup_location': 'Hostel', 'dropoff_location': 'Campus', 'fare': 25,
+        'weekdays': 'weekdays', 'departure_time': '08:00',
+        'starts_on': '2099-01-05', 'ends_on': '2099-03-01'})
+    assert response.status_code == 201
+    schedule = db.session.get(RideSchedule, response.get_json()['id'])
+
+    # Nothing is materialised beyond the window
+    assert Ride.query.filter_by(schedule_id=schedule.id).count() == 0
+    first_day = datetime(2099, 1, 5, 7, 0)
+    assert extend_schedules(now=first_day) == 11  # Jan 5-19: 11 weekdays
+    assert extend_schedules(now=first_day) == 0
+    assert extend_schedules(now=datetime(2099, 1, 6, 7, 0)) == 1
+
+    response = client.delete(f'/api/schedules/{schedule.id}')
+    assert response.get_json()['cancelled'] == 12
+    assert extend_schedules(now=datetime(2099, 1, 20, 7, 0)) == 0
+    assert client.get('/api/schedules').get_json()[0]['active'] is False
+
+
+def test_ended_schedule_is_not_reprocessed(app, client, login, make_user, monkeypatch):
+    driver = make_user('driver')
+    login(driver)
+    response = client.post('/api/schedules', json={
+        'pickup_location': 'Hostel', 'dropoff_location': 'Campus', 'fare': 25,
+        'weekdays': 'weekdays', 'departure_time': '08:00',
+        'starts_on': '2099-01-05', 'ends_on': '2099-01-09'})
+    assert response.status_code == 201
+
+    assert extend_schedules(now=datetime(2099, 1, 5, 7, 0)) == 5
+    schedule = db.session.get(RideSchedule, response.get_json()['id'])
+    assert schedule.materialized_until == date(2099, 1, 9)
+
+    processed = []
+    monkeypatch.setattr('app.occurrences', lambda *args: processed.append(args) or [])
+    assert extend_schedules(now=datetime(2099, 2, 1, 7, 0)) == 0
+    assert processed == []
@@ -0,0 +1,84 @@
+"""
+Tests for full-text ride search and place typeahead
+"""
+
+from datetime import datetime
+
+from sqlalchemy import create_engine, text
+
+import migrations
+from app import archive_finished_rides, db, insert_rides, Place, Ride
+from search import fts5_query, parse_terms
+
+
+def test_query_building_quotes_terms_and_prefixes_the_last():
+    assert parse_terms('  Sion "St*') == ['sion', 'st']
+    assert fts5_query(['sion', 'st']) == '"sion" AND "st"*'
+    assert fts5_query(['som'], 'dropoff_location') == 'dropoff_location : ("som"*)'
+
+
+def test_search_matches_prefixes_and_orders_by_pickup_time(client, make_user, make_ride):
+    driver = make_user('driver')
+    later = make_ride(driver, pickup_location='Sion Station', dropoff_location='Somaiya College',
+                      pickup_time=datetime(2030, 1, 2, 9, 0))
+    sooner = make_ride(driver, pickup_location='Kurla West', dropoff_location='Somaiya College',
+                       pickup_time=datetime(2030, 1, 2, 8, 0))
+    make_ride(driver, pickup_location='Dadar', dropoff_location='Sion Hospital')
+
+    assert [r['id'] for r in client.get('/api/rides/search?q=soma').get_json()] == [sooner.id, later.id]
+    assert [r['id'] for r in client.get('/api/rides/search?q=sion sta').get_json()] == [later.id]
+    assert len(client.get('/api/rides/search?dropoff=sion').get_json()) == 1
+    assert client.get('/api/rides/search?q=*').status_code == 400
+
+    page = client.get('/api/rides/search?q=soma&limit=1')
+    rest = client.get(f"/api/rides/search?q=soma&cursor={page.headers['X-Next-Cursor']}")
+    assert [r['id'] for r in rest.get_json()] == [later.id]
+
+
+def test_index_follows_status_changes_and_bulk_inserts(client, login, make_user, make_ride):
+    driver = make_user('driver')
+    ride = make_ride(driver, pickup_location='Chembur Naka')
+    login(make_user('student'))
+    client.post('/api/book_ride', json={'ride_id': ride.id})
+    assert client.get('/api/rides/search?q=chembur').get_json() == []
+
+    insert_rides([dict(driver_id=driver.id, pickup_location='Chembur Camp', dropoff_location='Vidyavihar',
+                       pickup_time=datetime(2030, 2, 1, 8, 0), fare=30.0, status='available')])
+    db.session.commit()
+    assert [r['pickup_location'] for r in client.get('/api/rides/search?q=chembur').get_json()] == ['Chembur Camp']
+
+    # Finished rides leave the ride index but keep counting towards place suggestions
+    db.session.execute(db.update(Ride).values(status='completed', pickup_time=datetime(2020, 1, 1)))
+    db.session.commit()
+    archive_finished_rides()
+    assert client.get('/api/rides/search?q=chembur').get_json() == []
+    assert client.get('/api/places?q=chem').get_json()[0]['rides'] == 1
+
+
+def test_place_typeahead_ranks_by_use(client, make_user, make_ride):
+    driver = make_user('driver')
+    for _ in range(3):
+        make_ride(driver, pickup_location='Sion Station', dropoff_location='Somaiya College')
+    make_ride(driver, pickup_location='Sion Circle', dropoff_location='Somaiya College')
+
+    response = client.get('/api/places?q=si')
+    assert response.get_json() == [{'name': 'Sion Station', 'rides': 3}, {'name': 'Sion Circle', 'rides': 1}]
+    assert 'max-age' in response.headers['Cache-Control']
+    assert client.get('/api/places?q=').get_json() == []
+    assert db.session.get(Place, 1) is not None
+
+
+def test_upgrade_indexes_existing_rides(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TRIGGER ride_search_ai"))
+        conn.execute(text("DROP TABLE ride_search"))
+        conn.execute(text("INSERT INTO ride (id, ride_id, driver_id, pickup_location, dropoff_location, "
+                          "pickup_time, status, fare) VALUES (1, 'r1', 1, 'Ghatkopar', 'Vidyavihar', "
+                          "'2030-01-01', 'available', 40)"))
+
+    assert 'backfill ride_search' in migrations.upgrade(engine, db.metadata)
+    assert migrations.upgrade(engine, db.metadata) == []
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT rowid FROM ride_search WHERE ride_search MATCH 'ghat*'")).all() == [(1,)]
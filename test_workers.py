@@ -0,0 +1,144 @@
+"""
+Tests for the bounded CPU worker pool and periodic background workers
+"""
+
+import threading
+import time
+
+import pytest
+
+from workers import BoundedPool, PeriodicWorker, PoolSaturated
+
+
+def _square(x):
+    return x * x
+
+
+def test_pool_runs_jobs_and_records_metrics():
+    pool = BoundedPool(max_workers=2, max_queue=2, kind='thread')
+    assert [pool.run(_square, i) for i in range(4)] == [0, 1, 4, 9]
+
+    stats = pool.stats()
+    assert (stats['submitted'], stats['completed'], stats['rejected']) == (4, 4, 0)
+    assert stats['in_flight'] == 0 and stats['queue_depth'] == 0
+    assert stats['queue_seconds_max'] >= 0
+    pool.shutdown()
+
+
+def test_pool_rejects_when_saturated():
+    pool = BoundedPool(max_workers=1, max_queue=1, kind='thread')
+    release = threading.Event()
+    started = threading.Barrier(3)
+
+    def hold():
+        started.wait()
+        pool.run(release.wait, 5)
+
+    holders = [threading.Thread(target=hold) for _ in range(2)]
+    for t in holders:
+        t.start()
+    started.wait()
+    while pool.in_flight < 2:
+        pass
+
+    assert pool.queue_depth == 1
+    with pytest.raises(PoolSaturated) as exc:
+        pool.run(_square, 3)
+    assert exc.value.retry_after >= 1
+
+    release.set()
+    for t in holders:
+        t.join()
+    assert pool.stats()['rejected'] == 1
+    assert pool.run(_square, 3) == 9
+    pool.shutdown()
+
+
+def test_timed_out_job_keeps_its_slot_until_it_ends():
+    pool = BoundedPool(max_workers=1, max_queue=0, kind='thread', timeout=0.05)
+    release = threading.Event()
+
+    with pytest.raises(PoolSaturated):
+        pool.run(release.wait, 5)
+    # The caller gave up, but the job still occupies the only worker
+    assert pool.in_flight == 1
+    with pytest.raises(PoolSaturated):
+        pool.run(_square, 3)
+
+    release.set()
+    while pool.in_flight:
+        pass
+    assert pool.run(_square, 3) == 9
+    assert (pool.stats()['timed_out'], pool.stats()['rejected']) == (1, 1)
+    pool.shutdown()
+
+
+def test_process_pool_hashes_passwords():
+    from werkzeug.security import check_password_hash, generate_password_hash
+    pool = BoundedPool(max_workers=1, max_queue=0, kind='process')
+    hashed = pool.run(generate_password_hash, 'secret')
+    assert check_password_hash(hashed, 'secret')
+    pool.shutdown()
+
+
+def test_login_returns_503_when_pool_is_full(app, client, make_user, monkeypatch):
+    make_user('student', username='busy')
+
+    def saturated(*args, **kwargs):
+        raise PoolSaturated(3)
+
+    monkeypatch.setattr(app.extensions['cpu_pool'], 'run', saturated)
+    response = client.post('/login', data={'username': 'busy', 'password': 'pw'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '3'
+
+
+def test_login_returns_503_when_hashing_times_out(app, client, make_user, monkeypatch):
+    make_user('student', username='slow')
+    pool = BoundedPool(max_workers=1, max_queue=0, kind='thread', timeout=0.01)
+    monkeypatch.setattr('app.check_password_hash', lambda *args: time.sleep(0.2))
+    monkeypatch.setattr('app.cpu_pool', pool)
+
+    response = client.post('/login', data={'username': 'slow', 'password': 'pw'})
+    assert response.status_code == 503 and int(response.headers['Retry-After']) >= 1
+    pool.shutdown()
+
+
+def test_debug_workers_is_admin_only(app, client, login, make_user, monkeypatch):
+    monkeypatch.setitem(app.config, 'ADMIN_USERNAMES', {'ops'})
+    login(make_user('student'))
+    assert client.get('/debug/workers').status_code == 403
+    login(make_user('driver', username='ops'))
+    assert client.get('/debug/workers').get_json()['timed_out'] == 0
+
+
+def test_register_hashes_through_pool(app, client):
+    from app import User
+    response = client.post('/register', data={
+        'username': 'pooled', 'email': 'pooled@example.com', 'password': 'pw',
+        'phone': '123', 'user_type': 'student'
+    })
+    assert response.status_code == 302
+    assert User.query.filter_by(username='pooled').one().check_password('pw')
+    assert app.extensions['cpu_pool'].stats()['completed'] >= 2
+
+
+def test_periodic_worker_survives_failures_and_runs_on_stop():
+    calls = []
+    ran_twice = threading.Event()
+
+    def task():
+        calls.append(threading.current_thread().name)
+        if len(calls) == 2:
+            ran_twice.set()
+        if len(calls) == 1:
+            raise RuntimeError('first run fails')
+
+    worker = PeriodicWorker(task, 0.01, name='test-job')
+    worker.start()
+    assert ran_twice.wait(2)
+    worker.stop()
+    worker.join(2)
+
+    assert not worker.is_alive()
+    assert calls[0] == 'test-job' and threading.current_thread().name in calls
@@ -0,0 +1,185 @@
+"""
+Bounded worker pool for CPU-heavy request work, and periodic background jobs
+
+Password hashing and image rendering are handed to a pool of worker
+processes (or threads) instead of running on the request thread. The pool
+admits at most `max_workers + max_queue` jobs at once; anything beyond that
+is rejected immediately with PoolSaturated so callers can answer 503 rather
+than let latency grow without bound. A job's slot is held until the job
+really ends, even when the caller stops waiting for it after `timeout`.
+
+PeriodicWorker is the daemon thread behind the app's background jobs
+(location flushing, matching, archiving, schedule extension, payment
+settlement): it runs one task every few seconds and once more on stop.
+"""
+
+import atexit
+import logging
+import math
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+logger = logging.getLogger('edu_ride.workers')
+
+
+class PoolSaturated(Exception):
+    """Raised when the pool's queue is full"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Worker pool saturated, retry after {retry_after}s')
+        self.retry_after = retry_after
+
+
+def _timed_call(fn, args, kwargs):
+    # Runs in the worker; wall-clock stamps let the caller split queue and run time
+    started = time.time()
+    result = fn(*args, **kwargs)
+    return started, time.time(), result
+
+
+class BoundedPool:
+    """Executor wrapper with admission control and queue metrics.
+
+    kind is 'process', 'thread' or 'inline' (run on the calling thread,
+    still counted and bounded; useful for tests and single-process debugging).
+    """
+
+    def __init__(self, max_workers, max_queue, kind='process', timeout=None):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.kind = kind
+        self.timeout = timeout
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.queue_seconds_total = 0.0
+        self.queue_seconds_max = 0.0
+        self.run_seconds_total = 0.0
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.kind == 'process':
+                        # forkserver avoids forking a multi-threaded web worker
+                        methods = multiprocessing.get_all_start_methods()
+                        context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                        self._executor = ProcessPoolExecutor(self.max_workers, mp_context=context)
+                    else:
+                        self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='cpu-pool')
+        return self._executor
+
+    @property
+    def queue_depth(self):
+        """Jobs admitted but waiting for a free worker"""
+        return max(self.in_flight - self.max_workers, 0)
+
+    def retry_after(self):
+        avg_run = self.run_seconds_total / self.completed if self.completed else 1.0
+        waves = (self.in_flight + 1) / self.max_workers
+        return max(1, math.ceil(avg_run * waves))
+
+    def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) in the pool and wait for the result"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PoolSaturated(self.retry_after())
+
+        submitted_at = time.time()
+        with self._lock:
+            self.in_flight += 1
+            self.submitted += 1
+        if self.kind == 'inline':
+            try:
+                started, finished, result = _timed_call(fn, args, kwargs)
+            finally:
+                self._release()
+        else:
+            try:
+                future = self._get_executor().submit(_timed_call, fn, args, kwargs)
+            except BaseException:
+                self._release()
+                raise
+            # Release when the job ends, not when we give up on it, so a
+            # timed-out job still counts against the bound while it runs
+            future.add_done_callback(self._release)
+            try:
+                started, finished, result = future.result(timeout=self.timeout)
+            except TimeoutError:
+                future.cancel()  # only succeeds if it never started
+                with self._lock:
+                    self.timed_out += 1
+                raise PoolSaturated(self.retry_after())
+
+        queued = max(started - submitted_at, 0.0)
+        with self._lock:
+            self.completed += 1
+            self.queue_seconds_total += queued
+            self.queue_seconds_max = max(self.queue_seconds_max, queued)
+            self.run_seconds_total += finished - started
+        return result
+
+    def _release(self, future=None):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            completed = self.completed
+            return {
+                'kind': self.kind,
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'in_flight': self.in_flight,
+                'queue_depth': self.queue_depth,
+                'submitted': self.submitted,
+                'completed': completed,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'queue_seconds_avg': self.queue_seconds_total / completed if completed else 0.0,
+                'queue_seconds_max': self.queue_seconds_max,
+                'run_seconds_avg': self.run_seconds_total / completed if completed else 0.0,
+            }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def create_pool(max_workers=None, max_queue=None, kind='process', timeout=None):
+    max_workers = max_workers or multiprocessing.cpu_count()
+    max_queue = max_queue if max_queue is not None else max_workers * 2
+    pool = BoundedPool(max_workers, max_queue, kind=kind, timeout=timeout)
+    atexit.register(pool.shutdown)
+    return pool
+
+
+class PeriodicWorker(threading.Thread):
+    """Daemon thread that calls `task` every `interval` seconds"""
+
+    def __init__(self, task, interval, name):
+        super().__init__(name=name, daemon=True)
+        self.task = task
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.task()
+            except Exception as e:
+                logger.error('%s failed: %s', self.name, e)
+
+    def stop(self):
+        self._stop_event.set()
+        self.task()
@@ -0,0 +1,13 @@
+"""
+WSGI entry point for production servers
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+import os
+
+from app import create_app, shutdown_app
+
+app = create_app(os.environ.get('FLASK_ENV', 'production'))
+
+__all__ = ['app', 'shutdown_app']